@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Argument Types Memory Benchmark
+Compares the footprint of the slotted ZeroTierNodeArgs against the
+previous plain-class implementation when modelling large fleets
+
+Usage:
+    python pulumi/benchmarks/bench_args_memory.py [--sizes 1000 10000 100000]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from typing import Dict, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cloudcurio_lib.zerotier import ZeroTierNodeArgs
+
+
+class LegacyNodeArgs:
+    """ZeroTierNodeArgs as it was before it moved to FrozenArgs"""
+    def __init__(
+        self,
+        hostname: str,
+        ip_address: Optional[str] = None,
+        description: Optional[str] = None,
+        authorized: bool = True,
+        tags: Optional[Dict[str, str]] = None
+    ):
+        self.hostname = hostname
+        self.ip_address = ip_address
+        self.description = description or f"ZeroTier node for {hostname}"
+        self.authorized = authorized
+        self.tags = tags or {}
+
+
+def measure(cls, count: int):
+    """Bytes allocated and seconds taken to build `count` node args"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    nodes = [
+        cls(
+            hostname=f"node{i:06d}",
+            ip_address=f"172.28.{i // 256 % 256}.{i % 256}",
+            tags={"type": "server"} if i % 10 == 0 else None,
+        )
+        for i in range(count)
+    ]
+    seconds = time.perf_counter() - start
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del nodes
+    return allocated, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Node argument memory benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'nodes':>7} {'type':<16} {'memory':>10} {'per node':>9} {'build':>9}")
+    for size in args.sizes:
+        baseline = None
+        for cls in (LegacyNodeArgs, ZeroTierNodeArgs):
+            allocated, seconds = measure(cls, size)
+            ratio = f"  {allocated / baseline:.2f}x" if baseline else ""
+            baseline = baseline or allocated
+            print(f"{size:>7} {cls.__name__:<16} {allocated / 1024:>8.1f}KB "
+                  f"{allocated / size:>7.0f}B {seconds * 1000:>7.1f}ms{ratio}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+DNS Reconciliation Benchmark
+Times parsing a synthetic zone export and diffing it against a desired
+record set with a known amount of drift
+
+Usage:
+    python pulumi/benchmarks/bench_dns_reconcile.py [--records 10000] [--drift 0.02] [--budget 1.0]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cloudcurio_lib.dns import DnsRecord, in_scope, parse_zone_file, reconcile
+
+ZONE = "cloudcurio.cc"
+
+
+def zone_file(count: int) -> str:
+    """An export-shaped zone: A records under internal, CNAMEs and TXT elsewhere"""
+    lines = [f"$ORIGIN {ZONE}.", "$TTL 3600",
+             "@\t3600\tIN\tSOA\tns1.cloudflare.com. dns.cloudflare.com. 1 10000 2400 604800 3600"]
+    for i in range(count):
+        kind = i % 10
+        if kind < 8:
+            address = f"172.{16 + (i >> 16)}.{i >> 8 & 255}.{i & 255}"
+            lines.append(f"node{i:06d}.internal\t3600\tIN\tA\t{address}")
+        elif kind == 8:
+            lines.append(f"svc{i:06d}\t1\tIN\tCNAME\ttunnel.cfargotunnel.com. "
+                         "; cf_tags=cf-proxied:true")
+        else:
+            lines.append(f'txt{i:06d}\t300\tIN\tTXT\t"v=spf1 include:_spf.{ZONE} -all"')
+    return "\n".join(lines) + "\n"
+
+
+def desired_from(actual, drift: float, seed: int = 0):
+    """The snapshot's records with `drift` of them changed, removed or added"""
+    rng = random.Random(seed)
+    desired = []
+    for record in actual:
+        roll = rng.random()
+        if roll < drift / 3:
+            continue
+        if roll < drift * 2 / 3 and record.type == 'A':
+            record = record.replace(content=f"10.99.{rng.randrange(256)}.{rng.randrange(256)}")
+        desired.append(record)
+    added = int(len(actual) * drift / 3)
+    desired += [
+        DnsRecord(f"new{i:06d}.internal.{ZONE}", 'A', f"10.98.{i >> 8 & 255}.{i & 255}", 3600)
+        for i in range(added)
+    ]
+    return desired
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DNS reconciliation benchmark")
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--drift", type=float, default=0.02)
+    parser.add_argument("--budget", type=float, default=1.0,
+                        help="Seconds allowed for parse + diff")
+    args = parser.parse_args()
+
+    text = zone_file(args.records)
+    start = time.perf_counter()
+    actual = parse_zone_file(text, ZONE)
+    parsed = time.perf_counter()
+    desired = desired_from(actual, args.drift)
+    prepared = time.perf_counter()
+    plan = reconcile(desired, actual, in_scope(ZONE), comments=False)
+    done = time.perf_counter()
+
+    total = (parsed - start) + (done - prepared)
+    print(f"{len(actual)} records, {len(desired)} desired, drift {args.drift:.0%}")
+    print(f"  parse     {(parsed - start) * 1000:8.1f}ms")
+    print(f"  reconcile {(done - prepared) * 1000:8.1f}ms")
+    print(f"  plan      {len(plan.creates)} create, {len(plan.updates)} update, "
+          f"{len(plan.deletes)} delete, {plan.unchanged} unchanged")
+    if total > args.budget:
+        sys.exit(f"parse + reconcile took {total:.3f}s, budget {args.budget}s")
+
+
+if __name__ == "__main__":
+    main()
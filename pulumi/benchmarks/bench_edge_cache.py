@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Edge Cache Benchmark
+Replays synthetic API traffic through the api-worker in worker_cache_harness.mjs
+with caching off, raw-URL cache keys, normalized keys without
+stale-while-revalidate and the deployed cloudcurio_lib.edgecache config,
+and reports hit ratio and origin calls for each
+
+Usage:
+    python pulumi/benchmarks/bench_edge_cache.py [--requests 100000] [--origin-ms 120]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cloudcurio_lib.edgecache import API_CACHE_ROUTES, worker_config
+
+HARNESS = os.path.join(os.path.dirname(__file__), "worker_cache_harness.mjs")
+
+
+def run(node: str, config: str, args) -> dict:
+    command = [node, HARNESS, "--config", config, "--requests", str(args.requests),
+               "--seconds", str(args.seconds), "--origin-ms", str(args.origin_ms),
+               "--seed", str(args.seed)]
+    return json.loads(subprocess.run(command, check=True, capture_output=True, text=True).stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Edge cache benchmark")
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--seconds", type=int, default=3600,
+                        help="Virtual time the requests are spread over")
+    parser.add_argument("--origin-ms", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    node = shutil.which("node")
+    if node is None:
+        sys.exit("node (18 or later) is needed to run the Worker")
+
+    configs = {
+        'no cache': worker_config(()),
+        'raw keys': worker_config(normalize=False),
+        'no SWR': worker_config([route.replace(stale_while_revalidate=0)
+                                 for route in API_CACHE_ROUTES]),
+        'deployed': worker_config(),
+    }
+    results = {label: run(node, config, args) for label, config in configs.items()}
+
+    print(f"{args.requests} requests over {args.seconds}s, origin {args.origin_ms}ms")
+    print(f"{'config':<10} {'hit ratio':>9} {'hits':>7} {'stale':>7} {'misses':>7} {'bypass':>7} "
+          f"{'origin':>7} {'revalid':>7} {'entries':>7} {'seconds':>7}")
+    for label, result in results.items():
+        print(f"{label:<10} {result['hit_ratio']:>9.1%} {result['hits']:>7} {result['stale']:>7} "
+              f"{result['misses']:>7} {result['bypassed']:>7} {result['origin_calls']:>7} "
+              f"{result['revalidations']:>7} {result['cache_entries']:>7} "
+              f"{result['seconds']:>7.1f}")
+
+    for label, result in results.items():
+        served = result['hits'] + result['stale'] + result['misses'] + result['bypassed']
+        if served != result['requests']:
+            sys.exit(f"{label}: responses don't add up to requests")
+        if result['empty_gets']:
+            sys.exit(f"{label}: {result['empty_gets']} GETs were served a cached HEAD "
+                     "response")
+    if results['no cache']['origin_calls'] != args.requests:
+        sys.exit("Requests reached the cache with caching off")
+    if results['deployed']['origin_calls'] > results['raw keys']['origin_calls']:
+        sys.exit("Normalized cache keys called the origin more often than raw ones")
+    saved = 1 - results['deployed']['origin_calls'] / results['no cache']['origin_calls']
+    print(f"deployed config: {saved:.0%} fewer origin calls than no cache, "
+          f"{results['deployed']['stale']} responses served stale while revalidating")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Tunnel Ingress Matcher Benchmark
+Replays a synthetic Logpush sample through cloudflared-style first-match
+evaluation, comparing registry-ordered rules with the compiled ones
+
+Usage:
+    python pulumi/benchmarks/bench_ingress.py                  # the networking stack's services
+    python pulumi/benchmarks/bench_ingress.py --services 40    # a larger, Zipf-distributed registry
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cloudcurio_lib.tunnel import (
+    CATCH_ALL_SERVICE, IngressMatcher, IngressRule, TunnelService, compile_ingress, traffic_shares,
+    tunnel_services,
+)
+
+ZONE = "cloudcurio.cc"
+# Observed-looking mix for the real registry: the chat UI dominates, Prometheus is rare
+STACK_WEIGHTS = {'grafana': 20, 'prometheus': 4, 'loki': 10, 'anythingllm': 60}
+
+
+def registry(count: int):
+    if not count:
+        return tunnel_services("172.28.82.205"), STACK_WEIGHTS
+    services = [TunnelService(f"svc{i:03d}", "172.28.82.205", 8000 + i) for i in range(count)]
+    # Zipf: the busiest services are registered last, the worst case for a hand-written list
+    weights = {service.name: 1 / (count - i) for i, service in enumerate(services)}
+    return services, weights
+
+
+def write_sample(path: Path, weights, requests: int, seed: int = 0):
+    rng = random.Random(seed)
+    names = list(weights) + ["unknown"]
+    mix = list(weights.values()) + [sum(weights.values()) * 0.01]
+    with gzip.open(path, 'wt') as sample:
+        for name in rng.choices(names, mix, k=requests):
+            sample.write(json.dumps({"ClientRequestHost": f"{name}.{ZONE}", "ClientRequestURI": "/",
+                                     "EdgeResponseStatus": 200}) + "\n")
+
+
+def replay(rules, hosts, rounds: int):
+    matcher = IngressMatcher(rules)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for host in hosts:
+            matcher.match(host)
+    seconds = time.perf_counter() - start
+    lookups = len(hosts) * rounds
+    return matcher.tested / lookups, seconds / lookups * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tunnel ingress matcher benchmark")
+    parser.add_argument("--services", type=int, default=0,
+                        help="Synthetic registry size (0: the real one)")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    services, weights = registry(args.services)
+    with tempfile.TemporaryDirectory() as scratch:
+        sample = Path(scratch) / "http_requests.ndjson.gz"
+        write_sample(sample, weights, args.requests)
+        shares = traffic_shares([sample])
+        with gzip.open(sample, 'rt') as lines:
+            hosts = [json.loads(line)["ClientRequestHost"] for line in lines]
+
+    handwritten = [IngressRule(s.service, f"{s.name}.{ZONE}") for s in services]
+    handwritten.append(IngressRule(CATCH_ALL_SERVICE))
+    compiled = compile_ingress(services, ZONE, shares)
+
+    print(f"{len(services)} services, {len(hosts)} sampled requests x {args.rounds}")
+    print(f"{'order':<12} {'rules tested':>13} {'ns/request':>11}")
+    results = {}
+    for label, rules in (("registry", handwritten), ("compiled", compiled)):
+        results[label] = replay(rules, hosts, args.rounds)
+        tested, ns = results[label]
+        print(f"{label:<12} {tested:>13.2f} {ns:>11.0f}")
+    print(f"compiled order: {', '.join(rule.hostname or rule.service for rule in compiled)}"
+          if len(compiled) <= 8 else f"busiest first: {compiled[0].hostname}")
+    speedup = results["registry"][1] / results["compiled"][1]
+    print(f"{speedup:.2f}x faster per request")
+
+
+if __name__ == "__main__":
+    main()
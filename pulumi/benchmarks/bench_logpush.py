@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Logpush Analytics Benchmark
+Generates http_requests exports shaped like the cloudflare stack's
+LogpushJob output and aggregates them row at a time (json.loads per line,
+dicts and a list of latencies) and with cloudcurio_lib.logpush
+
+Usage:
+    python pulumi/benchmarks/bench_logpush.py [--rows 200000] [--files 4] [--workers 4]
+    python pulumi/benchmarks/bench_logpush.py --timestamps rfc3339
+    # real exports
+    python pulumi/benchmarks/bench_logpush.py --logs /var/log/cloudflare/20240601/*.log.gz
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from harness import measure_peak
+from cloudcurio_lib.logpush import LATENCY_BINS, _LOG_RATIO, analyze, read_batches
+
+ZONE = "cloudcurio.cc"
+HOSTS = ["anythingllm", "grafana", "loki", "prometheus", "www", "api", "docs", "status"]
+STATUSES = [200, 200, 200, 200, 200, 200, 204, 301, 304, 304, 403, 404, 429, 500, 502]
+PATHS = ["/", "/api/v1/query", "/api/v1/status", "/static/app.js", "/login", "/admin", "/d/home"]
+DAY_NS = 1_717_200_000 * 10**9
+
+
+def write_fixture(directory: Path, rows: int, files: int, timestamps: str, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    per_file = -(-rows // files)
+    paths = []
+    for index in range(files):
+        count = min(per_file, rows - index * per_file)
+        # Zipf-distributed hosts and clients: a few of each dominate, as in real traffic
+        hosts = np.array(HOSTS)[np.minimum(rng.zipf(1.6, count) - 1, len(HOSTS) - 1)]
+        clients = np.minimum(rng.zipf(1.3, count), 60000)
+        starts = DAY_NS + np.sort(rng.integers(0, 86400 * 10**9, count))
+        ends = starts + (rng.lognormal(np.log(40e6), 1.0, count)).astype(np.int64)
+        sizes = rng.lognormal(8, 2, count).astype(np.int64)
+        statuses = rng.choice(STATUSES, count)
+        uris = rng.choice(PATHS, count)
+        if timestamps == 'rfc3339':
+            starts = np.datetime_as_string(starts.astype('datetime64[ns]'), unit='ms')
+            ends = np.datetime_as_string(ends.astype('datetime64[ns]'), unit='ms')
+        path = directory / f"http_requests_{index:03d}.log.gz"
+        with gzip.open(path, 'wt', compresslevel=1) as export:
+            for i in range(count):
+                client = clients[i]
+                if timestamps == 'rfc3339':
+                    start, end = f'"{starts[i]}Z"', f'"{ends[i]}Z"'
+                else:
+                    start, end = starts[i], ends[i]
+                export.write(
+                    f'{{"ClientIP":"203.0.{client >> 8}.{client & 255}",'
+                    f'"ClientRequestHost":"{hosts[i]}.{ZONE}",'
+                    f'"ClientRequestMethod":"GET","ClientRequestURI":"{uris[i]}",'
+                    f'"EdgeEndTimestamp":{end},'
+                    f'"EdgeResponseBytes":{sizes[i]},"EdgeResponseStatus":{statuses[i]},'
+                    f'"EdgeStartTimestamp":{start},"RayID":"{index:02x}{i:014x}"}}\n'
+                )
+        paths.append(path)
+    return paths
+
+
+def nanos(stamp) -> int:
+    if isinstance(stamp, str):
+        return round(datetime.fromisoformat(stamp.replace('Z', '+00:00')).timestamp() * 1e6) * 1000
+    return stamp
+
+
+def row_at_a_time(paths):
+    """The straightforward version: every request becomes a dict, every latency stays in memory"""
+    hosts, statuses, clients = {}, Counter(), Counter()
+    latencies = []
+    for path in paths:
+        with gzip.open(path, 'rt') as lines:
+            for line in lines:
+                row = json.loads(line)
+                entry = hosts.setdefault(row["ClientRequestHost"].lower(), [0, 0])
+                entry[0] += 1
+                entry[1] += row["EdgeResponseBytes"]
+                statuses[row["EdgeResponseStatus"]] += 1
+                clients[row["ClientIP"]] += 1
+                latencies.append(nanos(row["EdgeEndTimestamp"]) - nanos(row["EdgeStartTimestamp"]))
+    latencies.sort()
+    percentiles = {p: latencies[min(int(p / 100 * len(latencies)), len(latencies) - 1)] / 1e6
+                   for p in (50, 90, 99, 99.9)}
+    return hosts, statuses, percentiles, clients.most_common(10)
+
+
+def timed(function, repeat: int):
+    """The last result and the best time of `repeat` runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def parse_only(paths, batch_bytes: int):
+    for _ in read_batches(paths, batch_bytes=batch_bytes):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logpush analytics benchmark")
+    parser.add_argument("--logs", type=Path, nargs="*",
+                        help="Existing exports instead of generated ones")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--timestamps", choices=("unixnano", "rfc3339"), default="unixnano")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-mb", type=float, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc runs")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.logs:
+            paths = args.logs
+        else:
+            start = time.perf_counter()
+            paths = write_fixture(Path(scratch), args.rows, args.files, args.timestamps)
+            print(f"generated {args.rows} requests in {len(paths)} files ({args.timestamps}) "
+                  f"in {time.perf_counter() - start:.1f}s")
+        megabytes = sum(path.stat().st_size for path in paths) / 1e6
+
+        batch_bytes = int(args.batch_mb * 2**20)
+        runs = {
+            'row at a time': (lambda: row_at_a_time(paths),) * 2,
+            # Worker processes aren't traced, so peak memory is measured in-process
+            'columnar': (lambda: analyze(paths, batch_bytes=batch_bytes, workers=args.workers),
+                         lambda: analyze(paths, batch_bytes=batch_bytes)),
+        }
+        results, seconds = {}, {}
+        print(f"{'pipeline':<14} {'seconds':>8} {'rows/s':>10} {'gz MB/s':>8} {'peak MB':>8}")
+        for label, (run, traced) in runs.items():
+            results[label], seconds[label] = timed(run, args.repeat)
+            peak = "-" if args.no_memory else f"{measure_peak(traced)[1] / 1e6:.1f}"
+            rows = sum(count for count, _ in results['row at a time'][0].values())
+            print(f"{label:<14} {seconds[label]:>8.2f} {rows / seconds[label]:>10.0f} "
+                  f"{megabytes / seconds[label]:>8.1f} {peak:>8}")
+        if args.workers <= 1:
+            _, parsing = timed(lambda: parse_only(paths, batch_bytes), args.repeat)
+            print(f"columnar: {parsing / seconds['columnar']:.0%} parsing, "
+                  f"{1 - parsing / seconds['columnar']:.0%} aggregating")
+
+    hosts, statuses, percentiles, talkers = results['row at a time']
+    stats = results['columnar']
+    if {host: tuple(entry) for host, entry in hosts.items()} != stats.per_host():
+        sys.exit("Per-host totals differ")
+    if dict(statuses) != stats.status_histogram():
+        sys.exit("Status histograms differ")
+    # Half a bin either side of the exact value, plus one bin for rank rounding
+    tolerance = np.exp(1.5 * _LOG_RATIO) - 1
+    for p, value in stats.latency_percentiles().items():
+        if abs(value - percentiles[p]) > tolerance * percentiles[p] + 1e-3:
+            sys.exit(f"p{p:g} latency {value:.3f}ms, exact {percentiles[p]:.3f}ms")
+    if [ip for ip, _ in stats.top_talkers(5)] != [ip for ip, _ in talkers[:5]]:
+        sys.exit(f"Top talkers differ: {stats.top_talkers(5)} vs {talkers[:5]}")
+
+    print(f"\n{'host':<28} {'requests':>9} {'MB':>8}")
+    for host, (count, total) in list(stats.per_host().items())[:8]:
+        print(f"{host:<28} {count:>9} {total / 1e6:>8.1f}")
+    latency = stats.latency_percentiles().items()
+    print("latency: " + ", ".join(f"p{p:g} {value:.1f}ms" for p, value in latency)
+          + f" ({LATENCY_BINS} bins)")
+    statuses = stats.status_histogram().items()
+    print("statuses: " + ", ".join(f"{status} {count}" for status, count in statuses))
+    print(f"top talkers (each within {stats.talker_error}): "
+          + ", ".join(f"{ip} {count}" for ip, count in stats.top_talkers(5)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Rate Limit Simulator Benchmark
+Replays synthetic API traffic (steady users, pollers and a few abusive
+clients) through a grid of candidate rate limits, checks the vectorized
+replay against a per-request deque implementation and reports throughput
+
+Usage:
+    python pulumi/benchmarks/bench_rate_limit.py [--requests 5000000] [--reference 200000]
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cloudcurio_lib.ratelimit import RequestLog, candidate_rules, replay
+from cloudcurio_lib.waf import API_RATE_LIMIT
+
+PATTERNS = ["/api/*", "/*"]
+HOUR_MS = 3600 * 1000
+
+
+def synthetic_log(requests: int, seed: int = 0) -> RequestLog:
+    rng = np.random.default_rng(seed)
+    # Abusive clients are 0.5% of clients but ~30% of requests, in minute-long bursts
+    users = max(requests // 400, 10)
+    attackers = max(users // 200, 1)
+    abusive_requests = int(requests * 0.3)
+    user_requests = requests - abusive_requests
+
+    # 1% of users are dashboards polling every ~2s, which a tight limit catches too
+    pollers = users // 100
+    polls = np.arange(0, HOUR_MS, 2000)
+    poll_clients = np.repeat(np.arange(pollers), len(polls))
+    poll_times = np.tile(polls, pollers) + rng.integers(0, 500, pollers * len(polls))
+    user_requests -= len(poll_times)
+    user_clients = np.concatenate((rng.integers(pollers, users, user_requests), poll_clients))
+    user_times = np.concatenate((rng.integers(0, HOUR_MS, user_requests), poll_times))
+    user_requests = len(user_times)
+
+    burst_starts = rng.integers(0, HOUR_MS - 60000, attackers * 10)
+    burst = rng.integers(0, len(burst_starts), abusive_requests)
+    abusive_clients = users + burst % attackers
+    abusive_times = burst_starts[burst] + rng.integers(0, 60000, abusive_requests)
+
+    clients = np.concatenate((user_clients, abusive_clients))
+    times = np.concatenate((user_times, abusive_times))
+    abusive = np.concatenate((np.zeros(user_requests, bool), np.ones(abusive_requests, bool)))
+    # Most attack traffic is on the API; 40% of user traffic is
+    api = np.where(abusive, rng.random(requests) < 0.9, rng.random(requests) < 0.4)
+    matches = np.where(api, 0b11, 0b10)
+    order = np.argsort(times, kind='stable')
+    return RequestLog(clients[order], times[order], abusive[order], matches[order], PATTERNS)
+
+
+def reference(log: RequestLog, rule) -> tuple:
+    """One request at a time, a deque of timestamps per client"""
+    bit = log.patterns.index(rule.path)
+    windows, mitigated_until, clients = {}, {}, set()
+    challenged = [0, 0]
+    period, timeout = rule.period * 1000, rule.mitigation_ms
+    columns = (log.clients, log.times, log.abusive, log.matches)
+    for client, now, abusive, matches in zip(*(column.tolist() for column in columns)):
+        if not matches >> bit & 1:
+            continue
+        window = windows.setdefault(client, deque())
+        window.append(now)
+        while window[0] <= now - period:
+            window.popleft()
+        if len(window) > rule.threshold:
+            mitigated_until[client] = now + timeout
+            hit = True
+        else:
+            hit = timeout and now < mitigated_until.get(client, -1)
+        if hit:
+            challenged[abusive] += 1
+            clients.add(client)
+    return challenged[0], challenged[1], len(clients)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rate limit simulator benchmark")
+    parser.add_argument("--requests", type=int, default=5_000_000)
+    parser.add_argument("--reference", type=int, default=200_000,
+                        help="Requests checked against the deque version")
+    parser.add_argument("--thresholds", default="20,50,100,200,500,1000")
+    parser.add_argument("--periods", default="10,60,300")
+    args = parser.parse_args()
+
+    thresholds = [int(value) for value in args.thresholds.split(",")]
+    periods = [int(value) for value in args.periods.split(",")]
+    rules = candidate_rules(thresholds, periods)
+    rules += candidate_rules(thresholds, periods, API_RATE_LIMIT.replace(path="/*"))
+    log = synthetic_log(args.requests)
+    start = time.perf_counter()
+    outcomes = replay(log, rules)
+    seconds = time.perf_counter() - start
+
+    print(f"{len(log)} requests over an hour, {len(rules)} candidate rules")
+    print(f"{'rule':<18} {'legit hit':>10} {'abuse hit':>10} {'FP rate':>8} {'caught':>7} "
+          f"{'clients':>8}")
+    for outcome in outcomes:
+        marker = " *" if outcome.rule == API_RATE_LIMIT else ""
+        print(f"{outcome.rule.label + marker:<18} {outcome.challenged_legitimate:>10} "
+              f"{outcome.challenged_abusive:>10} {outcome.false_positive_rate:>8.2%} "
+              f"{outcome.catch_rate:>7.1%} {outcome.clients_challenged:>8}")
+    per_minute = len(log) * 60 / seconds
+    evaluations = per_minute * len(rules)
+    print(f"replayed in {seconds:.2f}s: {per_minute / 1e6:.0f}M requests/min "
+          f"through all {len(rules)} rules ({evaluations / 1e6:.0f}M rule evaluations/min)")
+
+    head = slice(args.reference)
+    sample = RequestLog(log.clients[head], log.times[head], log.abusive[head], log.matches[head],
+                        PATTERNS)
+    checked = [API_RATE_LIMIT, API_RATE_LIMIT.replace(threshold=20, period=10),
+               API_RATE_LIMIT.replace(threshold=50, mode="ban", timeout=600),
+               API_RATE_LIMIT.replace(path="/*")]
+    start = time.perf_counter()
+    expected = [reference(sample, rule) for rule in checked]
+    reference_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = [(o.challenged_legitimate, o.challenged_abusive, o.clients_challenged)
+              for o in replay(sample, checked)]
+    vectorized_seconds = time.perf_counter() - start
+    if actual != expected:
+        sys.exit(f"Vectorized replay disagrees with the reference: {actual} vs {expected}")
+    print(f"matches the deque version on {len(sample)} requests x {len(checked)} rules "
+          f"({reference_seconds / vectorized_seconds:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Stack Evaluation Benchmarks
+Evaluates every Pulumi program under pulumi/ with mocks and synthetic
+inventories, recording evaluation time, peak memory and resource count
+
+Usage (offline; no Pulumi engine or cloud credentials needed):
+    python -m pytest pulumi/benchmarks                     # check against stack_baseline.json
+    python -m pytest pulumi/benchmarks --update-baseline   # record a new baseline
+"""
+
+import pytest
+
+from harness import measure_peak, run_stack
+
+NODE_COUNTS = (5, 100, 1000)
+# Stacks that build per-node resources from the inventory get every node
+# count; the rest don't read it, so one run each is enough
+STACKS = {
+    'cloudflare': NODE_COUNTS,
+    'networking': NODE_COUNTS,
+    'infrastructure': NODE_COUNTS,
+    'security': (None,),
+    'vercel': (None,),
+}
+CASES = [
+    pytest.param(stack, nodes, id=stack if nodes is None else f"{stack}-{nodes}")
+    for stack, counts in STACKS.items()
+    for nodes in counts
+]
+
+
+def _run(stack, nodes):
+    """run_stack(), skipping stacks whose provider SDK is not installed here"""
+    try:
+        return run_stack(stack, nodes)
+    except ModuleNotFoundError as exc:
+        pytest.skip(f"{stack}: provider not installed ({exc})")
+
+
+@pytest.mark.parametrize("stack, nodes", CASES)
+def bench_stack(benchmark, stack_baseline, stack, nodes):
+    _run(stack, nodes)
+    result = benchmark.pedantic(run_stack, args=(stack, nodes), rounds=3, iterations=1)
+    _, peak = measure_peak(lambda: run_stack(stack, nodes))
+
+    seconds = benchmark.stats.stats.median if benchmark.stats else result.seconds
+    benchmark.extra_info.update(resources=result.resource_count, peak_bytes=peak)
+    key = stack if nodes is None else f"{stack}[{nodes}]"
+    stack_baseline.check(key, seconds=seconds, peak_bytes=peak, resources=result.resource_count)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+WAF Rule Evaluation Benchmark
+Replays requests through the custom rules the two stacks used to declare
+separately and through optimize_rules(), reporting evaluation cost per
+request and per-rule hit rates
+
+Usage:
+    python pulumi/benchmarks/bench_waf.py                          # synthetic traffic
+    python pulumi/benchmarks/bench_waf.py --logpush http_requests.ndjson.gz
+    python pulumi/benchmarks/bench_waf.py --blocklist 60           # plus one block rule per country
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cloudcurio_lib.waf import (
+    WAF_RULES, WafEvaluator, WafRule, optimize_rules, request_from_logpush,
+)
+
+# What the cloudflare stack declared on top of the security stack's rules
+CLOUDFLARE_STACK_RULES = (
+    WafRule('block', '(http.request.uri.path contains "/admin" and not ip.geoip.country eq "US")',
+            "Block non-US access to admin"),
+    WafRule('challenge', '(cf.threat_score gt 10)', "Challenge high threat score requests"),
+)
+COUNTRIES = ["US"] * 12 + ["CA", "GB", "DE", "FR", "NL", "IN", "BR", "JP", "CN", "RU", "KP", "IR"]
+PATHS = ["/", "/api/v1/status", "/api/v1/query", "/static/app.js", "/admin", "/admin/users",
+         "/login"]
+
+
+def blocklist_rules(count: int):
+    # One rule per country, the way they tend to accrete by hand
+    codes = [f"{chr(65 + i // 26)}{chr(65 + i % 26)}" for i in range(count)]
+    return [WafRule('block', f'(ip.geoip.country eq "{code}")', f"Block {code}") for code in codes]
+
+
+def synthetic_requests(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        {
+            'http.request.uri.path': rng.choice(PATHS),
+            'ip.src': f"198.51.100.{rng.randrange(1, 255)}",
+            'ip.geoip.country': rng.choice(COUNTRIES),
+            'cf.threat_score': int(rng.expovariate(1 / 3)),
+            'cf.bot_management.score': rng.randint(1, 99),
+        }
+        for _ in range(count)
+    ]
+
+
+def logpush_requests(paths):
+    requests = []
+    for path in paths:
+        opener = gzip.open if path.suffix == '.gz' else open
+        with opener(path, 'rt') as lines:
+            requests.extend(request_from_logpush(json.loads(line))
+                            for line in lines if line.strip())
+    return requests
+
+
+def decisions(rules, requests):
+    evaluator = WafEvaluator(rules)
+    return [getattr(evaluator.evaluate(request), 'action', 'pass') for request in requests]
+
+
+def replay(rules, requests, rounds: int):
+    timed = WafEvaluator(rules)
+    for _ in range(rounds):
+        outcomes = timed.replay(requests)
+    # A second, counting pass so the counter doesn't skew the timing
+    counted = WafEvaluator(rules, count_predicates=True)
+    counted.replay(requests)
+    ns = timed.seconds / timed.requests * 1e9
+    return outcomes, ns, counted.predicates / len(requests), counted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WAF rule evaluation benchmark")
+    parser.add_argument("--logpush", type=Path, nargs="*",
+                        help="Recorded http_requests NDJSON (optionally .gz)")
+    parser.add_argument("--requests", type=int, default=20000,
+                        help="Synthetic requests when no --logpush")
+    parser.add_argument("--blocklist", type=int, default=0, help="Extra per-country block rules")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    requests = logpush_requests(args.logpush) if args.logpush else synthetic_requests(args.requests)
+    if not requests:
+        sys.exit("No requests to replay")
+    extra = blocklist_rules(args.blocklist)
+    handwritten = list(CLOUDFLARE_STACK_RULES) + extra + list(WAF_RULES)
+    optimized = optimize_rules(list(CLOUDFLARE_STACK_RULES) + extra + list(WAF_RULES))
+
+    print(f"{len(requests)} requests x {args.rounds}")
+    print(f"{'rules':<12} {'count':>6} {'predicates':>11} {'ns/request':>11}")
+    results = {}
+    for label, rules in (("handwritten", handwritten), ("optimized", optimized)):
+        results[label] = replay(rules, requests, args.rounds)
+        outcomes, ns, predicates, _ = results[label]
+        print(f"{label:<12} {len(rules):>6} {predicates:>11.2f} {ns:>11.0f}")
+    pairs = zip(decisions(handwritten, requests), decisions(optimized, requests))
+    mismatched = sum(a != b for a, b in pairs)
+    if mismatched:
+        sys.exit(f"Optimized rules decide {mismatched} requests differently")
+    totals = sorted(results['optimized'][0].items())
+    print(f"outcomes: {', '.join(f'{action} {count}' for action, count in totals)}")
+    print(f"{results['handwritten'][1] / results['optimized'][1]:.2f}x faster per request")
+
+    print(f"\n{'hit rate':>9} {'hits':>7}  rule")
+    for row in results["optimized"][3].report():
+        description = row['description']
+        if len(description) > 60:
+            description = description[:57] + "..."
+        print(f"{row['hit_rate']:>9.1%} {row['hits']:>7}  {row['action']}: {description}")
+
+
+if __name__ == "__main__":
+    main()
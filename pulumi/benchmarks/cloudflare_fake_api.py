@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Fake Cloudflare DNS API
+Local stand-in for the zone DNS records endpoints that enforces a rolling
+request limit, so the DNS change scheduler can be exercised offline
+
+Usage:
+    python pulumi/benchmarks/cloudflare_fake_api.py --port 8788 --limit 1200 --window 300
+    # then CloudflareDnsClient(zone_id, token, base_url="http://127.0.0.1:8788/client/v4")
+
+Only the dns_records list/create/patch/delete and batch endpoints are
+implemented. Requests over the limit get a 429 with Retry-After, and
+--flaky-429 injects extra 429s without the header.
+"""
+
+import argparse
+import collections
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+BATCH_LIMIT = 200
+_ROUTE = re.compile(r"^/client/v4/zones/(?P<zone>[^/]+)/dns_records(?:/(?P<id>batch|[^/]+))?$")
+
+
+class FakeZone:
+    """In-memory DNS records with a sliding-window rate limit"""
+
+    def __init__(self, limit: int = 1200, window: float = 300, flaky_429: float = 0.0,
+                 seed: int = 0):
+        self.limit = limit
+        self.window = window
+        self.flaky_429 = flaky_429
+        self.records: Dict[str, Dict] = {}
+        self.requests = 0
+        self.limited = 0
+        self.peak_window = 0
+        self._ids = itertools.count(1)
+        self._recent = collections.deque()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def admit(self) -> Tuple[bool, Optional[float]]:
+        """Count a request; (False, retry_after) when it is over the limit"""
+        with self._lock:
+            now = time.monotonic()
+            self.requests += 1
+            while self._recent and self._recent[0] <= now - self.window:
+                self._recent.popleft()
+            if len(self._recent) >= self.limit:
+                self.limited += 1
+                return False, self._recent[0] + self.window - now
+            if self.flaky_429 and self._random.random() < self.flaky_429:
+                self.limited += 1
+                return False, None
+            self._recent.append(now)
+            self.peak_window = max(self.peak_window, len(self._recent))
+            return True, None
+
+    def _check(self, record: Dict, ignore: Optional[str] = None):
+        for field in ('name', 'type', 'content'):
+            if not record.get(field):
+                raise ValueError(9000, f"DNS record is missing {field}")
+        key = (record['name'], record['type'], record['content'])
+        for existing in self.records.values():
+            same = (existing['name'], existing['type'], existing['content']) == key
+            if same and existing['id'] != ignore:
+                raise ValueError(81058, "An identical record already exists.")
+
+    def create(self, record: Dict) -> Dict:
+        self._check(record)
+        created = {**record, 'id': f"rec{next(self._ids):08d}"}
+        self.records[created['id']] = created
+        return created
+
+    def update(self, record_id: str, changes: Dict) -> Dict:
+        if record_id not in self.records:
+            raise ValueError(81044, "Record does not exist.")
+        updated = {**self.records[record_id], **changes, 'id': record_id}
+        self._check(updated, ignore=record_id)
+        self.records[record_id] = updated
+        return updated
+
+    def delete(self, record_id: str) -> Dict:
+        if self.records.pop(record_id, None) is None:
+            raise ValueError(81044, "Record does not exist.")
+        return {'id': record_id}
+
+    def batch(self, body: Dict) -> Dict:
+        """All-or-nothing, applied deletes, patches, posts as Cloudflare does"""
+        changes = sum(len(body.get(key, [])) for key in ('deletes', 'patches', 'posts'))
+        if changes > BATCH_LIMIT:
+            raise ValueError(81060, f"Batch of {changes} exceeds the limit of {BATCH_LIMIT}")
+        snapshot = dict(self.records)
+        try:
+            return {
+                'deletes': [self.delete(item['id']) for item in body.get('deletes', [])],
+                'patches': [self.update(item['id'], item) for item in body.get('patches', [])],
+                'posts': [self.create(item) for item in body.get('posts', [])],
+            }
+        except ValueError:
+            self.records = snapshot
+            raise
+
+
+class Handler(BaseHTTPRequestHandler):
+    zone: FakeZone = None
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: Dict, headers: Optional[Dict] = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status: int, code: int, message: str, headers: Optional[Dict] = None):
+        errors = [{'code': code, 'message': message}]
+        self._reply(status, {'success': False, 'errors': errors, 'result': None}, headers)
+
+    def _handle(self, method: str):
+        parts = urlsplit(self.path)
+        route = _ROUTE.match(parts.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+        if route is None:
+            return self._error(404, 7003, "No route for that URI")
+
+        admitted, retry_after = self.zone.admit()
+        if not admitted:
+            headers = {} if retry_after is None else {"Retry-After": str(math.ceil(retry_after))}
+            return self._error(429, 971, "Please wait and consider throttling your request speed",
+                               headers)
+
+        record_id = route.group('id')
+        zone = self.zone
+        try:
+            with zone._lock:
+                if method == 'GET' and record_id is None:
+                    query = parse_qs(parts.query)
+                    page = int(query.get('page', ['1'])[0])
+                    per_page = int(query.get('per_page', ['100'])[0])
+                    records = list(zone.records.values())
+                    result = records[(page - 1) * per_page:page * per_page]
+                    info = {'page': page, 'per_page': per_page, 'count': len(result),
+                            'total_count': len(records),
+                            'total_pages': max(1, math.ceil(len(records) / per_page))}
+                    return self._reply(200, {'success': True, 'errors': [], 'result': result,
+                                             'result_info': info})
+                if method == 'POST' and record_id == 'batch':
+                    result = zone.batch(body)
+                elif method == 'POST' and record_id is None:
+                    result = zone.create(body)
+                elif method in ('PATCH', 'PUT') and record_id:
+                    result = zone.update(record_id, body)
+                elif method == 'DELETE' and record_id:
+                    result = zone.delete(record_id)
+                else:
+                    return self._error(405, 7001, "Method not allowed")
+        except ValueError as exc:
+            code, message = exc.args
+            return self._error(400, code, message)
+        self._reply(200, {'success': True, 'errors': [], 'result': result})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+def serve(zone: FakeZone, port: int = 0) -> ThreadingHTTPServer:
+    """Start the fake API on a background thread; port 0 picks a free one"""
+    handler = type("ZoneHandler", (Handler,), {'zone': zone})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/client/v4"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Cloudflare DNS API")
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--limit", type=int, default=1200, help="Requests allowed per window")
+    parser.add_argument("--window", type=float, default=300, help="Window length in seconds")
+    parser.add_argument("--flaky-429", type=float, default=0.0,
+                        help="Probability of a spurious 429")
+    args = parser.parse_args()
+
+    zone = FakeZone(args.limit, args.window, args.flaky_429)
+    server = serve(zone, args.port)
+    print(f"Fake Cloudflare API on {base_url(server)} ({args.limit} requests / {args.window:g}s)")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"requests={zone.requests} limited={zone.limited} records={len(zone.records)}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Stack Benchmark Baseline
+Compares each benchmark against stack_baseline.json and, with
+--update-baseline, records the measured cost plus headroom instead
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+# bench_stacks imports harness as a sibling module
+sys.path.insert(0, os.path.dirname(__file__))
+
+BASELINE_FILE = Path(__file__).resolve().parent / "stack_baseline.json"
+HEADROOM = 1.5
+# Sub-50ms programs are dominated by scheduler noise; never budget below this
+MIN_SECONDS = 0.05
+
+
+class Baseline:
+    def __init__(self, path: Path, update: bool):
+        self.path = path
+        self.update = update
+        self.entries: Dict[str, Dict] = json.loads(path.read_text()) if path.exists() else {}
+        self.measured: Dict[str, Dict] = {}
+
+    def check(self, key: str, seconds: float, peak_bytes: int, resources: int):
+        """Fail the calling benchmark when it regressed past the stored entry"""
+        self.measured[key] = {
+            'seconds': round(max(seconds * HEADROOM, MIN_SECONDS), 4),
+            'peak_bytes': int(peak_bytes * HEADROOM),
+            'resources': resources,
+        }
+        entry = self.entries.get(key)
+        if self.update or entry is None:
+            return
+        failures = []
+        if seconds > entry['seconds']:
+            failures.append(f"evaluation took {seconds:.3f}s, budget {entry['seconds']:.3f}s")
+        if peak_bytes > entry['peak_bytes']:
+            failures.append(f"peak memory {peak_bytes / 2 ** 20:.1f}MiB, "
+                            f"budget {entry['peak_bytes'] / 2 ** 20:.1f}MiB")
+        if resources > entry['resources']:
+            failures.append(f"{resources} resources, baseline {entry['resources']}")
+        if failures:
+            pytest.fail(f"{key} regressed: " + "; ".join(failures))
+
+    def save(self):
+        entries = {**self.entries, **self.measured}
+        self.path.write_text(json.dumps(entries, indent=2, sort_keys=True) + "\n")
+
+
+def pytest_addoption(parser):
+    parser.addoption("--update-baseline", action="store_true",
+                     help=f"Write measured cost x{HEADROOM} to {BASELINE_FILE.name} "
+                          "instead of checking it")
+
+
+@pytest.fixture(scope="session")
+def stack_baseline(request):
+    baseline = Baseline(BASELINE_FILE, request.config.getoption("--update-baseline"))
+    yield baseline
+    if baseline.update and baseline.measured:
+        baseline.save()
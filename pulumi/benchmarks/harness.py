@@ -0,0 +1,175 @@
+"""
+Pulumi Mocks Harness
+Runs Pulumi programs offline under pulumi.runtime.set_mocks and records
+evaluation time, registered resources and an estimate of the state size
+"""
+
+import json
+import os
+import runpy
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pulumi
+from pulumi import ComponentResource
+from pulumi.runtime.stack import wait_for_rpcs
+from pulumi.runtime.sync_await import _sync_await
+
+# Make cloudcurio_lib importable from pulumi/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cloudcurio_lib import inventory as inventory_module
+from cloudcurio_lib.inventory import Host, Inventory
+
+PROJECT = "bench"
+STACK = "bench"
+STACKS_DIR = Path(__file__).resolve().parent.parent
+
+# Enough configuration for every stack to evaluate without a real backend
+STACK_CONFIG = {
+    'cloudflare_account_id': 'bench-account',
+    'tunnel_secret': 'YmVuY2gtdHVubmVsLXNlY3JldA==',
+    'zerotier_network_id': '0000000000000000',
+}
+# Stands in for cbwdellr720 in synthetic inventories; node00000 is always a server
+SYNTHETIC_CONFIG = {'tunnel_host': 'node00000'}
+# Invoke results use the wire (camelCase) property names
+CALL_RESULTS = {
+    'cloudflare:index/getZone:getZone': {
+        'zoneId': 'bench-zone', 'name': 'cloudcurio.cc', 'accountId': 'bench-account',
+    },
+}
+
+
+class RecordingMocks(pulumi.runtime.Mocks):
+    """Mocks that echo inputs back as outputs and record every registration"""
+
+    def __init__(self, call_results: Optional[Dict[str, Dict]] = None):
+        self.resources: List[Dict] = []
+        self.calls: List[str] = []
+        self.call_results = call_results or {}
+
+    def new_resource(self, args: pulumi.runtime.MockResourceArgs):
+        self.resources.append({'type': args.typ, 'name': args.name, 'inputs': args.inputs})
+        return [f"{args.name}-id", dict(args.inputs)]
+
+    def call(self, args: pulumi.runtime.MockCallArgs):
+        self.calls.append(args.token)
+        return dict(self.call_results.get(args.token, {}), id=f"{args.token}-id")
+
+
+class RunResult:
+    """Measurements from one mocked program evaluation"""
+
+    def __init__(self, seconds: float, resources: List[Dict], outputs: Dict[str, Dict],
+                 calls: List[str]):
+        self.seconds = seconds
+        self.resources = resources
+        self.outputs = outputs
+        self.calls = calls
+
+    @property
+    def resource_count(self) -> int:
+        return len(self.resources)
+
+    @property
+    def state_bytes(self) -> int:
+        """
+        Approximate checkpoint size: one JSON record per resource with its
+        URN, type, inputs and registered outputs, as `pulumi stack export` has
+        """
+        total = 0
+        for resource in self.resources:
+            record = {
+                'urn': f"urn:pulumi:{STACK}::{PROJECT}::{resource['type']}::{resource['name']}",
+                'type': resource['type'],
+                'inputs': resource['inputs'],
+                'outputs': self.outputs.get(resource['name'], resource['inputs']),
+            }
+            total += len(json.dumps(record, default=str))
+        return total
+
+
+def run_mocked(program: Callable[[], None], config: Optional[Dict[str, str]] = None,
+               call_results: Optional[Dict[str, Dict]] = None) -> RunResult:
+    """Evaluate `program` under fresh mocks and wait for every registration"""
+    mocks = RecordingMocks(call_results)
+    pulumi.runtime.set_mocks(mocks, project=PROJECT, stack=STACK, preview=True)
+    pulumi.runtime.set_all_config({f"{PROJECT}:{key}": value
+                                   for key, value in (config or {}).items()})
+
+    outputs: Dict[str, Dict] = {}
+    original = ComponentResource.register_outputs
+
+    def record_outputs(self, values):
+        outputs[self._name] = values
+        return original(self, values)
+
+    ComponentResource.register_outputs = record_outputs
+    try:
+        start = time.perf_counter()
+        program()
+        _sync_await(wait_for_rpcs())
+        seconds = time.perf_counter() - start
+    finally:
+        ComponentResource.register_outputs = original
+    return RunResult(seconds, mocks.resources, outputs, mocks.calls)
+
+
+def synthetic_inventory(node_count: int) -> Inventory:
+    """An inventory of `node_count` ZeroTier nodes cycling through the real host types"""
+    if node_count > 65000:
+        raise ValueError("Synthetic inventories are limited to the 172.28.0.0/16 subnet")
+    kinds = ('server', 'desktop', 'desktop', 'laptop')
+    hosts = [
+        Host(
+            hostname=f"node{i:05d}",
+            ansible_host=f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+            zerotier_ip=f"172.28.{(i + 10) >> 8}.{(i + 10) & 255}",
+            description=f"Synthetic node {i}",
+            groups=['zerotier_nodes', f"{kinds[i % len(kinds)]}s"],
+            tags={'type': kinds[i % len(kinds)]},
+        )
+        for i in range(node_count)
+    ]
+    return Inventory(hosts, internal_domain="zt.cloudcurio.cc")
+
+
+def run_stack(stack: str, node_count: Optional[int] = None,
+              config: Optional[Dict[str, str]] = None) -> RunResult:
+    """
+    Evaluate pulumi/<stack>/__main__.py under mocks
+    With `node_count` the stack sees a synthetic inventory of that size in
+    place of the repository's, via load_inventory()'s in-process cache.
+    """
+    program = STACKS_DIR / stack / "__main__.py"
+    key = str(inventory_module.REPO_ROOT.resolve())
+    previous = inventory_module._loaded.get(key)
+    synthetic = SYNTHETIC_CONFIG if node_count is not None else {}
+    if node_count is not None:
+        inventory_module._loaded[key] = synthetic_inventory(node_count)
+    try:
+        return run_mocked(
+            lambda: runpy.run_path(str(program), run_name="__main__"),
+            config={**STACK_CONFIG, **synthetic, **(config or {})},
+            call_results=CALL_RESULTS,
+        )
+    finally:
+        if previous is None:
+            inventory_module._loaded.pop(key, None)
+        else:
+            inventory_module._loaded[key] = previous
+
+
+def measure_peak(function: Callable[[], RunResult]) -> Tuple[RunResult, int]:
+    """Run `function` once under tracemalloc; returns its result and peak traced bytes"""
+    tracemalloc.start()
+    try:
+        result = function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Prometheus TSDB Capacity Plan
+Projects head memory, WAL and disk for the monitoring stack from the
+inventory's ZeroTier nodes and sampled /metrics series counts
+
+Usage:
+    python pulumi/benchmarks/plan_capacity.py                     # fixture samples
+    python pulumi/benchmarks/plan_capacity.py --live              # scrape one target per tier
+    python pulumi/benchmarks/plan_capacity.py --fleet 5000 --retention-days 180
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+from pathlib import Path
+from urllib.error import URLError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cloudcurio_lib.inventory import load_inventory
+from cloudcurio_lib.monitoring import (
+    DELL_R720, GiB, CapacityPlanner, HostLimits, MonitoringStackArgs, sample_file, sample_target,
+)
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+SCRAPE_TIERS = {"server": "15s", "desktop": "30s", "laptop": "60s"}
+
+
+def fixture_samples():
+    samples = {
+        tier: sample_file(FIXTURES / f"node_exporter_{tier}.prom")
+        for tier in SCRAPE_TIERS
+    }
+    samples["default"] = samples["server"]
+    return samples
+
+
+def live_samples(targets, labels, fallback):
+    """Scrape the first reachable target of each tier; fixtures fill the gaps"""
+    samples = dict(fallback)
+    seen = set()
+    for target in targets:
+        tier = labels.get(target, {}).get("type", "default")
+        if tier in seen:
+            continue
+        try:
+            samples[tier] = sample_target(target)
+            seen.add(tier)
+            print(f"sampled {tier:<8} {target}: {samples[tier].total} series", file=sys.stderr)
+        except (OSError, URLError) as exc:
+            print(f"could not scrape {target} ({exc}); using fixture for {tier}", file=sys.stderr)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prometheus TSDB capacity plan")
+    parser.add_argument("--live", action="store_true",
+                        help="Sample series counts from live node exporters")
+    parser.add_argument("--fleet", type=int, help="Model N targets with the inventory's tier mix")
+    parser.add_argument("--retention-days", type=int, default=90)
+    parser.add_argument("--memory-gib", type=float,
+                        help=f"Host memory (default {DELL_R720.memory_bytes // GiB})")
+    parser.add_argument("--disk-gb", type=float,
+                        help=f"Prometheus volume (default {DELL_R720.disk_bytes // 1000 ** 3})")
+    parser.add_argument("--json", action="store_true", help="Print the plan as JSON")
+    parser.add_argument("--strict", action="store_true", help="Exit 1 when the plan has warnings")
+    args = parser.parse_args()
+
+    inventory = load_inventory()
+    nodes = inventory.zerotier_nodes()
+    targets = [node.zerotier_ip for node in nodes]
+    labels = {node.zerotier_ip: dict(node.tags) for node in nodes}
+
+    samples = fixture_samples()
+    if args.live:
+        samples = live_samples(targets, labels, samples)
+
+    if args.fleet:
+        mix = itertools.cycle([labels[target] for target in targets])
+        targets = [f"fleet-{i:06d}" for i in range(args.fleet)]
+        labels = {target: next(mix) for target in targets}
+
+    limits = HostLimits(
+        DELL_R720.name,
+        memory_bytes=int(args.memory_gib * GiB) if args.memory_gib else DELL_R720.memory_bytes,
+        disk_bytes=int(args.disk_gb * 1000 ** 3) if args.disk_gb else DELL_R720.disk_bytes,
+    )
+    stack = MonitoringStackArgs(
+        retention_days=args.retention_days,
+        targets=targets,
+        scrape_tiers=SCRAPE_TIERS,
+        target_labels=labels,
+    )
+    plan = CapacityPlanner(limits).plan_stack(stack, samples)
+
+    print(json.dumps(plan.to_dict(), indent=2) if args.json else plan.report())
+    if args.strict and not plan.ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
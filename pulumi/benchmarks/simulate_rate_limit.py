@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Rate Limit Simulation
+Replays Logpush http_requests exports through candidate thresholds and
+periods for the security stack's api-rate-limit and prints what each
+would have challenged
+
+Usage:
+    python pulumi/benchmarks/simulate_rate_limit.py logs/20240601/*.log.gz
+    python pulumi/benchmarks/simulate_rate_limit.py logs/*.log.gz --abusive-ips blocklist.txt \\
+        --thresholds 50,100,200 --periods 10,60
+    python pulumi/benchmarks/simulate_rate_limit.py logs/*.log.gz --abusive-status 401,403 --json
+
+Without labels every request counts as legitimate, which still shows
+who each candidate would have challenged.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cloudcurio_lib.ratelimit import candidate_rules, load_requests, replay
+from cloudcurio_lib.waf import API_RATE_LIMIT, RATE_LIMIT_MODES
+
+
+def integers(text: str):
+    return [int(value) for value in text.split(",") if value]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay Logpush exports through candidate rate limits")
+    parser.add_argument("logs", nargs="+", help="http_requests NDJSON exports (optionally .gz)")
+    parser.add_argument("--zone", default="cloudcurio.cc", help="Host the URL pattern applies to")
+    parser.add_argument("--any-host", action="store_true", help="Count requests to every host")
+    parser.add_argument("--path", action="append",
+                        help=f"Path pattern (repeatable, default {API_RATE_LIMIT.path})")
+    parser.add_argument("--thresholds", type=integers, default=[25, 50, 100, 200, 500])
+    parser.add_argument("--periods", type=integers, default=[10, 60, 300])
+    parser.add_argument("--mode", choices=RATE_LIMIT_MODES, default=API_RATE_LIMIT.mode)
+    parser.add_argument("--timeout", type=int, default=API_RATE_LIMIT.timeout)
+    labels = parser.add_mutually_exclusive_group()
+    labels.add_argument("--abusive-ips", help="File of known abusive client IPs, one per line")
+    labels.add_argument("--abusive-status", type=integers,
+                        help="Statuses that mark a request abusive, e.g. 401,403")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    abusive = None
+    if args.abusive_ips:
+        with open(args.abusive_ips) as listing:
+            abusive = [line.strip() for line in listing
+                       if line.strip() and not line.startswith("#")]
+    elif args.abusive_status:
+        statuses = np.array(args.abusive_status)
+
+        def abusive(batch):
+            return np.isin(batch['status'], statuses)
+
+    paths = args.path or [API_RATE_LIMIT.path]
+    base = API_RATE_LIMIT.replace(mode=args.mode, timeout=args.timeout)
+    rules = [rule for path in paths
+             for rule in candidate_rules(args.thresholds, args.periods, base.replace(path=path))]
+
+    start = time.perf_counter()
+    host = None if args.any_host else args.zone
+    log = load_requests(args.logs, paths, host=host, abusive=abusive)
+    loaded = time.perf_counter() - start
+    start = time.perf_counter()
+    outcomes = replay(log, rules)
+    replayed = time.perf_counter() - start
+
+    if args.json:
+        print(json.dumps([outcome.to_dict() for outcome in outcomes], indent=2))
+        return
+    print(f"{len(log)} matching requests from {len(log.client_names)} clients "
+          f"(read in {loaded:.1f}s, replayed {len(rules)} rules in {replayed:.2f}s)")
+    print(f"{'rule':<22} {'legit hit':>10} {'abuse hit':>10} {'FP rate':>8} {'caught':>7} "
+          f"{'clients':>8}")
+    for outcome in outcomes:
+        marker = " *" if outcome.rule == API_RATE_LIMIT else ""
+        print(f"{outcome.rule.label + marker:<22} {outcome.challenged_legitimate:>10} "
+              f"{outcome.challenged_abusive:>10} {outcome.false_positive_rate:>8.2%} "
+              f"{outcome.catch_rate:>7.1%} {outcome.clients_challenged:>8}")
+    print("* the deployed rule")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env node
+// Worker Cache Harness
+// Runs cloudflare/workers/api-worker.js as Miniflare would (service-worker
+// globals, caches.default, waitUntil) against an in-memory Cache API, a
+// virtual clock and an origin with fixed latency, replays an hour of
+// synthetic API traffic and prints hit ratio and origin calls as JSON.
+// Needs only Node 18+; bench_edge_cache.py drives it with the stack's config.
+//
+// Usage:
+//   node pulumi/benchmarks/worker_cache_harness.mjs --config '<CACHE_ROUTES json>' [--requests 100000]
+
+import fs from 'node:fs'
+import path from 'node:path'
+import { fileURLToPath } from 'node:url'
+import { parseArgs } from 'node:util'
+import vm from 'node:vm'
+
+const here = path.dirname(fileURLToPath(import.meta.url))
+const { values: args } = parseArgs({
+  options: {
+    config: { type: 'string', default: '{"version":1,"routes":[]}' },
+    worker: { type: 'string', default: path.join(here, '..', 'cloudflare', 'workers', 'api-worker.js') },
+    requests: { type: 'string', default: '100000' },
+    seconds: { type: 'string', default: '3600' },
+    'origin-ms': { type: 'string', default: '120' },
+    seed: { type: 'string', default: '1' },
+  },
+})
+
+// Virtual time: every origin call takes the same time, so pending calls
+// finish in the order they started and a FIFO queue is a timer wheel
+const clock = { now: 1_717_200_000_000 }
+const timers = []
+const sleep = ms => new Promise(resolve => timers.push({ at: clock.now + ms, resolve }))
+const settle = () => new Promise(resolve => setImmediate(resolve))
+
+// Lets pending work finish before the clock moves, so the Worker never
+// reads a time later than its request
+async function advance(to) {
+  await settle()
+  while (timers.length && timers[0].at <= to) {
+    const timer = timers.shift()
+    clock.now = timer.at
+    timer.resolve()
+    await settle()
+  }
+  clock.now = Math.max(clock.now, to)
+}
+
+// caches.default: GET entries by URL until their max-age runs out. Like
+// Miniflare it throws on 206 and Vary: *, and drops responses with
+// Set-Cookie, no-store, private or no max-age
+class MemoryCache {
+  constructor() {
+    this.entries = new Map()
+  }
+
+  async match(request) {
+    request = request instanceof Request ? request : new Request(request)
+    const entry = request.method === 'GET' && this.entries.get(request.url)
+    if (!entry) return undefined
+    if (clock.now >= entry.expires) {
+      this.entries.delete(request.url)
+      return undefined
+    }
+    return new Response(entry.body, { status: entry.status, headers: entry.headers })
+  }
+
+  async put(request, response) {
+    request = request instanceof Request ? request : new Request(request)
+    if (request.method !== 'GET') throw new TypeError('Cache.put only accepts GET requests')
+    if (response.status === 206) throw new TypeError('Cache.put does not accept partial responses')
+    if (response.headers.get('vary') === '*') throw new TypeError('Cache.put does not accept Vary: *')
+    const body = await response.arrayBuffer()
+    const control = response.headers.get('cache-control') || ''
+    const maxAge = /s-maxage=(\d+)/.exec(control) || /max-age=(\d+)/.exec(control)
+    if (!maxAge || response.headers.has('set-cookie') || /no-store|private/.test(control)) return
+    this.entries.set(request.url, {
+      body, status: response.status, headers: [...response.headers], expires: clock.now + Number(maxAge[1]) * 1000,
+    })
+  }
+
+  async delete(request) {
+    return this.entries.delete((request instanceof Request ? request : new Request(request)).url)
+  }
+}
+
+function loadWorker(source, config) {
+  const listeners = []
+  const context = vm.createContext({
+    __clock: clock,
+    addEventListener: (type, listener) => type === 'fetch' && listeners.push(listener),
+    caches: { default: new MemoryCache() },
+    CACHE_ROUTES: config,
+    console, Headers, Request, Response, URL, URLSearchParams,
+  })
+  vm.runInContext('Date.now = () => __clock.now', context)
+  vm.runInContext(source, context, { filename: 'api-worker.js' })
+  // The origin is the Worker's own handleRequest, counted and delayed; like
+  // a real origin it answers HEAD with the GET headers and no body
+  const handleRequest = context.handleRequest
+  const origin = { calls: 0 }
+  context.handleRequest = async request => {
+    origin.calls++
+    await sleep(Number(args['origin-ms']))
+    const response = await handleRequest(request)
+    return request.method === 'HEAD' ? new Response(null, response) : response
+  }
+  return { listener: listeners[0], origin, cache: context.caches.default }
+}
+
+// Seeded traffic: Zipf-popular items and searches, tracking parameters and
+// shuffled query strings on a third of requests, some signed-in, HEAD and writes
+function mulberry32(seed) {
+  return () => {
+    seed = (seed + 0x6d2b79f5) | 0
+    let t = Math.imul(seed ^ (seed >>> 15), 1 | seed)
+    t = (t + Math.imul(t ^ (t >>> 7), 61 | t)) ^ t
+    return ((t ^ (t >>> 14)) >>> 0) / 4294967296
+  }
+}
+
+function zipf(random, n, s) {
+  const cdf = new Float64Array(n)
+  let total = 0
+  for (let i = 0; i < n; i++) cdf[i] = total += 1 / Math.pow(i + 1, s)
+  return () => {
+    const target = random() * total
+    let low = 0, high = n - 1
+    while (low < high) {
+      const middle = (low + high) >> 1
+      if (cdf[middle] < target) low = middle + 1
+      else high = middle
+    }
+    return low
+  }
+}
+
+function* traffic(count, seconds, random) {
+  const start = clock.now
+  const item = zipf(random, 5000, 1.1)
+  const term = zipf(random, 2000, 1.0)
+  const times = Array.from({ length: count }, () => random() * seconds * 1000).sort((a, b) => a - b)
+  for (const offset of times) {
+    const roll = random()
+    let path, params = [], method = 'GET'
+    if (roll < 0.2) path = '/v1/status'
+    else if (roll < 0.6) path = `/v1/items/${item()}`
+    else if (roll < 0.75) {
+      path = '/v1/search'
+      params = [['q', `term${term()}`], ['page', String(1 + Math.floor(random() * random() * 4))]]
+    } else if (roll < 0.9) path = random() < 0.5 ? '/' : '/docs'
+    else if (roll < 0.95) path = '/health'
+    else {
+      path = '/v1/items'
+      method = 'POST'
+    }
+    if (method === 'GET' && random() < 0.05) method = 'HEAD'
+    if (random() < 0.33) {
+      params.push(['utm_source', ['newsletter', 'twitter', 'hn'][Math.floor(random() * 3)]])
+      if (random() < 0.5) params.push(['fbclid', Math.floor(random() * 1e9).toString(36)])
+      params.sort(() => random() - 0.5)
+    }
+    const query = params.length ? '?' + new URLSearchParams(params) : ''
+    const headers = random() < 0.05 ? { authorization: 'Bearer session' } : {}
+    yield { at: start + offset, request: new Request(`https://api.cloudcurio.cc${path}${query}`, { method, headers }) }
+  }
+}
+
+async function main() {
+  const { listener, origin, cache } = loadWorker(fs.readFileSync(args.worker, 'utf8'), args.config)
+  const counts = { HIT: 0, STALE: 0, MISS: 0, BYPASS: 0 }
+  // GETs answered without a body, as when a HEAD response was cached under the GET key
+  let emptyGets = 0
+  const inflight = []
+  const started = performance.now()
+  const start = clock.now
+  for (const { at, request } of traffic(Number(args.requests), Number(args.seconds), mulberry32(Number(args.seed)))) {
+    await advance(at)
+    const background = []
+    const event = {
+      request,
+      respondWith(response) {
+        this.response = Promise.resolve(response)
+      },
+      waitUntil(promise) {
+        background.push(promise)
+      },
+    }
+    listener(event)
+    inflight.push(event.response.then(async response => {
+      counts[response.headers.get('x-cache') || 'BYPASS']++
+      const body = await response.arrayBuffer()
+      if (request.method === 'GET' && response.status === 200 && !body.byteLength) emptyGets++
+      await Promise.all(background)
+    }))
+  }
+  while (timers.length) await advance(timers[0].at)
+  await Promise.all(inflight)
+
+  const requests = Number(args.requests)
+  console.log(JSON.stringify({
+    requests,
+    hits: counts.HIT,
+    stale: counts.STALE,
+    misses: counts.MISS,
+    bypassed: counts.BYPASS,
+    hit_ratio: (counts.HIT + counts.STALE) / requests,
+    origin_calls: origin.calls,
+    revalidations: origin.calls - counts.MISS - counts.BYPASS,
+    origin_ratio: origin.calls / requests,
+    cache_entries: cache.entries.size,
+    empty_gets: emptyGets,
+    virtual_seconds: (clock.now - start) / 1000,
+    seconds: (performance.now() - started) / 1000,
+  }))
+}
+
+await main()
@@ -3,17 +3,21 @@ CloudCurio Pulumi Library
 Custom infrastructure components for CloudCurio infrastructure management
 """
 
-from .zerotier import ZeroTierNode, ZeroTierNetwork
+from .zerotier import ZeroTierNode, ZeroTierNetwork, SubnetAllocator
 from .monitoring import MonitoringStack
 from .database import DatabaseStack
 from .web import WebServerStack
+from .inventory import Inventory, load_inventory
 
 __all__ = [
     'ZeroTierNode',
     'ZeroTierNetwork',
+    'SubnetAllocator',
     'MonitoringStack',
     'DatabaseStack',
     'WebServerStack',
+    'Inventory',
+    'load_inventory',
 ]
 
 __version__ = '0.1.0'
@@ -0,0 +1,212 @@
+"""
+Component Argument Base Types
+Slotted, immutable and hashable building blocks for the *Args classes
+"""
+
+import ipaddress
+import re
+import socket
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Optional
+
+_DURATION = re.compile(r"^(\d+(ms|s|m|h|d|w|y))+$")
+_SCALARS = frozenset((str, int, float, bool, type(None)))
+
+
+class FrozenDict(dict):
+    """Read-only, hashable dict; still a dict for Pulumi serialization"""
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("FrozenDict is immutable")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __hash__(self) -> int:
+        return hash(frozenset(self.items()))
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+EMPTY = FrozenDict()
+
+
+def freeze(value: Any) -> Any:
+    """Recursively convert dicts and lists into hashable equivalents"""
+    kind = type(value)
+    if kind in _SCALARS or kind is FrozenDict or (
+            kind is tuple and all(type(v) in _SCALARS for v in value)):
+        return value
+    if kind is dict:
+        return FrozenDict((k, freeze(v)) for k, v in value.items()) if value else EMPTY
+    if kind is list:
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, (FrozenArgs, FrozenDict)):
+        return value
+    if isinstance(value, Mapping):
+        return FrozenDict((k, freeze(v)) for k, v in value.items()) if value else EMPTY
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, set):
+        return frozenset(freeze(v) for v in value)
+    return value
+
+
+class FrozenArgs:
+    """
+    Base class for component arguments
+    Subclasses list their fields in __slots__ and call _set() from __init__.
+    Instances have no per-instance __dict__, cannot be modified after
+    construction, compare and hash by value, and can be built from a dict
+    with coerce() so components accept either form.
+    """
+
+    __slots__ = ()
+    _setters: Dict[str, Any] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Slot descriptors' own setters skip the __setattr__ guard and the
+        # attribute lookup object.__setattr__ does on every call
+        own = {name: cls.__dict__[name].__set__ for name in cls.__dict__.get('__slots__', ())}
+        cls._setters = {**cls._setters, **own}
+
+    def _set(self, **values):
+        setters = self._setters
+        for name, value in values.items():
+            setters[name](self, value if type(value) in _SCALARS else freeze(value))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable; use replace()")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self._values() == other._values()
+
+    def __hash__(self) -> int:
+        return hash((type(self).__name__, self._values()))
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def __reduce__(self):
+        # Values were validated on construction; unpickling just restores them
+        return (_restore, (type(self), self._values()))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def replace(self, **changes) -> "FrozenArgs":
+        """Copy with some fields changed"""
+        return type(self)(**{**self.to_dict(), **changes})
+
+    @classmethod
+    def coerce(cls, value):
+        """Accept an instance or a dict of constructor arguments"""
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, Mapping):
+            return cls(**value)
+        raise TypeError(f"Expected {cls.__name__} or dict, got {type(value).__name__}")
+
+
+def _restore(cls, values: tuple) -> FrozenArgs:
+    args = object.__new__(cls)
+    for name, value in zip(cls.__slots__, values):
+        cls._setters[name](args, value)
+    return args
+
+
+# Validators shared by the argument types; each returns the value or raises ValueError
+
+def require_str(name: str, value: Any, optional: bool = False) -> Optional[str]:
+    if value is None and optional:
+        return None
+    if not isinstance(value, str) or not value:
+        raise ValueError(f"{name} must be a non-empty string, got {value!r}")
+    return value
+
+
+def require_bool(name: str, value: Any) -> bool:
+    if not isinstance(value, bool):
+        raise ValueError(f"{name} must be a bool, got {value!r}")
+    return value
+
+
+def require_int(name: str, value: Any, minimum: Optional[int] = None,
+                maximum: Optional[int] = None) -> int:
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"{name} must be an int, got {value!r}")
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise ValueError(f"{name} must be between {minimum} and {maximum}, got {value}")
+    return value
+
+
+def require_choice(name: str, value: Any, choices: Iterable[str]) -> str:
+    choices = tuple(choices)
+    if value not in choices:
+        raise ValueError(f"{name} must be one of {', '.join(choices)}, got {value!r}")
+    return value
+
+
+def require_duration(name: str, value: Any) -> str:
+    if not isinstance(value, str) or not _DURATION.match(value):
+        raise ValueError(f"{name} must be a Prometheus duration like '15s' or '1m', got {value!r}")
+    return value
+
+
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'y': 31536000}
+_DURATION_PART = re.compile(r"(\d+)(ms|s|m|h|d|w|y)")
+
+
+def duration_seconds(value: str) -> float:
+    """Seconds in a Prometheus duration such as '1m30s'"""
+    require_duration('duration', value)
+    return sum(int(n) * _DURATION_UNITS[unit] for n, unit in _DURATION_PART.findall(value))
+
+
+def require_ip(name: str, value: Any, optional: bool = False) -> Optional[str]:
+    if value is None and optional:
+        return None
+    if isinstance(value, str):
+        try:
+            socket.inet_pton(socket.AF_INET6 if ':' in value else socket.AF_INET, value)
+            return value
+        except OSError:
+            pass
+    raise ValueError(f"{name} must be an IP address, got {value!r}")
+
+
+def require_network(name: str, value: Any) -> str:
+    try:
+        ipaddress.ip_network(value)
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"{name} must be a CIDR network, got {value!r}") from exc
+    return value
+
+
+def require_str_list(name: str, value: Any) -> tuple:
+    values = tuple(value or ())
+    for item in values:
+        require_str(name, item)
+    return values
+
+
+def require_str_map(name: str, value: Any) -> FrozenDict:
+    if not value:
+        return EMPTY
+    mapping = value if type(value) is FrozenDict else FrozenDict(value)
+    for key, item in mapping.items():
+        require_str(f"{name} key", key)
+        if not isinstance(item, str):
+            raise ValueError(f"{name}[{key!r}] must be a string, got {item!r}")
+    return mapping
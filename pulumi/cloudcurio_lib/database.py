@@ -5,11 +5,19 @@ PostgreSQL, MySQL, Redis, and MongoDB infrastructure components
 
 import pulumi
 from pulumi import ComponentResource, ResourceOptions
-from typing import Optional, Dict
+from typing import Optional, Dict, Union
 
+from .args import FrozenArgs, require_bool, require_str
 
-class DatabaseStackArgs:
+
+class DatabaseStackArgs(FrozenArgs):
     """Arguments for DatabaseStack component"""
+
+    __slots__ = (
+        'postgres_enabled', 'mysql_enabled', 'redis_enabled', 'mongodb_enabled',
+        'postgres_version', 'mysql_version', 'redis_version', 'mongodb_version',
+    )
+
     def __init__(
         self,
         postgres_enabled: bool = True,
@@ -21,14 +29,16 @@ class DatabaseStackArgs:
         redis_version: str = "7",
         mongodb_version: str = "6",
     ):
-        self.postgres_enabled = postgres_enabled
-        self.mysql_enabled = mysql_enabled
-        self.redis_enabled = redis_enabled
-        self.mongodb_enabled = mongodb_enabled
-        self.postgres_version = postgres_version
-        self.mysql_version = mysql_version
-        self.redis_version = redis_version
-        self.mongodb_version = mongodb_version
+        self._set(
+            postgres_enabled=require_bool('postgres_enabled', postgres_enabled),
+            mysql_enabled=require_bool('mysql_enabled', mysql_enabled),
+            redis_enabled=require_bool('redis_enabled', redis_enabled),
+            mongodb_enabled=require_bool('mongodb_enabled', mongodb_enabled),
+            postgres_version=require_str('postgres_version', postgres_version),
+            mysql_version=require_str('mysql_version', mysql_version),
+            redis_version=require_str('redis_version', redis_version),
+            mongodb_version=require_str('mongodb_version', mongodb_version),
+        )
 
 
 class DatabaseStack(ComponentResource):
@@ -40,10 +50,11 @@ class DatabaseStack(ComponentResource):
     def __init__(
         self,
         name: str,
-        args: DatabaseStackArgs,
+        args: Union[DatabaseStackArgs, Dict],
         opts: Optional[ResourceOptions] = None
     ):
         super().__init__('cloudcurio:database:Stack', name, {}, opts)
+        args = DatabaseStackArgs.coerce(args)
         
         self.databases = {}
         
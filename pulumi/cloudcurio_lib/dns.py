@@ -0,0 +1,647 @@
+"""
+DNS Record Management
+Reconciles desired records against a zone snapshot into a minimal change
+set, and applies changes to Cloudflare in batches paced by a token bucket
+that backs off adaptively on 429 responses
+"""
+
+import http.client
+import json
+import random
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .args import FrozenArgs, require_bool, require_choice, require_int, require_str
+
+API_BASE = "https://api.cloudflare.com/client/v4"
+# Cloudflare allows 1200 requests per user in any rolling 5 minutes
+CLOUDFLARE_WINDOW_REQUESTS = 1200
+CLOUDFLARE_WINDOW_SECONDS = 300
+# Changes per /dns_records/batch request on the Free plan
+BATCH_SIZE = 200
+# The order the batch endpoint applies changes in; deletes free names for creates
+ACTIONS = ('delete', 'update', 'create')
+RECORD_TYPES = ('A', 'AAAA', 'CNAME', 'TXT', 'MX', 'NS', 'SRV', 'CAA', 'PTR')
+
+
+class CloudflareError(Exception):
+    def __init__(self, message: str, status: int = 0, retryable: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+class RateLimited(CloudflareError):
+    def __init__(self, retry_after: Optional[float]):
+        super().__init__(f"Rate limited (retry after {retry_after}s)", 429, True)
+        self.retry_after = retry_after
+
+
+class RecordChange(FrozenArgs):
+    """One create, update or delete of a DNS record"""
+
+    __slots__ = ('action', 'name', 'type', 'content', 'ttl', 'proxied', 'comment', 'record_id')
+
+    def __init__(
+        self,
+        action: str,
+        name: str,
+        type: str = "A",
+        content: Optional[str] = None,
+        ttl: int = 1,
+        proxied: bool = False,
+        comment: Optional[str] = None,
+        record_id: Optional[str] = None,
+    ):
+        require_choice('action', action, ACTIONS)
+        if action != 'create':
+            require_str('record_id', record_id)
+        if action != 'delete':
+            require_str('content', content)
+        self._set(
+            action=action,
+            name=require_str('name', name),
+            type=require_choice('type', type, RECORD_TYPES),
+            content=content,
+            ttl=require_int('ttl', ttl, minimum=1),
+            proxied=require_bool('proxied', proxied),
+            comment=require_str('comment', comment, optional=True),
+            record_id=record_id,
+        )
+
+    def body(self) -> Dict:
+        """The record as the Cloudflare API expects it"""
+        if self.action == 'delete':
+            return {'id': self.record_id}
+        body = {'name': self.name, 'type': self.type, 'content': self.content,
+                'ttl': self.ttl, 'proxied': self.proxied}
+        if self.comment:
+            body['comment'] = self.comment
+        if self.action == 'update':
+            body['id'] = self.record_id
+        return body
+
+
+class TokenBucket:
+    """
+    Classic token bucket; acquire() blocks until a token is available
+    A bucket of `capacity` refilled at `rate` per second admits at most
+    capacity + rate * window requests in any window, which is how
+    for_window() keeps a client inside a rolling limit.
+    """
+
+    def __init__(self, rate: float, capacity: float,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._updated = clock()
+        self._blocked_until = 0.0
+
+    @classmethod
+    def for_window(cls, requests: int = CLOUDFLARE_WINDOW_REQUESTS,
+                   seconds: float = CLOUDFLARE_WINDOW_SECONDS, burst: Optional[int] = None,
+                   **kwargs) -> "TokenBucket":
+        """A bucket that never exceeds `requests` per rolling `seconds`"""
+        burst = max(1, requests // 20) if burst is None else burst
+        return cls((requests - burst) / seconds, burst, **kwargs)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Take `tokens`, sleeping as needed; returns the seconds spent waiting"""
+        waited = 0.0
+        while True:
+            now = self.clock()
+            if now < self._blocked_until:
+                pause = self._blocked_until - now
+            else:
+                self._refill(now)
+                # Rounding can leave a deficit too small to advance the clock
+                if self.tokens >= tokens - 1e-9:
+                    self.tokens -= tokens
+                    return waited
+                pause = (tokens - self.tokens) / self.rate
+            self.sleep(pause)
+            waited += pause
+
+    def pause(self, seconds: float):
+        """Empty the bucket and admit nothing for `seconds`"""
+        now = self.clock()
+        self._refill(now)
+        self.tokens = 0
+        self._blocked_until = max(self._blocked_until, now + seconds)
+
+
+class CloudflareDnsClient:
+    """Minimal DNS records API client over one keep-alive connection"""
+
+    def __init__(self, zone_id: str, token: str, base_url: str = API_BASE, timeout: float = 30.0):
+        parts = urlsplit(base_url)
+        self.zone_id = zone_id
+        self.token = token
+        self.secure = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.requests = 0
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            cls = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+            self._conn = cls(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def request(self, method: str, path: str, body=None):
+        return self._call(method, path, body).get('result')
+
+    def _call(self, method: str, path: str, body=None) -> Dict:
+        payload = json.dumps(body) if body is not None else None
+        headers = {'Authorization': f"Bearer {self.token}", 'Content-Type': 'application/json'}
+        self.requests += 1
+        # The server may have closed an idle keep-alive connection; retry once on a fresh one
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.request(method, f"{self.prefix}/zones/{self.zone_id}{path}",
+                             body=payload, headers=headers)
+                response = conn.getresponse()
+                raw = response.read()
+                break
+            except (ConnectionError, http.client.HTTPException, OSError) as exc:
+                self.close()
+                if attempt:
+                    raise CloudflareError(f"Cloudflare API unreachable: {exc}",
+                                          retryable=True) from exc
+
+        if response.status == 429:
+            retry_after = response.getheader('Retry-After')
+            raise RateLimited(float(retry_after) if retry_after else None)
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            data = {}
+        if response.status >= 400 or not data.get('success', False):
+            errors = "; ".join(f"{error.get('code')}: {error.get('message')}"
+                               for error in data.get('errors', []))
+            raise CloudflareError(errors or f"HTTP {response.status}", response.status,
+                                  response.status >= 500)
+        return data
+
+    def apply(self, change: RecordChange) -> Dict:
+        if change.action == 'create':
+            return self.request('POST', "/dns_records", change.body())
+        if change.action == 'update':
+            return self.request('PATCH', f"/dns_records/{change.record_id}", change.body())
+        return self.request('DELETE', f"/dns_records/{change.record_id}")
+
+    def list_records(self, per_page: int = 5000) -> Iterator[Dict]:
+        """Every record in the zone, one page at a time"""
+        page = 1
+        while True:
+            data = self._call('GET', f"/dns_records?page={page}&per_page={per_page}")
+            yield from data['result']
+            if page >= data.get('result_info', {}).get('total_pages', 1):
+                return
+            page += 1
+
+    def batch(self, changes: List[RecordChange]) -> Dict:
+        """Apply up to BATCH_SIZE changes atomically in one request"""
+        body = {'deletes': [], 'patches': [], 'posts': []}
+        keys = {'delete': 'deletes', 'update': 'patches', 'create': 'posts'}
+        for change in changes:
+            body[keys[change.action]].append(change.body())
+        return self.request('POST', "/dns_records/batch", {k: v for k, v in body.items() if v})
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class ApplyReport:
+    __slots__ = ('applied', 'failed', 'requests', 'rate_limited', 'retries', 'waited', 'seconds',
+                 'final_rate')
+
+    def __init__(self):
+        self.applied = 0
+        self.failed: List[Tuple[RecordChange, str]] = []
+        self.requests = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.waited = 0.0
+        self.seconds = 0.0
+        self.final_rate = 0.0
+
+    def to_dict(self) -> Dict:
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values['failed'] = [{'name': change.name, 'action': change.action, 'error': error}
+                            for change, error in self.failed]
+        return values
+
+
+class DnsChangeScheduler:
+    """
+    Applies RecordChanges without tripping Cloudflare's rate limit
+    Changes are ordered deletes, updates, creates and sent BATCH_SIZE at a
+    time through the batch endpoint (or one per request with
+    use_batch=False). Every request takes a token first. A 429 halves the
+    bucket's rate and pauses it for Retry-After, or an exponential backoff
+    when the header is missing; each run of `recover_after` successes then
+    adds back a quarter of the original rate. A batch rejected for its
+    content is split in half until the offending change is isolated.
+    """
+
+    def __init__(
+        self,
+        client: CloudflareDnsClient,
+        bucket: Optional[TokenBucket] = None,
+        batch_size: int = BATCH_SIZE,
+        use_batch: bool = True,
+        max_attempts: int = 8,
+        min_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        recover_after: int = 5,
+    ):
+        self.client = client
+        self.bucket = bucket or TokenBucket.for_window()
+        self.batch_size = batch_size if use_batch else 1
+        self.use_batch = use_batch
+        self.max_attempts = max_attempts
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.recover_after = recover_after
+        self.ceiling = self.bucket.rate
+        self.floor = self.ceiling / 16
+        self._successes = 0
+        self._limited = 0
+        self._random = random.Random()
+
+    def batches(self, changes: Iterable[RecordChange]) -> List[List[RecordChange]]:
+        ordered = sorted(changes, key=lambda change: ACTIONS.index(change.action))
+        return [ordered[i:i + self.batch_size] for i in range(0, len(ordered), self.batch_size)]
+
+    def apply(self, changes: Iterable[RecordChange]) -> ApplyReport:
+        report = ApplyReport()
+        start = self.bucket.clock()
+        pending = self.batches(changes)
+        while pending:
+            batch = pending.pop(0)
+            try:
+                self._send(batch, report)
+                report.applied += len(batch)
+            except CloudflareError as exc:
+                if len(batch) > 1 and not exc.retryable:
+                    middle = len(batch) // 2
+                    pending[:0] = [batch[:middle], batch[middle:]]
+                else:
+                    report.failed.extend((change, str(exc)) for change in batch)
+        report.seconds = self.bucket.clock() - start
+        report.final_rate = self.bucket.rate
+        return report
+
+    def _send(self, batch: List[RecordChange], report: ApplyReport):
+        for attempt in range(self.max_attempts):
+            report.waited += self.bucket.acquire()
+            report.requests += 1
+            try:
+                result = self.client.batch(batch) if self.use_batch else self.client.apply(batch[0])
+            except RateLimited as exc:
+                report.rate_limited += 1
+                self._on_limited(exc.retry_after)
+            except CloudflareError as exc:
+                if not exc.retryable:
+                    raise
+                self.bucket.sleep(self._backoff(attempt))
+            else:
+                self._on_success()
+                return result
+            report.retries += 1
+        raise CloudflareError(f"Gave up after {self.max_attempts} attempts", retryable=True)
+
+    def _backoff(self, attempt: int) -> float:
+        # "Equal jitter": at least half the exponential delay, so retries still spread out
+        delay = min(self.max_backoff, self.min_backoff * 2 ** attempt)
+        return delay / 2 + self._random.uniform(0, delay / 2)
+
+    def _on_limited(self, retry_after: Optional[float]):
+        self._successes = 0
+        self._limited += 1
+        self.bucket.rate = max(self.floor, self.bucket.rate / 2)
+        if retry_after is None:
+            retry_after = self._backoff(self._limited - 1)
+        self.bucket.pause(retry_after)
+
+    def _on_success(self):
+        self._limited = 0
+        self._successes += 1
+        if self._successes >= self.recover_after and self.bucket.rate < self.ceiling:
+            self._successes = 0
+            self.bucket.rate = min(self.ceiling, self.bucket.rate + self.ceiling / 4)
+
+
+# Reconciliation
+
+INTERNAL_TTL = 3600
+# Types whose content is a hostname, compared without case or trailing dot
+_HOSTNAME_TYPES = frozenset(('CNAME', 'NS', 'PTR'))
+
+
+def _fqdn(name: str, origin: str) -> str:
+    name = name.lower()
+    if name == '@':
+        return origin
+    if name.endswith('.'):
+        return name[:-1]
+    if origin and name != origin and not name.endswith(f".{origin}"):
+        return f"{name}.{origin}"
+    return name
+
+
+class DnsRecord(FrozenArgs):
+    """A record as it exists in, or should exist in, a zone; name is fully qualified"""
+
+    __slots__ = ('name', 'type', 'content', 'ttl', 'proxied', 'comment', 'record_id')
+
+    def __init__(
+        self,
+        name: str,
+        type: str,
+        content: str,
+        ttl: int = 1,
+        proxied: bool = False,
+        comment: Optional[str] = None,
+        record_id: Optional[str] = None,
+    ):
+        type = type.upper()
+        if type in _HOSTNAME_TYPES:
+            content = content.lower().rstrip('.')
+        self._set(
+            name=require_str('name', name).lower().rstrip('.'),
+            type=require_choice('type', type, RECORD_TYPES),
+            content=require_str('content', content),
+            ttl=require_int('ttl', ttl, minimum=1),
+            proxied=require_bool('proxied', proxied),
+            comment=comment or None,
+            record_id=record_id,
+        )
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return (self.name, self.type, self.content)
+
+    def label(self, zone_name: str) -> str:
+        """Name relative to the zone, as the stacks pass it to cloudflare.Record"""
+        suffix = f".{zone_name.lower()}"
+        return self.name[:-len(suffix)] if self.name.endswith(suffix) else self.name
+
+    def differs(self, other: "DnsRecord", comments: bool = True) -> bool:
+        """Whether an update is needed to turn `other` into this record"""
+        # Proxied records always report ttl 1 ("automatic")
+        ttl_differs = not self.proxied and self.ttl != other.ttl
+        return (self.content != other.content or self.proxied != other.proxied or ttl_differs
+                or (comments and self.comment is not None and self.comment != other.comment))
+
+    @classmethod
+    def from_api(cls, record: Dict) -> "DnsRecord":
+        return cls(record['name'], record['type'], record['content'], record.get('ttl') or 1,
+                   bool(record.get('proxied')), record.get('comment'), record.get('id'))
+
+
+class ReconcilePlan:
+    """The minimal changes turning a zone snapshot into the desired record set"""
+
+    __slots__ = ('creates', 'updates', 'deletes', 'unchanged')
+
+    def __init__(self):
+        self.creates: List[DnsRecord] = []
+        self.updates: List[Tuple[DnsRecord, DnsRecord]] = []
+        self.deletes: List[DnsRecord] = []
+        self.unchanged = 0
+
+    @property
+    def empty(self) -> bool:
+        return not (self.creates or self.updates or self.deletes)
+
+    def __len__(self) -> int:
+        return len(self.creates) + len(self.updates) + len(self.deletes)
+
+    def changes(self) -> List[RecordChange]:
+        """RecordChanges for DnsChangeScheduler; needs record ids from an API snapshot"""
+        existing = self.deletes + [old for old, _ in self.updates]
+        missing = [r.name for r in existing if not r.record_id]
+        if missing:
+            raise ValueError(f"Snapshot has no record ids (e.g. {missing[0]}); "
+                             "take one from the API to apply")
+        changes = [RecordChange('delete', r.name, r.type, record_id=r.record_id)
+                   for r in self.deletes]
+        changes += [
+            RecordChange('update', new.name, new.type, new.content, new.ttl, new.proxied,
+                         new.comment, old.record_id)
+            for old, new in self.updates
+        ]
+        changes += [RecordChange('create', r.name, r.type, r.content, r.ttl, r.proxied, r.comment)
+                    for r in self.creates]
+        return changes
+
+    def summary(self) -> str:
+        lines = [f"{len(self.creates)} to create, {len(self.updates)} to update, "
+                 f"{len(self.deletes)} to delete, {self.unchanged} unchanged"]
+        lines += [f"  + {r.name} {r.type} {r.content}" for r in self.creates]
+        lines += [f"  ~ {new.name} {new.type} {old.content} -> {new.content}"
+                  for old, new in self.updates]
+        lines += [f"  - {r.name} {r.type} {r.content}" for r in self.deletes]
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict:
+        return {
+            'create': [r.to_dict() for r in self.creates],
+            'update': [{'from': old.to_dict(), 'to': new.to_dict()} for old, new in self.updates],
+            'delete': [r.to_dict() for r in self.deletes],
+            'unchanged': self.unchanged,
+        }
+
+
+def in_scope(*suffixes: str) -> Callable[[str], bool]:
+    """A `managed` predicate for reconcile(): names equal to or under any suffix"""
+    suffixes = tuple(s.lower().rstrip('.') for s in suffixes)
+    dotted = tuple(f".{s}" for s in suffixes)
+    return lambda name: name in suffixes or name.endswith(dotted)
+
+
+def reconcile(desired: Iterable[DnsRecord], actual: Iterable[DnsRecord],
+              managed: Optional[Callable[[str], bool]] = None,
+              comments: bool = True) -> ReconcilePlan:
+    """
+    Diff desired records against a zone snapshot
+    Records are matched by (name, type, content) through dict lookups, so a
+    diff is linear in the size of both sides. Unmatched records of the same
+    name and type are paired into in-place updates, which is one API call
+    where delete plus create would be two. Only snapshot records whose name
+    passes `managed` are ever deleted; duplicates of a desired record are.
+    Pass comments=False for zone file snapshots, which don't carry them.
+    """
+    plan = ReconcilePlan()
+    have: Dict[Tuple[str, str, str], List[DnsRecord]] = {}
+    for record in actual:
+        if managed is None or managed(record.name):
+            have.setdefault(record.key, []).append(record)
+
+    spare_desired: Dict[Tuple[str, str], List[DnsRecord]] = {}
+    for record in {record.key: record for record in desired}.values():
+        existing = have.pop(record.key, None)
+        if existing is None:
+            spare_desired.setdefault((record.name, record.type), []).append(record)
+            continue
+        current, *duplicates = existing
+        plan.deletes.extend(duplicates)
+        if record.differs(current, comments):
+            plan.updates.append((current, record))
+        else:
+            plan.unchanged += 1
+
+    spare_actual: Dict[Tuple[str, str], List[DnsRecord]] = {}
+    for records in have.values():
+        for record in records:
+            spare_actual.setdefault((record.name, record.type), []).append(record)
+
+    for name_type, records in spare_desired.items():
+        stale = spare_actual.pop(name_type, [])
+        records.sort(key=lambda r: r.content)
+        stale.sort(key=lambda r: r.content)
+        plan.updates.extend(zip(stale, records))
+        plan.creates.extend(records[len(stale):])
+        plan.deletes.extend(stale[len(records):])
+    for stale in spare_actual.values():
+        plan.deletes.extend(stale)
+    return plan
+
+
+def internal_records(inventory, zone_name: str, ttl: int = INTERNAL_TTL) -> Dict[str, DnsRecord]:
+    """
+    hostname -> the <hostname>.internal A record for each ZeroTier node
+    The one source of these records for every stack.
+    """
+    return {
+        host.hostname: DnsRecord(
+            f"{host.hostname}.internal.{zone_name}", 'A', host.zerotier_ip, ttl,
+            comment=f"ZeroTier internal IP for {host.hostname}",
+        )
+        for host in inventory.zerotier_nodes()
+    }
+
+
+# Zone snapshots
+
+def _split_comment(line: str) -> Tuple[str, str]:
+    if ';' not in line:
+        return line, ''
+    if '"' not in line:
+        data, _, comment = line.partition(';')
+        return data, comment
+    quoted = False
+    for index, char in enumerate(line):
+        if char == '"' and (index == 0 or line[index - 1] != '\\'):
+            quoted = not quoted
+        elif char == ';' and not quoted:
+            return line[:index], line[index + 1:]
+    return line, ''
+
+
+def _tokens(data: str) -> List[str]:
+    if '"' not in data:
+        return data.split()
+    tokens, current, quoted = [], '', False
+    for char in data:
+        if char == '"':
+            quoted = not quoted
+            current += char
+        elif char.isspace() and not quoted:
+            if current:
+                tokens.append(current)
+            current = ''
+        else:
+            current += char
+    if current:
+        tokens.append(current)
+    return tokens
+
+
+def parse_zone_file(text: str, origin: str) -> List[DnsRecord]:
+    """
+    Records from a BIND zone file such as Cloudflare's DNS export
+    Handles $ORIGIN, $TTL, relative and omitted owner names, parentheses
+    and Cloudflare's "cf_tags=cf-proxied:true" comments; SOA records and
+    types outside RECORD_TYPES are skipped. Exports carry no record ids.
+    """
+    origin = origin.lower().rstrip('.')
+    default_ttl = 1
+    records: List[DnsRecord] = []
+    previous = origin
+    pending = ''
+    # A parenthesized record's owner, or its absence, is on its first line
+    first = ''
+    comments = ''
+    for raw in text.splitlines():
+        data, comment = _split_comment(raw)
+        if pending:
+            data = pending + ' ' + data
+            comment = comments + ' ' + comment
+        else:
+            first = raw
+        if data.count('(') > data.count(')'):
+            pending = data
+            comments = comment
+            continue
+        pending = ''
+        if not data.strip():
+            continue
+        tokens = _tokens(data.replace('(', ' ').replace(')', ' '))
+        if tokens[0].upper() == '$ORIGIN':
+            origin = tokens[1].lower().rstrip('.')
+            continue
+        if tokens[0].upper() == '$TTL':
+            default_ttl = int(tokens[1])
+            continue
+
+        if first[:1].isspace():
+            name = previous
+        else:
+            name = _fqdn(tokens.pop(0), origin)
+            previous = name
+        ttl = default_ttl
+        while tokens and (tokens[0].isdigit() or tokens[0].upper() in ('IN', 'CH', 'HS')):
+            value = tokens.pop(0)
+            if value.isdigit():
+                ttl = int(value)
+        if len(tokens) < 2 or tokens[0].upper() not in RECORD_TYPES:
+            continue
+        type_ = tokens[0].upper()
+        rdata = tokens[1:]
+        if type_ in _HOSTNAME_TYPES:
+            content = _fqdn(rdata[0], origin)
+        elif type_ == 'TXT':
+            content = ''.join(part.strip('"') for part in rdata)
+        else:
+            content = ' '.join(rdata)
+        records.append(DnsRecord(name, type_, content, ttl, 'cf-proxied:true' in comment))
+    return records
+
+
+def load_snapshot(path, origin: str) -> List[DnsRecord]:
+    """Records from a zone file export or a JSON dump of the dns_records API"""
+    text = Path(path).read_text()
+    if text.lstrip().startswith(('{', '[')):
+        data = json.loads(text)
+        records = data['result'] if isinstance(data, dict) else data
+        return [DnsRecord.from_api(record) for record in records]
+    return parse_zone_file(text, origin)
@@ -0,0 +1,110 @@
+"""
+Edge Caching
+Per-route Cache API settings for the api-worker and the zone's cache
+rules for the docs site
+"""
+
+import json
+from typing import Dict, Iterable, Optional, Sequence
+
+from .args import FrozenArgs, require_bool, require_int, require_str
+from .waf import parse
+
+# Dropped from cache keys by the Worker and by the cache rules alike
+TRACKING_PARAMS = (
+    'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content',
+    'fbclid', 'gclid', 'mc_cid', 'mc_eid',
+)
+
+
+class CacheRoute(FrozenArgs):
+    """
+    How the api-worker caches one path pattern (* matches anything)
+    `query` lists the parameters kept in the cache key; None keeps all
+    but TRACKING_PARAMS. A ttl of 0 bypasses the cache.
+    """
+
+    __slots__ = ('path', 'ttl', 'stale_while_revalidate', 'query')
+
+    def __init__(self, path: str, ttl: int, stale_while_revalidate: int = 0,
+                 query: Optional[Iterable[str]] = None):
+        if not require_str('path', path).startswith('/'):
+            raise ValueError(f"path must start with /, got {path!r}")
+        self._set(
+            path=path,
+            ttl=require_int('ttl', ttl, minimum=0),
+            stale_while_revalidate=require_int('stale_while_revalidate', stale_while_revalidate,
+                                               minimum=0),
+            query=None if query is None
+            else tuple(sorted(require_str('query', name) for name in query)),
+        )
+
+
+# First match wins; anything unmatched bypasses the cache
+API_CACHE_ROUTES = (
+    CacheRoute("/health", ttl=0),
+    CacheRoute("/v1/status", ttl=15, stale_while_revalidate=60, query=()),
+    CacheRoute("/v1/*", ttl=60, stale_while_revalidate=300),
+    CacheRoute("/*", ttl=300, stale_while_revalidate=3600, query=()),
+)
+
+
+def worker_config(routes: Sequence[CacheRoute] = API_CACHE_ROUTES, version: int = 1,
+                  normalize: bool = True) -> str:
+    """
+    JSON for the api-worker's CACHE_ROUTES binding
+    Bumping `version` changes every cache key, which empties the cache on
+    the next deploy. normalize=False keys on the raw URL (for comparison).
+    """
+    return json.dumps({
+        'version': version,
+        'normalize': normalize,
+        'tracking': list(TRACKING_PARAMS),
+        'routes': [{'path': r.path, 'ttl': r.ttl, 'swr': r.stale_while_revalidate,
+                    'query': None if r.query is None else list(r.query)} for r in routes],
+    }, separators=(',', ':'))
+
+
+class CacheRule(FrozenArgs):
+    """
+    A zone cache rule for one hostname under the zone
+    edge_ttl/browser_ttl of None respect the origin's Cache-Control.
+    """
+
+    __slots__ = ('host', 'description', 'edge_ttl', 'browser_ttl', 'serve_stale')
+
+    def __init__(self, host: str, description: str, edge_ttl: Optional[int] = None,
+                 browser_ttl: Optional[int] = None, serve_stale: bool = True):
+        self._set(
+            host=require_str('host', host),
+            description=require_str('description', description),
+            edge_ttl=None if edge_ttl is None else require_int('edge_ttl', edge_ttl, minimum=0),
+            browser_ttl=None if browser_ttl is None
+            else require_int('browser_ttl', browser_ttl, minimum=0),
+            serve_stale=require_bool('serve_stale', serve_stale),
+        )
+
+    def hostname(self, zone_name: str) -> str:
+        return f"{self.host}.{zone_name}"
+
+    def expression(self, zone_name: str) -> str:
+        expression = f'(http.host eq "{self.hostname(zone_name)}")'
+        parse(expression)
+        return expression
+
+    def ttl_args(self) -> Dict[str, Dict]:
+        """edge_ttl and browser_ttl for cloudflare.RulesetRuleActionParametersArgs"""
+        return {
+            'edge_ttl': {'mode': 'respect_origin'} if self.edge_ttl is None
+            else {'mode': 'override_origin', 'default': self.edge_ttl},
+            'browser_ttl': {'mode': 'respect_origin'} if self.browser_ttl is None
+            else {'mode': 'override_origin', 'default': self.browser_ttl},
+        }
+
+
+# api.<zone> has no rule: the api-worker caches it through the Cache API and
+# skips requests with an Authorization header, which a host-wide rule can't.
+# docs.<zone> is the Pages project's custom domain; purge it after a release.
+CACHE_RULES = (
+    CacheRule("docs", "Cache the docs site at the edge for four hours", edge_ttl=4 * 3600),
+)
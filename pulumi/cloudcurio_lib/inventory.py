@@ -0,0 +1,334 @@
+"""
+Inventory Model
+Single parsed view of the Ansible inventory shared by all Pulumi stacks
+"""
+
+import hashlib
+import ipaddress
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import yaml
+
+# pulumi/cloudcurio_lib/inventory.py -> repository root
+REPO_ROOT = Path(__file__).resolve().parents[2]
+CACHE_DIR = Path(os.environ.get("CLOUDCURIO_CACHE_DIR", Path.home() / ".cache" / "cloudcurio"))
+CACHE_VERSION = 1
+
+# Subnet prefix lengths indexed for O(1) membership queries
+INDEXED_PREFIXES = (16, 24)
+
+_loaded: Dict[str, "Inventory"] = {}
+
+
+def _ip(address: str):
+    """`address` as an ipaddress object, or None for a DNS name"""
+    try:
+        return ipaddress.ip_address(address)
+    except ValueError:
+        return None
+
+
+def _subnet_keys(address: str) -> List[str]:
+    """Indexed networks containing `address`, e.g. 172.28.82.0/24; none for a DNS name"""
+    octets = address.split(".")
+    if len(octets) == 4 and all(octet.isdigit() for octet in octets):
+        # Plain string slicing: ipaddress objects are ~20x slower at fleet scale
+        return [
+            ".".join(octets[:prefix // 8] + ["0"] * (4 - prefix // 8)) + f"/{prefix}"
+            for prefix in INDEXED_PREFIXES
+        ]
+    if _ip(address) is None:
+        return []
+    return [
+        str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+        for prefix in INDEXED_PREFIXES
+    ]
+
+
+class Host:
+    """A single inventory host merged across all inventory sources"""
+
+    __slots__ = ('hostname', 'ansible_host', 'zerotier_ip', 'description', 'groups', 'tags', 'vars',
+                 'environments')
+
+    def __init__(
+        self,
+        hostname: str,
+        ansible_host: Optional[str] = None,
+        zerotier_ip: Optional[str] = None,
+        description: Optional[str] = None,
+        groups: Optional[Iterable[str]] = None,
+        tags: Optional[Dict[str, str]] = None,
+        vars: Optional[Dict[str, str]] = None,
+        environments: Optional[Iterable[str]] = None,
+    ):
+        self.hostname = hostname
+        self.ansible_host = ansible_host
+        self.zerotier_ip = zerotier_ip
+        self.description = description
+        self.groups = sorted(set(groups or []))
+        self.tags = dict(tags or {})
+        self.vars = dict(vars or {})
+        self.environments = sorted(set(environments or []))
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f"Host({self.hostname!r}, zerotier_ip={self.zerotier_ip!r})"
+
+
+class Inventory:
+    """
+    Indexed inventory
+    Hosts are indexed by hostname, group, tag and subnet so stacks can
+    query them with dict lookups instead of rebuilding literal maps
+    """
+
+    def __init__(self, hosts: List[Host], subnet: str = "172.28.0.0/16",
+                 internal_domain: Optional[str] = None):
+        self.subnet = subnet
+        self.internal_domain = internal_domain
+        self.hosts: Dict[str, Host] = {}
+        self.by_group: Dict[str, List[Host]] = {}
+        self.by_tag: Dict[tuple, List[Host]] = {}
+        self.by_subnet: Dict[str, List[Host]] = {}
+
+        for host in hosts:
+            self.hosts[host.hostname] = host
+            for group in host.groups:
+                self.by_group.setdefault(group, []).append(host)
+            for item in host.tags.items():
+                self.by_tag.setdefault(item, []).append(host)
+            networks = {key for address in (host.ansible_host, host.zerotier_ip) if address
+                        for key in _subnet_keys(address)}
+            for network in networks:
+                self.by_subnet.setdefault(network, []).append(host)
+
+    def __len__(self) -> int:
+        return len(self.hosts)
+
+    def __iter__(self):
+        return iter(self.hosts.values())
+
+    def host(self, hostname: str) -> Host:
+        return self.hosts[hostname]
+
+    def group(self, name: str) -> List[Host]:
+        return self.by_group.get(name, [])
+
+    def with_tag(self, key: str, value: str) -> List[Host]:
+        return self.by_tag.get((key, value), [])
+
+    def in_subnet(self, cidr: str) -> List[Host]:
+        network = ipaddress.ip_network(cidr, strict=False)
+        if network.prefixlen in INDEXED_PREFIXES:
+            return self.by_subnet.get(str(network), [])
+        return [
+            host for host in self
+            if any(address is not None and address in network
+                   for address in map(_ip, filter(None, (host.ansible_host, host.zerotier_ip))))
+        ]
+
+    def zerotier_nodes(self) -> List[Host]:
+        """Hosts with a ZeroTier address, in hostname order"""
+        return sorted((h for h in self if h.zerotier_ip), key=lambda h: h.hostname)
+
+    def zerotier_map(self) -> Dict[str, str]:
+        """hostname -> ZeroTier IP, the map the stacks used to hard-code"""
+        return {host.hostname: host.zerotier_ip for host in self.zerotier_nodes()}
+
+    def to_dict(self) -> Dict:
+        return {
+            'subnet': self.subnet,
+            'internal_domain': self.internal_domain,
+            'hosts': [host.to_dict() for host in self],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Inventory":
+        hosts = [Host(**host) for host in data['hosts']]
+        return cls(hosts, subnet=data['subnet'], internal_domain=data.get('internal_domain'))
+
+
+def parse_ini(text: str) -> tuple:
+    """
+    Parse an Ansible INI inventory
+    Returns (hosts, children, group_vars): host name -> (vars, groups),
+    group -> child groups, and group -> vars
+    """
+    hosts: Dict[str, tuple] = {}
+    children: Dict[str, List[str]] = {}
+    group_vars: Dict[str, Dict[str, str]] = {}
+    section, kind = "ungrouped", "hosts"
+
+    for raw in text.splitlines():
+        line = raw.split(" #", 1)[0].strip()
+        if not line or line[0] in "#;":
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            section, _, kind = line[1:-1].partition(":")
+            kind = kind or "hosts"
+            continue
+
+        if kind == "children":
+            children.setdefault(section, []).append(line)
+        elif kind == "vars":
+            key, _, value = line.partition("=")
+            group_vars.setdefault(section, {})[key.strip()] = value.strip()
+        else:
+            name, *pairs = line.split()
+            host_vars, groups = hosts.setdefault(name, ({}, set()))
+            groups.add(section)
+            for pair in pairs:
+                key, _, value = pair.partition("=")
+                host_vars[key] = value
+    return hosts, children, group_vars
+
+
+def _expand_children(group: str, children: Dict[str, List[str]], seen=None) -> set:
+    """All groups whose members belong to `group`"""
+    seen = seen if seen is not None else set()
+    for child in children.get(group, []):
+        if child not in seen:
+            seen.add(child)
+            _expand_children(child, children, seen)
+    return seen
+
+
+def inventory_sources(root: Path = REPO_ROOT) -> List[Path]:
+    """Inventory files that make up the merged inventory"""
+    sources = [root / "inventory" / "hosts.ini"]
+    sources += sorted((root / "inventory").glob("*/hosts.ini"))
+    sources.append(root / "group_vars" / "zerotier_nodes.yml")
+    return [path for path in sources if path.exists()]
+
+
+def build_inventory(sources: List[Path]) -> Inventory:
+    """Parse the inventory files and merge hosts across them"""
+    merged: Dict[str, Dict] = {}
+    zerotier_vars: Dict = {}
+
+    for path in sources:
+        if path.suffix in (".yml", ".yaml"):
+            zerotier_vars.update(yaml.safe_load(path.read_text()) or {})
+            continue
+
+        hosts, children, group_vars = parse_ini(path.read_text())
+        environment = group_vars.get("all", {}).get("environment")
+        parents: Dict[str, set] = {}
+        for parent in children:
+            for child in _expand_children(parent, children):
+                parents.setdefault(child, set()).add(parent)
+
+        for name, (host_vars, groups) in hosts.items():
+            entry = merged.setdefault(name, {'vars': {}, 'groups': set(), 'environments': set()})
+            entry['vars'].update(host_vars)
+            for group in groups:
+                entry['groups'].add(group)
+                entry['groups'].update(parents.get(group, ()))
+            if environment:
+                entry['environments'].add(environment)
+
+    subnet = zerotier_vars.get("zerotier_network_subnet", "172.28.0.0/16")
+    network = ipaddress.ip_network(subnet)
+    zerotier_ips = zerotier_vars.get("zerotier_hostname_map") or {}
+    node_meta = zerotier_vars.get("zerotier_node_meta") or {}
+
+    hosts = []
+    for name in sorted(set(merged) | set(zerotier_ips)):
+        entry = merged.get(name, {'vars': {}, 'groups': set(), 'environments': set()})
+        ansible_host = entry['vars'].get("ansible_host")
+        zerotier_ip = zerotier_ips.get(name)
+        # ansible_host may be a DNS name, which says nothing about the ZeroTier subnet
+        address = _ip(ansible_host) if ansible_host else None
+        if not zerotier_ip and address is not None and address in network:
+            zerotier_ip = ansible_host
+        meta = node_meta.get(name, {})
+        hosts.append(Host(
+            hostname=name,
+            ansible_host=ansible_host,
+            zerotier_ip=zerotier_ip,
+            description=meta.get("description"),
+            groups=entry['groups'],
+            tags=meta.get("tags"),
+            vars=entry['vars'],
+            environments=entry['environments'],
+        ))
+
+    return Inventory(hosts, subnet=subnet, internal_domain=zerotier_vars.get("internal_domain"))
+
+
+def _fingerprint(sources: List[Path]) -> List[List]:
+    return [[str(path), path.stat().st_mtime_ns, path.stat().st_size] for path in sources]
+
+
+def _content_hash(sources: List[Path]) -> str:
+    digest = hashlib.sha256()
+    for path in sources:
+        digest.update(str(path).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def load_inventory(root: Path = REPO_ROOT, use_cache: bool = True) -> Inventory:
+    """
+    Load the merged inventory
+    Parsed once per process; across processes the parsed result is cached
+    on disk and reused while the source files' mtimes, or failing that
+    their content hash, are unchanged
+    """
+    root = Path(root).resolve()
+    if use_cache and str(root) in _loaded:
+        return _loaded[str(root)]
+
+    sources = inventory_sources(root)
+    fingerprint = _fingerprint(sources)
+    cache_file = CACHE_DIR / f"inventory-{hashlib.sha256(str(root).encode()).hexdigest()[:16]}.json"
+
+    cached = None
+    if use_cache and cache_file.exists():
+        try:
+            cached = json.loads(cache_file.read_text())
+        except ValueError:
+            cached = None
+        if cached and cached.get('version') != CACHE_VERSION:
+            cached = None
+
+    inventory = None
+    content_hash = None
+    if cached and cached['fingerprint'] == fingerprint:
+        inventory = Inventory.from_dict(cached['inventory'])
+    elif cached:
+        # Touched but possibly unchanged (e.g. git checkout): compare contents
+        content_hash = _content_hash(sources)
+        if cached['content_hash'] == content_hash:
+            inventory = Inventory.from_dict(cached['inventory'])
+
+    if inventory is None:
+        inventory = build_inventory(sources)
+
+    if use_cache:
+        if not cached or cached['fingerprint'] != fingerprint:
+            _write_cache(cache_file, {
+                'version': CACHE_VERSION,
+                'fingerprint': fingerprint,
+                'content_hash': content_hash or _content_hash(sources),
+                'inventory': inventory.to_dict(),
+            })
+        _loaded[str(root)] = inventory
+    return inventory
+
+
+def _write_cache(cache_file: Path, payload: Dict):
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(payload))
+        os.replace(tmp, cache_file)
+    except OSError:
+        # The cache is an optimisation; read-only home directories still work
+        pass
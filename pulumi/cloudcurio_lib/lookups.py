@@ -0,0 +1,207 @@
+"""
+Data-Source Lookup Cache
+Disk-backed memoization of provider data-source invokes such as get_zone
+"""
+
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import pulumi
+from pulumi.runtime.config import CONFIG, get_config_env
+from pulumi.runtime.mocks import MockMonitor
+from pulumi.runtime.settings import get_monitor
+
+from .inventory import CACHE_DIR
+
+LOOKUP_DIR = CACHE_DIR / "lookups"
+DEFAULT_TTL = 15 * 60
+# Any non-empty value bypasses cached entries for a run; fresh results are still stored
+REFRESH_ENV = "CLOUDCURIO_REFRESH_LOOKUPS"
+TTL_ENV = "CLOUDCURIO_LOOKUP_TTL"
+CACHE_VERSION = 2
+
+
+class LookupCache:
+    """
+    Memoizes data-source results on disk
+    Entries are keyed by the function's module and name, the call's keyword
+    arguments, the current Pulumi project and stack and the provider's
+    credentials and account, and are trusted for `ttl` seconds. Results are
+    stored as JSON, with provider result types rebuilt from their
+    constructor arguments on a hit.
+    """
+
+    def __init__(self, directory: Path = LOOKUP_DIR, ttl: float = DEFAULT_TTL):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, function: Callable, kwargs: Dict[str, Any]) -> str:
+        scope = [pulumi.get_project(), pulumi.get_stack()] if _in_program() else []
+        identity = [CACHE_VERSION, function.__module__, function.__qualname__, scope,
+                    _provider_identity(function), kwargs]
+        encoded = json.dumps(identity, sort_keys=True, default=repr).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str, ttl: Optional[float] = None) -> Optional[Dict]:
+        """The stored entry, or None when missing, unreadable or older than ttl"""
+        try:
+            entry = json.loads(self._path(key).read_text())
+        except (OSError, ValueError):
+            return None
+        ttl = self.ttl if ttl is None else ttl
+        if time.time() - entry.get('stored', 0) > ttl:
+            return None
+        return entry
+
+    def put(self, key: str, function: Callable, kwargs: Dict[str, Any], result: Any):
+        path = self._path(key)
+        payload = {
+            'stored': time.time(),
+            'function': f"{function.__module__}.{function.__qualname__}",
+            'args': kwargs,
+            'result': _encode(result),
+        }
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            # Lookups can return account details; keep them private to the user
+            with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+                json.dump(payload, f, default=repr)
+            os.replace(tmp, path)
+        except OSError:
+            # The cache is an optimisation; read-only home directories still work
+            pass
+
+    def call(self, function: Callable, ttl: Optional[float] = None, refresh: bool = False,
+             **kwargs) -> Any:
+        """function(**kwargs), served from disk when a fresh entry exists"""
+        key = self.key(function, kwargs)
+        if not refresh:
+            entry = self.get(key, ttl)
+            if entry is not None:
+                try:
+                    result = _decode(entry['result'])
+                except (ImportError, AttributeError, KeyError, TypeError):
+                    # Written by a different provider version; fetch afresh
+                    pass
+                else:
+                    self.hits += 1
+                    return result
+        self.misses += 1
+        result = function(**kwargs)
+        if isinstance(result, pulumi.Output):
+            raise TypeError(f"{function.__qualname__} returned an Output; "
+                            "cache the plain invoke instead")
+        self.put(key, function, kwargs, result)
+        return result
+
+    def clear(self) -> int:
+        """Remove every entry; returns the number removed"""
+        removed = 0
+        for path in self.directory.glob("*/*.json"):
+            path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, dict):
+        return {'__dict__': {k: _encode(v) for k, v in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    # Provider result types take every property as a constructor argument
+    cls = type(value)
+    parameters = inspect.signature(cls.__init__).parameters
+    names = [name for name in parameters if name not in ('self', '__self__')]
+    return {
+        '__type__': f"{cls.__module__}:{cls.__qualname__}",
+        'values': {name: _encode(getattr(value, name)) for name in names},
+    }
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if '__dict__' in value:
+        return {k: _decode(v) for k, v in value['__dict__'].items()}
+    module, qualname = value['__type__'].split(':')
+    cls = importlib.import_module(module)
+    for part in qualname.split('.'):
+        cls = getattr(cls, part)
+    return cls(**{k: _decode(v) for k, v in value['values'].items()})
+
+
+def _provider_identity(function: Callable) -> str:
+    """
+    Digest of the credentials and account a provider function runs as
+    For pulumi_<name> functions: <NAME>_* environment variables (API tokens,
+    keys, account IDs) and `<name>:*` or `*:<name>_*` config values, such as
+    cloudflare:apiToken or a project's cloudflare_account_id, whether set
+    in the stack or as PULUMI_CONFIG_* variables. Switching either gets new
+    entries instead of another account's results; only the digest is kept.
+    """
+    package = function.__module__.partition('.')[0]
+    if not package.startswith('pulumi_'):
+        return ""
+    name = package[len('pulumi_'):]
+    env_prefix = f"{name.upper()}_"
+    config = {**get_config_env(), **CONFIG.get()}
+    values = sorted(
+        [('env', key, value) for key, value in os.environ.items()
+         if key.startswith(env_prefix)
+         or (key.startswith("PULUMI_CONFIG_") and name.upper() in key)]
+        + [('config', key, str(value)) for key, value in config.items()
+           if key.startswith(f"{name}:") or key.partition(':')[2].startswith(f"{name}_")]
+    )
+    return hashlib.sha256(json.dumps(values).encode()).hexdigest()
+
+
+def _in_program() -> bool:
+    try:
+        return get_monitor() is not None
+    except Exception:
+        return False
+
+
+def _mocked() -> bool:
+    return _in_program() and isinstance(get_monitor(), MockMonitor)
+
+
+_default: Optional[LookupCache] = None
+
+
+def default_cache() -> LookupCache:
+    global _default
+    if _default is None:
+        _default = LookupCache(ttl=float(os.environ.get(TTL_ENV, DEFAULT_TTL)))
+    return _default
+
+
+def cached_invoke(function: Callable, ttl: Optional[float] = None, refresh: bool = False,
+                  **kwargs) -> Any:
+    """
+    Call a data-source function through the shared lookup cache
+    refresh=True, or CLOUDCURIO_REFRESH_LOOKUPS=1 in the environment,
+    always calls the provider and stores the fresh result. Under
+    pulumi.runtime.set_mocks the cache is skipped entirely so mocked
+    results never reach a real run.
+    """
+    if _mocked():
+        return function(**kwargs)
+    refresh = refresh or bool(os.environ.get(REFRESH_ENV))
+    return default_cache().call(function, ttl=ttl, refresh=refresh, **kwargs)
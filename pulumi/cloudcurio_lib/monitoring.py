@@ -0,0 +1,816 @@
+"""
+Monitoring Stack Components
+Prometheus, Grafana, and Loki infrastructure components
+"""
+
+import hashlib
+import json
+import math
+import os
+import tempfile
+from pathlib import Path
+
+import pulumi
+import yaml
+from pulumi import ComponentResource, ResourceOptions, Output
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from .args import (
+    FrozenArgs, duration_seconds, require_bool, require_duration, require_int, require_str,
+    require_str_list, require_str_map,
+)
+
+DEFAULT_FILE_SD_DIR = "/etc/prometheus/file_sd"
+DEFAULT_RULES_DIR = "/etc/prometheus/rules"
+DEFAULT_TIER_TAG = "type"
+DEFAULT_SCRAPE_TIMEOUT = 10
+NODE_EXPORTER_JOB = "node-exporter"
+NODE_EXPORTER_PORT = 9100
+FILE_SD_GROUP_SIZE = 500
+
+
+class MonitoringStackArgs(FrozenArgs):
+    """Arguments for MonitoringStack component"""
+
+    __slots__ = (
+        'prometheus_enabled', 'grafana_enabled', 'loki_enabled',
+        'retention_days', 'scrape_interval', 'targets', 'prometheus_shards',
+        'scrape_tiers', 'tier_tag', 'target_labels',
+    )
+
+    def __init__(
+        self,
+        prometheus_enabled: bool = True,
+        grafana_enabled: bool = True,
+        loki_enabled: bool = True,
+        retention_days: int = 90,
+        scrape_interval: str = "15s",
+        targets: Optional[List[str]] = None,
+        prometheus_shards: int = 1,
+        scrape_tiers: Optional[Dict[str, str]] = None,
+        tier_tag: str = DEFAULT_TIER_TAG,
+        target_labels: Optional[Dict[str, Dict[str, str]]] = None,
+    ):
+        self._set(
+            prometheus_enabled=require_bool('prometheus_enabled', prometheus_enabled),
+            grafana_enabled=require_bool('grafana_enabled', grafana_enabled),
+            loki_enabled=require_bool('loki_enabled', loki_enabled),
+            retention_days=require_int('retention_days', retention_days, minimum=1),
+            scrape_interval=require_duration('scrape_interval', scrape_interval),
+            targets=require_str_list('targets', targets),
+            prometheus_shards=require_int('prometheus_shards', prometheus_shards, minimum=1),
+            scrape_tiers={
+                tier: require_duration(f'scrape_tiers[{tier!r}]', interval)
+                for tier, interval in require_str_map('scrape_tiers', scrape_tiers).items()
+            },
+            tier_tag=require_str('tier_tag', tier_tag),
+            target_labels={
+                target: require_str_map(f'target_labels[{target!r}]', labels)
+                for target, labels in (target_labels or {}).items()
+            },
+        )
+
+    def labelled_targets(self) -> List[Tuple[str, Dict[str, str]]]:
+        """Targets paired with their labels, as PrometheusConfig.write_file_sd takes them"""
+        return [(target, self.target_labels.get(target) or None) for target in self.targets]
+
+
+class MonitoringStack(ComponentResource):
+    """
+    Monitoring Stack Component
+    Deploys Prometheus, Grafana, and Loki monitoring infrastructure.
+    Targets whose `tier_tag` label matches a key of `scrape_tiers` are
+    scraped at that tier's interval instead of the global one.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        args: Union[MonitoringStackArgs, Dict],
+        opts: Optional[ResourceOptions] = None
+    ):
+        super().__init__('cloudcurio:monitoring:Stack', name, {}, opts)
+        args = MonitoringStackArgs.coerce(args)
+        
+        self.prometheus_enabled = args.prometheus_enabled
+        self.grafana_enabled = args.grafana_enabled
+        self.loki_enabled = args.loki_enabled
+        
+        # Configuration
+        self.config = {
+            'retention_days': args.retention_days,
+            'scrape_interval': args.scrape_interval,
+            'targets': args.targets,
+            'prometheus_shards': args.prometheus_shards,
+            'prometheus_flags': PrometheusConfig.flags(args.retention_days),
+            'scrape_tiers': args.scrape_tiers,
+            'recording_rules': PrometheusConfig.recording_rules(
+                args.scrape_interval, args.scrape_tiers, args.tier_tag
+            ),
+        }
+        self.targets_per_tier = self._targets_per_tier(args)
+        
+        # Export outputs
+        self.register_outputs({
+            'prometheus_enabled': self.prometheus_enabled,
+            'grafana_enabled': self.grafana_enabled,
+            'loki_enabled': self.loki_enabled,
+            'prometheus_port': 9090,
+            'grafana_port': 3000,
+            'loki_port': 3100,
+            'prometheus_shards': args.prometheus_shards,
+            'scrape_tiers': args.scrape_tiers,
+            'targets_per_tier': self.targets_per_tier,
+        })
+
+    @staticmethod
+    def _targets_per_tier(args: MonitoringStackArgs) -> Dict[str, int]:
+        counts = dict.fromkeys(['default', *args.scrape_tiers], 0)
+        for _, labels in args.labelled_targets():
+            tier = (labels or {}).get(args.tier_tag)
+            counts[tier if tier in args.scrape_tiers else 'default'] += 1
+        return counts
+
+
+class _HashingFile:
+    """Temporary file that hashes everything written to it"""
+
+    def __init__(self, writer: "ArtifactWriter", name: str):
+        self.writer = writer
+        self.name = name
+        self.path = writer.directory / name
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.sha256 = hashlib.sha256()
+        self._handle = tempfile.NamedTemporaryFile(
+            'w', dir=self.path.parent, prefix=f".{self.path.name}-", delete=False
+        )
+
+    def write(self, text: str):
+        self.sha256.update(text.encode())
+        self._handle.write(text)
+
+    def close(self):
+        if self._handle.closed:
+            return
+        self._handle.close()
+        self.writer._finish(self.name, self._handle.name, self.sha256.hexdigest())
+
+    def discard(self):
+        """Drop the temporary file if close() was never reached"""
+        self._handle.close()
+        if os.path.exists(self._handle.name):
+            os.unlink(self._handle.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        self.discard()
+
+
+class ArtifactWriter:
+    """
+    Content-addressed writer for generated monitoring artifacts
+    Keeps a sha256 manifest of everything written under `directory`. Files
+    whose content is unchanged are left alone (mtime included), so tools
+    that react to file changes stay quiet on no-op runs. Files written by
+    the previous run but not this one are removed on commit().
+    """
+
+    MANIFEST = ".artifacts.json"
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        try:
+            self.previous = json.loads((self.directory / self.MANIFEST).read_text())
+        except (OSError, ValueError):
+            self.previous = {}
+        self.current: Dict[str, Dict] = {}
+        self.changed: List[str] = []
+        self.unchanged: List[str] = []
+
+    def _is_current(self, name: str, digest: str) -> bool:
+        entry = self.previous.get(name)
+        if not entry or entry['sha256'] != digest:
+            return False
+        try:
+            stat = (self.directory / name).stat()
+        except OSError:
+            return False
+        if stat.st_size == entry['size'] and stat.st_mtime_ns == entry['mtime_ns']:
+            return True
+        # Touched or edited since the last run; fall back to hashing it
+        return hashlib.sha256((self.directory / name).read_bytes()).hexdigest() == digest
+
+    def _finish(self, name: str, temp_path: str, digest: str):
+        path = self.directory / name
+        if self._is_current(name, digest):
+            os.unlink(temp_path)
+            self.unchanged.append(name)
+        else:
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+            self.changed.append(name)
+        stat = path.stat()
+        self.current[name] = {'sha256': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def open(self, name: str) -> _HashingFile:
+        """Streaming writer for `name`; the file is only replaced if its hash changed"""
+        return _HashingFile(self, name)
+
+    def write_text(self, name: str, text: str) -> bool:
+        """Write `name` if its content changed; returns whether it did"""
+        with self.open(name) as handle:
+            handle.write(text)
+        return name in self.changed
+
+    def commit(self) -> Dict[str, List[str]]:
+        """Remove stale artifacts, save the manifest and report what changed"""
+        removed = sorted(set(self.previous) - set(self.current))
+        for name in removed:
+            try:
+                (self.directory / name).unlink()
+            except FileNotFoundError:
+                pass
+        if self.current != self.previous:
+            manifest = json.dumps(self.current, indent=2, sort_keys=True)
+            (self.directory / self.MANIFEST).write_text(manifest + "\n")
+        return {
+            'changed': sorted(self.changed),
+            'unchanged': sorted(self.unchanged),
+            'removed': removed,
+        }
+
+
+class PrometheusConfig:
+    """
+    Helper class for Prometheus configuration generation
+    Targets are written to file_sd JSON files rather than inlined, so the
+    main config stays small and target changes are picked up without a
+    reload. With `shards` > 1 each replica keeps only its hashmod share.
+    """
+
+    @staticmethod
+    def shard_of(address: str, shards: int) -> int:
+        """Replica that owns `address`, computed like Prometheus' hashmod action"""
+        if shards == 1:
+            return 0
+        digest = hashlib.md5(address.encode()).digest()
+        return int.from_bytes(digest[8:], 'big') % shards
+
+    @staticmethod
+    def file_sd_name(job: str, shard: int) -> str:
+        return f"{job}.shard-{shard}.json"
+
+    @staticmethod
+    def flags(
+        retention_days: int,
+        config_file: str = "/etc/prometheus/prometheus.yml",
+        storage_path: str = "/var/lib/prometheus/",
+    ) -> List[str]:
+        """Startup flags; retention can only be set on the command line"""
+        return [
+            f"--config.file={config_file}",
+            f"--storage.tsdb.path={storage_path}",
+            f"--storage.tsdb.retention.time={retention_days}d",
+        ]
+
+    @staticmethod
+    def tier_jobs(job: str, scrape_tiers: Optional[Dict[str, str]]) -> Dict[str, Optional[str]]:
+        """Scrape job name per tier; the untiered job uses the global interval"""
+        jobs: Dict[str, Optional[str]] = {job: None}
+        for tier, interval in (scrape_tiers or {}).items():
+            jobs[f"{job}-{tier}"] = interval
+        return jobs
+
+    @staticmethod
+    def rate_window(scrape_interval: str, scrape_tiers: Optional[Dict[str, str]] = None) -> str:
+        """rate() window covering at least four scrapes of the slowest tier"""
+        intervals = [scrape_interval, *(scrape_tiers or {}).values()]
+        slowest = max(duration_seconds(interval) for interval in intervals)
+        return f"{max(5, math.ceil(slowest * 4 / 60))}m"
+
+    @staticmethod
+    def recording_rules(
+        scrape_interval: str,
+        scrape_tiers: Optional[Dict[str, str]] = None,
+        tier_tag: str = DEFAULT_TIER_TAG,
+        job: str = NODE_EXPORTER_JOB,
+    ) -> Dict:
+        """
+        Recording rules for the node-exporter queries the dashboards run
+        Per-instance series collapse the per-cpu, per-mode and per-device
+        raw series; the per-class rules roll those up by `tier_tag` so fleet
+        panels read a handful of series instead of scanning every target.
+        """
+        w = PrometheusConfig.rate_window(scrape_interval, scrape_tiers)
+        sel = f'job="{job}"'
+        disks = 'device=~"(/dev/)?(mmcblk.p.+|nvme.+|rbd.+|sd.+|vd.+|xvd.+|dm-.+|md.+)"'
+        filesystems = 'fstype!~"tmpfs|overlay|squashfs|ramfs"'
+        instance_rules = [
+            ('instance:node_num_cpu:sum',
+             f'count without (cpu, mode) (node_cpu_seconds_total{{{sel},mode="idle"}})'),
+            (f'instance:node_cpu_utilisation:rate{w}',
+             f'1 - avg without (cpu) (sum without (mode) '
+             f'(rate(node_cpu_seconds_total{{{sel},mode=~"idle|iowait|steal"}}[{w}])))'),
+            ('instance:node_load1_per_cpu:ratio',
+             f'node_load1{{{sel}}} / instance:node_num_cpu:sum{{{sel}}}'),
+            ('instance:node_memory_utilisation:ratio',
+             f'1 - (node_memory_MemAvailable_bytes{{{sel}}} '
+             f'/ node_memory_MemTotal_bytes{{{sel}}})'),
+            (f'instance:node_network_receive_bytes_excluding_lo:rate{w}',
+             f'sum without (device) '
+             f'(rate(node_network_receive_bytes_total{{{sel},device!="lo"}}[{w}]))'),
+            (f'instance:node_network_transmit_bytes_excluding_lo:rate{w}',
+             f'sum without (device) '
+             f'(rate(node_network_transmit_bytes_total{{{sel},device!="lo"}}[{w}]))'),
+            (f'instance_device:node_disk_io_time_seconds:rate{w}',
+             f'rate(node_disk_io_time_seconds_total{{{sel},{disks}}}[{w}])'),
+            ('instance:node_filesystem_avail:min_ratio',
+             f'min without (device, fstype, mountpoint) '
+             f'(node_filesystem_avail_bytes{{{sel},{filesystems}}} '
+             f'/ node_filesystem_size_bytes{{{sel},{filesystems}}})'),
+        ]
+        class_rules = [
+            (f'{tier_tag}:up:sum', f'sum by ({tier_tag}) (up{{{sel}}})'),
+            (f'{tier_tag}:node_cpu_utilisation:avg_rate{w}',
+             f'avg by ({tier_tag}) (instance:node_cpu_utilisation:rate{w})'),
+            (f'{tier_tag}:node_memory_utilisation:avg_ratio',
+             f'avg by ({tier_tag}) (instance:node_memory_utilisation:ratio)'),
+            (f'{tier_tag}:node_network_receive_bytes_excluding_lo:sum_rate{w}',
+             f'sum by ({tier_tag}) (instance:node_network_receive_bytes_excluding_lo:rate{w})'),
+            (f'{tier_tag}:node_network_transmit_bytes_excluding_lo:sum_rate{w}',
+             f'sum by ({tier_tag}) (instance:node_network_transmit_bytes_excluding_lo:rate{w})'),
+            (f'{tier_tag}:node_filesystem_avail:min_ratio',
+             f'min by ({tier_tag}) (instance:node_filesystem_avail:min_ratio)'),
+        ]
+        return {
+            'groups': [
+                {
+                    'name': f'{job}.rules',
+                    'rules': [{'record': record, 'expr': expr} for record, expr in instance_rules],
+                },
+                {
+                    # Evaluated after the instance group, one interval later at worst
+                    'name': f'{job}.{tier_tag}.rules',
+                    'rules': [{'record': record, 'expr': expr} for record, expr in class_rules],
+                },
+            ]
+        }
+
+    @staticmethod
+    def generate_config(
+        scrape_interval: str,
+        *,
+        retention_days: int = 90,
+        shards: int = 1,
+        shard: int = 0,
+        file_sd_dir: str = DEFAULT_FILE_SD_DIR,
+        job: str = NODE_EXPORTER_JOB,
+        scrape_tiers: Optional[Dict[str, str]] = None,
+        rules_dir: Optional[str] = DEFAULT_RULES_DIR,
+    ) -> Dict:
+        """Generate the Prometheus configuration for replica `shard` of `shards`"""
+        require_int('retention_days', retention_days, minimum=1)
+        require_int('shards', shards, minimum=1)
+        require_int('shard', shard, minimum=0, maximum=shards - 1)
+
+        scrape_configs = [
+            {
+                'job_name': 'prometheus',
+                'static_configs': [{'targets': ['localhost:9090']}]
+            },
+        ]
+        for job_name, interval in PrometheusConfig.tier_jobs(job, scrape_tiers).items():
+            targets_job = {
+                'job_name': job_name,
+                'file_sd_configs': [{
+                    'files': [f"{file_sd_dir}/{PrometheusConfig.file_sd_name(job_name, shard)}"],
+                    'refresh_interval': '5m',
+                }],
+            }
+            relabel_configs = []
+            if interval:
+                targets_job['scrape_interval'] = interval
+                if duration_seconds(interval) < DEFAULT_SCRAPE_TIMEOUT:
+                    targets_job['scrape_timeout'] = interval
+                # Every tier reports as the base job so dashboards and rules see one job
+                relabel_configs.append({'target_label': 'job', 'replacement': job})
+            if shards > 1:
+                # Files are already partitioned by the same hash; relabeling keeps
+                # a misplaced target from being scraped twice
+                relabel_configs += [
+                    {
+                        'source_labels': ['__address__'],
+                        'modulus': shards,
+                        'target_label': '__tmp_hash',
+                        'action': 'hashmod',
+                    },
+                    {
+                        'source_labels': ['__tmp_hash'],
+                        'regex': str(shard),
+                        'action': 'keep',
+                    },
+                ]
+            if relabel_configs:
+                targets_job['relabel_configs'] = relabel_configs
+            scrape_configs.append(targets_job)
+
+        config = {
+            'global': {
+                'scrape_interval': scrape_interval,
+                'evaluation_interval': scrape_interval,
+                'external_labels': {'cluster': 'cloudcurio', 'replica': str(shard)},
+            },
+        }
+        if rules_dir:
+            config['rule_files'] = [f"{rules_dir}/*.yml"]
+        config['scrape_configs'] = scrape_configs
+        return config
+
+    @staticmethod
+    def write_file_sd(
+        targets: Iterable[Union[str, Tuple[str, Dict[str, str]]]],
+        writer: "ArtifactWriter",
+        shards: int = 1,
+        job: str = NODE_EXPORTER_JOB,
+        port: int = NODE_EXPORTER_PORT,
+        group_size: int = FILE_SD_GROUP_SIZE,
+        subdir: str = "file_sd",
+        scrape_tiers: Optional[Dict[str, str]] = None,
+        tier_tag: str = DEFAULT_TIER_TAG,
+    ) -> Dict[str, List[int]]:
+        """
+        Stream targets into one file_sd file per scrape tier and shard
+        Targets are addresses or (address, labels) pairs; a target lands in
+        the tier named by its `tier_tag` label, or the base job otherwise.
+        Consecutive targets with the same labels share a target group. Only
+        one group per file is buffered, so memory does not grow with the
+        number of targets. Returns target counts per job and shard.
+        """
+        jobs = list(PrometheusConfig.tier_jobs(job, scrape_tiers))
+        tiers = {tier: f"{job}-{tier}" for tier in (scrape_tiers or {})}
+        counts = {job_name: [0] * shards for job_name in jobs}
+        keys = [(job_name, index) for job_name in jobs for index in range(shards)]
+        pending: Dict[Tuple[str, int], Tuple[Optional[Dict], List[str]]] = {
+            key: (None, []) for key in keys
+        }
+        started = dict.fromkeys(keys, False)
+        files = {
+            key: writer.open(f"{subdir}/{PrometheusConfig.file_sd_name(*key)}")
+            for key in keys
+        }
+
+        def flush(key):
+            labels, addresses = pending[key]
+            if not addresses:
+                return
+            files[key].write(",\n" if started[key] else "[\n")
+            files[key].write(json.dumps({'targets': addresses, 'labels': labels or {}}))
+            started[key] = True
+            pending[key] = (None, [])
+
+        try:
+            for target in targets:
+                address, labels = (target, None) if isinstance(target, str) else target
+                if ':' not in address:
+                    address = f"{address}:{port}"
+                job_name = tiers.get((labels or {}).get(tier_tag), job)
+                key = (job_name, PrometheusConfig.shard_of(address, shards))
+                if pending[key][0] != labels or len(pending[key][1]) >= group_size:
+                    flush(key)
+                    pending[key] = (labels, pending[key][1])
+                pending[key][1].append(address)
+                counts[job_name][key[1]] += 1
+
+            for key, handle in files.items():
+                flush(key)
+                handle.write("\n]\n" if started[key] else "[]\n")
+                handle.close()
+        finally:
+            for handle in files.values():
+                handle.discard()
+        return counts
+
+    @staticmethod
+    def write_configs(
+        directory: Union[str, Path],
+        scrape_interval: str,
+        targets: Iterable[Union[str, Tuple[str, Dict[str, str]]]],
+        retention_days: int = 90,
+        shards: int = 1,
+        file_sd_dir: str = DEFAULT_FILE_SD_DIR,
+        scrape_tiers: Optional[Dict[str, str]] = None,
+        tier_tag: str = DEFAULT_TIER_TAG,
+        rules_dir: str = DEFAULT_RULES_DIR,
+    ) -> Dict:
+        """
+        Write prometheus-<shard>.yml for every replica, the file_sd shards
+        under `directory`/file_sd and the recording rules under
+        `directory`/rules, touching only files whose content changed.
+        Returns paths, target counts, the startup flags carrying the
+        retention setting, and the change report from ArtifactWriter.
+        """
+        writer = ArtifactWriter(directory)
+        counts = PrometheusConfig.write_file_sd(
+            targets, writer, shards, scrape_tiers=scrape_tiers, tier_tag=tier_tag
+        )
+        rules = PrometheusConfig.recording_rules(scrape_interval, scrape_tiers, tier_tag)
+        writer.write_text(f"rules/{NODE_EXPORTER_JOB}.yml",
+                          "# Generated by cloudcurio_lib.monitoring.PrometheusConfig\n"
+                          + yaml.safe_dump(rules, sort_keys=False))
+        configs = []
+        for shard in range(shards):
+            name = f"prometheus-{shard}.yml"
+            config = PrometheusConfig.generate_config(
+                scrape_interval, retention_days=retention_days, shards=shards, shard=shard,
+                file_sd_dir=file_sd_dir, scrape_tiers=scrape_tiers, rules_dir=rules_dir,
+            )
+            writer.write_text(name, "# Generated by cloudcurio_lib.monitoring.PrometheusConfig\n"
+                              + yaml.safe_dump(config, sort_keys=False))
+            configs.append(str(writer.directory / name))
+        report = writer.commit()
+
+        touched = report['changed'] + report['removed']
+        if any(path.startswith('rules/') for path in touched):
+            # Every replica evaluates the same rules
+            changed_shards = list(range(shards))
+        else:
+            changed_shards = sorted({
+                int(path.rsplit('-', 1)[1].split('.')[0])
+                for path in touched
+                if path.startswith('prometheus-') or '.shard-' in path
+            })
+        return {
+            'configs': configs,
+            'targets_per_shard': [sum(column) for column in zip(*counts.values())],
+            'targets_per_job': {job_name: sum(column) for job_name, column in counts.items()},
+            'flags': PrometheusConfig.flags(retention_days),
+            'changed': report['changed'],
+            'removed': report['removed'],
+            'changed_shards': changed_shards,
+            # file_sd is re-read by Prometheus on its own; only config and rule changes
+            # need a reload
+            'reload_required': any(not path.startswith('file_sd/') for path in touched),
+        }
+
+
+# Capacity planning
+#
+# Sizing rules of thumb from the Prometheus storage docs and observed RSS on
+# 2.x servers; they are estimates to plan hardware with, not guarantees.
+GiB = 1024 ** 3
+HEAD_BYTES_PER_SERIES = 8 * 1024   # RSS per active series, incl. Go GC headroom
+BYTES_PER_SAMPLE = 2               # compressed block storage (docs quote 1-2)
+WAL_BYTES_PER_SAMPLE = 4           # snappy-compressed WAL sample records
+WAL_BYTES_PER_SERIES = 256         # series records written to each WAL segment
+INDEX_BYTES_PER_SERIES = 1024      # per series, per persisted block
+HEAD_HOURS = 3                     # head and WAL cover 2-3h before compaction
+
+
+class SeriesSample:
+    """Active series counted from one /metrics exposition"""
+
+    __slots__ = ('total', 'by_metric')
+
+    def __init__(self, total: int = 0, by_metric: Optional[Dict[str, int]] = None):
+        self.total = total
+        self.by_metric = by_metric or {}
+
+    def top(self, count: int = 5) -> List[Tuple[str, int]]:
+        return sorted(self.by_metric.items(), key=lambda item: item[1], reverse=True)[:count]
+
+
+def count_series(lines: Iterable[Union[str, bytes]]) -> SeriesSample:
+    """
+    Count series in Prometheus text exposition, one line at a time
+    Every sample line is one series; comments and blank lines are skipped.
+    Memory is bounded by the number of metric names, not the input size.
+    """
+    sample = SeriesSample()
+    by_metric = sample.by_metric
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        line = line.lstrip()
+        if not line or line[0] == '#':
+            continue
+        end = len(line)
+        for stop in ('{', ' ', '\t'):
+            position = line.find(stop, 0, end)
+            if position != -1:
+                end = position
+        name = line[:end]
+        by_metric[name] = by_metric.get(name, 0) + 1
+        sample.total += 1
+    return sample
+
+
+def sample_target(address: str, port: int = NODE_EXPORTER_PORT,
+                  timeout: float = 5.0) -> SeriesSample:
+    """Scrape `address` once and count its series without buffering the body"""
+    from urllib.request import urlopen
+
+    if ':' not in address:
+        address = f"{address}:{port}"
+    with urlopen(f"http://{address}/metrics", timeout=timeout) as response:
+        return count_series(response)
+
+
+def sample_file(path: Union[str, Path]) -> SeriesSample:
+    """Count series in a saved /metrics exposition (e.g. a fixture)"""
+    with open(path, encoding='utf-8') as handle:
+        return count_series(handle)
+
+
+class HostLimits:
+    """Resources a Prometheus server may use on its host"""
+
+    def __init__(
+        self,
+        name: str,
+        memory_bytes: int,
+        disk_bytes: int,
+        memory_share: float = 0.25,
+        disk_share: float = 0.8,
+    ):
+        self.name = name
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.memory_share = memory_share
+        self.disk_share = disk_share
+
+    @property
+    def memory_budget(self) -> int:
+        return int(self.memory_bytes * self.memory_share)
+
+    @property
+    def disk_budget(self) -> int:
+        return int(self.disk_bytes * self.disk_share)
+
+
+# cbwdellr720 as provisioned: 64 GiB RAM shared with the database and AI/ML
+# containers, /var/lib/prometheus on a 1 TB array volume
+DELL_R720 = HostLimits("Dell R720 (cbwdellr720)", memory_bytes=64 * GiB, disk_bytes=1000 ** 4)
+
+
+class JobLoad:
+    """Scrape load of one job or tier"""
+
+    __slots__ = ('job', 'targets', 'series_per_target', 'scrape_interval')
+
+    def __init__(self, job: str, targets: int, series_per_target: int, scrape_interval: str):
+        self.job = job
+        self.targets = targets
+        self.series_per_target = series_per_target
+        self.scrape_interval = scrape_interval
+
+    @property
+    def series(self) -> int:
+        return self.targets * self.series_per_target
+
+    @property
+    def samples_per_second(self) -> float:
+        return self.series / duration_seconds(self.scrape_interval)
+
+
+class CapacityPlan:
+    """Projected TSDB resource usage for a set of job loads"""
+
+    def __init__(self, loads: List[JobLoad], retention_days: int, limits: HostLimits,
+                 warn_ratio: float):
+        self.loads = loads
+        self.retention_days = retention_days
+        self.limits = limits
+        self.active_series = sum(load.series for load in loads)
+        self.samples_per_second = sum(load.samples_per_second for load in loads)
+
+        head_samples = self.samples_per_second * HEAD_HOURS * 3600
+        self.head_memory_bytes = int(self.active_series * HEAD_BYTES_PER_SERIES
+                                     + head_samples * BYTES_PER_SAMPLE)
+        self.wal_bytes = int(head_samples * WAL_BYTES_PER_SAMPLE
+                             + self.active_series * WAL_BYTES_PER_SERIES)
+
+        # Blocks compact up to 10% of retention (max 31d); compaction needs
+        # room for one extra block of that size while it runs
+        retention_seconds = retention_days * 86400
+        block_days = min(31.0, max(retention_days * 0.1, 2 / 24))
+        blocks = math.ceil(retention_days / block_days)
+        chunk_bytes = retention_seconds * self.samples_per_second * BYTES_PER_SAMPLE
+        index_bytes = blocks * self.active_series * INDEX_BYTES_PER_SERIES
+        self.block_bytes = int((chunk_bytes + index_bytes) * (1 + block_days / retention_days))
+        self.disk_bytes = self.block_bytes + self.wal_bytes
+
+        self.warnings: List[str] = []
+        for what, used, budget in (
+            ('head memory', self.head_memory_bytes, limits.memory_budget),
+            ('disk', self.disk_bytes, limits.disk_budget),
+        ):
+            if used > budget:
+                self.warnings.append(
+                    f"{what} {_size(used)} exceeds the {_size(budget)} budget on {limits.name}"
+                )
+            elif used > budget * warn_ratio:
+                self.warnings.append(
+                    f"{what} {_size(used)} is {used / budget:.0%} of the {_size(budget)} budget "
+                    f"on {limits.name}"
+                )
+
+    @property
+    def ok(self) -> bool:
+        return not self.warnings
+
+    def max_retention_days(self) -> int:
+        """Longest retention that still fits the disk budget"""
+        per_day = self.block_bytes / self.retention_days
+        return max(0, int((self.limits.disk_budget - self.wal_bytes) / per_day))
+
+    def to_dict(self) -> Dict:
+        return {
+            'active_series': self.active_series,
+            'samples_per_second': round(self.samples_per_second, 1),
+            'head_memory_bytes': self.head_memory_bytes,
+            'wal_bytes': self.wal_bytes,
+            'disk_bytes': self.disk_bytes,
+            'retention_days': self.retention_days,
+            'max_retention_days': self.max_retention_days(),
+            'warnings': list(self.warnings),
+        }
+
+    def report(self) -> str:
+        lines = [f"{'job':<24} {'targets':>8} {'series/t':>9} {'interval':>9} {'series':>10} "
+                 f"{'samples/s':>10}"]
+        for load in self.loads:
+            lines.append(
+                f"{load.job:<24} {load.targets:>8} {load.series_per_target:>9} "
+                f"{load.scrape_interval:>9} {load.series:>10} {load.samples_per_second:>10.1f}"
+            )
+        lines += [
+            "",
+            f"{'active series':<19}{self.active_series}",
+            f"{'ingest':<19}{self.samples_per_second:.1f} samples/s",
+            f"{'head memory':<19}{_size(self.head_memory_bytes)} "
+            f"(budget {_size(self.limits.memory_budget)})",
+            f"{'WAL':<19}{_size(self.wal_bytes)}",
+            f"{f'disk ({self.retention_days}d)':<19}{_size(self.disk_bytes)} "
+            f"(budget {_size(self.limits.disk_budget)})",
+            f"{'max retention':<19}{self.max_retention_days()}d on {self.limits.name}",
+        ]
+        lines += [f"WARNING: {warning}" for warning in self.warnings]
+        return "\n".join(lines)
+
+
+def _size(value: float) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+        if value < 1024 or unit == 'TiB':
+            return f"{value:.1f}{unit}"
+        value /= 1024
+
+
+class CapacityPlanner:
+    """
+    TSDB capacity planner for a MonitoringStack
+    Turns series counts sampled per scrape tier into memory, WAL and disk
+    projections for the configured retention, and warns before the
+    Prometheus host runs out of either.
+    """
+
+    def __init__(self, limits: HostLimits = DELL_R720, warn_ratio: float = 0.8):
+        self.limits = limits
+        self.warn_ratio = warn_ratio
+
+    @staticmethod
+    def loads_for(
+        args: MonitoringStackArgs,
+        samples: Dict[str, SeriesSample],
+        job: str = NODE_EXPORTER_JOB,
+    ) -> List[JobLoad]:
+        """
+        One JobLoad per scrape tier of `args`
+        `samples` maps tier names (and 'default' for untiered targets) to a
+        representative SeriesSample; tiers without one use the default.
+        """
+        counts = MonitoringStack._targets_per_tier(args)
+        loads = []
+        for tier, targets in counts.items():
+            if not targets:
+                continue
+            sample = samples.get(tier) or samples.get('default')
+            if sample is None:
+                raise ValueError(f"No series sample for tier {tier!r} and no 'default' sample")
+            interval = args.scrape_tiers.get(tier, args.scrape_interval)
+            name = job if tier == 'default' else f"{job}-{tier}"
+            loads.append(JobLoad(name, targets, sample.total, interval))
+        return loads
+
+    def plan(self, loads: Iterable[JobLoad], retention_days: int) -> CapacityPlan:
+        return CapacityPlan(list(loads), require_int('retention_days', retention_days, minimum=1),
+                            self.limits, self.warn_ratio)
+
+    def plan_stack(self, args: Union[MonitoringStackArgs, Dict],
+                   samples: Dict[str, SeriesSample]) -> CapacityPlan:
+        args = MonitoringStackArgs.coerce(args)
+        return self.plan(self.loads_for(args, samples), args.retention_days)
@@ -0,0 +1,340 @@
+"""
+Construction Profiler
+Opt-in timing of component construction, resource registration, output
+resolution and provider invokes, exported as Chrome trace and Prometheus text
+"""
+
+import atexit
+import importlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pulumi
+import pulumi.runtime
+from pulumi import ComponentResource, Output
+from pulumi.resource import Resource
+
+PROFILE_ENV = "CLOUDCURIO_PROFILE"
+COMPONENT_MODULES = (
+    'cloudcurio_lib.zerotier',
+    'cloudcurio_lib.monitoring',
+    'cloudcurio_lib.database',
+    'cloudcurio_lib.web',
+)
+
+_active: Optional["Profiler"] = None
+
+
+class Span:
+    """One timed event; end is None until it finishes"""
+
+    __slots__ = ('name', 'type', 'category', 'start', 'end', 'parent', 'children', 'size', 'thread')
+
+    def __init__(self, name: str, type_: str, category: str, parent: Optional["Span"] = None):
+        self.name = name
+        self.type = type_
+        self.category = category
+        self.start = time.perf_counter_ns()
+        self.end: Optional[int] = None
+        self.parent = parent
+        self.children = 0
+        self.size = 0
+        self.thread = threading.get_ident()
+
+    @property
+    def seconds(self) -> float:
+        return ((self.end or self.start) - self.start) / 1e9
+
+
+def _approx_size(value) -> int:
+    """Serialized size of an outputs dict; unresolved Outputs count as a placeholder"""
+    return len(json.dumps(value,
+                          default=lambda v: "<output>" if isinstance(v, Output) else repr(v)))
+
+
+class Profiler:
+    """
+    Records construction spans for one Pulumi program
+    While enabled, every cloudcurio_lib component's __init__, every resource
+    registration, every provider invoke and the time until each resource's
+    URN resolves are recorded. Components are timed including the children
+    they build, so nested spans show where a preview spends its time.
+    """
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self.origin = time.perf_counter_ns()
+        self._stack: List[Span] = []
+        self._by_resource: Dict[int, Span] = {}
+        self._patched: List[tuple] = []
+
+    # Patching
+
+    def _patch(self, owner, name: str, replacement):
+        self._patched.append((owner, name, owner.__dict__[name]))
+        setattr(owner, name, replacement)
+
+    def enable(self) -> "Profiler":
+        global _active
+        if _active is not None:
+            raise RuntimeError("A profiler is already enabled")
+        _active = self
+        for module in COMPONENT_MODULES:
+            importlib.import_module(module)
+        for cls in _component_classes():
+            if '__init__' in cls.__dict__:
+                self._patch(cls, '__init__', self._wrap_component(cls.__dict__['__init__']))
+        self._patch(Resource, '__init__', self._wrap_resource(Resource.__init__))
+        self._patch(ComponentResource, 'register_outputs',
+                    self._wrap_register_outputs(ComponentResource.register_outputs))
+        for name in ('invoke', 'invoke_output'):
+            if name in pulumi.runtime.__dict__:
+                self._patch(pulumi.runtime, name, self._wrap_invoke(pulumi.runtime.__dict__[name]))
+        return self
+
+    def disable(self):
+        global _active
+        for owner, name, original in reversed(self._patched):
+            setattr(owner, name, original)
+        self._patched.clear()
+        if _active is self:
+            _active = None
+
+    def __enter__(self) -> "Profiler":
+        return self.enable()
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    # Recording
+
+    def _open(self, name: str, type_: str, category: str, parent: Optional[Span]) -> Span:
+        span = Span(name, type_, category, parent)
+        if parent is not None:
+            parent.children += 1
+        self.spans.append(span)
+        return span
+
+    def _parent_of(self, opts) -> Optional[Span]:
+        parent = getattr(opts, 'parent', None)
+        if parent is not None and id(parent) in self._by_resource:
+            return self._by_resource[id(parent)]
+        return self._stack[-1] if self._stack else None
+
+    def _wrap_component(self, init):
+        profiler = self
+
+        def __init__(resource, name, *args, **kwargs):
+            if profiler._stack and profiler._stack[-1] is profiler._by_resource.get(id(resource)):
+                # A cloudcurio_lib subclass calling its cloudcurio_lib base
+                return init(resource, name, *args, **kwargs)
+            opts = kwargs.get('opts', args[1] if len(args) > 1 else None)
+            span = profiler._open(name, type(resource).__name__, 'construct',
+                                  profiler._parent_of(opts))
+            profiler._by_resource[id(resource)] = span
+            profiler._stack.append(span)
+            try:
+                return init(resource, name, *args, **kwargs)
+            finally:
+                profiler._stack.pop()
+                span.end = time.perf_counter_ns()
+
+        __init__.__wrapped__ = init
+        return __init__
+
+    def _wrap_resource(self, init):
+        profiler = self
+
+        def __init__(resource, t, name, custom, props=None, opts=None, *args, **kwargs):
+            if id(resource) in profiler._by_resource:
+                # Registration of a profiled component; its construct span covers this
+                init(resource, t, name, custom, props, opts, *args, **kwargs)
+                profiler._track_resolution(resource, name, t)
+                return
+            span = profiler._open(name, t, 'register', profiler._parent_of(opts))
+            span.size = _approx_size(props or {})
+            profiler._by_resource[id(resource)] = span
+            try:
+                return init(resource, t, name, custom, props, opts, *args, **kwargs)
+            finally:
+                span.end = time.perf_counter_ns()
+                profiler._track_resolution(resource, name, t)
+
+        __init__.__wrapped__ = init
+        return __init__
+
+    def _track_resolution(self, resource, name: str, type_: str):
+        urn = getattr(resource, 'urn', None)
+        if not isinstance(urn, Output):
+            return
+        span = self._open(name, type_, 'resolve', None)
+
+        def resolved(value):
+            span.end = time.perf_counter_ns()
+            return value
+
+        urn.apply(resolved)
+
+    def _wrap_register_outputs(self, register_outputs):
+        profiler = self
+
+        def wrapper(resource, outputs):
+            span = profiler._by_resource.get(id(resource))
+            if span is not None:
+                span.size = _approx_size(outputs)
+            return register_outputs(resource, outputs)
+
+        wrapper.__wrapped__ = register_outputs
+        return wrapper
+
+    def _wrap_invoke(self, invoke):
+        profiler = self
+
+        def wrapper(tok, props, *args, **kwargs):
+            parent = profiler._stack[-1] if profiler._stack else None
+            span = profiler._open(tok, tok, 'invoke', parent)
+            span.size = _approx_size(props)
+            try:
+                return invoke(tok, props, *args, **kwargs)
+            finally:
+                span.end = time.perf_counter_ns()
+
+        wrapper.__wrapped__ = invoke
+        return wrapper
+
+    # Export
+
+    def chrome_trace(self) -> Dict:
+        """Trace Event Format; open in chrome://tracing or ui.perfetto.dev"""
+        pid = os.getpid()
+        events = []
+        for index, span in enumerate(self.spans):
+            if span.end is None:
+                continue
+            ts = (span.start - self.origin) / 1000
+            args = {'type': span.type, 'children': span.children, 'bytes': span.size}
+            if span.category == 'resolve':
+                # Resolution overlaps everything else; async events get their own track
+                common = {'name': span.name, 'cat': 'resolve', 'id': index, 'pid': pid,
+                          'tid': span.thread}
+                events.append({**common, 'ph': 'b', 'ts': ts, 'args': args})
+                events.append({**common, 'ph': 'e', 'ts': (span.end - self.origin) / 1000})
+            else:
+                events.append({
+                    'name': f"{span.type} {span.name}" if span.category != 'invoke' else span.name,
+                    'cat': span.category,
+                    'ph': 'X',
+                    'ts': ts,
+                    'dur': (span.end - span.start) / 1000,
+                    'pid': pid,
+                    'tid': span.thread,
+                    'args': args,
+                })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def prometheus_text(self, project: Optional[str] = None, stack: Optional[str] = None) -> str:
+        """Metrics in text exposition format, e.g. for node_exporter's textfile collector"""
+        project = project or pulumi.get_project()
+        stack = stack or pulumi.get_stack()
+        base = f'project="{_escape(project)}",stack="{_escape(stack)}"'
+        families = {
+            'cloudcurio_pulumi_span_seconds':
+                'Wall time of construct, register, invoke or resolve spans',
+            'cloudcurio_pulumi_children': 'Resources constructed under components',
+            'cloudcurio_pulumi_bytes': 'Serialized size of component outputs or resource inputs',
+        }
+        # The textfile collector rejects a file that repeats a series; two
+        # get_zone calls, or same-named children of different parents, share
+        # labels, so spans are summed per label set
+        series: Dict[tuple, List[float]] = {}
+        for span in self.spans:
+            if span.end is None:
+                continue
+            sums = series.setdefault((span.category, span.type, span.name), [0.0, 0, 0])
+            sums[0] += span.seconds
+            sums[1] += span.children
+            sums[2] += span.size
+
+        lines = []
+        for metric, help_text in families.items():
+            lines += [f"# HELP {metric} {help_text}, summed per type and name",
+                      f"# TYPE {metric} gauge"]
+            for (category, type_, name), (seconds, children, size) in series.items():
+                labels = (f'{base},category="{category}",'
+                          f'type="{_escape(type_)}",name="{_escape(name)}"')
+                if metric.endswith('_seconds'):
+                    lines.append(f"{metric}{{{labels}}} {seconds:.6f}")
+                elif metric.endswith('_children') and category == 'construct':
+                    lines.append(f"{metric}{{{labels}}} {children}")
+                elif metric.endswith('_bytes') and size:
+                    lines.append(f"{metric}{{{labels}}} {size}")
+
+        totals: Dict[str, List[float]] = {}
+        for span in self.spans:
+            if span.end is not None:
+                totals.setdefault(span.category, []).append(span.seconds)
+        lines += [
+            "# HELP cloudcurio_pulumi_category_seconds_total Summed span time per category",
+            "# TYPE cloudcurio_pulumi_category_seconds_total counter",
+        ]
+        lines += [f'cloudcurio_pulumi_category_seconds_total{{{base},category="{c}"}} {sum(v):.6f}'
+                  for c, v in sorted(totals.items())]
+        lines += [
+            "# HELP cloudcurio_pulumi_spans_total Spans recorded per category",
+            "# TYPE cloudcurio_pulumi_spans_total counter",
+        ]
+        lines += [f'cloudcurio_pulumi_spans_total{{{base},category="{c}"}} {len(v)}'
+                  for c, v in sorted(totals.items())]
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory, prefix: Optional[str] = None) -> Dict[str, str]:
+        """Write <prefix>.trace.json and <prefix>.prom atomically; returns their paths"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        prefix = prefix or f"{pulumi.get_project()}-{pulumi.get_stack()}"
+        paths = {}
+        files = {'trace.json': json.dumps(self.chrome_trace()), 'prom': self.prometheus_text()}
+        for suffix, content in files.items():
+            path = directory / f"{prefix}.{suffix}"
+            temp = path.with_name(f".{path.name}.tmp")
+            temp.write_text(content)
+            os.replace(temp, path)
+            paths[suffix] = str(path)
+        return paths
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _component_classes() -> List[type]:
+    """ComponentResource subclasses defined in cloudcurio_lib"""
+    found, pending = [], list(ComponentResource.__subclasses__())
+    while pending:
+        cls = pending.pop()
+        pending.extend(cls.__subclasses__())
+        if cls.__module__.startswith('cloudcurio_lib.') and cls not in found:
+            found.append(cls)
+    return found
+
+
+def active() -> Optional[Profiler]:
+    return _active
+
+
+def profile_from_env() -> Optional[Profiler]:
+    """
+    Enable profiling when CLOUDCURIO_PROFILE names an output directory
+    Results are written when the program exits; point the directory at
+    node_exporter's textfile collector to scrape the .prom file.
+    """
+    directory = os.environ.get(PROFILE_ENV)
+    if not directory or _active is not None:
+        return _active
+    profiler = Profiler().enable()
+    atexit.register(lambda: profiler.write(directory))
+    return profiler
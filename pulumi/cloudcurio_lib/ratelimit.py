@@ -0,0 +1,189 @@
+"""
+Rate Limit Simulator
+Replays Logpush request logs through sliding-window rate limits to show
+what candidate thresholds would have challenged
+"""
+
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .logpush import BATCH_BYTES, read_batches
+from .waf import API_RATE_LIMIT, RateLimitRule
+
+
+def candidate_rules(thresholds: Iterable[int], periods: Iterable[int],
+                    base: RateLimitRule = API_RATE_LIMIT) -> List[RateLimitRule]:
+    """`base` with every combination of threshold and period"""
+    return [base.replace(threshold=threshold, period=period)
+            for period in periods for threshold in thresholds]
+
+
+def _glob(pattern: str) -> "re.Pattern":
+    # Rate limit URL patterns only have *, matching anything including /
+    return re.compile(b".*".join(re.escape(part.encode()) for part in pattern.split("*")) + rb"\Z")
+
+
+# Request logs
+
+Labeler = Union[Iterable[str], Callable[[Dict[str, np.ndarray]], np.ndarray]]
+
+
+class RequestLog:
+    """
+    Requests as arrays: client (index into client_names), time in ms,
+    whether it's abusive, and a bitmask of the path patterns it matches
+    """
+
+    __slots__ = ('clients', 'times', 'abusive', 'matches', 'patterns', 'client_names')
+
+    def __init__(self, clients: np.ndarray, times: np.ndarray, abusive: np.ndarray,
+                 matches: np.ndarray, patterns: Sequence[str],
+                 client_names: Optional[List[str]] = None):
+        if len(patterns) > 63:
+            raise ValueError("At most 63 distinct path patterns")
+        self.clients = np.asarray(clients, dtype=np.int64)
+        self.times = np.asarray(times, dtype=np.int64)
+        self.abusive = np.asarray(abusive, dtype=bool)
+        self.matches = np.asarray(matches, dtype=np.int64)
+        self.patterns = list(patterns)
+        self.client_names = client_names
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+
+def _labeler(abusive: Optional[Labeler]) -> Callable[[Dict[str, np.ndarray]], np.ndarray]:
+    if abusive is None:
+        return lambda batch: np.zeros(len(batch['start']), dtype=bool)
+    if callable(abusive):
+        return abusive
+    known = np.array([ip.encode() for ip in abusive], dtype=bytes)
+    return lambda batch: np.isin(batch['client_ip'], known)
+
+
+def load_requests(
+    paths: Iterable,
+    patterns: Sequence[str],
+    host: Optional[str] = None,
+    abusive: Optional[Labeler] = None,
+    batch_bytes: int = BATCH_BYTES,
+) -> RequestLog:
+    """
+    The requests in Logpush exports that match any of `patterns`
+    `host` restricts them to one hostname, as a zone/path URL pattern
+    does. `abusive` labels requests: either known abusive client IPs or a
+    function from a column batch (client_ip, host, uri, start, status) to
+    a boolean mask; unlabeled requests all count as legitimate. Only
+    matching requests are kept, at 25 bytes each.
+    """
+    compiled = [_glob(pattern) for pattern in patterns]
+    label = _labeler(abusive)
+    names: Dict[bytes, int] = {}
+    parts = []
+    columns = ('client_ip', 'host', 'uri', 'start', 'status')
+    for batch in read_batches(paths, columns=columns, batch_bytes=batch_bytes):
+        urls, inverse = np.unique(np.char.partition(batch['uri'], b"?")[:, 0], return_inverse=True)
+        matches = np.zeros(len(urls), dtype=np.int64)
+        for bit, pattern in enumerate(compiled):
+            hits = (pattern.match(url) is not None for url in urls.tolist())
+            matches |= np.fromiter(hits, bool, len(urls)) << bit
+        matches = matches[inverse]
+        keep = (matches != 0) & (batch['start'] > 0)
+        if host is not None:
+            keep &= batch['host'] == host.lower().encode()
+        if not keep.any():
+            continue
+        ips, inverse = np.unique(batch['client_ip'][keep], return_inverse=True)
+        codes = np.array([names.setdefault(ip, len(names)) for ip in ips.tolist()], dtype=np.int64)
+        millis = batch['start'][keep] // 1_000_000
+        parts.append((codes[inverse], millis, label(batch)[keep], matches[keep]))
+    if not parts:
+        return RequestLog([], [], [], [], patterns, [])
+    clients, times, flags, matches = (np.concatenate(column) for column in zip(*parts))
+    return RequestLog(clients, times, flags, matches, patterns, [name.decode() for name in names])
+
+
+# Replay
+
+class RateLimitOutcome:
+    __slots__ = ('rule', 'legitimate', 'abusive', 'challenged_legitimate', 'challenged_abusive',
+                 'clients_challenged')
+
+    def __init__(self, rule: RateLimitRule, legitimate: int, abusive: int,
+                 challenged_legitimate: int, challenged_abusive: int, clients_challenged: int):
+        self.rule = rule
+        self.legitimate = legitimate
+        self.abusive = abusive
+        self.challenged_legitimate = challenged_legitimate
+        self.challenged_abusive = challenged_abusive
+        self.clients_challenged = clients_challenged
+
+    @property
+    def false_positive_rate(self) -> float:
+        return self.challenged_legitimate / self.legitimate if self.legitimate else 0.0
+
+    @property
+    def catch_rate(self) -> float:
+        return self.challenged_abusive / self.abusive if self.abusive else 0.0
+
+    def to_dict(self) -> Dict:
+        values = {name: getattr(self, name) for name in self.__slots__[1:]}
+        values.update(rule=self.rule.to_dict(), false_positive_rate=self.false_positive_rate,
+                      catch_rate=self.catch_rate)
+        return values
+
+
+def _challenged(keys: np.ndarray, counts: np.ndarray, rule: RateLimitRule) -> np.ndarray:
+    over = counts > rule.threshold
+    if not rule.mitigation_ms:
+        return over
+    # Every request over the limit (re)starts the timeout; find the latest one so far
+    latest = np.maximum.accumulate(np.where(over, keys, -1))
+    return (latest >= 0) & (keys - latest < rule.mitigation_ms)
+
+
+def replay(log: RequestLog, rules: Sequence[RateLimitRule]) -> List[RateLimitOutcome]:
+    """
+    What each rule would have done to the logged requests
+    Requests are sorted by client and time once. Each request's count of
+    same-client requests in the trailing period is then a searchsorted
+    over (client, time) keys, shared by every threshold with that period.
+    """
+    order = np.lexsort((log.times, log.clients))
+    clients, times = log.clients[order], log.times[order]
+    abusive, matches = log.abusive[order], log.matches[order]
+    start = times.min() if len(times) else 0
+
+    outcomes: Dict[int, RateLimitOutcome] = {}
+    for bit, pattern in enumerate(log.patterns):
+        indexes = [i for i, rule in enumerate(rules) if rule.path == pattern]
+        if not indexes:
+            continue
+        selected = (matches >> bit) & 1 == 1
+        group, flags = clients[selected], abusive[selected]
+        elapsed = times[selected] - start
+        # Clients sit further apart than any window or timeout, so lookbacks never cross clients
+        reach = max(max(rules[i].period * 1000, rules[i].mitigation_ms) for i in indexes)
+        keys = group * (int(elapsed.max(initial=0)) + reach + 1) + elapsed
+        positions = np.arange(len(keys))
+        abusive_total = int(flags.sum())
+        counts: Dict[int, np.ndarray] = {}
+        for index in indexes:
+            rule = rules[index]
+            if rule.period not in counts:
+                earliest = np.searchsorted(keys, keys - rule.period * 1000, 'right')
+                counts[rule.period] = positions - earliest + 1
+            challenged = _challenged(keys, counts[rule.period], rule)
+            caught = int(np.count_nonzero(challenged & flags))
+            hit = group[challenged]
+            outcomes[index] = RateLimitOutcome(
+                rule, len(keys) - abusive_total, abusive_total,
+                int(np.count_nonzero(challenged)) - caught, caught,
+                int(np.count_nonzero(np.diff(hit))) + 1 if len(hit) else 0,
+            )
+    missing = [rule.path for i, rule in enumerate(rules) if i not in outcomes]
+    if missing:
+        raise ValueError(f"The log wasn't loaded with pattern {missing[0]!r}")
+    return [outcomes[i] for i in range(len(rules))]
@@ -0,0 +1,268 @@
+"""
+Tunnel Ingress Compiler
+Builds cloudflared ingress rules from a service registry, collapsed and
+ordered by observed request share, with the catch-all 404 rule last
+"""
+
+import gzip
+import heapq
+import json
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .args import FrozenArgs, require_choice, require_int, require_str
+
+CATCH_ALL_SERVICE = "http_status:404"
+SCHEMES = ('http', 'https', 'tcp', 'ssh', 'rdp')
+
+# name -> origin port for the services published through the tunnel
+SERVICE_PORTS = {
+    'grafana': 3000,
+    'prometheus': 9090,
+    'loki': 3100,
+    'anythingllm': 3001,
+}
+
+
+class IngressError(ValueError):
+    pass
+
+
+class TunnelService(FrozenArgs):
+    """A service in the registry; hostname defaults to <name>.<zone>"""
+
+    __slots__ = ('name', 'host', 'port', 'scheme', 'hostname', 'path')
+
+    def __init__(
+        self,
+        name: str,
+        host: str,
+        port: int,
+        scheme: str = "http",
+        hostname: Optional[str] = None,
+        path: Optional[str] = None,
+    ):
+        if path is not None:
+            try:
+                re.compile(path)
+            except re.error as exc:
+                raise ValueError(f"path for {name} is not a valid regex: {exc}") from exc
+        self._set(
+            name=require_str('name', name),
+            host=require_str('host', host),
+            port=require_int('port', port, minimum=1, maximum=65535),
+            scheme=require_choice('scheme', scheme, SCHEMES),
+            hostname=require_str('hostname', hostname, optional=True),
+            path=path,
+        )
+
+    @property
+    def service(self) -> str:
+        return f"{self.scheme}://{self.host}:{self.port}"
+
+
+def tunnel_services(host: str, names: Optional[Iterable[str]] = None) -> List[TunnelService]:
+    """Registry entries for `names` (default: all of SERVICE_PORTS) served from `host`"""
+    return [TunnelService(name, host, SERVICE_PORTS[name]) for name in (names or SERVICE_PORTS)]
+
+
+class IngressRule(FrozenArgs):
+    """One cloudflared ingress rule; no hostname and no path makes it a catch-all"""
+
+    __slots__ = ('hostname', 'path', 'service')
+
+    def __init__(self, service: str, hostname: Optional[str] = None, path: Optional[str] = None):
+        self._set(
+            service=require_str('service', service),
+            hostname=require_str('hostname', hostname, optional=True),
+            path=require_str('path', path, optional=True),
+        )
+
+    @property
+    def catch_all(self) -> bool:
+        return self.hostname is None and self.path is None
+
+    @property
+    def wildcard(self) -> bool:
+        return self.hostname is not None and self.hostname.startswith('*.')
+
+    def matches_host(self, host: str) -> bool:
+        if self.hostname is None:
+            return True
+        if self.wildcard:
+            return host.endswith(self.hostname[1:])
+        return host == self.hostname
+
+    def overlaps(self, other: "IngressRule") -> bool:
+        """Whether some request could match both, so their order matters"""
+        if self.hostname is None or other.hostname is None:
+            return True
+        if not (self.matches_host(other.hostname.lstrip('*.'))
+                or other.matches_host(self.hostname.lstrip('*.'))):
+            return False
+        # Regex intersection is undecidable in general; only disjoint if both paths are
+        # literal prefixes
+        return not (_literal_prefix(self.path) and _literal_prefix(other.path)
+                    and not (self.path.startswith(other.path) or other.path.startswith(self.path)))
+
+    def args(self) -> Dict[str, str]:
+        """Keyword arguments for cloudflare.TunnelConfigConfigIngressRuleArgs"""
+        fields = (('hostname', self.hostname), ('path', self.path), ('service', self.service))
+        return {key: value for key, value in fields if value is not None}
+
+
+def _literal_prefix(path: Optional[str]) -> bool:
+    return path is not None and path.startswith('^/') and re.escape(path[1:]) == path[1:]
+
+
+# Traffic samples
+
+def _open_log(path: Path):
+    return gzip.open(path, 'rt') if path.suffix == '.gz' else open(path)
+
+
+def traffic_shares(paths: Iterable, field: str = "ClientRequestHost") -> Dict[str, float]:
+    """Share of requests per hostname in Logpush http_requests NDJSON (optionally gzipped)"""
+    counts = Counter()
+    for path in paths:
+        with _open_log(Path(path)) as lines:
+            for line in lines:
+                if line.strip():
+                    counts[json.loads(line).get(field, "").lower()] += 1
+    total = sum(counts.values())
+    return {host: count / total for host, count in counts.items()} if total else {}
+
+
+# Compilation
+
+def _collapse(rules: List[IngressRule]) -> List[IngressRule]:
+    """
+    Drop duplicates, merge paths per host and service, and drop exact hosts
+    a same-service wildcard already covers; returns the specificity order
+    """
+    by_target: Dict[Tuple[str, str], List[IngressRule]] = {}
+    for rule in rules:
+        by_target.setdefault((rule.hostname, rule.service), []).append(rule)
+
+    merged = []
+    for (hostname, service), group in by_target.items():
+        paths = list(dict.fromkeys(rule.path for rule in group))
+        if None in paths:
+            path = None
+        elif len(paths) == 1:
+            path = paths[0]
+        else:
+            path = "|".join(f"(?:{p})" for p in paths)
+        merged.append(IngressRule(service, hostname, path))
+
+    seen: Dict[Tuple[str, str], str] = {}
+    for rule in merged:
+        target = seen.setdefault((rule.hostname, rule.path), rule.service)
+        if target != rule.service:
+            raise IngressError(f"{rule.hostname}{rule.path or ''} routes to both {target} "
+                               f"and {rule.service}")
+
+    ordered = sorted(merged, key=_specificity)
+    return [rule for index, rule in enumerate(ordered)
+            if rule.wildcard or not _covered(rule, ordered[index + 1:])]
+
+
+def _covered(rule: IngressRule, later: List[IngressRule]) -> bool:
+    """
+    Whether every request for `rule` would reach its service anyway
+    Walks the rules after it: a same-service wildcard taking all of its
+    paths covers it, but any rule for another service that could match
+    its host first (such as a pathed wildcard) means it has to stay.
+    """
+    for other in later:
+        if not other.matches_host(rule.hostname):
+            continue
+        if other.service != rule.service:
+            return False
+        if other.wildcard and other.path in (None, rule.path):
+            return True
+    return False
+
+
+def _specificity(rule: IngressRule) -> Tuple:
+    # Exact hosts before wildcards, pathed rules before bare ones; otherwise registry order
+    return (rule.wildcard, rule.path is None)
+
+
+def rule_share(rule: IngressRule, shares: Dict[str, float]) -> float:
+    return sum(share for host, share in shares.items() if rule.matches_host(host))
+
+
+def order_by_traffic(rules: List[IngressRule], shares: Dict[str, float]) -> List[IngressRule]:
+    """
+    Busiest rules first without changing which rule any request matches
+    A rule may only move ahead of rules it cannot overlap with, so this
+    is a traffic-weighted topological sort of the specificity order.
+    """
+    weight = [rule_share(rule, shares) for rule in rules]
+    blockers = [0] * len(rules)
+    unblocks: List[List[int]] = [[] for _ in rules]
+    for later in range(len(rules)):
+        for earlier in range(later):
+            if rules[earlier].overlaps(rules[later]):
+                blockers[later] += 1
+                unblocks[earlier].append(later)
+
+    # Max-heap on share; ties keep the specificity order
+    ready = [(-weight[i], i) for i in range(len(rules)) if not blockers[i]]
+    heapq.heapify(ready)
+    ordered = []
+    while ready:
+        _, index = heapq.heappop(ready)
+        ordered.append(rules[index])
+        for later in unblocks[index]:
+            blockers[later] -= 1
+            if not blockers[later]:
+                heapq.heappush(ready, (-weight[later], later))
+    return ordered
+
+
+def validate_ingress(rules: List[IngressRule]):
+    """cloudflared's own rule: exactly one catch-all, and it comes last"""
+    if not rules or not rules[-1].catch_all:
+        raise IngressError("The last ingress rule must be a catch-all (no hostname or path)")
+    for index, rule in enumerate(rules[:-1]):
+        if rule.catch_all:
+            raise IngressError(f"Catch-all rule {index} ({rule.service}) "
+                               "shadows every rule after it")
+
+
+def compile_ingress(
+    services: Iterable[TunnelService],
+    zone_name: str,
+    shares: Optional[Dict[str, float]] = None,
+    catch_all: str = CATCH_ALL_SERVICE,
+) -> List[IngressRule]:
+    """Registry -> collapsed, traffic-ordered ingress rules ending in the catch-all"""
+    rules = [IngressRule(s.service, s.hostname or f"{s.name}.{zone_name}", s.path)
+             for s in services]
+    rules = _collapse(rules)
+    if shares:
+        rules = order_by_traffic(rules, {host.lower(): share for host, share in shares.items()})
+    rules.append(IngressRule(catch_all))
+    validate_ingress(rules)
+    return rules
+
+
+class IngressMatcher:
+    """First-match evaluation as cloudflared does it, counting rules tested"""
+
+    def __init__(self, rules: List[IngressRule]):
+        validate_ingress(rules)
+        self.rules = [(rule, re.compile(rule.path) if rule.path else None) for rule in rules]
+        self.tested = 0
+
+    def match(self, host: str, path: str = "/") -> IngressRule:
+        for rule, pattern in self.rules[:-1]:
+            self.tested += 1
+            if rule.matches_host(host) and (pattern is None or pattern.search(path)):
+                return rule
+        self.tested += 1
+        return self.rules[-1][0]
@@ -0,0 +1,597 @@
+"""
+WAF Rules
+The zone's custom firewall rules, defined once, optimized, and evaluated
+locally with a subset of the Cloudflare Rules language
+"""
+
+import ipaddress
+import re
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .args import FrozenArgs, require_bool, require_choice, require_int, require_str
+
+ACTIONS = ('block', 'challenge', 'managed_challenge', 'js_challenge', 'log', 'skip')
+# Actions that stop evaluation; consecutive rules sharing one can be merged
+TERMINATING = frozenset(('block', 'challenge', 'managed_challenge', 'js_challenge'))
+
+# Supported fields and their types
+FIELDS = {
+    'http.host': 'str',
+    'http.request.method': 'str',
+    'http.request.uri': 'str',
+    'http.request.uri.path': 'str',
+    'http.request.uri.query': 'str',
+    'http.request.full_uri': 'str',
+    'http.user_agent': 'str',
+    'http.referer': 'str',
+    'http.cookie': 'str',
+    'ip.src': 'ip',
+    'ip.geoip.country': 'str',
+    'ip.geoip.continent': 'str',
+    'ip.geoip.asnum': 'int',
+    'cf.threat_score': 'int',
+    'cf.bot_management.score': 'int',
+    'cf.bot_management.verified_bot': 'bool',
+    'cf.client.bot': 'bool',
+    'ssl': 'bool',
+}
+_DEFAULTS = {'str': "", 'int': 0, 'bool': False, 'ip': "0.0.0.0"}
+
+# Logpush http_requests field -> rules language field, for replaying logs
+LOGPUSH_FIELDS = {
+    'ClientRequestHost': 'http.host',
+    'ClientRequestMethod': 'http.request.method',
+    'ClientRequestURI': 'http.request.uri',
+    'ClientRequestPath': 'http.request.uri.path',
+    'ClientRequestQuery': 'http.request.uri.query',
+    'ClientRequestUserAgent': 'http.user_agent',
+    'ClientRequestReferer': 'http.referer',
+    'ClientIP': 'ip.src',
+    'ClientCountry': 'ip.geoip.country',
+    'ClientASN': 'ip.geoip.asnum',
+    'BotScore': 'cf.bot_management.score',
+    'ThreatScore': 'cf.threat_score',
+}
+
+_OPERATORS = {
+    '==': 'eq', '!=': 'ne', '<': 'lt', '<=': 'le', '>': 'gt', '>=': 'ge', '~': 'matches',
+    'eq': 'eq', 'ne': 'ne', 'lt': 'lt', 'le': 'le', 'gt': 'gt', 'ge': 'ge',
+    'contains': 'contains', 'matches': 'matches',
+}
+# name -> (argument type, result type, implementation)
+_FUNCTIONS = {
+    'lower': ('str', 'str', lambda v: v.lower()),
+    'upper': ('str', 'str', lambda v: v.upper()),
+    'len': ('str', 'int', len),
+}
+
+# Relative cost of each predicate, used to put cheap checks first
+_COSTS = {'bool': 1, 'eq': 1, 'ne': 1, 'lt': 1, 'le': 1, 'gt': 1, 'ge': 1,
+          'in': 2, 'contains': 4, 'matches': 25}
+_CALL_COST = 2
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+      (?P<string>"(?:\\.|[^"\\])*")
+    | (?P<network>\d+\.\d+\.\d+\.\d+(?:/\d+)?|[0-9a-fA-F]*:[0-9a-fA-F:]+(?:/\d+)?)
+    | (?P<number>-?\d+)
+    | (?P<name>[A-Za-z_][A-Za-z0-9_.]*)
+    | (?P<symbol>==|!=|<=|>=|&&|\|\||\^\^|[<>!~(){},])
+    )''', re.VERBOSE)
+
+
+class WafError(ValueError):
+    pass
+
+
+# Parsing: expressions become nested tuples, which compare and hash by value
+#   ('or', (a, b, ...))  ('and', (...))  ('xor', (...))  ('not', a)
+#   ('cmp', op, operand, value)  ('in', operand, frozenset)  ('bool', operand)
+#   operands: ('field', name) or ('call', function, operand)
+
+def _tokenize(text: str) -> List[Tuple[str, Any]]:
+    tokens, position = [], 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise WafError(f"Unexpected input at {position}: {text[position:position + 20]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            value = re.sub(r'\\(.)', r'\1', value[1:-1])
+        elif kind == 'number':
+            value = int(value)
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.index = 0
+
+    def peek(self) -> Tuple[Optional[str], Any]:
+        return self.tokens[self.index] if self.index < len(self.tokens) else (None, None)
+
+    def take(self, *values) -> bool:
+        kind, value = self.peek()
+        if kind in ('name', 'symbol') and value in values:
+            self.index += 1
+            return True
+        return False
+
+    def expect(self, value: str):
+        if not self.take(value):
+            raise WafError(f"Expected {value!r} in {self.text!r}")
+
+    def parse(self):
+        node = self.disjunction()
+        if self.index != len(self.tokens):
+            raise WafError(f"Unexpected {self.peek()[1]!r} in {self.text!r}")
+        return node
+
+    def _chain(self, kind: str, operators: Tuple[str, ...], child):
+        nodes = [child()]
+        while self.take(*operators):
+            nodes.append(child())
+        return nodes[0] if len(nodes) == 1 else (kind, tuple(nodes))
+
+    # Precedence, loosest first: or, xor, and, not
+    def disjunction(self):
+        return self._chain('or', ('or', '||'), self.exclusive)
+
+    def exclusive(self):
+        return self._chain('xor', ('xor', '^^'), self.conjunction)
+
+    def conjunction(self):
+        return self._chain('and', ('and', '&&'), self.negation)
+
+    def negation(self):
+        if self.take('not', '!'):
+            return ('not', self.negation())
+        if self.take('('):
+            node = self.disjunction()
+            self.expect(')')
+            return node
+        return self.comparison()
+
+    def operand(self):
+        kind, name = self.peek()
+        if kind != 'name':
+            raise WafError(f"Expected a field in {self.text!r}")
+        self.index += 1
+        if self.take('('):
+            if name not in _FUNCTIONS:
+                raise WafError(f"Unsupported function {name}()")
+            inner = self.operand()
+            self.expect(')')
+            argument = _FUNCTIONS[name][0]
+            if _type_of(inner) != argument:
+                raise WafError(f"{name}() takes a {argument}, "
+                               f"got {_describe(inner)} ({_type_of(inner)})")
+            return ('call', name, inner)
+        if name not in FIELDS:
+            raise WafError(f"Unknown or unsupported field {name}")
+        return ('field', name)
+
+    def literal(self, operand):
+        kind, value = self.peek()
+        if kind not in ('string', 'number', 'network'):
+            raise WafError(f"Expected a value after {_describe(operand)} in {self.text!r}")
+        self.index += 1
+        expected = _type_of(operand)
+        if {'int': 'number', 'str': 'string', 'ip': 'network'}.get(expected, kind) != kind:
+            raise WafError(f"{_describe(operand)} is {expected}, got {value!r}")
+        return value
+
+    def comparison(self):
+        operand = self.operand()
+        kind, value = self.peek()
+        if kind in ('name', 'symbol') and value == 'in':
+            self.index += 1
+            self.expect('{')
+            values = []
+            while not self.take('}'):
+                values.append(self.literal(operand))
+                self.take(',')
+            return ('in', operand, frozenset(values))
+        if kind in ('name', 'symbol') and value in _OPERATORS:
+            self.index += 1
+            op = _OPERATORS[value]
+            literal = self.literal(operand)
+            if op == 'matches':
+                try:
+                    re.compile(literal)
+                except re.error as exc:
+                    raise WafError(f"Invalid regex {literal!r}: {exc}") from exc
+            return ('cmp', op, operand, literal)
+        if _type_of(operand) != 'bool':
+            raise WafError(f"{_describe(operand)} needs a comparison in {self.text!r}")
+        return ('bool', operand)
+
+
+def _type_of(operand) -> str:
+    return _FUNCTIONS[operand[1]][1] if operand[0] == 'call' else FIELDS[operand[1]]
+
+
+def _describe(operand) -> str:
+    return f"{operand[1]}({_describe(operand[2])})" if operand[0] == 'call' else operand[1]
+
+
+def parse(expression: str):
+    return _Parser(expression).parse()
+
+
+# Optimization
+
+def cost(node) -> int:
+    """Worst-case relative cost of evaluating `node`"""
+    kind = node[0]
+    if kind in ('and', 'or', 'xor'):
+        return sum(cost(child) for child in node[1])
+    if kind == 'not':
+        return cost(node[1])
+    operand = node[2] if kind == 'cmp' else node[1]
+    calls = 0
+    while operand[0] == 'call':
+        calls += 1
+        operand = operand[2]
+    return _COSTS[node[1] if kind == 'cmp' else kind] + calls * _CALL_COST
+
+
+_NEGATED = {'eq': 'ne', 'ne': 'eq', 'lt': 'ge', 'ge': 'lt', 'gt': 'le', 'le': 'gt'}
+
+
+def normalize(node):
+    """
+    An equivalent, cheaper expression tree
+    Nested and/or are flattened, repeated terms dropped, not-comparisons
+    inverted, `x eq a or x eq b` folded into `x in {a b}` (and the ne/and
+    dual into `not x in {...}`), and terms sorted cheapest first so
+    short-circuiting skips the expensive ones.
+    """
+    kind = node[0]
+    if kind == 'not':
+        inner = normalize(node[1])
+        if inner[0] == 'not':
+            return inner[1]
+        if inner[0] == 'cmp' and inner[1] in _NEGATED:
+            return ('cmp', _NEGATED[inner[1]], inner[2], inner[3])
+        return ('not', inner)
+    if kind == 'xor':
+        return ('xor', tuple(normalize(child) for child in node[1]))
+    if kind not in ('and', 'or'):
+        return node
+
+    children = []
+    for child in (normalize(child) for child in node[1]):
+        children.extend(child[1] if child[0] == kind else (child,))
+    children = _fold_sets(kind, list(dict.fromkeys(children)))
+    if len(children) == 1:
+        return children[0]
+    return (kind, tuple(sorted(children, key=cost)))
+
+
+def _fold_sets(kind: str, children: List) -> List:
+    # or: eq / in on one operand become a single in; and: ne / not-in likewise
+    wanted = 'eq' if kind == 'or' else 'ne'
+    groups: Dict[Any, set] = {}
+    rest = []
+    for child in children:
+        if child[0] == 'cmp' and child[1] == wanted:
+            groups.setdefault(child[2], set()).add(child[3])
+        elif kind == 'or' and child[0] == 'in':
+            groups.setdefault(child[1], set()).update(child[2])
+        elif kind == 'and' and child[0] == 'not' and child[1][0] == 'in':
+            groups.setdefault(child[1][1], set()).update(child[1][2])
+        else:
+            rest.append(child)
+    for operand, values in groups.items():
+        if len(values) == 1:
+            rest.append(('cmp', wanted, operand, next(iter(values))))
+        else:
+            folded = ('in', operand, frozenset(values))
+            rest.append(folded if kind == 'or' else ('not', folded))
+    return rest
+
+
+def _literal(value, type_: str) -> str:
+    if type_ == 'str':
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return str(value)
+
+
+def to_expression(node, top: bool = True) -> str:
+    """Cloudflare Rules language text for a parsed expression"""
+    kind = node[0]
+    if kind in ('and', 'or', 'xor'):
+        text = f" {kind} ".join(to_expression(child, False) for child in node[1])
+        return f"({text})" if top or kind != 'and' else text
+    if kind == 'not':
+        # not binds tightest, so a compound operand needs its parentheses
+        inner = to_expression(node[1], node[1][0] in ('and', 'or', 'xor'))
+        return f"(not {inner})" if top else f"not {inner}"
+    if kind == 'bool':
+        text = _operand(node[1])
+    elif kind == 'in':
+        values = ' '.join(_literal(v, _type_of(node[1])) for v in sorted(node[2], key=str))
+        text = f"{_operand(node[1])} in {{{values}}}"
+    else:
+        text = f"{_operand(node[2])} {node[1]} {_literal(node[3], _type_of(node[2]))}"
+    return f"({text})" if top else text
+
+
+def _operand(operand) -> str:
+    return f"{operand[1]}({_operand(operand[2])})" if operand[0] == 'call' else operand[1]
+
+
+class WafRule(FrozenArgs):
+    """One custom rule; the expression is validated against the supported subset"""
+
+    __slots__ = ('action', 'expression', 'description', 'enabled')
+
+    def __init__(self, action: str, expression: str, description: str, enabled: bool = True):
+        parse(require_str('expression', expression))
+        self._set(
+            action=require_choice('action', action, ACTIONS),
+            expression=expression,
+            description=require_str('description', description),
+            enabled=require_bool('enabled', enabled),
+        )
+
+    @property
+    def tree(self):
+        return parse(self.expression)
+
+    def args(self) -> Dict[str, Any]:
+        """Keyword arguments for cloudflare.RulesetRuleArgs"""
+        return {'action': self.action, 'expression': self.expression,
+                'description': self.description, 'enabled': self.enabled}
+
+
+# The zone's http_request_firewall_custom rules, in evaluation order. Rate
+# limiting is API_RATE_LIMIT below: the rules language has no request-rate
+# field.
+WAF_RULES = (
+    WafRule('block', '(http.request.uri.path contains "/admin" and not ip.geoip.country eq "US")',
+            "Block non-US access to admin paths"),
+    WafRule('challenge', '(cf.threat_score gt 10)', "Challenge high threat score requests"),
+    WafRule('block', '(cf.bot_management.score lt 30)', "Block requests from known bad bots"),
+)
+
+
+# Rate limiting
+
+RATE_LIMIT_MODES = ('simulate', 'ban', 'challenge', 'js_challenge', 'managed_challenge')
+# Challenges last as long as the zone's challenge passage, not `timeout`
+CHALLENGE_MODES = frozenset(('challenge', 'js_challenge', 'managed_challenge'))
+
+
+class RateLimitRule(FrozenArgs):
+    """A zone rate limit: over `threshold` matching requests per client IP in `period` seconds"""
+
+    __slots__ = ('threshold', 'period', 'path', 'mode', 'timeout')
+
+    def __init__(self, threshold: int, period: int, path: str = "/api/*", mode: str = "challenge",
+                 timeout: int = 3600):
+        if not require_str('path', path).startswith(('/', '*')):
+            raise ValueError(f"path must start with / or *, got {path!r}")
+        self._set(
+            threshold=require_int('threshold', threshold, minimum=1, maximum=1_000_000),
+            period=require_int('period', period, minimum=10, maximum=86400),
+            path=path,
+            mode=require_choice('mode', mode, RATE_LIMIT_MODES),
+            timeout=require_int('timeout', timeout, minimum=10, maximum=86400),
+        )
+
+    def url_pattern(self, zone_name: str) -> str:
+        return f"{zone_name}{self.path}"
+
+    @property
+    def mitigation_ms(self) -> int:
+        """How long one request over the limit keeps the client mitigated; 0 for challenges"""
+        return 0 if self.mode in CHALLENGE_MODES else self.timeout * 1000
+
+    @property
+    def label(self) -> str:
+        return f"{self.threshold}/{self.period}s {self.path}"
+
+
+# The security stack's api-rate-limit; cloudcurio_lib.ratelimit replays logs against candidates
+API_RATE_LIMIT = RateLimitRule(threshold=100, period=60, path="/api/*", mode="challenge",
+                               timeout=3600)
+
+
+def optimize_rules(rules: Iterable[WafRule], merge: bool = True) -> List[WafRule]:
+    """
+    Normalized rules with duplicates removed
+    Disabled rules are dropped, a rule identical (after normalization) to
+    an earlier one with the same action is dropped, and with merge=True
+    adjacent rules with the same terminating action become one rule whose
+    expression is the or of theirs. Rules are never reordered, since the
+    first terminating match decides the action.
+    """
+    optimized: List[Tuple[str, Any, List[str]]] = []
+    seen = set()
+    for rule in rules:
+        if not rule.enabled:
+            continue
+        tree = normalize(rule.tree)
+        if (rule.action, tree) in seen:
+            continue
+        seen.add((rule.action, tree))
+        previous = optimized[-1] if optimized else None
+        if merge and previous and previous[0] == rule.action and rule.action in TERMINATING:
+            merged = normalize(('or', (previous[1], tree)))
+            optimized[-1] = (rule.action, merged, previous[2] + [rule.description])
+        else:
+            optimized.append((rule.action, tree, [rule.description]))
+    return [WafRule(action, to_expression(tree), "; ".join(descriptions))
+            for action, tree, descriptions in optimized]
+
+
+# Evaluation
+
+def _compile(node, counter: Optional[List[int]]) -> Callable[[Dict], bool]:
+    kind = node[0]
+    if kind in ('and', 'or'):
+        # Chained closures short-circuit without all()/any()'s generator overhead
+        children = [_compile(child, counter) for child in node[1]]
+        combined = children[-1]
+        for child in reversed(children[:-1]):
+            combined = _both(child, combined) if kind == 'and' else _either(child, combined)
+        return combined
+    if kind == 'xor':
+        # a xor b xor c parses as one node; true when an odd number of terms are
+        children = [_compile(child, counter) for child in node[1]]
+        combined = children[0]
+        for child in children[1:]:
+            combined = _differ(combined, child)
+        return combined
+    if kind == 'not':
+        inner = _compile(node[1], counter)
+        return lambda request: not inner(request)
+
+    operand = node[2] if kind == 'cmp' else node[1]
+    value = _compile_operand(operand)
+    if kind == 'bool':
+        def test(request):
+            return bool(value(request))
+    elif kind == 'in':
+        test = _membership(value, node[2], _type_of(operand))
+    else:
+        test = _comparison(value, node[1], node[3], _type_of(operand))
+    if counter is None:
+        return test
+
+    def counted(request, test=test):
+        counter[0] += 1
+        return test(request)
+    return counted
+
+
+def _both(first, second):
+    return lambda request: first(request) and second(request)
+
+
+def _either(first, second):
+    return lambda request: first(request) or second(request)
+
+
+def _differ(first, second):
+    return lambda request: first(request) != second(request)
+
+
+def _compile_operand(operand) -> Callable[[Dict], Any]:
+    if operand[0] == 'call':
+        inner = _compile_operand(operand[2])
+        function = _FUNCTIONS[operand[1]][2]
+        return lambda request: function(inner(request))
+    name = operand[1]
+    default = _DEFAULTS[FIELDS[name]]
+    return lambda request: request.get(name, default)
+
+
+def _membership(value, values: frozenset, type_: str):
+    if type_ == 'ip':
+        addresses = frozenset(v for v in values if '/' not in v)
+        networks = [ipaddress.ip_network(v, strict=False) for v in values if '/' in v]
+
+        def contains(request):
+            address = value(request)
+            if address in addresses:
+                return True
+            return bool(networks) and any(ipaddress.ip_address(address) in n for n in networks)
+        return contains
+    return lambda request: value(request) in values
+
+
+def _comparison(value, op: str, literal, type_: str):
+    if op == 'contains':
+        return lambda request: literal in value(request)
+    if op == 'matches':
+        search = re.compile(literal).search
+        return lambda request: search(value(request)) is not None
+    if type_ == 'ip' and '/' in str(literal):
+        network = ipaddress.ip_network(literal, strict=False)
+
+        def inside(request):
+            return ipaddress.ip_address(value(request)) in network
+        return inside if op == 'eq' else (lambda request: not inside(request))
+    return {
+        'eq': lambda request: value(request) == literal,
+        'ne': lambda request: value(request) != literal,
+        'lt': lambda request: value(request) < literal,
+        'le': lambda request: value(request) <= literal,
+        'gt': lambda request: value(request) > literal,
+        'ge': lambda request: value(request) >= literal,
+    }[op]
+
+
+def request_from_logpush(record: Dict) -> Dict[str, Any]:
+    """A recorded Logpush http_requests line as rules-language fields"""
+    request = {LOGPUSH_FIELDS[key]: value for key, value in record.items() if key in LOGPUSH_FIELDS}
+    uri = request.get('http.request.uri')
+    if uri is not None and 'http.request.uri.path' not in request:
+        path, _, query = uri.partition('?')
+        request['http.request.uri.path'] = path
+        request.setdefault('http.request.uri.query', query)
+    return request
+
+
+class WafEvaluator:
+    """
+    Replays requests through rules the way the custom phase does
+    Rules are checked in order until a terminating action matches;
+    log and skip rules are counted but don't stop evaluation. With
+    count_predicates=True each comparison evaluated is counted too,
+    which costs some speed, so leave it off when timing.
+    """
+
+    def __init__(self, rules: Iterable[WafRule], count_predicates: bool = False):
+        self.rules = [rule for rule in rules if rule.enabled]
+        self._counter = [0] if count_predicates else None
+        self._tests = [(rule, _compile(rule.tree, self._counter), rule.action in TERMINATING)
+                       for rule in self.rules]
+        self.hits = [0] * len(self.rules)
+        self.evaluated = [0] * len(self.rules)
+        self.requests = 0
+        self.seconds = 0.0
+
+    @property
+    def predicates(self) -> int:
+        return self._counter[0] if self._counter else 0
+
+    def evaluate(self, request: Dict) -> Optional[WafRule]:
+        """The terminating rule that applies, or None when the request passes"""
+        self.requests += 1
+        for index, (rule, test, terminating) in enumerate(self._tests):
+            self.evaluated[index] += 1
+            if test(request):
+                self.hits[index] += 1
+                if terminating:
+                    return rule
+        return None
+
+    def replay(self, requests: Iterable[Dict]) -> Dict[str, int]:
+        """Evaluate every request; returns action -> count ('pass' for no match)"""
+        outcomes: Dict[str, int] = {}
+        start = time.perf_counter()
+        for request in requests:
+            rule = self.evaluate(request)
+            action = rule.action if rule else 'pass'
+            outcomes[action] = outcomes.get(action, 0) + 1
+        self.seconds += time.perf_counter() - start
+        return outcomes
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Per rule: evaluations, hits and hit rate"""
+        return [
+            {'description': rule.description, 'action': rule.action, 'evaluated': evaluated,
+             'hits': hits, 'hit_rate': hits / evaluated if evaluated else 0.0}
+            for rule, evaluated, hits in zip(self.rules, self.evaluated, self.hits)
+        ]
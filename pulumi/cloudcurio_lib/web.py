@@ -5,11 +5,18 @@ Caddy, Nginx, and Apache web server infrastructure
 
 import pulumi
 from pulumi import ComponentResource, ResourceOptions
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Union
 
+from .args import FrozenArgs, require_bool, require_choice, require_int, require_str_list
 
-class WebServerStackArgs:
+SERVER_TYPES = ('caddy', 'nginx', 'apache')
+
+
+class WebServerStackArgs(FrozenArgs):
     """Arguments for WebServerStack component"""
+
+    __slots__ = ('server_type', 'domains', 'ssl_enabled', 'http_port', 'https_port')
+
     def __init__(
         self,
         server_type: str = "caddy",  # caddy, nginx, apache
@@ -18,11 +25,13 @@ class WebServerStackArgs:
         http_port: int = 80,
         https_port: int = 443,
     ):
-        self.server_type = server_type
-        self.domains = domains or []
-        self.ssl_enabled = ssl_enabled
-        self.http_port = http_port
-        self.https_port = https_port
+        self._set(
+            server_type=require_choice('server_type', server_type, SERVER_TYPES),
+            domains=require_str_list('domains', domains),
+            ssl_enabled=require_bool('ssl_enabled', ssl_enabled),
+            http_port=require_int('http_port', http_port, minimum=1, maximum=65535),
+            https_port=require_int('https_port', https_port, minimum=1, maximum=65535),
+        )
 
 
 class WebServerStack(ComponentResource):
@@ -34,10 +43,11 @@ class WebServerStack(ComponentResource):
     def __init__(
         self,
         name: str,
-        args: WebServerStackArgs,
+        args: Union[WebServerStackArgs, Dict],
         opts: Optional[ResourceOptions] = None
     ):
         super().__init__('cloudcurio:web:Stack', name, {}, opts)
+        args = WebServerStackArgs.coerce(args)
         
         self.server_type = args.server_type
         self.domains = args.domains
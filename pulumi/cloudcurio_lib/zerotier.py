@@ -0,0 +1,396 @@
+"""
+ZeroTier Infrastructure Components
+Manages ZeroTier networks and node configurations
+"""
+
+import base64
+import ipaddress
+import json
+import os
+import re
+import socket
+import zlib
+import pulumi
+from pulumi import ComponentResource, ResourceOptions, Output
+from typing import Dict, Iterable, List, Optional, Union
+
+from .args import (
+    FrozenArgs, require_bool, require_ip, require_network, require_str, require_str_map,
+)
+
+# First byte of the bitmap that still has a free slot
+_NOT_FULL = re.compile(b"[^\xff]")
+
+
+class AllocationError(ValueError):
+    """Raised for address collisions, out-of-subnet or exhausted subnets"""
+
+
+class SubnetAllocator:
+    """
+    Bitmap-backed IP address allocator for a subnet
+    One bit per address; free addresses are found with a next-fit cursor
+    and a C-level scan for the first non-full byte, so allocation is O(1)
+    amortized and a /16 (65k slots) allocates and validates in milliseconds.
+    The network and broadcast addresses are always reserved.
+    """
+
+    def __init__(self, subnet: str):
+        self.network = ipaddress.ip_network(subnet)
+        self._base = int(self.network.network_address)
+        self._size = self.network.num_addresses
+        self._bits = bytearray((self._size + 7) // 8)
+        self._v4 = self.network.version == 4
+        self._cursor = 0
+        self.assignments: Dict[str, str] = {}
+        self.used = 0
+
+        self._mark(0)
+        self._mark(self._size - 1)
+        # Bits past the end of a subnet smaller than 8 addresses are never free
+        for index in range(self._size, len(self._bits) * 8):
+            self._bits[index >> 3] |= 1 << (index & 7)
+
+    def _mark(self, index: int):
+        if not self._bits[index >> 3] & (1 << (index & 7)):
+            self._bits[index >> 3] |= 1 << (index & 7)
+            self.used += 1
+
+    def _index(self, address: str) -> int:
+        # inet_pton/inet_ntoa are ~10x faster than ipaddress objects per call
+        try:
+            if self._v4:
+                packed = socket.inet_pton(socket.AF_INET, address)
+                index = int.from_bytes(packed, "big") - self._base
+            else:
+                index = int(ipaddress.ip_address(address)) - self._base
+        except (OSError, ValueError) as exc:
+            raise AllocationError(f"Invalid address {address!r}") from exc
+        if not 0 <= index < self._size:
+            raise AllocationError(f"{address} is outside subnet {self.network}")
+        return index
+
+    def _address(self, index: int) -> str:
+        if self._v4:
+            return socket.inet_ntoa((self._base + index).to_bytes(4, "big"))
+        return str(ipaddress.ip_address(self._base + index))
+
+    def is_allocated(self, address: str) -> bool:
+        index = self._index(address)
+        return bool(self._bits[index >> 3] & (1 << (index & 7)))
+
+    @property
+    def free(self) -> int:
+        return self._size - self.used
+
+    def reserve(self, address: str, hostname: Optional[str] = None) -> str:
+        """Claim a static address; raises AllocationError on collision"""
+        index = self._index(address)
+        if self._bits[index >> 3] & (1 << (index & 7)):
+            owner = next((h for h, a in self.assignments.items() if a == address), None)
+            if hostname is not None and owner == hostname:
+                return address
+            holder = f" (held by {owner})" if owner else ""
+            raise AllocationError(f"{address} is already allocated{holder}")
+        self._mark(index)
+        if hostname is not None:
+            self.assignments[hostname] = address
+        return address
+
+    def allocate(self, hostname: Optional[str] = None) -> str:
+        """Hand out the next free address; a known hostname keeps its address"""
+        if hostname is not None and hostname in self.assignments:
+            return self.assignments[hostname]
+
+        bits = self._bits
+        cursor = self._cursor >> 3
+        match = _NOT_FULL.search(bits, cursor) or _NOT_FULL.search(bits, 0, cursor)
+        if not match:
+            raise AllocationError(f"Subnet {self.network} is exhausted")
+
+        byte = match.start()
+        lowest_free = ~bits[byte] & -~bits[byte] & 0xFF
+        bits[byte] |= lowest_free
+        self.used += 1
+        index = (byte << 3) + lowest_free.bit_length() - 1
+        self._cursor = index + 1 if index + 1 < self._size else 0
+
+        address = self._address(index)
+        if hostname is not None:
+            self.assignments[hostname] = address
+        return address
+
+    def release(self, address: str):
+        index = self._index(address)
+        if self._bits[index >> 3] & (1 << (index & 7)):
+            self._bits[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+            self.used -= 1
+        self.assignments = {h: a for h, a in self.assignments.items() if a != address}
+
+    def to_dict(self) -> Dict:
+        return {
+            'subnet': str(self.network),
+            'bitmap': base64.b64encode(zlib.compress(bytes(self._bits))).decode(),
+            'used': self.used,
+            'cursor': self._cursor,
+            'assignments': self.assignments,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SubnetAllocator":
+        allocator = cls(data['subnet'])
+        allocator._bits = bytearray(zlib.decompress(base64.b64decode(data['bitmap'])))
+        allocator.used = data['used']
+        allocator._cursor = data.get('cursor', 0)
+        allocator.assignments = dict(data.get('assignments', {}))
+        return allocator
+
+    def save(self, path: str):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, subnet: str) -> "SubnetAllocator":
+        """Load saved state, or start empty when there is none for this subnet"""
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data.get('subnet') == str(ipaddress.ip_network(subnet)):
+                return cls.from_dict(data)
+        return cls(subnet)
+
+    def assign(self, nodes: Iterable["ZeroTierNodeArgs"]) -> List["ZeroTierNodeArgs"]:
+        """Copies of `nodes` with allocated addresses filled in"""
+        return [
+            node if node.ip_address else node.replace(ip_address=self.assignments[node.hostname])
+            for node in nodes
+        ]
+
+    @classmethod
+    def for_nodes(cls, subnet: str, nodes: Iterable,
+                  state_file: Optional[str] = None) -> "SubnetAllocator":
+        """
+        Validate and assign node addresses
+        Static `ip_address` values are reserved (collisions and out-of-subnet
+        addresses raise AllocationError); nodes without one keep the address
+        they held in `state_file` on a previous run unless a static address
+        now claims it, and the rest get the next free address.
+        Assigned addresses are in `assignments`; see assign().
+        """
+        previous = cls.load(state_file, subnet) if state_file else cls(subnet)
+        allocator = cls(subnet)
+        nodes = list(nodes)
+
+        for node in nodes:
+            if node.ip_address:
+                allocator.reserve(node.ip_address, node.hostname)
+        dynamic = [node for node in nodes if not node.ip_address]
+        # Every saved address is held before any new node allocates, wherever
+        # the new node appears in the list
+        for node in dynamic:
+            sticky = previous.assignments.get(node.hostname)
+            if sticky and not allocator.is_allocated(sticky):
+                allocator.reserve(sticky, node.hostname)
+        for node in dynamic:
+            allocator.allocate(node.hostname)
+
+        if state_file:
+            allocator.save(state_file)
+        return allocator
+
+
+class ZeroTierNodeArgs(FrozenArgs):
+    """Arguments for ZeroTierNode component"""
+
+    __slots__ = ('hostname', 'ip_address', 'description', 'authorized', 'tags')
+
+    def __init__(
+        self,
+        hostname: str,
+        ip_address: Optional[str] = None,
+        description: Optional[str] = None,
+        authorized: bool = True,
+        tags: Optional[Dict[str, str]] = None
+    ):
+        self._set(
+            hostname=require_str('hostname', hostname),
+            ip_address=require_ip('ip_address', ip_address, optional=True),
+            description=require_str('description', description, optional=True)
+            or f"ZeroTier node for {hostname}",
+            authorized=require_bool('authorized', authorized),
+            tags=require_str_map('tags', tags),
+        )
+
+
+class ZeroTierNode(ComponentResource):
+    """
+    ZeroTier Node Component
+    Represents a node in the ZeroTier network with DNS and configuration
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        args: Union[ZeroTierNodeArgs, Dict],
+        opts: Optional[ResourceOptions] = None
+    ):
+        super().__init__('cloudcurio:zerotier:Node', name, {}, opts)
+        args = ZeroTierNodeArgs.coerce(args)
+        
+        self.hostname = args.hostname
+        self.ip_address = args.ip_address
+        self.description = args.description
+        
+        # Export outputs
+        self.register_outputs({
+            'hostname': self.hostname,
+            'ip_address': self.ip_address,
+            'description': self.description,
+        })
+
+
+class ZeroTierMemberTable(ComponentResource):
+    """
+    ZeroTier Member Table Component
+    Holds every member of a network in one column-oriented table with a
+    single aggregated output, instead of one ZeroTierNode per member.
+    Default descriptions are stored as None to keep the state compact.
+    """
+
+    COLUMNS = ('hostname', 'ip_address', 'description', 'authorized', 'tags')
+
+    def __init__(
+        self,
+        name: str,
+        nodes: List[ZeroTierNodeArgs],
+        opts: Optional[ResourceOptions] = None
+    ):
+        super().__init__('cloudcurio:zerotier:MemberTable', name, {}, opts)
+
+        self.hostname = [node.hostname for node in nodes]
+        self.ip_address = [node.ip_address for node in nodes]
+        self.description = [
+            None if node.description == f"ZeroTier node for {node.hostname}" else node.description
+            for node in nodes
+        ]
+        self.authorized = [node.authorized for node in nodes]
+        self.tags = [node.tags or None for node in nodes]
+
+        self._rows = {hostname: row for row, hostname in enumerate(self.hostname)}
+        if len(self._rows) != len(nodes):
+            raise ValueError(f"Duplicate hostnames in member table {name}")
+
+        # Export outputs
+        self.register_outputs({
+            'member_count': len(self),
+            'members': self.columns(),
+        })
+
+    def __len__(self) -> int:
+        return len(self.hostname)
+
+    def __contains__(self, hostname: str) -> bool:
+        return hostname in self._rows
+
+    def columns(self) -> Dict[str, list]:
+        return {column: getattr(self, column) for column in self.COLUMNS}
+
+    def member(self, hostname: str) -> Dict:
+        """One member as a row dict, O(1) by hostname"""
+        row = self._rows[hostname]
+        return {
+            'hostname': hostname,
+            'ip_address': self.ip_address[row],
+            'description': self.description[row] or f"ZeroTier node for {hostname}",
+            'authorized': self.authorized[row],
+            'tags': self.tags[row] or {},
+        }
+
+
+class ZeroTierNetworkArgs(FrozenArgs):
+    """Arguments for ZeroTierNetwork component; nodes may be ZeroTierNodeArgs or dicts"""
+
+    __slots__ = ('network_id', 'network_name', 'nodes', 'subnet', 'allocation_file', 'bulk')
+
+    def __init__(
+        self,
+        network_id: str,
+        network_name: str,
+        nodes: List[Union[ZeroTierNodeArgs, Dict]],
+        subnet: str = "172.28.0.0/16",
+        allocation_file: Optional[str] = None,
+        bulk: bool = False,
+    ):
+        self._set(
+            network_id=require_str('network_id', network_id),
+            network_name=require_str('network_name', network_name),
+            nodes=[ZeroTierNodeArgs.coerce(node) for node in nodes],
+            subnet=require_network('subnet', subnet),
+            allocation_file=require_str('allocation_file', allocation_file, optional=True),
+            bulk=require_bool('bulk', bulk),
+        )
+
+
+class ZeroTierNetwork(ComponentResource):
+    """
+    ZeroTier Network Component
+    Manages a complete ZeroTier network with multiple nodes.
+    With `bulk=True` members live in a single ZeroTierMemberTable instead
+    of one child component each, which keeps previews and state small
+    at fleet scale.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        args: Union[ZeroTierNetworkArgs, Dict],
+        opts: Optional[ResourceOptions] = None
+    ):
+        super().__init__('cloudcurio:zerotier:Network', name, {}, opts)
+        args = ZeroTierNetworkArgs.coerce(args)
+        
+        self.network_id = args.network_id
+        self.network_name = args.network_name
+        self.subnet = args.subnet
+        
+        # Validate static addresses and assign free ones before creating nodes
+        self.allocator = SubnetAllocator.for_nodes(args.subnet, args.nodes, args.allocation_file)
+        nodes = self.allocator.assign(args.nodes)
+
+        # Create nodes
+        self.nodes = []
+        self.members = None
+        self._node_index = {}
+        if args.bulk:
+            self.members = ZeroTierMemberTable(
+                f"{name}-members",
+                nodes,
+                ResourceOptions(parent=self)
+            )
+        else:
+            for node_args in nodes:
+                node = ZeroTierNode(
+                    f"{name}-{node_args.hostname}",
+                    node_args,
+                    ResourceOptions(parent=self)
+                )
+                self.nodes.append(node)
+        
+        # Export outputs
+        self.register_outputs({
+            'network_id': self.network_id,
+            'network_name': self.network_name,
+            'subnet': self.subnet,
+            'node_count': len(args.nodes),
+            'addresses_free': self.allocator.free,
+        })
+
+    def ip_address(self, hostname: str) -> str:
+        """Address of a member in either mode"""
+        if self.members is not None:
+            return self.members.member(hostname)['ip_address']
+        if len(self._node_index) != len(self.nodes):
+            self._node_index = {node.hostname: node for node in self.nodes}
+        return self._node_index[hostname].ip_address
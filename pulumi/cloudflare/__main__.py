@@ -6,6 +6,19 @@ Manages DNS, Workers, Pages, WAF, Access, and other Cloudflare services
 import pulumi
 import pulumi_cloudflare as cloudflare
 from pulumi import Config, Output
+import sys
+import os
+from pathlib import Path
+
+# Add parent directory to path to import cloudcurio_lib
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cloudcurio_lib.edgecache import CACHE_RULES, TRACKING_PARAMS, worker_config
+from cloudcurio_lib.profiling import profile_from_env
+from cloudcurio_lib.tunnel import compile_ingress, traffic_shares, tunnel_services
+
+# Opt-in construction profile (CLOUDCURIO_PROFILE=<dir>)
+profile_from_env()
 
 # Configuration
 config = Config()
@@ -20,25 +33,9 @@ zone = cloudflare.Zone("cloudcurio-zone",
     type="full"
 )
 
-# DNS Records for ZeroTier nodes
-zerotier_nodes = {
-    "cbwdellr720": "172.28.82.205",
-    "cbwhpz": "172.28.27.157",
-    "cbwamd": "172.28.176.115",
-    "cbwlapkali": "172.28.196.74",
-    "cbwmac": "172.28.169.48"
-}
-
-# Create A records for internal ZeroTier IPs (for reference)
-for hostname, ip in zerotier_nodes.items():
-    record = cloudflare.Record(f"{hostname}-zerotier",
-        zone_id=zone.id,
-        name=f"{hostname}.internal",
-        type="A",
-        value=ip,
-        ttl=3600,
-        comment=f"ZeroTier IP for {hostname}"
-    )
+# ZeroTier *.internal records are owned by the networking stack
+# (cloudcurio_lib.dns.internal_records); declaring them here too made the
+# two stacks fight over the same names
 
 # Cloudflare Access Application for internal services
 access_app = cloudflare.AccessApplication("cloudcurio-internal",
@@ -50,42 +47,19 @@ access_app = cloudflare.AccessApplication("cloudcurio-internal",
     auto_redirect_to_identity=True
 )
 
-# WAF Custom Rules
-waf_rule = cloudflare.Ruleset("cloudcurio-waf",
-    zone_id=zone.id,
-    name="CloudCurio WAF Rules",
-    description="Custom WAF rules for cloudcurio.cc",
-    kind="zone",
-    phase="http_request_firewall_custom",
-    rules=[
-        cloudflare.RulesetRuleArgs(
-            action="block",
-            expression='(http.request.uri.path contains "/admin" and not ip.geoip.country eq "US")',
-            description="Block non-US access to admin",
-        ),
-        cloudflare.RulesetRuleArgs(
-            action="challenge",
-            expression='(cf.threat_score gt 10)',
-            description="Challenge high threat score requests",
-        )
-    ]
-)
+# The cloudcurio-waf ruleset is owned by the security stack
+# (cloudcurio_lib.waf.WAF_RULES); a zone has one custom firewall
+# ruleset, so a second declaration here overwrote the first
 
-# Cloudflare Workers for API endpoints
+# Cloudflare Workers for API endpoints; routes and TTLs for its Cache API
+# layer come from cloudcurio_lib.edgecache
 worker_script = cloudflare.WorkerScript("api-worker",
     account_id=account_id,
     name="cloudcurio-api",
-    content="""
-addEventListener('fetch', event => {
-  event.respondWith(handleRequest(event.request))
-})
-
-async function handleRequest(request) {
-  return new Response('CloudCurio API - Coming Soon', {
-    headers: { 'content-type': 'text/plain' },
-  })
-}
-"""
+    content=Path(__file__).with_name("workers").joinpath("api-worker.js").read_text(),
+    plain_text_bindings=[
+        cloudflare.WorkerScriptPlainTextBindingArgs(name="CACHE_ROUTES", text=worker_config())
+    ]
 )
 
 # Worker Route
@@ -95,6 +69,53 @@ worker_route = cloudflare.WorkerRoute("api-route",
     script_name=worker_script.name
 )
 
+# Cache rules for the docs site; tracking parameters and query order
+# don't split the cache. The api-worker does its own caching.
+tracking_excluded = cloudflare.RulesetRuleActionParametersCacheKeyCustomKeyQueryStringArgs(
+    excludes=list(TRACKING_PARAMS)
+)
+cache_rules = cloudflare.Ruleset("cloudcurio-cache-rules",
+    zone_id=zone.id,
+    name="CloudCurio cache rules",
+    description="Edge caching for the docs site",
+    kind="zone",
+    phase="http_request_cache_settings",
+    rules=[
+        cloudflare.RulesetRuleArgs(
+            action="set_cache_settings",
+            expression=rule.expression(zone_name),
+            description=rule.description,
+            enabled=True,
+            action_parameters=cloudflare.RulesetRuleActionParametersArgs(
+                cache=True,
+                edge_ttl=cloudflare.RulesetRuleActionParametersEdgeTtlArgs(
+                    **rule.ttl_args()["edge_ttl"]
+                ),
+                browser_ttl=cloudflare.RulesetRuleActionParametersBrowserTtlArgs(
+                    **rule.ttl_args()["browser_ttl"]
+                ),
+                serve_stale=cloudflare.RulesetRuleActionParametersServeStaleArgs(
+                    disable_stale_while_updating=not rule.serve_stale
+                ),
+                cache_key=cloudflare.RulesetRuleActionParametersCacheKeyArgs(
+                    ignore_query_strings_order=True,
+                    custom_key=cloudflare.RulesetRuleActionParametersCacheKeyCustomKeyArgs(
+                        query_string=tracking_excluded
+                    )
+                )
+            )
+        )
+        for rule in CACHE_RULES
+    ]
+)
+
+# Smart tiered caching is zone-wide: cache misses in one data center go to
+# an upper tier before the origin
+tiered_cache = cloudflare.TieredCache("cloudcurio-tiered-cache",
+    zone_id=zone.id,
+    cache_type="smart"
+)
+
 # Cloudflare Pages project
 pages_project = cloudflare.PagesProject("cloudcurio-docs",
     account_id=account_id,
@@ -113,13 +134,31 @@ pages_project = cloudflare.PagesProject("cloudcurio-docs",
     )
 )
 
-# Logpush job for analytics
+# docs.<zone> serves the Pages project, proxied so the docs cache rule applies
+pages_domain = cloudflare.PagesDomain("cloudcurio-docs-domain",
+    account_id=account_id,
+    project_name=pages_project.name,
+    domain=f"docs.{zone_name}"
+)
+docs_record = cloudflare.Record("docs",
+    zone_id=zone.id,
+    name="docs",
+    type="CNAME",
+    value=pages_project.subdomain,
+    ttl=1,
+    proxied=True,
+    comment="Cloudflare Pages: cloudcurio-docs"
+)
+
+# Logpush job for analytics; cloudcurio_lib.logpush reads these fields
 logpush = cloudflare.LogpushJob("cloudcurio-logs",
     account_id=account_id,
     enabled=True,
     zone_id=zone.id,
     name="cloudcurio-http-requests",
-    logpull_options="fields=ClientIP,ClientRequestHost,ClientRequestMethod,ClientRequestURI,EdgeEndTimestamp,EdgeResponseBytes,EdgeResponseStatus,EdgeStartTimestamp,RayID",
+    logpull_options=("fields=ClientIP,ClientRequestHost,ClientRequestMethod,ClientRequestURI,"
+                     "EdgeEndTimestamp,EdgeResponseBytes,EdgeResponseStatus,EdgeStartTimestamp,"
+                     "RayID"),
     destination_conf="s3://cloudcurio-logs?region=us-east-1",
     dataset="http_requests"
 )
@@ -131,24 +170,20 @@ tunnel = cloudflare.Tunnel("cloudcurio-tunnel",
     secret=config.require_secret("tunnel_secret")
 )
 
-# Tunnel configuration
+# Tunnel configuration; cloudflared runs on the host serving these, and
+# orders rules busiest first when traffic samples are configured
+traffic_logs = config.get("ingress_traffic_logs")
+ingress = compile_ingress(
+    tunnel_services("localhost", ["grafana", "prometheus"]),
+    zone_name,
+    traffic_shares(traffic_logs.split(",")) if traffic_logs else None,
+)
 tunnel_config = cloudflare.TunnelConfig("tunnel-config",
     account_id=account_id,
     tunnel_id=tunnel.id,
     config=cloudflare.TunnelConfigConfigArgs(
-        ingress_rules=[
-            cloudflare.TunnelConfigConfigIngressRuleArgs(
-                hostname=f"grafana.{zone_name}",
-                service="http://localhost:3000"
-            ),
-            cloudflare.TunnelConfigConfigIngressRuleArgs(
-                hostname=f"prometheus.{zone_name}",
-                service="http://localhost:9090"
-            ),
-            cloudflare.TunnelConfigConfigIngressRuleArgs(
-                service="http_status:404"
-            )
-        ]
+        ingress_rules=[cloudflare.TunnelConfigConfigIngressRuleArgs(**rule.args())
+                       for rule in ingress]
     )
 )
 
@@ -158,4 +193,5 @@ pulumi.export("zone_name", zone.zone)
 pulumi.export("tunnel_id", tunnel.id)
 pulumi.export("tunnel_cname", tunnel.cname)
 pulumi.export("pages_url", pages_project.subdomain)
+pulumi.export("docs_url", Output.concat("https://", pages_domain.domain))
 pulumi.export("worker_url", Output.concat("https://api.", zone_name))
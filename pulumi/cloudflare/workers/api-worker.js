@@ -0,0 +1,104 @@
+// cloudcurio-api: serves api.<zone> through the Cache API
+//
+// CACHE_ROUTES is a plain-text binding built by
+// cloudcurio_lib.edgecache.worker_config: per-route TTL and
+// stale-while-revalidate windows, and the query parameters kept in each
+// route's cache key. Routes with no match or a ttl of 0 are never cached.
+
+const CONFIG = typeof CACHE_ROUTES === 'string' ? JSON.parse(CACHE_ROUTES) : { version: 1, routes: [] }
+const TRACKING = new Set(CONFIG.tracking || [])
+const ROUTES = CONFIG.routes.map(route => ({
+  ...route,
+  pattern: new RegExp('^' + route.path.split('*').map(part => part.replace(/[.+?^${}()|[\]\\]/g, '\\$&')).join('.*') + '$'),
+  query: route.query && new Set(route.query),
+}))
+const STORED_AT = 'x-cache-stored-at'
+
+// Revalidations in flight in this isolate, so a burst of stale hits refreshes once
+const revalidating = new Map()
+
+addEventListener('fetch', event => {
+  event.respondWith(handleCached(event))
+})
+
+async function handleRequest(request) {
+  return new Response('CloudCurio API - Coming Soon', {
+    headers: { 'content-type': 'text/plain' },
+  })
+}
+
+function routeFor(pathname) {
+  return ROUTES.find(route => route.pattern.test(pathname))
+}
+
+// Equivalent URLs share an entry: lowercase host, no fragment, no
+// tracking or unlisted parameters, the rest sorted
+function cacheKey(request, route) {
+  const url = new URL(request.url)
+  let search = url.search
+  if (CONFIG.normalize !== false) {
+    const params = [...url.searchParams]
+      .filter(([name]) => !TRACKING.has(name) && (!route.query || route.query.has(name)))
+      .sort(([a, x], [b, y]) => (a < b ? -1 : a > b ? 1 : x < y ? -1 : x > y ? 1 : 0))
+    search = params.length ? '?' + new URLSearchParams(params) : ''
+  }
+  const separator = search ? '&' : '?'
+  return new Request(`${url.origin}${url.pathname}${search}${separator}__cache_v=${CONFIG.version}`, { method: 'GET' })
+}
+
+function cacheable(request) {
+  return (request.method === 'GET' || request.method === 'HEAD') && !request.headers.has('authorization')
+}
+
+function tagged(response, status, age) {
+  const tagged = new Response(response.body, response)
+  tagged.headers.delete(STORED_AT)
+  tagged.headers.set('x-cache', status)
+  if (age !== undefined) tagged.headers.set('age', String(Math.floor(age)))
+  return tagged
+}
+
+// Fetches from the origin and stores a copy that the Cache API keeps for
+// the whole stale window; freshness is judged from STORED_AT on the way out.
+// HEAD shares the GET key but its response has no body, so it is never stored
+async function refresh(event, request, key, route) {
+  const response = await handleRequest(request)
+  const control = response.headers.get('cache-control') || ''
+  if (request.method === 'GET' && response.status === 200 && !response.headers.has('set-cookie') &&
+      !/no-store|private/.test(control)) {
+    const stored = new Response(response.clone().body, response)
+    stored.headers.set(STORED_AT, String(Date.now()))
+    stored.headers.set('cache-control', `public, max-age=${route.ttl + route.swr}`)
+    event.waitUntil(caches.default.put(key, stored))
+  }
+  return response
+}
+
+function revalidate(event, request, key, route) {
+  if (revalidating.has(key.url)) return
+  const pending = refresh(event, request, key, route).finally(() => revalidating.delete(key.url))
+  revalidating.set(key.url, pending)
+  event.waitUntil(pending)
+}
+
+async function handleCached(event) {
+  const request = event.request
+  const route = routeFor(new URL(request.url).pathname)
+  if (!route || !route.ttl || !cacheable(request)) {
+    return handleRequest(request)
+  }
+
+  const key = cacheKey(request, route)
+  const cached = await caches.default.match(key)
+  if (cached) {
+    const age = (Date.now() - Number(cached.headers.get(STORED_AT))) / 1000
+    if (age < route.ttl) {
+      return tagged(cached, 'HIT', age)
+    }
+    if (age < route.ttl + route.swr) {
+      if (request.method === 'GET') revalidate(event, request, key, route)
+      return tagged(cached, 'STALE', age)
+    }
+  }
+  return tagged(await refresh(event, request, key, route), 'MISS')
+}
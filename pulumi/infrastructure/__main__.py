@@ -8,49 +8,32 @@ from pulumi import Config, export
 import sys
 import os
 
-# Add parent directory to path to import cloudcurio-lib
+# Add parent directory to path to import cloudcurio_lib
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
+from cloudcurio_lib.inventory import load_inventory
+from cloudcurio_lib.profiling import profile_from_env
 from cloudcurio_lib.zerotier import ZeroTierNetwork, ZeroTierNodeArgs
 from cloudcurio_lib.monitoring import MonitoringStack, MonitoringStackArgs
 from cloudcurio_lib.database import DatabaseStack, DatabaseStackArgs
 from cloudcurio_lib.web import WebServerStack, WebServerStackArgs
 
+# Opt-in construction profile (CLOUDCURIO_PROFILE=<dir>)
+profile_from_env()
+
 # Configuration
 config = Config()
 
-# ZeroTier Network Configuration
+# ZeroTier Network Configuration (from the shared Ansible inventory)
+inventory = load_inventory()
 zerotier_nodes = [
     ZeroTierNodeArgs(
-        hostname="cbwdellr720",
-        ip_address="172.28.82.205",
-        description="Dell R720 Server",
-        tags={"type": "server", "role": "infrastructure"}
-    ),
-    ZeroTierNodeArgs(
-        hostname="cbwhpz",
-        ip_address="172.28.27.157",
-        description="HP Workstation",
-        tags={"type": "desktop", "role": "development"}
-    ),
-    ZeroTierNodeArgs(
-        hostname="cbwamd",
-        ip_address="172.28.176.115",
-        description="AMD Desktop",
-        tags={"type": "desktop", "role": "development"}
-    ),
-    ZeroTierNodeArgs(
-        hostname="cbwlapkali",
-        ip_address="172.28.196.74",
-        description="Kali Laptop",
-        tags={"type": "laptop", "role": "security"}
-    ),
-    ZeroTierNodeArgs(
-        hostname="cbwmac",
-        ip_address="172.28.169.48",
-        description="Mac Desktop",
-        tags={"type": "desktop", "role": "development"}
-    ),
+        hostname=host.hostname,
+        ip_address=host.zerotier_ip,
+        description=host.description,
+        tags=host.tags,
+    )
+    for host in inventory.zerotier_nodes()
 ]
 
 # Create ZeroTier Network
@@ -60,7 +43,7 @@ zerotier_network = ZeroTierNetwork(
         'network_id': config.get('zerotier_network_id') or 'NETWORK_ID',
         'network_name': 'CloudCurio Network',
         'nodes': zerotier_nodes,
-        'subnet': '172.28.0.0/16',
+        'subnet': inventory.subnet,
     }
 )
 
@@ -73,7 +56,13 @@ monitoring = MonitoringStack(
         loki_enabled=True,
         retention_days=90,
         scrape_interval="15s",
-        targets=[node.ip_address for node in zerotier_nodes],
+        targets=[zerotier_network.ip_address(node.hostname) for node in zerotier_nodes],
+        # Laptops are often asleep or on battery; scrape them less often
+        scrape_tiers={"server": "15s", "desktop": "30s", "laptop": "60s"},
+        target_labels={
+            zerotier_network.ip_address(node.hostname): node.tags
+            for node in zerotier_nodes
+        },
     )
 )
 
@@ -115,7 +104,7 @@ export("web_servers_enabled", True)
 
 # Export node information
 node_info = {
-    node.hostname: node.ip_address
+    node.hostname: zerotier_network.ip_address(node.hostname)
     for node in zerotier_nodes
 }
 export("nodes", node_info)
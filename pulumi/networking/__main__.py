@@ -6,20 +6,29 @@ Manages networking infrastructure including DNS, tunnels, and VPN
 import pulumi
 import pulumi_cloudflare as cloudflare
 from pulumi import Config, export
+import sys
+import os
+
+# Add parent directory to path to import cloudcurio_lib
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cloudcurio_lib.dns import internal_records
+from cloudcurio_lib.inventory import load_inventory
+from cloudcurio_lib.lookups import cached_invoke
+from cloudcurio_lib.profiling import profile_from_env
+from cloudcurio_lib.tunnel import compile_ingress, traffic_shares, tunnel_services
+
+# Opt-in construction profile (CLOUDCURIO_PROFILE=<dir>)
+profile_from_env()
 
 # Configuration
 config = Config()
 zone_name = config.get("zone_name") or "cloudcurio.cc"
 account_id = config.get("cloudflare_account_id")
 
-# ZeroTier nodes configuration
-zerotier_nodes = {
-    "cbwdellr720": "172.28.82.205",
-    "cbwhpz": "172.28.27.157",
-    "cbwamd": "172.28.176.115",
-    "cbwlapkali": "172.28.196.74",
-    "cbwmac": "172.28.169.48"
-}
+# ZeroTier nodes configuration (from the shared Ansible inventory)
+inventory = load_inventory()
+zerotier_nodes = inventory.zerotier_map()
 
 # Create or reference the Cloudflare zone
 if account_id:
@@ -32,19 +41,20 @@ if account_id:
     zone_id = zone.id
 else:
     # Use existing zone if account_id not provided
-    zone = cloudflare.get_zone(name=zone_name)
+    zone = cached_invoke(cloudflare.get_zone, name=zone_name)
     zone_id = zone.id
 
-# Create DNS A records for internal ZeroTier IPs
+# Create DNS A records for internal ZeroTier IPs. This stack is the only
+# owner of *.internal; reconcile_dns.py checks the live zone against the same set
 zerotier_records = {}
-for hostname, ip in zerotier_nodes.items():
+for hostname, desired in internal_records(inventory, zone_name).items():
     record = cloudflare.Record(f"{hostname}-internal",
         zone_id=zone_id,
-        name=f"{hostname}.internal",
-        type="A",
-        value=ip,
-        ttl=3600,
-        comment=f"ZeroTier internal IP for {hostname}"
+        name=desired.label(zone_name),
+        type=desired.type,
+        value=desired.content,
+        ttl=desired.ttl,
+        comment=desired.comment
     )
     zerotier_records[hostname] = record
 
@@ -57,46 +67,36 @@ if tunnel_secret:
         secret=tunnel_secret
     )
     
-    # Configure tunnel ingress rules
+    # The services run on the tunnel host; it reaches them over its ZeroTier IP
+    tunnel_host = config.get("tunnel_host") or "cbwdellr720"
+    origin = inventory.hosts.get(tunnel_host)
+    if origin is None or not origin.zerotier_ip:
+        raise ValueError(f"tunnel_host {tunnel_host!r} is not a ZeroTier node in the inventory")
+
+    # Configure tunnel ingress rules, busiest first when traffic samples are configured
+    services = tunnel_services(origin.zerotier_ip)
+    traffic_logs = config.get("ingress_traffic_logs")
+    shares = traffic_shares(traffic_logs.split(",")) if traffic_logs else None
+    ingress = compile_ingress(services, zone_name, shares)
     tunnel_config = cloudflare.TunnelConfig("tunnel-config",
         account_id=account_id,
         tunnel_id=tunnel.id,
         config=cloudflare.TunnelConfigConfigArgs(
-            ingress_rules=[
-                cloudflare.TunnelConfigConfigIngressRuleArgs(
-                    hostname=f"grafana.{zone_name}",
-                    service="http://172.28.82.205:3000"
-                ),
-                cloudflare.TunnelConfigConfigIngressRuleArgs(
-                    hostname=f"prometheus.{zone_name}",
-                    service="http://172.28.82.205:9090"
-                ),
-                cloudflare.TunnelConfigConfigIngressRuleArgs(
-                    hostname=f"loki.{zone_name}",
-                    service="http://172.28.82.205:3100"
-                ),
-                cloudflare.TunnelConfigConfigIngressRuleArgs(
-                    hostname=f"anythingllm.{zone_name}",
-                    service="http://172.28.82.205:3001"
-                ),
-                cloudflare.TunnelConfigConfigIngressRuleArgs(
-                    service="http_status:404"
-                )
-            ]
+            ingress_rules=[cloudflare.TunnelConfigConfigIngressRuleArgs(**rule.args())
+                           for rule in ingress]
         )
     )
     
     # Create DNS records for tunnel services
-    tunnel_services = ["grafana", "prometheus", "loki", "anythingllm"]
-    for service in tunnel_services:
-        cloudflare.Record(f"{service}-tunnel",
+    for service in services:
+        cloudflare.Record(f"{service.name}-tunnel",
             zone_id=zone_id,
-            name=service,
+            name=service.name,
             type="CNAME",
             value=tunnel.cname,
             ttl=1,
             proxied=True,
-            comment=f"Cloudflare Tunnel for {service}"
+            comment=f"Cloudflare Tunnel for {service.name}"
         )
 
 # Export outputs
@@ -6,6 +6,18 @@ Manages security infrastructure including WAF, Access, and security policies
 import pulumi
 import pulumi_cloudflare as cloudflare
 from pulumi import Config, export
+import sys
+import os
+
+# Add parent directory to path to import cloudcurio_lib
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cloudcurio_lib.lookups import cached_invoke
+from cloudcurio_lib.profiling import profile_from_env
+from cloudcurio_lib.waf import API_RATE_LIMIT, WAF_RULES, optimize_rules
+
+# Opt-in construction profile (CLOUDCURIO_PROFILE=<dir>)
+profile_from_env()
 
 # Configuration
 config = Config()
@@ -13,45 +25,16 @@ zone_name = config.get("zone_name") or "cloudcurio.cc"
 account_id = config.require("cloudflare_account_id")
 
 # Get zone
-zone = cloudflare.get_zone(name=zone_name)
+zone = cached_invoke(cloudflare.get_zone, name=zone_name)
 
-# WAF Custom Rules
+# WAF Custom Rules (cloudcurio_lib.waf owns the definitions; this stack owns the ruleset)
 waf_rules = cloudflare.Ruleset("cloudcurio-waf",
     zone_id=zone.id,
     name="CloudCurio WAF Rules",
     description="Security rules for CloudCurio infrastructure",
     kind="zone",
     phase="http_request_firewall_custom",
-    rules=[
-        # Block non-US access to admin paths
-        cloudflare.RulesetRuleArgs(
-            action="block",
-            expression='(http.request.uri.path contains "/admin" and not ip.geoip.country eq "US")',
-            description="Block non-US access to admin paths",
-            enabled=True,
-        ),
-        # Challenge high threat score requests
-        cloudflare.RulesetRuleArgs(
-            action="challenge",
-            expression='(cf.threat_score gt 10)',
-            description="Challenge high threat score requests",
-            enabled=True,
-        ),
-        # Block known bot patterns
-        cloudflare.RulesetRuleArgs(
-            action="block",
-            expression='(cf.bot_management.score lt 30)',
-            description="Block requests from known bad bots",
-            enabled=True,
-        ),
-        # Rate limiting for API endpoints
-        cloudflare.RulesetRuleArgs(
-            action="challenge",
-            expression='(http.request.uri.path contains "/api/" and rate.http.request.uri gt 100)',
-            description="Rate limit API endpoints",
-            enabled=True,
-        ),
-    ]
+    rules=[cloudflare.RulesetRuleArgs(**rule.args()) for rule in optimize_rules(WAF_RULES)],
 )
 
 # Cloudflare Access Application for internal services
@@ -74,9 +57,7 @@ access_policy = cloudflare.AccessPolicy("internal-policy",
     decision="allow",
     includes=[
         cloudflare.AccessPolicyIncludeArgs(
-            email_domain=cloudflare.AccessPolicyIncludeEmailDomainArgs(
-                domain="cloudcurio.cc"
-            )
+            email_domains=["cloudcurio.cc"]
         )
     ]
 )
@@ -93,19 +74,19 @@ page_rule_security_headers = cloudflare.PageRule("security-headers",
     priority=1,
 )
 
-# Rate limiting rule
+# Rate limiting rule; simulate_rate_limit.py replays Logpush exports against candidate thresholds
 rate_limit = cloudflare.RateLimit("api-rate-limit",
     zone_id=zone.id,
-    threshold=100,
-    period=60,
+    threshold=API_RATE_LIMIT.threshold,
+    period=API_RATE_LIMIT.period,
     match=cloudflare.RateLimitMatchArgs(
         request=cloudflare.RateLimitMatchRequestArgs(
-            url_pattern=f"{zone_name}/api/*"
+            url_pattern=API_RATE_LIMIT.url_pattern(zone_name)
         )
     ),
     action=cloudflare.RateLimitActionArgs(
-        mode="challenge",
-        timeout=3600,
+        mode=API_RATE_LIMIT.mode,
+        timeout=API_RATE_LIMIT.timeout,
     ),
     description="Rate limit for API endpoints"
 )
@@ -4,8 +4,18 @@ Manages projects, deployments, and environment variables
 """
 
 import pulumi
-import pulumi_vercel as vercel
+import pulumiverse_vercel as vercel
 from pulumi import Config, Output
+import sys
+import os
+
+# Add parent directory to path to import cloudcurio_lib
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cloudcurio_lib.profiling import profile_from_env
+
+# Opt-in construction profile (CLOUDCURIO_PROFILE=<dir>)
+profile_from_env()
 
 # Configuration
 config = Config()
@@ -39,7 +49,8 @@ for key, value in env_vars:
         team_id=team_id,
         key=key,
         value=value,
-        targets=["production", "preview"]
+        targets=["production", "preview"],
+        sensitive=False,
     )
 
 # Vercel Project for CloudCurio Dashboard
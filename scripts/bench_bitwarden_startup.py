@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# ================================================================
+# Script Name : bench_bitwarden_startup.py
+# Summary     : Startup benchmark for bitwarden.py. Measures
+#               `python -X importtime` cost per command and fails
+#               when a command exceeds its regression budget.
+# Dependencies: same as bitwarden.py
+# ================================================================
+#
+# Usage:
+#   python scripts/bench_bitwarden_startup.py              # check against budget
+#   python scripts/bench_bitwarden_startup.py --update     # record a new budget
+#
+# Commands run in a scratch directory, which also checks that startup has
+# no filesystem side effects (no `secrets/` directory may appear).
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent / "bitwarden.py"
+BUDGET_FILE = Path(__file__).resolve().parent / "bitwarden_startup_budget.json"
+HEADROOM = 1.5
+
+# Commands that never reach the vault, so they can run anywhere
+COMMANDS = {
+    "help": ["--help"],
+    "env-summary": ["env-summary", "--env-file", "{env_file}"],
+    "inject-all": ["inject-all", "--env-file", "{env_file}"],
+    "fetch --help": ["fetch", "--help"],
+    "fetch-many --help": ["fetch-many", "--help"],
+}
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Cumulative microseconds per top-level import from -X importtime output"""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented under the module that pulled them in
+        if name.startswith("  "):
+            continue
+        totals[name.strip()] = totals.get(name.strip(), 0) + int(cumulative)
+    return totals
+
+
+def run_command(args: list, workdir: Path) -> tuple:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", str(SCRIPT), *args],
+        cwd=workdir, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} exited {result.returncode}: {result.stdout[-500:]}")
+    return wall, parse_importtime(result.stderr)
+
+
+def measure(repeat: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        workdir = Path(scratch) / "cwd"
+        workdir.mkdir()
+        env_file = Path(scratch) / "bench.env"
+        env_file.write_text("".join(f"KEY_{n}='value-{n}'\n" for n in range(50)))
+
+        for label, template in COMMANDS.items():
+            args = [arg.format(env_file=env_file) for arg in template]
+            walls, imports, breakdown = [], [], {}
+            for _ in range(repeat):
+                wall, totals = run_command(args, workdir)
+                walls.append(wall)
+                imports.append(sum(totals.values()))
+                breakdown = totals
+            if (workdir / "secrets").exists():
+                raise RuntimeError(f"`{label}` created secrets/ at startup")
+            top = sorted(breakdown.items(), key=lambda kv: kv[1], reverse=True)[:5]
+            results[label] = {
+                "import_us": int(statistics.median(imports)),
+                "wall_ms": round(statistics.median(walls) * 1000, 1),
+                "top": top,
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bitwarden.py startup benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per command (median is used)")
+    parser.add_argument("--update", action="store_true",
+                        help=f"Write measured cost x{HEADROOM} as the new budget")
+    args = parser.parse_args()
+
+    results = measure(args.repeat)
+    budget = json.loads(BUDGET_FILE.read_text()) if BUDGET_FILE.exists() else {}
+
+    failed = []
+    for label, result in results.items():
+        limit = budget.get(label)
+        status = "ok"
+        if limit is not None and result["import_us"] > limit:
+            status = "OVER BUDGET"
+            failed.append(label)
+        limit_text = f"{limit / 1000:.1f}ms" if limit else "-"
+        print(f"{label:<20} import {result['import_us'] / 1000:7.1f}ms  "
+              f"wall {result['wall_ms']:7.1f}ms  budget {limit_text:>8}  {status}")
+        for name, cumulative in result["top"]:
+            print(f"    {name:<30} {cumulative / 1000:7.1f}ms")
+
+    if args.update:
+        new_budget = {label: int(result["import_us"] * HEADROOM)
+                      for label, result in results.items()}
+        BUDGET_FILE.write_text(json.dumps(new_budget, indent=2) + "\n")
+        print(f"Budget written to {BUDGET_FILE}")
+        return
+
+    if failed:
+        print(f"Startup regression in: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
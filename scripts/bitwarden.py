@@ -4,24 +4,703 @@
 # Date        : 2025-06-03
 # Author      : Blaine Winslow (CBW) & ChatGPT
 # Summary     : CLI tool to fetch and inject secrets using Bitwarden CLI
-# Dependencies: bitwarden-cli, python-dotenv, typer, rich
+# Dependencies: bitwarden-cli, python-dotenv, typer, rich,
+#               cryptography (only for --cache)
 # ================================================================
 
+# This script runs from shell hooks and cron many times a minute, so only
+# what every command needs is imported here. asyncio, http.client, rich,
+# python-dotenv and the crypto modules are imported where they are used,
+# and nothing touches the filesystem at import time.
+# Track the cost with scripts/bench_bitwarden_startup.py.
+
+import fcntl
+import io
+import json
 import os
+import queue
+import re
+import signal
 import subprocess
+import time
 import typer
-from dotenv import load_dotenv, set_key
-from rich.console import Console
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
 from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+
+class _LazyConsole:
+    """rich Console that is only imported and built on first use"""
+
+    _console = None
+
+    def __getattr__(self, name):
+        if _LazyConsole._console is None:
+            from rich.console import Console
+            _LazyConsole._console = Console()
+        return getattr(_LazyConsole._console, name)
+
 
 app = typer.Typer()
-console = Console()
+serve_app = typer.Typer(help="Manage a long-running `bw serve` daemon")
+app.add_typer(serve_app, name="serve")
+cache_app = typer.Typer(help="Inspect and invalidate the local secret cache")
+app.add_typer(cache_app, name="cache")
+console = _LazyConsole()
 
-# Path to .env file for storing injected secrets
+# Path to .env file for storing injected secrets (created on first write)
 SECRETS_DIR = Path("secrets")
-SECRETS_DIR.mkdir(exist_ok=True)
 DEFAULT_ENV_FILE = SECRETS_DIR / "default.env"
 
+# `bw serve` daemon: listens on localhost only, state is kept next to the secrets
+SERVE_HOST = "127.0.0.1"
+# Secrets cross plain HTTP, so a non-local BW_SERVE_URL needs BW_SERVE_ALLOW_REMOTE=1
+LOCAL_SERVE_HOSTS = ("127.0.0.1", "localhost", "::1")
+DEFAULT_SERVE_PORT = 8087
+SERVE_STATE_FILE = SECRETS_DIR / "bw-serve.json"
+SERVE_LOG_FILE = SECRETS_DIR / "bw-serve.log"
+
+# Opt-in secret cache (--cache or BW_CACHE=1), encrypted with a key derived from BW_SESSION
+CACHE_FILE = SECRETS_DIR / "cache.bin"
+CACHE_MAGIC = b"BWC1"
+DEFAULT_CACHE_TTL = 900
+DEFAULT_CACHE_MAX_ENTRIES = 256
+
+# Attachments and custom fields missing from the listing are looked up concurrently
+DEFAULT_CONCURRENCY = 8
+DEFAULT_LOOKUP_TIMEOUT = 30.0
+ATTACHMENT_PREFIX = "attachment:"
+ENV_KEY_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+# list-vault output: item type names, default projection, and fields that hold secret values
+ITEM_TYPES = {1: "login", 2: "note", 3: "card", 4: "identity", 5: "ssh-key"}
+DEFAULT_LIST_FIELDS = "id,name,type,folder"
+SECRET_FIELD_PREFIXES = (
+    "login.password", "login.totp", "login.fido2Credentials", "passwordHistory", "notes", "fields",
+    "card", "identity", "sshKey",
+)
+STREAM_CHUNK_SIZE = 1 << 16
+
+
+class BackendError(Exception):
+    """Raised when a vault backend cannot complete a request"""
+
+
+def _text(data: bytes, source: str) -> str:
+    # Values end up in an env file, so binary attachments are reported, not decoded
+    try:
+        return data.decode()
+    except UnicodeDecodeError as exc:
+        raise BackendError(
+            f"{source} returned binary data, which cannot go in an env file"
+        ) from exc
+
+
+def iter_json_array(read, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Yield the elements of the first JSON array in a text stream, one at a time.
+    `read(n)` returns up to n characters ("" at EOF). Only the current element
+    is held in memory, so large vault listings parse in constant space.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, started, eof = "", 0, False, False
+    while True:
+        if not started:
+            start = buffer.find("[", pos)
+            if start != -1:
+                pos, started = start + 1, True
+                continue
+            pos = len(buffer)
+        else:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer):
+                if buffer[pos] == "]":
+                    return
+                try:
+                    element, pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    yield element
+                    continue
+
+        if eof:
+            raise ValueError("JSON array ended unexpectedly")
+        chunk = read(chunk_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+
+class CliBackend:
+    """Vault backend that runs one `bw` subprocess per call"""
+
+    name = "cli"
+
+    def __init__(self, session: str):
+        self.session = session
+
+    def _run(self, *args: str) -> str:
+        env = {**os.environ, "BW_SESSION": self.session}
+        result = subprocess.run(["bw", *args], capture_output=True, text=True, env=env)
+        if result.returncode != 0:
+            raise BackendError(result.stderr.strip() or f"bw {args[0]} failed")
+        return result.stdout
+
+    async def _run_async(self, *args: str) -> str:
+        import asyncio
+
+        env = {**os.environ, "BW_SESSION": self.session}
+        proc = await asyncio.create_subprocess_exec(
+            "bw", *args, env=env, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await proc.communicate()
+        except asyncio.CancelledError:
+            # Timed out: do not leave the bw process behind
+            proc.kill()
+            await proc.wait()
+            raise
+        if proc.returncode != 0:
+            raise BackendError(stderr.decode(errors="replace").strip() or f"bw {args[0]} failed")
+        return _text(stdout, f"bw {args[0]} {args[1]}")
+
+    def get_password(self, name: str) -> str:
+        return self._run("get", "password", name).strip()
+
+    async def get_item_async(self, item_id: str) -> dict:
+        return json.loads(await self._run_async("get", "item", item_id))
+
+    async def get_attachment_async(self, item_id: str, attachment: dict) -> str:
+        return await self._run_async("get", "attachment", attachment["id"],
+                                     "--itemid", item_id, "--raw")
+
+    def list_items(self) -> list:
+        return json.loads(self._run("list", "items"))
+
+    def iter_items(self):
+        env = {**os.environ, "BW_SESSION": self.session}
+        proc = subprocess.Popen(
+            ["bw", "list", "items"], env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            yield from iter_json_array(proc.stdout.read)
+        except ValueError as exc:
+            proc.wait()
+            raise BackendError(proc.stderr.read().strip() or str(exc)) from exc
+        finally:
+            proc.stdout.close()
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+            proc.stderr.close()
+
+    def list_folders(self) -> list:
+        return json.loads(self._run("list", "folders"))
+
+    def list_collections(self) -> list:
+        return json.loads(self._run("list", "collections"))
+
+    def close(self):
+        pass
+
+
+class ServeBackend:
+    """
+    Vault backend that talks to a `bw serve` daemon on localhost.
+    Keeps a small pool of keep-alive connections so every call reuses
+    the already-unlocked vault instead of spawning and decrypting again.
+    """
+
+    name = "serve"
+
+    def __init__(self, url: str, pool_size: int = 4, timeout: float = 30.0):
+        parts = urlsplit(url)
+        if parts.scheme != "http":
+            raise BackendError(f"bw serve URL must be http://, got {url!r}")
+        if (parts.hostname or SERVE_HOST) not in LOCAL_SERVE_HOSTS \
+                and os.environ.get("BW_SERVE_ALLOW_REMOTE") != "1":
+            raise BackendError(f"Refusing to send vault secrets over plain HTTP to {url}; "
+                               "set BW_SERVE_ALLOW_REMOTE=1 to allow a non-local bw serve")
+        self.url = url
+        self.host = parts.hostname or SERVE_HOST
+        self.port = parts.port or DEFAULT_SERVE_PORT
+        self.timeout = timeout
+        # `unlocked`, `locked` or `unauthenticated` from the last ping
+        self.vault_status = None
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    @contextmanager
+    def _connection(self):
+        import http.client
+
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            yield conn
+        except Exception:
+            conn.close()
+            raise
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _request(self, method: str, path: str, body=None, raw_body: bool = False):
+        import http.client
+
+        payload = json.dumps(body) if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload else {}
+        # A pooled connection may have been closed by the daemon; retry once on a fresh one
+        for attempt in range(2):
+            try:
+                with self._connection() as conn:
+                    conn.request(method, path, body=payload, headers=headers)
+                    response = conn.getresponse()
+                    raw = response.read()
+                break
+            except (ConnectionError, http.client.HTTPException, OSError) as exc:
+                if attempt:
+                    raise BackendError(f"bw serve unreachable at {self.url}: {exc}") from exc
+        if raw_body and response.status < 400:
+            return _text(raw, f"bw serve {path.partition('?')[0]}")
+        try:
+            data = json.loads(raw)
+        except ValueError as exc:
+            raise BackendError(f"Invalid response from bw serve: {raw[:200]!r}") from exc
+        if response.status >= 400 or not data.get("success", False):
+            raise BackendError(data.get("message") or f"bw serve returned HTTP {response.status}")
+        return data.get("data")
+
+    def ping(self) -> dict:
+        status = self._request("GET", "/status") or {}
+        self.vault_status = (status.get("template") or {}).get("status", "unknown")
+        return status
+
+    def get_password(self, name: str) -> str:
+        return self._request("GET", f"/object/password/{quote(name, safe='')}")["data"]
+
+    async def get_item_async(self, item_id: str) -> dict:
+        import asyncio
+
+        path = f"/object/item/{quote(item_id, safe='')}"
+        return await asyncio.to_thread(self._request, "GET", path)
+
+    async def get_attachment_async(self, item_id: str, attachment: dict) -> str:
+        import asyncio
+
+        path = (f"/object/attachment/{quote(attachment['id'], safe='')}"
+                f"?itemid={quote(item_id, safe='')}")
+        return await asyncio.to_thread(self._request, "GET", path, None, True)
+
+    def list_items(self) -> list:
+        return self._request("GET", "/list/object/items")["data"]
+
+    def iter_items(self):
+        import http.client
+
+        # A dedicated connection: the stream may be abandoned part way through
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request("GET", "/list/object/items")
+            response = conn.getresponse()
+            if response.status >= 400:
+                raise BackendError(f"bw serve returned HTTP {response.status}")
+            try:
+                yield from iter_json_array(io.TextIOWrapper(response, encoding="utf-8").read)
+            except ValueError as exc:
+                raise BackendError(f"Invalid listing from bw serve: {exc}") from exc
+        except (ConnectionError, http.client.HTTPException, OSError) as exc:
+            raise BackendError(f"bw serve unreachable at {self.url}: {exc}") from exc
+        finally:
+            conn.close()
+
+    def list_folders(self) -> list:
+        return self._request("GET", "/list/object/folders")["data"]
+
+    def list_collections(self) -> list:
+        return self._request("GET", "/list/object/collections")["data"]
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def atomic_write(path: Path, data: bytes, mode: int = 0o600):
+    """
+    Replace `path` with `data` via a temp file in the same directory,
+    fsync and rename, so readers see either the old or the new file.
+    """
+    import tempfile
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            os.fchmod(f.fileno(), mode)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    dir_fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _quote_env_value(value: str) -> str:
+    # Same single-quoted form as dotenv.set_key, so load_dotenv reads it back unchanged
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def write_env(env_file: Path, updates: dict):
+    """
+    Apply many key updates to an .env file in one pass.
+    The file is parsed once, existing keys are replaced in place, new keys
+    are appended, and the result is written atomically. A lock file
+    serializes concurrent writers so no update is lost.
+    """
+    from dotenv.parser import parse_stream
+
+    env_file = Path(env_file)
+    env_file.parent.mkdir(parents=True, exist_ok=True)
+    lock_path = env_file.with_name(f".{env_file.name}.lock")
+    with open(lock_path, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        source = env_file.read_text() if env_file.exists() else ""
+        mode = env_file.stat().st_mode & 0o777 if env_file.exists() else 0o600
+
+        remaining = dict(updates)
+        lines = []
+        for binding in parse_stream(io.StringIO(source)):
+            if binding.key in updates:
+                # Keep only the first definition of a key that is being replaced
+                if binding.key in remaining:
+                    exported = binding.original.string.lstrip().startswith("export ")
+                    value = _quote_env_value(remaining.pop(binding.key))
+                    lines.append(f"{'export ' if exported else ''}{binding.key}={value}\n")
+                continue
+            lines.append(binding.original.string)
+        if lines and not lines[-1].endswith("\n"):
+            lines[-1] += "\n"
+        lines.extend(f"{key}={_quote_env_value(value)}\n" for key, value in remaining.items())
+
+        atomic_write(env_file, "".join(lines).encode(), mode)
+
+
+def read_serve_state() -> dict:
+    """Return the recorded daemon state, or an empty dict"""
+    try:
+        return json.loads(SERVE_STATE_FILE.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def connect_serve() -> "ServeBackend | None":
+    """Connect to BW_SERVE_URL or the recorded daemon, if it answers"""
+    url = os.environ.get("BW_SERVE_URL") or read_serve_state().get("url")
+    if not url:
+        return None
+    try:
+        backend = ServeBackend(url)
+    except BackendError as exc:
+        console.print(f"[red]{exc}[/red]")
+        raise typer.Exit(code=1)
+    try:
+        backend.ping()
+    except BackendError:
+        backend.close()
+        return None
+    return backend
+
+
+def get_backend():
+    """Prefer an unlocked `bw serve` daemon, falling back to one subprocess per call"""
+    backend = connect_serve()
+    if backend and backend.vault_status == "unlocked":
+        return backend
+    if backend:
+        # A locked daemon answers /status but fails every lookup
+        backend.close()
+        typer.secho(f"bw serve at {backend.url} is {backend.vault_status}; "
+                    "using the bw CLI instead.", fg="yellow", err=True)
+
+    session = os.environ.get("BW_SESSION")
+    if not session:
+        console.print("[red]No Bitwarden session found. Run `bwsecrets login` first.[/red]")
+        raise typer.Exit(code=1)
+    return CliBackend(session)
+
+
+class VaultIndex:
+    """
+    Name, folder and collection indexes over a single vault listing.
+    A reference is either `name` or `scope/name`, where scope is a folder
+    or collection name. Matching is case-insensitive, like `bw get`.
+    """
+
+    def __init__(self, items: list, folders: list, collections: list):
+        folder_names = {f["id"]: f["name"].lower() for f in folders if f.get("id")}
+        collection_names = {c["id"]: c["name"].lower() for c in collections}
+
+        self.by_name = defaultdict(list)
+        self.by_folder = defaultdict(lambda: defaultdict(list))
+        self.by_collection = defaultdict(lambda: defaultdict(list))
+        for item in items:
+            name = item["name"].lower()
+            self.by_name[name].append(item)
+            folder = folder_names.get(item.get("folderId"))
+            if folder:
+                self.by_folder[folder][name].append(item)
+            for collection_id in item.get("collectionIds") or []:
+                collection = collection_names.get(collection_id)
+                if collection:
+                    self.by_collection[collection][name].append(item)
+
+    @classmethod
+    def from_backend(cls, backend) -> "VaultIndex":
+        return cls(backend.list_items(), backend.list_folders(), backend.list_collections())
+
+    def lookup(self, reference: str) -> list:
+        scope, _, name = split_reference(reference)[0].lower().rpartition("/")
+        if not scope:
+            return self.by_name.get(name, [])
+
+        matches = (self.by_folder.get(scope, {}).get(name, [])
+                   + self.by_collection.get(scope, {}).get(name, []))
+        unique = {item["id"]: item for item in matches}
+        return list(unique.values())
+
+
+class SecretCache:
+    """
+    Encrypted on-disk cache of resolved secrets.
+    Entries carry their own expiry and are kept in LRU order; once the cache
+    holds more than `max_entries`, the least recently used entries are evicted.
+    The file is a salt followed by a Fernet token over the JSON payload, keyed
+    with HMAC-SHA256(salt, BW_SESSION), so a new session cannot read old entries.
+    """
+
+    def __init__(self, path: Path, session: str, max_entries: int = DEFAULT_CACHE_MAX_ENTRIES):
+        try:
+            from cryptography.fernet import Fernet, InvalidToken
+        except ImportError:
+            console.print("[red]The secret cache needs the `cryptography` package.[/red]")
+            raise typer.Exit(code=1)
+
+        self.path = path
+        self.session = session
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self.run_hits = 0
+        self.run_misses = 0
+        self.salt = os.urandom(16)
+        self._dirty = False
+
+        raw = path.read_bytes() if path.exists() else b""
+        if raw.startswith(CACHE_MAGIC):
+            salt = raw[len(CACHE_MAGIC):len(CACHE_MAGIC) + 16]
+            try:
+                payload = json.loads(Fernet(self._key(salt)).decrypt(raw[len(CACHE_MAGIC) + 16:]))
+            except (InvalidToken, ValueError):
+                # Written under another session: start over rather than fail
+                payload = None
+            if payload:
+                self.salt = salt
+                self.entries = OrderedDict(payload["entries"])
+                self.stats.update(payload["stats"])
+        self._fernet = Fernet(self._key(self.salt))
+
+    def _key(self, salt: bytes) -> bytes:
+        import base64
+        import hashlib
+        import hmac
+
+        digest = hmac.new(salt, self.session.encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest)
+
+    def _expire(self):
+        now = time.time()
+        for name in [name for name, entry in self.entries.items() if entry["expires"] <= now]:
+            del self.entries[name]
+            self._dirty = True
+
+    def get(self, reference: str):
+        entry = self.entries.get(reference.lower())
+        if entry and entry["expires"] > time.time():
+            self.entries.move_to_end(reference.lower())
+            self.stats["hits"] += 1
+            self.run_hits += 1
+            self._dirty = True
+            return entry["value"]
+        self.stats["misses"] += 1
+        self.run_misses += 1
+        self._dirty = True
+        return None
+
+    def put(self, reference: str, env_key: str, value: str, ttl: int):
+        self.entries[reference.lower()] = {
+            "key": env_key, "value": value, "expires": time.time() + ttl,
+        }
+        self.entries.move_to_end(reference.lower())
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+        self._dirty = True
+
+    def live(self, count_hits: bool = True) -> dict:
+        """Env key to value for every unexpired entry"""
+        self._expire()
+        if count_hits and self.entries:
+            self.stats["hits"] += len(self.entries)
+            self.run_hits += len(self.entries)
+            self._dirty = True
+        return {entry["key"]: entry["value"] for entry in self.entries.values()}
+
+    def invalidate(self, references=None) -> int:
+        if not references:
+            dropped = len(self.entries)
+            self.entries.clear()
+        else:
+            dropped = sum(self.entries.pop(ref.lower(), None) is not None for ref in references)
+        self._dirty = True
+        return dropped
+
+    def save(self):
+        if not self._dirty:
+            return
+        self._expire()
+        payload = json.dumps({"entries": self.entries, "stats": self.stats}).encode()
+        atomic_write(self.path, CACHE_MAGIC + self.salt + self._fernet.encrypt(payload))
+        self._dirty = False
+
+    def report(self):
+        if self.run_hits or self.run_misses:
+            console.print(f"[dim]cache: {self.run_hits} hits, {self.run_misses} misses[/dim]")
+
+
+def open_cache(enabled: bool):
+    """Return the SecretCache when caching is enabled and a session is available"""
+    if not enabled:
+        return None
+    session = os.environ.get("BW_SESSION")
+    if not session:
+        console.print("[yellow]Cache disabled: "
+                      "BW_SESSION is needed to derive the cache key.[/yellow]")
+        return None
+    max_entries = int(os.environ.get("BW_CACHE_MAX_ENTRIES", DEFAULT_CACHE_MAX_ENTRIES))
+    return SecretCache(CACHE_FILE, session, max_entries=max_entries)
+
+
+def split_reference(reference: str) -> tuple:
+    """
+    Split `[scope/]name[#field]` into (item reference, field).
+    A field of `attachment:<file>` names an attachment instead of a custom field.
+    """
+    item_ref, _, field = reference.partition("#")
+    return item_ref, field or None
+
+
+def env_key_for(reference: str) -> str:
+    """Env variable name used for a reference when none is given"""
+    item_ref, field = split_reference(reference)
+    key = item_ref.rpartition("/")[2]
+    if field:
+        field = field[len(ATTACHMENT_PREFIX):] if field.startswith(ATTACHMENT_PREFIX) else field
+        key = f"{key}_{field}"
+    key = re.sub(r"[^A-Z0-9_]+", "_", key.upper())
+    if not ENV_KEY_PATTERN.fullmatch(key):
+        raise ValueError(f"'{reference}' gives env key '{key}'; name one with KEY=reference")
+    return key
+
+
+def resolve_from_item(item: dict, field):
+    """
+    Resolve a secret from a listed item.
+    Returns (value, None) when the listing is enough, (None, lookup) when a
+    `bw get` is still needed, or (None, None) when the secret does not exist.
+    """
+    if field is None:
+        return (item.get("login") or {}).get("password"), None
+
+    if field.startswith(ATTACHMENT_PREFIX):
+        filename = field[len(ATTACHMENT_PREFIX):]
+        for attachment in item.get("attachments") or []:
+            if attachment.get("fileName") == filename:
+                return None, ("attachment", item["id"], attachment)
+        return None, None
+
+    if "fields" not in item:
+        return None, ("field", item["id"], field)
+    for custom in item["fields"]:
+        if custom.get("name") == field:
+            return custom.get("value"), None
+    return None, None
+
+
+async def _run_lookup(backend, lookup: tuple):
+    kind, item_id, target = lookup
+    if kind == "attachment":
+        return await backend.get_attachment_async(item_id, target)
+
+    item = await backend.get_item_async(item_id)
+    for custom in item.get("fields") or []:
+        if custom.get("name") == target:
+            return custom.get("value")
+    return None
+
+
+async def resolve_concurrently(backend, lookups: list, concurrency: int, timeout: float) -> list:
+    """
+    Run `bw get` lookups concurrently, at most `concurrency` at a time.
+    Returns one result per lookup, in input order: the value, None when
+    the field does not exist, or a BackendError instead of raising.
+    """
+    import asyncio
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(lookup):
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(_run_lookup(backend, lookup), timeout)
+            except asyncio.TimeoutError:
+                return BackendError(f"timed out after {timeout:g}s")
+            except BackendError as exc:
+                return exc
+
+    return await asyncio.gather(*(bounded(lookup) for lookup in lookups))
+
+
+def parse_manifest(manifest: Path) -> list:
+    """Read `[ENV_KEY=]reference` lines, skipping blanks and comments"""
+    entries = []
+    for line in manifest.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        key, sep, reference = line.partition("=")
+        if sep:
+            if not ENV_KEY_PATTERN.fullmatch(key.strip()):
+                raise ValueError(f"'{key.strip()}' in {manifest} is not a valid env key")
+            entries.append((key.strip(), reference.strip()))
+        else:
+            entries.append((env_key_for(line), line))
+    return entries
+
 
 @app.command()
 def login(email: str = typer.Option(..., help="Your Bitwarden email")):
@@ -35,61 +714,406 @@ def login(email: str = typer.Option(..., help="Your Bitwarden email")):
 
 
 @app.command()
-def fetch(secret_name: str = typer.Argument(...), env_file: Path = typer.Option(DEFAULT_ENV_FILE)):
+def fetch(
+    secret_name: str = typer.Argument(...),
+    env_file: Path = typer.Option(DEFAULT_ENV_FILE),
+    cache: bool = typer.Option(False, "--cache", envvar="BW_CACHE",
+                               help="Serve and store secrets in the local cache"),
+    cache_ttl: int = typer.Option(DEFAULT_CACHE_TTL, envvar="BW_CACHE_TTL",
+                                  help="Cache entry lifetime in seconds"),
+):
     """Fetch a Bitwarden secret and inject it into an .env file"""
-    session = os.environ.get("BW_SESSION")
-    if not session:
-        console.print("[red]No Bitwarden session found. Run `bwsecrets login` first.[/red]")
-        raise typer.Exit(code=1)
+    secret_cache = open_cache(cache)
+    secret_value = secret_cache.get(secret_name) if secret_cache else None
+    if secret_value is None:
+        backend = get_backend()
+        try:
+            secret_value = backend.get_password(secret_name)
+        except BackendError as exc:
+            console.print(f"[red]Failed to fetch secret: {exc}[/red]")
+            raise typer.Exit(code=1)
+        finally:
+            backend.close()
+        if secret_cache:
+            secret_cache.put(secret_name, secret_name.upper(), secret_value, cache_ttl)
+
+    write_env(env_file, {secret_name.upper(): secret_value})
+    console.print(f"[cyan]Secret '{secret_name}' injected into {env_file}.[/cyan]")
+    if secret_cache:
+        secret_cache.save()
+        secret_cache.report()
 
-    result = subprocess.run(["bw", "get", "password", secret_name], capture_output=True, text=True, env={"BW_SESSION": session})
-    if result.returncode != 0:
-        console.print(f"[red]Failed to fetch secret: {result.stderr}[/red]")
+
+@app.command()
+def fetch_many(
+    secret_names: list[str] = typer.Argument(
+        None, help="References: `[folder/]name[#field|#attachment:file]`",
+    ),
+    manifest: Path = typer.Option(None, help="File of `[ENV_KEY=]reference` lines"),
+    env_file: Path = typer.Option(DEFAULT_ENV_FILE),
+    cache: bool = typer.Option(False, "--cache", envvar="BW_CACHE",
+                               help="Serve and store secrets in the local cache"),
+    cache_ttl: int = typer.Option(DEFAULT_CACHE_TTL, envvar="BW_CACHE_TTL",
+                                  help="Cache entry lifetime in seconds"),
+    concurrency: int = typer.Option(DEFAULT_CONCURRENCY, min=1,
+                                    help="Parallel lookups for attachments and fields"),
+    timeout: float = typer.Option(DEFAULT_LOOKUP_TIMEOUT,
+                                  help="Seconds allowed per attachment or field lookup"),
+):
+    """Fetch many secrets from one vault listing and inject them into an .env file"""
+    try:
+        entries = [(env_key_for(name), name) for name in secret_names or []]
+        if manifest:
+            entries.extend(parse_manifest(manifest))
+    except ValueError as exc:
+        console.print(f"[red]{exc}[/red]")
+        raise typer.Exit(code=1)
+    if not entries:
+        console.print("[red]Nothing to fetch. Pass secret names or --manifest.[/red]")
         raise typer.Exit(code=1)
 
-    secret_value = result.stdout.strip()
-    env_file = Path(env_file)
-    env_file.touch(exist_ok=True)
-    load_dotenv(dotenv_path=env_file)
-    set_key(env_file, secret_name.upper(), secret_value)
-    console.print(f"[cyan]Secret '{secret_name}' injected into {env_file}.[/cyan]")
+    values = [None] * len(entries)
+    missing, ambiguous, failed = [], {}, {}
+    secret_cache = open_cache(cache)
+    pending = []
+    for position, (key, reference) in enumerate(entries):
+        values[position] = secret_cache.get(reference) if secret_cache else None
+        if values[position] is None:
+            pending.append(position)
+
+    # Only talk to the vault when something was not served from the cache
+    if pending:
+        backend = get_backend()
+        try:
+            index = VaultIndex.from_backend(backend)
+            deferred = []
+            for position in pending:
+                reference = entries[position][1]
+                matches = index.lookup(reference)
+                if len(matches) > 1:
+                    ambiguous[reference] = matches
+                    continue
+                value, lookup = (resolve_from_item(matches[0], split_reference(reference)[1])
+                                 if matches else (None, None))
+                if lookup:
+                    deferred.append((position, lookup))
+                elif value is None:
+                    missing.append(reference)
+                else:
+                    values[position] = value
+
+            if deferred:
+                import asyncio
+
+                lookups = [lookup for _, lookup in deferred]
+                results = asyncio.run(resolve_concurrently(backend, lookups, concurrency, timeout))
+                for (position, _), result in zip(deferred, results):
+                    if isinstance(result, BackendError):
+                        failed[entries[position][1]] = result
+                    elif result is None:
+                        missing.append(entries[position][1])
+                    else:
+                        values[position] = result
+        except BackendError as exc:
+            console.print(f"[red]Failed to list vault: {exc}[/red]")
+            raise typer.Exit(code=1)
+        finally:
+            backend.close()
+
+    resolved, fetched = {}, set(pending)
+    for position, (key, reference) in enumerate(entries):
+        if values[position] is None:
+            continue
+        resolved[key] = values[position]
+        if secret_cache and position in fetched:
+            secret_cache.put(reference, key, values[position], cache_ttl)
+
+    if resolved:
+        write_env(env_file, resolved)
+    console.print(f"[cyan]{len(resolved)} secrets injected into {env_file}.[/cyan]")
+    if secret_cache:
+        secret_cache.save()
+        secret_cache.report()
+
+    for reference in missing:
+        console.print(f"[red]Missing: {reference}[/red]")
+    for reference, matches in ambiguous.items():
+        ids = ", ".join(item["id"] for item in matches)
+        console.print(f"[red]Ambiguous: {reference} matches {len(matches)} items ({ids})[/red]")
+    for reference, exc in failed.items():
+        console.print(f"[red]Failed: {reference}: {exc}[/red]")
+    if missing or ambiguous or failed:
+        raise typer.Exit(code=1)
 
 
 @app.command()
-def inject_all(env_file: Path = typer.Option(DEFAULT_ENV_FILE)):
+def inject_all(
+    env_file: Path = typer.Option(DEFAULT_ENV_FILE),
+    cache: bool = typer.Option(False, "--cache", envvar="BW_CACHE",
+                               help="Also export unexpired cached secrets"),
+):
     """Export all variables from the .env file into environment"""
-    if not env_file.exists():
+    secret_cache = open_cache(cache)
+    cached = secret_cache.live() if secret_cache else {}
+    if not env_file.exists() and not cached:
         console.print(f"[red]{env_file} not found. Fetch some secrets first.[/red]")
         raise typer.Exit(code=1)
 
-    load_dotenv(dotenv_path=env_file, override=True)
+    if env_file.exists():
+        from dotenv import load_dotenv
+
+        load_dotenv(dotenv_path=env_file, override=True)
+    os.environ.update(cached)
     console.print(f"[bold yellow]Secrets from {env_file} exported to environment.[/bold yellow]")
+    if secret_cache:
+        secret_cache.save()
+        secret_cache.report()
+
+
+def secret_fields(fields: list) -> list:
+    """The fields that are, sit below, or contain a secret value"""
+    return [
+        field for field in fields
+        if any(field == p or field.startswith(p + ".") or p.startswith(field + ".")
+               for p in SECRET_FIELD_PREFIXES)
+    ]
+
+
+def project_item(item: dict, fields: list, folder_names: dict, collection_names: dict) -> dict:
+    """Pick dotted `fields` from an item; `folder` and `collections` resolve ids to names"""
+    row = {}
+    for field in fields:
+        if field == "folder":
+            row[field] = folder_names.get(item.get("folderId"))
+        elif field == "collections":
+            row[field] = [collection_names.get(cid, cid) for cid in item.get("collectionIds") or []]
+        elif field == "type":
+            row[field] = ITEM_TYPES.get(item.get("type"), item.get("type"))
+        else:
+            value = item
+            for part in field.split("."):
+                value = value.get(part) if isinstance(value, dict) else None
+            row[field] = value
+    return row
 
 
 @app.command()
-def list_vault():
-    """List all items in Bitwarden vault (basic info)"""
-    session = os.environ.get("BW_SESSION")
-    if not session:
-        console.print("[red]No Bitwarden session found. Run `bwsecrets login` first.[/red]")
+def list_vault(
+    folder: str = typer.Option(None, help="Only items in this folder (name)"),
+    collection: str = typer.Option(None, help="Only items in this collection (name)"),
+    item_type: str = typer.Option(
+        None, "--type", help=f"Only items of this type: {', '.join(ITEM_TYPES.values())}",
+    ),
+    name: str = typer.Option(None,
+                             help="Only items whose name matches this regex (case-insensitive)"),
+    fields: str = typer.Option(DEFAULT_LIST_FIELDS,
+                               help="Comma-separated fields to print; dotted paths allowed"),
+    show_secrets: bool = typer.Option(False, "--show-secrets",
+                                      help="Allow projecting secret fields"),
+):
+    """Stream vault items as JSON lines, filtered and projected (no secret values by default)"""
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    secret = secret_fields(selected)
+    if secret and not show_secrets:
+        console.print(f"[red]Refusing to print secret fields ({', '.join(secret)}) "
+                      "without --show-secrets.[/red]")
+        raise typer.Exit(code=1)
+
+    type_ids = {label: type_id for type_id, label in ITEM_TYPES.items()}
+    if item_type and item_type not in type_ids:
+        console.print(f"[red]Unknown item type '{item_type}'.[/red]")
         raise typer.Exit(code=1)
+    name_pattern = re.compile(name, re.IGNORECASE) if name else None
+
+    backend = get_backend()
+    shown = scanned = 0
+    try:
+        folder_names, collection_names = {}, {}
+        if folder or "folder" in selected:
+            folder_names = {f["id"]: f["name"] for f in backend.list_folders() if f.get("id")}
+        if collection or "collections" in selected:
+            collection_names = {c["id"]: c["name"] for c in backend.list_collections()}
+        folder_id = collection_id = None
+        if folder:
+            folder_id = next((fid for fid, fname in folder_names.items() if fname == folder), "")
+        if collection:
+            collection_id = next(
+                (cid for cid, cname in collection_names.items() if cname == collection), "")
 
-    result = subprocess.run(["bw", "list", "items"], capture_output=True, text=True, env={"BW_SESSION": session})
-    console.print(result.stdout)
+        for item in backend.iter_items():
+            scanned += 1
+            if folder_id is not None and item.get("folderId") != folder_id:
+                continue
+            if collection_id is not None and collection_id not in (item.get("collectionIds") or []):
+                continue
+            if item_type and item.get("type") != type_ids[item_type]:
+                continue
+            if name_pattern and not name_pattern.search(item.get("name", "")):
+                continue
+            shown += 1
+            typer.echo(json.dumps(project_item(item, selected, folder_names, collection_names)))
+    except BackendError as exc:
+        console.print(f"[red]Failed to list vault: {exc}[/red]")
+        raise typer.Exit(code=1)
+    finally:
+        backend.close()
+    typer.echo(f"{shown} of {scanned} items", err=True)
 
 
 @app.command()
 def env_summary(env_file: Path = typer.Option(DEFAULT_ENV_FILE)):
     """Show a summary of keys in the environment file"""
+    # Called from shell hooks: plain typer output keeps rich off the startup path
     if not env_file.exists():
-        console.print(f"[red]{env_file} not found.[/red]")
+        typer.secho(f"{env_file} not found.", fg="red")
         raise typer.Exit(code=1)
 
     with open(env_file) as f:
         lines = [line.strip() for line in f if line.strip() and not line.startswith('#')]
-    console.print(f"[green]{len(lines)} secrets in {env_file}[/green]")
+    typer.secho(f"{len(lines)} secrets in {env_file}", fg="green")
     for line in lines:
-        console.print(f" - [bold]{line.split('=')[0]}[/bold]")
+        typer.echo(f" - {typer.style(line.split('=')[0], bold=True)}")
+
+
+@serve_app.command("start")
+def serve_start(
+    port: int = typer.Option(DEFAULT_SERVE_PORT, help="Local port for `bw serve`"),
+    wait: float = typer.Option(15.0, help="Seconds to wait for the daemon to come up"),
+):
+    """Start `bw serve` on localhost so later commands skip vault decryption"""
+    running = connect_serve()
+    if running:
+        running.close()
+        console.print(f"[yellow]bw serve already running at {running.url}[/yellow]")
+        return
+
+    session = os.environ.get("BW_SESSION")
+    if not session:
+        console.print("[red]No Bitwarden session found. Run `bwsecrets login` first.[/red]")
+        raise typer.Exit(code=1)
+
+    url = f"http://{SERVE_HOST}:{port}"
+    SECRETS_DIR.mkdir(exist_ok=True)
+    with open(SERVE_LOG_FILE, "ab") as log:
+        proc = subprocess.Popen(
+            ["bw", "serve", "--hostname", SERVE_HOST, "--port", str(port)],
+            env={**os.environ, "BW_SESSION": session},
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            start_new_session=True,
+        )
+
+    backend = ServeBackend(url)
+    deadline = time.monotonic() + wait
+    try:
+        while True:
+            try:
+                backend.ping()
+                break
+            except BackendError:
+                if proc.poll() is not None or time.monotonic() > deadline:
+                    proc.terminate()
+                    console.print(f"[red]bw serve did not start, see {SERVE_LOG_FILE}[/red]")
+                    raise typer.Exit(code=1)
+                time.sleep(0.2)
+    finally:
+        backend.close()
+
+    SERVE_STATE_FILE.write_text(json.dumps({"pid": proc.pid, "port": port, "url": url}))
+    SERVE_STATE_FILE.chmod(0o600)
+    console.print(f"[bold green]bw serve running at {url} (pid {proc.pid}).[/bold green]")
+
+
+def process_args(pid: int) -> "list | None":
+    """Command line of a running process, or None if there is no such process"""
+    try:
+        return Path(f"/proc/{pid}/cmdline").read_bytes().decode(errors="replace").split("\0")[:-1]
+    except FileNotFoundError:
+        if Path("/proc/self").exists():
+            return None
+    # No procfs (macOS); ps prints nothing for a missing pid
+    result = subprocess.run(["ps", "-o", "command=", "-p", str(pid)],
+                            capture_output=True, text=True)
+    return result.stdout.split() or None
+
+
+def is_serve_process(pid: int, port: int) -> bool:
+    """Whether `pid` is still the daemon `serve start` launched, not a reused pid"""
+    args = process_args(pid)
+    expected = ["serve", "--hostname", SERVE_HOST, "--port", str(port)]
+    return args is not None and args[-len(expected):] == expected
+
+
+@serve_app.command("stop")
+def serve_stop():
+    """Stop the `bw serve` daemon started by `serve start`"""
+    state = read_serve_state()
+    if not state:
+        console.print("[yellow]No bw serve daemon recorded.[/yellow]")
+        return
+
+    if not is_serve_process(state["pid"], state["port"]):
+        SERVE_STATE_FILE.unlink(missing_ok=True)
+        console.print(f"[yellow]pid {state['pid']} is no longer bw serve; "
+                      "cleared the stale record.[/yellow]")
+        return
+    try:
+        os.kill(state["pid"], signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    SERVE_STATE_FILE.unlink(missing_ok=True)
+    console.print(f"[cyan]Stopped bw serve (pid {state['pid']}).[/cyan]")
+
+
+@serve_app.command("status")
+def serve_status():
+    """Show which backend commands will use"""
+    backend = connect_serve()
+    if not backend:
+        console.print("[yellow]bw serve not reachable; "
+                      "commands will run the bw CLI per call.[/yellow]")
+        return
+
+    backend.close()
+    if backend.vault_status != "unlocked":
+        console.print(f"[yellow]bw serve at {backend.url} is {backend.vault_status}; "
+                      "commands will run the bw CLI per call.[/yellow]")
+        return
+    console.print(f"[green]Using bw serve at {backend.url} (vault unlocked).[/green]")
+
+
+def _require_cache() -> SecretCache:
+    secret_cache = open_cache(True)
+    if not secret_cache:
+        raise typer.Exit(code=1)
+    return secret_cache
+
+
+@cache_app.command("invalidate")
+def cache_invalidate(
+    secret_names: list[str] = typer.Argument(None, help="Entries to drop; all when omitted"),
+):
+    """Drop cached secrets so the next fetch goes to the vault"""
+    secret_cache = _require_cache()
+    dropped = secret_cache.invalidate(secret_names)
+    secret_cache.save()
+    console.print(f"[cyan]Invalidated {dropped} cached secrets.[/cyan]")
+
+
+@cache_app.command("stats")
+def cache_stats():
+    """Show cache size and hit/miss counters"""
+    secret_cache = _require_cache()
+    live = len(secret_cache.live(count_hits=False))
+    stats = secret_cache.stats
+    lookups = stats["hits"] + stats["misses"]
+    hit_rate = stats["hits"] / lookups * 100 if lookups else 0.0
+    size = CACHE_FILE.stat().st_size if CACHE_FILE.exists() else 0
+    console.print(f"[green]{live} live entries (max {secret_cache.max_entries}), "
+                  f"{size} bytes on disk[/green]")
+    console.print(f" - hits: {stats['hits']}  misses: {stats['misses']}  hit rate: {hit_rate:.1f}%")
+    console.print(f" - evictions: {stats['evictions']}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# ================================================================
+# Script Name : bw_fake_server.py
+# Summary     : Local stand-in for `bw serve` so bitwarden.py can be
+#               exercised without a real vault
+# Dependencies: none (standard library only)
+# ================================================================
+#
+# Usage:
+#   python scripts/bw_fake_server.py --port 8087 [--vault items.json] [--delay 0.5]
+#   BW_SERVE_URL=http://127.0.0.1:8087 python scripts/bitwarden.py fetch github-token
+#
+# Only the subset of the `bw serve` API used by bitwarden.py is implemented.
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+SAMPLE_VAULT = {
+    "folders": [
+        {"object": "folder", "id": "f-infra", "name": "infra"},
+        {"object": "folder", "id": "f-ci", "name": "ci"},
+    ],
+    "collections": [
+        {"object": "collection", "id": "c-ops", "name": "ops"},
+    ],
+    "items": [
+        {
+            "object": "item", "id": "i-github", "type": 1, "name": "github-token",
+            "folderId": "f-ci", "collectionIds": ["c-ops"],
+            "login": {"username": "cbwinslow", "password": "ghp_fake_token"},
+        },
+        {
+            "object": "item", "id": "i-cloudflare", "type": 1, "name": "cloudflare-api-token",
+            "folderId": "f-infra", "collectionIds": ["c-ops"],
+            "login": {"username": "api", "password": "cf_fake_token"},
+            "fields": [{"name": "account_id", "value": "fake-account", "type": 0}],
+        },
+        {
+            "object": "item", "id": "i-deploy-key", "type": 2, "name": "deploy-key",
+            "folderId": "f-infra", "collectionIds": ["c-ops"],
+            "attachments": [
+                {"id": "a-deploy-key", "fileName": "id_ed25519", "content": "fake-private-key"},
+            ],
+        },
+        {
+            "object": "item", "id": "i-zerotier", "type": 1, "name": "zerotier-network",
+            "folderId": "f-infra", "collectionIds": [],
+            "login": {"username": "", "password": "zt_fake_secret"},
+        },
+    ],
+}
+
+
+class FakeVault:
+    """In-memory vault answering `bw serve` style lookups"""
+
+    def __init__(self, data: dict, delay: float = 0.0, status: str = "unlocked"):
+        self.delay = delay
+        self.status = status
+        self.items = data.get("items", [])
+        self.folders = data.get("folders", [])
+        self.collections = data.get("collections", [])
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def find(self, ident: str) -> list:
+        exact = [item for item in self.items if item["id"] == ident]
+        if exact:
+            return exact
+        lowered = ident.lower()
+        named = [item for item in self.items if item["name"].lower() == lowered]
+        return named or [item for item in self.items if lowered in item["name"].lower()]
+
+    def slow(self):
+        """Simulate the per-object decryption cost of a real vault"""
+        if self.delay:
+            time.sleep(self.delay)
+
+
+def _public(item: dict) -> dict:
+    """Item as listed by bw: attachment metadata without file contents"""
+    if "attachments" not in item:
+        return item
+    attachments = [{k: v for k, v in a.items() if k != "content"} for a in item["attachments"]]
+    return {**item, "attachments": attachments}
+
+
+def _make_handler(vault: FakeVault):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, payload: dict):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _ok(self, data):
+            self._reply(200, {"success": True, "data": data})
+
+        def _fail(self, status: int, message: str):
+            self._reply(status, {"success": False, "message": message})
+
+        def _file(self, content: str):
+            body = content.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _single(self, ident: str):
+            matches = vault.find(ident)
+            if not matches:
+                self._fail(404, "Not found.")
+                return None
+            if len(matches) > 1:
+                self._fail(400, "More than one result was found.")
+                return None
+            return matches[0]
+
+        def do_GET(self):
+            vault.count()
+            parts = urlsplit(self.path)
+            path = [unquote(p) for p in parts.path.strip("/").split("/")]
+            query = parse_qs(parts.query)
+
+            if path == ["status"]:
+                self._ok({"object": "template", "template": {"status": vault.status}})
+            elif vault.status != "unlocked":
+                self._fail(400, "Vault is locked.")
+            elif path == ["list", "object", "items"]:
+                items = vault.items
+                if "search" in query:
+                    needle = query["search"][0].lower()
+                    items = [item for item in items if needle in item["name"].lower()]
+                self._ok({"object": "list", "data": [_public(item) for item in items]})
+            elif path == ["list", "object", "folders"]:
+                self._ok({"object": "list", "data": vault.folders})
+            elif path == ["list", "object", "collections"]:
+                self._ok({"object": "list", "data": vault.collections})
+            elif len(path) == 3 and path[:2] == ["object", "item"]:
+                vault.slow()
+                item = self._single(path[2])
+                if item:
+                    self._ok(_public(item))
+            elif len(path) == 3 and path[:2] == ["object", "attachment"]:
+                vault.slow()
+                item = self._single(query.get("itemid", [""])[0])
+                attachments = (item or {}).get("attachments", [])
+                attachment = next((a for a in attachments if a["id"] == path[2]), None)
+                if attachment:
+                    self._file(attachment["content"])
+                elif item:
+                    self._fail(404, "Attachment not found.")
+            elif len(path) == 3 and path[:2] == ["object", "password"]:
+                item = self._single(path[2])
+                if item:
+                    password = item.get("login", {}).get("password", "")
+                    self._ok({"object": "string", "data": password})
+            else:
+                self._fail(404, f"Unsupported path {parts.path}")
+
+    return Handler
+
+
+def start_fake_server(data: Optional[dict] = None, port: int = 0, delay: float = 0.0,
+                      status: str = "unlocked"):
+    """Start a fake `bw serve` in a background thread; returns (server, vault, url)"""
+    vault = FakeVault(data or SAMPLE_VAULT, delay=delay, status=status)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(vault))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, bound_port = server.server_address[:2]
+    return server, vault, f"http://{host}:{bound_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake `bw serve` for local testing")
+    parser.add_argument("--port", type=int, default=8087)
+    parser.add_argument("--vault", type=Path, help="JSON file with items/folders/collections")
+    parser.add_argument("--delay", type=float, default=0.0,
+                        help="Seconds to sleep per item or attachment lookup")
+    parser.add_argument("--status", choices=("unlocked", "locked", "unauthenticated"),
+                        default="unlocked",
+                        help="Vault status to report; lookups fail unless unlocked")
+    args = parser.parse_args()
+
+    data = json.loads(args.vault.read_text()) if args.vault else SAMPLE_VAULT
+    vault = FakeVault(data, delay=args.delay, status=args.status)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), _make_handler(vault))
+    print(f"Fake bw serve on http://127.0.0.1:{args.port} with {len(vault.items)} items")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served {vault.requests} requests")
+
+
+if __name__ == "__main__":
+    main()
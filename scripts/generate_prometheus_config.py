@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Prometheus Config Generator
+Writes prometheus-<shard>.yml, the file_sd target shards and the recording
+rules for the inventory's ZeroTier nodes into the directory the
+monitoring/prometheus role deploys as prometheus_generated_dir
+
+Usage:
+    python scripts/generate_prometheus_config.py build/prometheus [--shards 2]
+
+Prints the change report as JSON; only files whose content changed are
+rewritten, so an unchanged inventory leaves the directory untouched.
+Needs the pulumi/infrastructure requirements on the machine that runs it.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'pulumi'))
+
+from cloudcurio_lib.inventory import load_inventory
+from cloudcurio_lib.monitoring import DEFAULT_TIER_TAG, PrometheusConfig
+
+# Matches the MonitoringStack in pulumi/infrastructure/__main__.py
+SCRAPE_TIERS = {"server": "15s", "desktop": "30s", "laptop": "60s"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate Prometheus artifacts")
+    parser.add_argument("directory", help="Output directory (prometheus_generated_dir)")
+    parser.add_argument("--scrape-interval", default="15s")
+    parser.add_argument("--retention-days", type=int, default=90)
+    parser.add_argument("--shards", type=int, default=1)
+    args = parser.parse_args()
+
+    nodes = load_inventory().zerotier_nodes()
+    result = PrometheusConfig.write_configs(
+        args.directory,
+        scrape_interval=args.scrape_interval,
+        targets=[(node.zerotier_ip, dict(node.tags) or None) for node in nodes],
+        retention_days=args.retention_days,
+        shards=args.shards,
+        scrape_tiers=SCRAPE_TIERS,
+        tier_tag=DEFAULT_TIER_TAG,
+    )
+    print(json.dumps({key: result[key] for key in (
+        'changed', 'removed', 'changed_shards', 'reload_required', 'targets_per_job',
+    )}))
+
+
+if __name__ == "__main__":
+    main()
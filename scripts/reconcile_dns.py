@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+DNS Reconciliation
+Diffs the inventory's *.internal records against a zone snapshot and prints,
+or applies, the minimal create/update/delete plan
+
+Usage:
+    python scripts/reconcile_dns.py --snapshot cloudcurio.cc.txt   # zone export
+    python scripts/reconcile_dns.py --snapshot records.json        # API dump
+    CLOUDFLARE_API_TOKEN=... python scripts/reconcile_dns.py --zone-id <id> [--apply]
+
+Only names under --scope (default internal.<zone>) are ever deleted.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'pulumi'))
+
+from cloudcurio_lib.dns import (
+    API_BASE, CloudflareDnsClient, DnsChangeScheduler, DnsRecord, in_scope, internal_records,
+    load_snapshot, reconcile,
+)
+from cloudcurio_lib.inventory import load_inventory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile ZeroTier DNS records")
+    parser.add_argument("--zone", default="cloudcurio.cc")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--snapshot", help="Zone file export or JSON dump of dns_records")
+    source.add_argument("--zone-id", help="Read the zone from the API (CLOUDFLARE_API_TOKEN)")
+    parser.add_argument("--api-base", default=API_BASE,
+                        help="e.g. pulumi/benchmarks/cloudflare_fake_api.py")
+    parser.add_argument("--scope", action="append", help="Managed name suffix (repeatable)")
+    parser.add_argument("--apply", action="store_true", help="Apply the plan (needs --zone-id)")
+    parser.add_argument("--json", action="store_true", help="Print the plan as JSON")
+    parser.add_argument("--check", action="store_true", help="Exit 1 when the zone has drifted")
+    args = parser.parse_args()
+
+    desired = internal_records(load_inventory(), args.zone).values()
+    managed = in_scope(*(args.scope or [f"internal.{args.zone}"]))
+
+    client = None
+    if args.zone_id:
+        token = os.environ.get("CLOUDFLARE_API_TOKEN")
+        if not token:
+            parser.error("CLOUDFLARE_API_TOKEN is required with --zone-id")
+        client = CloudflareDnsClient(args.zone_id, token, base_url=args.api_base)
+        actual = [DnsRecord.from_api(record) for record in client.list_records()]
+        plan = reconcile(desired, actual, managed)
+    else:
+        if args.apply:
+            parser.error("--apply needs record ids; use --zone-id")
+        plan = reconcile(desired, load_snapshot(args.snapshot, args.zone), managed,
+                         comments=args.snapshot.endswith('.json'))
+
+    print(json.dumps(plan.to_dict(), indent=2) if args.json else plan.summary())
+    if args.apply and not plan.empty:
+        report = DnsChangeScheduler(client).apply(plan.changes())
+        print(f"applied {report.applied}, failed {len(report.failed)} "
+              f"in {report.requests} requests")
+        for change, error in report.failed:
+            print(f"  {change.action} {change.name}: {error}", file=sys.stderr)
+        sys.exit(1 if report.failed else 0)
+    if args.check and not plan.empty:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
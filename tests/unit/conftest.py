@@ -0,0 +1,28 @@
+"""
+Unit Test Setup
+Puts scripts/ and pulumi/ on sys.path so tests import bitwarden and
+cloudcurio_lib the same way the CLI and the Pulumi stacks do
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path[:0] = [str(ROOT / "scripts"), str(ROOT / "pulumi")]
+
+
+@pytest.fixture(autouse=True)
+def current_event_loop():
+    """
+    A current event loop for Pulumi's runtime, which calls get_event_loop()
+    asyncio.run() in the bitwarden tests closes its loop and unsets it,
+    which would break every later test that builds Outputs or mocks.
+    """
+    try:
+        asyncio.get_event_loop_policy().get_event_loop()
+    except RuntimeError:
+        asyncio.set_event_loop(asyncio.new_event_loop())
+    yield
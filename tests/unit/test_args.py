@@ -0,0 +1,135 @@
+"""
+cloudcurio_lib.args
+FrozenArgs and FrozenDict immutability, replace() and coerce(), and the
+validators' error messages
+"""
+
+import pickle
+
+import pytest
+
+from cloudcurio_lib.args import (
+    EMPTY, FrozenArgs, FrozenDict, duration_seconds, freeze, require_bool, require_choice,
+    require_duration, require_int, require_ip, require_network, require_str, require_str_list,
+    require_str_map,
+)
+
+
+class ServiceArgs(FrozenArgs):
+    __slots__ = ('name', 'port', 'labels', 'hosts')
+
+    def __init__(self, name: str, port: int = 80, labels=None, hosts=()):
+        self._set(
+            name=require_str('name', name),
+            port=require_int('port', port, minimum=1, maximum=65535),
+            labels=require_str_map('labels', labels),
+            hosts=hosts,
+        )
+
+
+# FrozenArgs
+
+def test_fields_cannot_be_set_or_deleted():
+    args = ServiceArgs("grafana", 3000)
+    with pytest.raises(AttributeError, match="ServiceArgs is immutable; use replace"):
+        args.port = 3001
+    with pytest.raises(AttributeError, match="immutable"):
+        args.extra = 1
+    with pytest.raises(AttributeError, match="immutable"):
+        del args.port
+    assert not hasattr(args, '__dict__')
+
+
+def test_replace_validates_and_leaves_the_original():
+    args = ServiceArgs("grafana", 3000, labels={'team': "infra"})
+    moved = args.replace(port=3001)
+    assert (args.port, moved.port) == (3000, 3001)
+    assert moved.labels is args.labels
+    with pytest.raises(ValueError, match="port must be between 1 and 65535, got 0"):
+        args.replace(port=0)
+
+
+def test_equal_by_value_and_hashable():
+    first = ServiceArgs("grafana", labels={'a': "1"}, hosts=["r720", {'zone': "cc"}])
+    second = ServiceArgs("grafana", labels={'a': "1"}, hosts=["r720", {'zone': "cc"}])
+    assert first == second and hash(first) == hash(second)
+    assert first != first.replace(port=81)
+    assert len({first, second}) == 1
+    assert first.hosts == ("r720", FrozenDict(zone="cc"))
+
+
+def test_pickle_and_coerce_round_trip():
+    args = ServiceArgs("grafana", 3000, labels={'team': "infra"})
+    assert pickle.loads(pickle.dumps(args)) == args
+    assert ServiceArgs.coerce(args) is args
+    as_dict = {'name': "grafana", 'port': 3000, 'labels': {'team': "infra"}}
+    assert ServiceArgs.coerce(as_dict) == args
+    with pytest.raises(TypeError, match="Expected ServiceArgs or dict, got list"):
+        ServiceArgs.coerce(["grafana"])
+
+
+# FrozenDict and freeze
+
+def test_frozen_dict_is_read_only():
+    frozen = FrozenDict(a=1)
+    for mutate in (lambda: frozen.__setitem__('b', 2), lambda: frozen.update(b=2),
+                   lambda: frozen.pop('a'), frozen.clear, lambda: frozen.setdefault('b', 2)):
+        with pytest.raises(TypeError, match="FrozenDict is immutable"):
+            mutate()
+    with pytest.raises(TypeError):
+        frozen |= {'b': 2}
+    assert frozen == {'a': 1} and isinstance(frozen, dict)
+    assert hash(frozen) == hash(FrozenDict(a=1))
+    assert pickle.loads(pickle.dumps(frozen)) == frozen
+
+
+def test_freeze_converts_nested_containers():
+    frozen = freeze({'hosts': ["a", {'b': [1, 2]}], 'tags': {"x"}, 'empty': {}})
+    assert frozen == {'hosts': ("a", {'b': (1, 2)}), 'tags': frozenset({"x"}), 'empty': {}}
+    assert type(frozen['hosts'][1]) is FrozenDict
+    assert frozen['empty'] is EMPTY
+    hash(frozen)
+
+
+# Validators
+
+@pytest.mark.parametrize("check, message", [
+    (lambda: require_str('hostname', ""), "hostname must be a non-empty string, got ''"),
+    (lambda: require_str('hostname', 5), "hostname must be a non-empty string, got 5"),
+    (lambda: require_bool('authorized', 1), "authorized must be a bool, got 1"),
+    (lambda: require_int('port', True), "port must be an int, got True"),
+    (lambda: require_int('port', "80"), "port must be an int, got '80'"),
+    (lambda: require_int('port', 70000, minimum=1, maximum=65535),
+     "port must be between 1 and 65535, got 70000"),
+    (lambda: require_choice('mode', "drop", ("block", "log")),
+     "mode must be one of block, log, got 'drop'"),
+    (lambda: require_duration('interval', "15"),
+     "interval must be a Prometheus duration like '15s' or '1m', got '15'"),
+    (lambda: require_ip('ip_address', "172.28.0.256"),
+     "ip_address must be an IP address, got '172.28.0.256'"),
+    (lambda: require_ip('ip_address', None), "ip_address must be an IP address, got None"),
+    (lambda: require_network('subnet', "172.28.0.1/16"),
+     "subnet must be a CIDR network, got '172.28.0.1/16'"),
+    (lambda: require_str_list('groups', ["a", ""]), "groups must be a non-empty string, got ''"),
+    (lambda: require_str_map('tags', {'type': 1}), "tags\\['type'\\] must be a string, got 1"),
+    (lambda: require_str_map('tags', {"": "x"}), "tags key must be a non-empty string, got ''"),
+])
+def test_validators_name_the_field_and_the_value(check, message):
+    with pytest.raises(ValueError, match=f"^{message}$"):
+        check()
+
+
+def test_validators_return_valid_values():
+    assert require_str('description', None, optional=True) is None
+    assert require_ip('ip_address', "fd00::1") == "fd00::1"
+    assert require_ip('ip_address', None, optional=True) is None
+    assert require_network('subnet', "172.28.0.0/16") == "172.28.0.0/16"
+    assert require_str_list('groups', None) == ()
+    assert require_str_map('tags', None) is EMPTY
+    assert require_int('port', 0, minimum=0) == 0
+
+
+@pytest.mark.parametrize("value, seconds", [("15s", 15), ("1m30s", 90), ("500ms", 0.5),
+                                            ("2h", 7200), ("1w1d", 691200)])
+def test_duration_seconds(value, seconds):
+    assert duration_seconds(value) == seconds
@@ -0,0 +1,400 @@
+"""
+bitwarden.py
+Backends against scripts/bw_fake_server.py, and the pure helpers behind
+the fetch, fetch-many and list-vault commands
+"""
+
+import json
+
+import pytest
+import typer
+
+import bitwarden
+from bw_fake_server import start_fake_server
+
+
+@pytest.fixture
+def fake_serve(monkeypatch):
+    """Start a fake `bw serve` and point BW_SERVE_URL at it"""
+    servers = []
+
+    def start(**kwargs):
+        server, vault, url = start_fake_server(**kwargs)
+        servers.append(server)
+        monkeypatch.setenv("BW_SERVE_URL", url)
+        return vault, url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+# Backends
+
+def test_serve_backend_reads_the_vault(fake_serve):
+    _, url = fake_serve()
+    backend = bitwarden.ServeBackend(url)
+    try:
+        assert backend.get_password("github-token") == "ghp_fake_token"
+        assert [item["name"] for item in backend.iter_items()] == [
+            item["name"] for item in backend.list_items()
+        ]
+        assert {folder["name"] for folder in backend.list_folders()} == {"infra", "ci"}
+    finally:
+        backend.close()
+
+
+def test_serve_backend_reuses_pooled_connections(fake_serve):
+    vault, url = fake_serve()
+    backend = bitwarden.ServeBackend(url, pool_size=1)
+    try:
+        for _ in range(5):
+            backend.get_password("github-token")
+        assert backend._pool.qsize() == 1
+        assert vault.requests == 5
+    finally:
+        backend.close()
+
+
+def test_get_backend_prefers_an_unlocked_daemon(fake_serve):
+    fake_serve()
+    backend = bitwarden.get_backend()
+    try:
+        assert isinstance(backend, bitwarden.ServeBackend)
+        assert backend.vault_status == "unlocked"
+    finally:
+        backend.close()
+
+
+def test_get_backend_falls_back_to_the_cli_when_serve_is_locked(fake_serve, monkeypatch, capsys):
+    fake_serve(status="locked")
+    monkeypatch.setenv("BW_SESSION", "session")
+    backend = bitwarden.get_backend()
+    assert isinstance(backend, bitwarden.CliBackend)
+    assert "is locked" in capsys.readouterr().err
+
+
+def test_get_backend_exits_when_locked_and_no_session(fake_serve, monkeypatch):
+    fake_serve(status="locked")
+    monkeypatch.delenv("BW_SESSION", raising=False)
+    with pytest.raises(typer.Exit):
+        bitwarden.get_backend()
+
+
+def test_locked_daemon_fails_lookups(fake_serve):
+    _, url = fake_serve(status="locked")
+    backend = bitwarden.ServeBackend(url)
+    try:
+        with pytest.raises(bitwarden.BackendError, match="locked"):
+            backend.get_password("github-token")
+    finally:
+        backend.close()
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1:8087", "http://localhost:8087", "http://[::1]:8087",
+])
+def test_serve_backend_accepts_local_urls(url, monkeypatch):
+    monkeypatch.delenv("BW_SERVE_ALLOW_REMOTE", raising=False)
+    assert bitwarden.ServeBackend(url).url == url
+
+
+@pytest.mark.parametrize("url, error", [
+    ("http://vault.example.com:8087", "BW_SERVE_ALLOW_REMOTE"),
+    ("http://10.0.0.5:8087", "BW_SERVE_ALLOW_REMOTE"),
+    ("https://127.0.0.1:8087", "must be http"),
+])
+def test_serve_backend_rejects_urls_secrets_could_leak_to(url, error, monkeypatch):
+    monkeypatch.delenv("BW_SERVE_ALLOW_REMOTE", raising=False)
+    with pytest.raises(bitwarden.BackendError, match=error):
+        bitwarden.ServeBackend(url)
+    monkeypatch.setenv("BW_SERVE_ALLOW_REMOTE", "1")
+    if url.startswith("http:"):
+        assert bitwarden.ServeBackend(url).url == url
+
+
+def test_connect_serve_exits_on_a_remote_url(monkeypatch, capsys):
+    monkeypatch.delenv("BW_SERVE_ALLOW_REMOTE", raising=False)
+    monkeypatch.setenv("BW_SERVE_URL", "http://vault.example.com:8087")
+    with pytest.raises(typer.Exit):
+        bitwarden.connect_serve()
+
+
+# serve stop
+
+@pytest.fixture
+def serve_state(tmp_path, monkeypatch):
+    """Record `args` as the running daemon; yields the process"""
+    import subprocess
+    import sys
+
+    processes = []
+    monkeypatch.setattr(bitwarden, "SERVE_STATE_FILE", tmp_path / "bw-serve.json")
+
+    def record(*args):
+        proc = subprocess.Popen([sys.executable, "-c", "import time; print(); time.sleep(60)",
+                                 *args], stdout=subprocess.PIPE)
+        processes.append(proc)
+        proc.stdout.readline()  # exec has finished once it prints
+        bitwarden.SERVE_STATE_FILE.write_text(json.dumps({"pid": proc.pid, "port": 8087}))
+        return proc
+
+    yield record
+    for proc in processes:
+        proc.kill()
+        proc.wait()
+
+
+def test_serve_stop_terminates_the_recorded_daemon(serve_state):
+    from typer.testing import CliRunner
+
+    proc = serve_state("serve", "--hostname", "127.0.0.1", "--port", "8087")
+    assert bitwarden.is_serve_process(proc.pid, 8087)
+    result = CliRunner().invoke(bitwarden.app, ["serve", "stop"])
+    assert result.exit_code == 0
+    assert proc.wait(timeout=10) != 0
+    assert not bitwarden.SERVE_STATE_FILE.exists()
+
+
+def test_serve_stop_leaves_a_reused_pid_alone(serve_state):
+    from typer.testing import CliRunner
+
+    proc = serve_state()
+    result = CliRunner().invoke(bitwarden.app, ["serve", "stop"])
+    assert "no longer bw serve" in result.output
+    assert proc.poll() is None
+    assert not bitwarden.SERVE_STATE_FILE.exists()
+
+
+# Env keys
+
+@pytest.mark.parametrize("reference, key", [
+    ("github-token", "GITHUB_TOKEN"),
+    ("infra/cloudflare-api-token", "CLOUDFLARE_API_TOKEN"),
+    ("cloudflare-api-token#account id", "CLOUDFLARE_API_TOKEN_ACCOUNT_ID"),
+    ("deploy-key#attachment:id_ed25519", "DEPLOY_KEY_ID_ED25519"),
+    ("my.app key", "MY_APP_KEY"),
+])
+def test_env_key_for_gives_shell_variable_names(reference, key):
+    assert bitwarden.env_key_for(reference) == key
+
+
+def test_env_key_for_rejects_a_leading_digit():
+    with pytest.raises(ValueError, match="KEY=reference"):
+        bitwarden.env_key_for("1password-import")
+
+
+def test_parse_manifest_checks_explicit_keys(tmp_path):
+    manifest = tmp_path / "secrets.txt"
+    manifest.write_text("# comment\n\nGH=github-token\ncloudflare-api-token#account_id\n")
+    assert bitwarden.parse_manifest(manifest) == [
+        ("GH", "github-token"),
+        ("CLOUDFLARE_API_TOKEN_ACCOUNT_ID", "cloudflare-api-token#account_id"),
+    ]
+    manifest.write_text("GH-TOKEN=github-token\n")
+    with pytest.raises(ValueError, match="not a valid env key"):
+        bitwarden.parse_manifest(manifest)
+
+
+# Secret cache
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(bitwarden.time, "time", clock)
+    return clock
+
+
+def test_cache_round_trips_through_the_encrypted_file(tmp_path, clock):
+    path = tmp_path / "cache.bin"
+    cache = bitwarden.SecretCache(path, "session-a")
+    cache.put("GitHub-Token", "GITHUB_TOKEN", "ghp_fake_token", ttl=60)
+    cache.save()
+
+    assert b"ghp_fake_token" not in path.read_bytes()
+    reloaded = bitwarden.SecretCache(path, "session-a")
+    assert reloaded.get("github-token") == "ghp_fake_token"
+    assert reloaded.live(count_hits=False) == {"GITHUB_TOKEN": "ghp_fake_token"}
+
+
+def test_cache_written_under_another_session_starts_empty(tmp_path, clock):
+    path = tmp_path / "cache.bin"
+    cache = bitwarden.SecretCache(path, "session-a")
+    cache.put("github-token", "GITHUB_TOKEN", "ghp_fake_token", ttl=60)
+    cache.save()
+
+    other = bitwarden.SecretCache(path, "session-b")
+    assert other.get("github-token") is None
+    assert other.stats["misses"] == 1
+
+
+def test_cache_entries_expire(tmp_path, clock):
+    cache = bitwarden.SecretCache(tmp_path / "cache.bin", "session")
+    cache.put("github-token", "GITHUB_TOKEN", "ghp_fake_token", ttl=60)
+    clock.now += 59
+    assert cache.get("github-token") == "ghp_fake_token"
+    clock.now += 1
+    assert cache.get("github-token") is None
+    assert cache.live(count_hits=False) == {}
+
+
+def test_cache_evicts_least_recently_used(tmp_path, clock):
+    cache = bitwarden.SecretCache(tmp_path / "cache.bin", "session", max_entries=2)
+    cache.put("a", "A", "1", ttl=60)
+    cache.put("b", "B", "2", ttl=60)
+    cache.get("a")
+    cache.put("c", "C", "3", ttl=60)
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.stats["evictions"] == 1
+
+
+def test_cache_invalidate(tmp_path, clock):
+    cache = bitwarden.SecretCache(tmp_path / "cache.bin", "session")
+    for name in ("a", "b", "c"):
+        cache.put(name, name.upper(), name, ttl=60)
+    assert cache.invalidate(["A", "missing"]) == 1
+    assert cache.invalidate() == 2
+    assert not cache.entries
+
+
+# Concurrent lookups
+
+FAKE_BW = """#!/bin/sh
+case "$1 $2" in
+  "get attachment") if [ "$3" = a-binary ]; then printf '\\377\\376\\000'; else printf 'key'; fi ;;
+  "get item") echo '{"id": "'"$3"'", "name": "note"}' ;;
+  *) echo "unsupported: $*" >&2; exit 1 ;;
+esac
+"""
+
+
+@pytest.fixture
+def fake_bw(tmp_path, monkeypatch):
+    """A `bw` executable on PATH answering attachment and item lookups"""
+    bw = tmp_path / "bw"
+    bw.write_text(FAKE_BW)
+    bw.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:{bitwarden.os.environ['PATH']}")
+    return bitwarden.CliBackend("session")
+
+
+def test_binary_attachment_fails_only_its_own_lookup(fake_bw):
+    import asyncio
+
+    lookups = [
+        ("attachment", "i-deploy", {"id": "a-binary"}),
+        ("attachment", "i-deploy", {"id": "a-text"}),
+        ("field", "i-note", "api_key"),
+    ]
+    binary, text, field = asyncio.run(bitwarden.resolve_concurrently(fake_bw, lookups, 2, 10))
+    assert isinstance(binary, bitwarden.BackendError)
+    assert "binary data" in str(binary)
+    assert text == "key"
+    assert field is None
+
+
+def test_fetch_many_reports_a_field_the_item_lacks_as_missing(fake_serve, tmp_path):
+    from typer.testing import CliRunner
+
+    fake_serve()
+    env_file = tmp_path / "test.env"
+    result = CliRunner().invoke(bitwarden.app, [
+        "fetch-many", "github-token", "zerotier-network#api_key", "--env-file", str(env_file),
+    ])
+    assert result.exit_code == 1
+    assert "Missing: zerotier-network#api_key" in result.output
+    assert "Failed" not in result.output
+    assert env_file.read_text() == "GITHUB_TOKEN='ghp_fake_token'\n"
+
+
+# Env file writer
+
+def test_write_env_round_trips_through_dotenv(tmp_path):
+    from dotenv import dotenv_values
+
+    env_file = tmp_path / "secrets" / "default.env"
+    values = {
+        "PLAIN": "value",
+        "QUOTES": "it's \"quoted\"",
+        "BACKSLASH": "C:\\path\\to",
+        "SPACES": "  padded  ",
+        "HASH": "a#b",
+        "EMPTY": "",
+    }
+    bitwarden.write_env(env_file, values)
+    assert dotenv_values(env_file) == values
+    assert env_file.stat().st_mode & 0o777 == 0o600
+
+
+def test_write_env_updates_in_place(tmp_path):
+    from dotenv import dotenv_values
+
+    env_file = tmp_path / "default.env"
+    env_file.write_text("# header\nexport A=1\nB=2\nA=duplicate\nC=3")
+    env_file.chmod(0o640)
+    bitwarden.write_env(env_file, {"A": "new", "D": "4"})
+
+    assert env_file.read_text() == "# header\nexport A='new'\nB=2\nC=3\nD='4'\n"
+    assert dotenv_values(env_file) == {"A": "new", "B": "2", "C": "3", "D": "4"}
+    assert env_file.stat().st_mode & 0o777 == 0o640
+
+
+def test_write_env_keeps_concurrent_updates(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    from dotenv import dotenv_values
+
+    env_file = tmp_path / "default.env"
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: bitwarden.write_env(env_file, {f"KEY_{i}": str(i)}), range(32)))
+    assert dotenv_values(env_file) == {f"KEY_{i}": str(i) for i in range(32)}
+
+
+# list-vault
+
+@pytest.mark.parametrize("fields, secret", [
+    (["id", "name", "login.username", "login.uris"], []),
+    (["login.password", "notes"], ["login.password", "notes"]),
+    (["card.number", "fields.value"], ["card.number", "fields.value"]),
+    (["name", "login"], ["login"]),
+    (["passwordHistory"], ["passwordHistory"]),
+    (["passwordHistory.password"], ["passwordHistory.password"]),
+    (["login.fido2Credentials"], ["login.fido2Credentials"]),
+])
+def test_secret_fields(fields, secret):
+    assert bitwarden.secret_fields(fields) == secret
+
+
+@pytest.mark.parametrize("fields", ["name,login", "name,passwordHistory"])
+def test_list_vault_refuses_parents_of_secret_fields(fake_serve, fields):
+    from typer.testing import CliRunner
+
+    fake_serve()
+    result = CliRunner().invoke(bitwarden.app, ["list-vault", "--fields", fields])
+    assert result.exit_code == 1
+    assert "--show-secrets" in result.output
+    assert "ghp_fake_token" not in result.output
+
+
+def test_list_vault_projects_with_show_secrets(fake_serve):
+    import json
+    from typer.testing import CliRunner
+
+    fake_serve()
+    result = CliRunner().invoke(bitwarden.app, [
+        "list-vault", "--fields", "name,login", "--type", "login", "--folder", "ci",
+        "--show-secrets",
+    ])
+    assert result.exit_code == 0
+    rows = [json.loads(line) for line in result.stdout.splitlines()]
+    assert rows == [
+        {"name": "github-token", "login": {"username": "cbwinslow", "password": "ghp_fake_token"}},
+    ]
@@ -0,0 +1,161 @@
+"""
+cloudcurio_lib.dns reconciliation
+Plans from reconcile(), their RecordChanges, and zone snapshots parsed
+from Cloudflare zone file exports and dns_records API dumps
+"""
+
+import json
+import random
+
+import pytest
+
+from cloudcurio_lib.dns import DnsRecord, in_scope, load_snapshot, parse_zone_file, reconcile
+
+ZONE = "cloudcurio.cc"
+
+
+def a(host, ip, record_id=None, **kwargs):
+    return DnsRecord(f"{host}.internal.{ZONE}", 'A', ip, 3600, record_id=record_id, **kwargs)
+
+
+def apply(plan, actual):
+    """The zone after a plan, as keys"""
+    keys = [record.key for record in actual]
+    for record in plan.deletes:
+        keys.remove(record.key)
+    for old, new in plan.updates:
+        keys[keys.index(old.key)] = new.key
+    return sorted(keys + [record.key for record in plan.creates])
+
+
+def test_identical_zone_needs_nothing():
+    records = [a("r720", "172.28.82.205", "r1"), a("desk", "172.28.82.10", "r2")]
+    plan = reconcile(records, records)
+    assert plan.empty
+    assert plan.unchanged == 2
+    assert plan.summary().startswith("0 to create, 0 to update, 0 to delete, 2 unchanged")
+
+
+def test_moved_address_is_one_update_not_delete_and_create():
+    plan = reconcile([a("r720", "172.28.82.206")], [a("r720", "172.28.82.205", "r1")])
+    assert (plan.creates, plan.deletes) == ([], [])
+    assert [(old.content, new.content) for old, new in plan.updates] == [
+        ("172.28.82.205", "172.28.82.206"),
+    ]
+
+
+def test_ttl_comment_and_proxied_drift():
+    current = a("r720", "172.28.82.205", "r1", comment="old")
+    assert len(reconcile([a("r720", "172.28.82.205", comment="new")], [current]).updates) == 1
+    assert reconcile([a("r720", "172.28.82.205", comment="new")], [current], comments=False).empty
+    assert reconcile([a("r720", "172.28.82.205")], [current]).empty
+
+    proxied = DnsRecord(f"api.{ZONE}", 'A', "192.0.2.1", 1, proxied=True)
+    assert reconcile([proxied], [proxied.replace(ttl=300)]).empty
+    assert len(reconcile([proxied], [proxied.replace(proxied=False)]).updates) == 1
+
+
+def test_only_managed_names_are_deleted():
+    actual = [a("gone", "172.28.82.9", "r1"),
+              DnsRecord(f"www.{ZONE}", 'CNAME', ZONE, record_id="r2")]
+    plan = reconcile([], actual, managed=in_scope(f"internal.{ZONE}"))
+    assert [record.name for record in plan.deletes] == [f"gone.internal.{ZONE}"]
+    assert len(reconcile([], actual).deletes) == 2
+
+
+def test_duplicates_of_a_desired_record_are_deleted():
+    actual = [a("r720", "172.28.82.205", "r1"), a("r720", "172.28.82.205", "r2")]
+    plan = reconcile([a("r720", "172.28.82.205")], actual)
+    assert [record.record_id for record in plan.deletes] == ["r2"]
+    assert plan.unchanged == 1
+
+
+def test_plan_turns_a_random_zone_into_the_desired_one():
+    rng = random.Random(7)
+    hosts = [f"node{i}" for i in range(60)]
+    desired = [a(rng.choice(hosts), f"172.28.1.{rng.randrange(1, 40)}") for _ in range(80)]
+    actual = [a(rng.choice(hosts), f"172.28.1.{rng.randrange(1, 40)}", f"r{i}") for i in range(80)]
+    actual += actual[:5]
+    plan = reconcile(desired, actual)
+    assert apply(plan, actual) == sorted({record.key for record in desired})
+    assert reconcile(desired, [DnsRecord(*key, ttl=3600) for key in apply(plan, actual)]).empty
+
+
+def test_changes_need_record_ids():
+    actual = [a("old", "172.28.82.1", "r1"), a("r720", "172.28.82.205", "r2")]
+    plan = reconcile([a("r720", "172.28.82.206"), a("new", "172.28.82.2")], actual)
+    assert [(c.action, c.name, c.record_id) for c in plan.changes()] == [
+        ('delete', f"old.internal.{ZONE}", "r1"),
+        ('update', f"r720.internal.{ZONE}", "r2"),
+        ('create', f"new.internal.{ZONE}", None),
+    ]
+    with pytest.raises(ValueError, match="no record ids"):
+        reconcile([], [a("old", "172.28.82.1")]).changes()
+
+
+ZONE_FILE = """\
+;; Exported from Cloudflare
+$ORIGIN cloudcurio.cc.
+$TTL 3600
+@       IN SOA  ns1.cloudflare.com. dns.cloudflare.com. (
+                2043145221 10000 2400 604800 3600 )
+@       1   IN A      192.0.2.1 ; cf_tags=cf-proxied:true
+www         IN CNAME  CloudCurio.CC.
+r720.internal 300 IN A 172.28.82.205
+            IN AAAA   fd00::205
+txt         IN TXT    "v=spf1 include:_spf.example.com; -all" "more"
+$ORIGIN internal.cloudcurio.cc.
+desk        IN A      172.28.82.10
+odd         IN HINFO  "x86" "linux"
+"""
+
+
+def test_parse_zone_file():
+    records = {(r.name, r.type): r for r in parse_zone_file(ZONE_FILE, ZONE)}
+    assert set(records) == {
+        (ZONE, 'A'), (f"www.{ZONE}", 'CNAME'), (f"r720.internal.{ZONE}", 'A'),
+        (f"r720.internal.{ZONE}", 'AAAA'), (f"txt.{ZONE}", 'TXT'), (f"desk.internal.{ZONE}", 'A'),
+    }
+    apex = records[(ZONE, 'A')]
+    assert (apex.ttl, apex.proxied) == (1, True)
+    assert records[(f"www.{ZONE}", 'CNAME')].content == ZONE
+    assert records[(f"r720.internal.{ZONE}", 'A')].ttl == 300
+    assert records[(f"r720.internal.{ZONE}", 'AAAA')].ttl == 3600
+    assert records[(f"txt.{ZONE}", 'TXT')].content == "v=spf1 include:_spf.example.com; -allmore"
+
+
+def test_parenthesized_records_take_the_owner_from_their_first_line():
+    zone = """\
+$ORIGIN cloudcurio.cc.
+www         IN A      192.0.2.1
+_dmarc  300 IN TXT    ( "v=DMARC1; p=reject;"
+                        "rua=mailto:dmarc@cloudcurio.cc" )
+            IN TXT    "second"
+api         IN A      ( 192.0.2.2 ) ; cf_tags=cf-proxied:true
+    IN AAAA (
+        2001:db8::2 ) ; cf_tags=cf-proxied:true
+"""
+    records = [(r.name, r.type, r.content, r.ttl, r.proxied) for r in parse_zone_file(zone, ZONE)]
+    assert records == [
+        (f"www.{ZONE}", 'A', "192.0.2.1", 1, False),
+        (f"_dmarc.{ZONE}", 'TXT', "v=DMARC1; p=reject;rua=mailto:dmarc@cloudcurio.cc", 300, False),
+        (f"_dmarc.{ZONE}", 'TXT', "second", 1, False),
+        (f"api.{ZONE}", 'A', "192.0.2.2", 1, True),
+        (f"api.{ZONE}", 'AAAA', "2001:db8::2", 1, True),
+    ]
+
+
+def test_load_snapshot_reads_api_dumps(tmp_path):
+    dump = tmp_path / "records.json"
+    dump.write_text(json.dumps({'result': [
+        {'id': "r1", 'name': f"r720.internal.{ZONE}", 'type': 'A', 'content': "172.28.82.205",
+         'ttl': 3600},
+        {'id': "r2", 'name': f"api.{ZONE}", 'type': 'A', 'content': "192.0.2.1", 'proxied': True,
+         'ttl': 1},
+    ]}))
+    records = load_snapshot(dump, ZONE)
+    assert [(r.record_id, r.proxied) for r in records] == [("r1", False), ("r2", True)]
+
+    export = tmp_path / "zone.txt"
+    export.write_text(ZONE_FILE)
+    assert len(load_snapshot(export, ZONE)) == 6
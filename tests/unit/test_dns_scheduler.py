@@ -0,0 +1,167 @@
+"""
+cloudcurio_lib.dns.TokenBucket and DnsChangeScheduler
+Pacing on a virtual clock, 429 handling and batch bisection, against a
+scripted client and against pulumi/benchmarks/cloudflare_fake_api.py
+"""
+
+import collections
+
+import pytest
+
+from benchmarks.cloudflare_fake_api import FakeZone, base_url, serve
+from cloudcurio_lib.dns import (
+    CloudflareDnsClient, CloudflareError, DnsChangeScheduler, RateLimited, RecordChange,
+    TokenBucket,
+)
+
+
+class Clock:
+    """Virtual time; sleep() advances it instead of blocking"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def bucket(clock, **kwargs):
+    return TokenBucket.for_window(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def creates(count):
+    return [RecordChange('create', f"node{i:03d}.zt", 'A', f"172.28.0.{i + 1}")
+            for i in range(count)]
+
+
+# TokenBucket
+
+def test_bucket_admits_the_burst_then_paces_at_its_rate(clock):
+    paced = TokenBucket(rate=2, capacity=5, clock=clock, sleep=clock.sleep)
+    assert [paced.acquire() for _ in range(5)] == [0.0] * 5
+    assert paced.acquire() == pytest.approx(0.5)
+    assert paced.acquire() == pytest.approx(0.5)
+    assert clock.now == pytest.approx(1.0)
+
+
+def test_bucket_never_exceeds_its_rolling_window(clock):
+    paced = bucket(clock, requests=120, seconds=10)
+    times = []
+    for _ in range(600):
+        paced.acquire()
+        times.append(clock.now)
+
+    window = collections.deque()
+    for at in times:
+        window.append(at)
+        while window[0] <= at - 10:
+            window.popleft()
+        assert len(window) <= 120
+
+
+def test_pause_blocks_until_it_ends(clock):
+    paced = TokenBucket(rate=10, capacity=10, clock=clock, sleep=clock.sleep)
+    paced.pause(3)
+    assert paced.acquire() == pytest.approx(3)
+    paced.pause(1)
+    paced.pause(0.5)
+    assert paced.acquire() == pytest.approx(1)
+
+
+# DnsChangeScheduler
+
+class ScriptedClient:
+    """Records every batch; rejects any batch holding a name in `bad`"""
+
+    def __init__(self, bad=(), limited=0, retry_after=2.0):
+        self.bad = set(bad)
+        self.limited = limited
+        self.retry_after = retry_after
+        self.sent = []
+
+    def batch(self, changes):
+        self.sent.append([change.name for change in changes])
+        if self.limited:
+            self.limited -= 1
+            raise RateLimited(self.retry_after)
+        rejected = self.bad.intersection(change.name for change in changes)
+        if rejected:
+            raise CloudflareError(f"81058: invalid {sorted(rejected)}", 400)
+        return {}
+
+    apply = None
+
+
+def test_changes_are_ordered_and_batched(clock):
+    client = ScriptedClient()
+    scheduler = DnsChangeScheduler(client, bucket(clock), batch_size=3)
+    mixed = [
+        RecordChange('create', 'a.zt', 'A', '172.28.0.1'),
+        RecordChange('delete', 'b.zt', 'A', '172.28.0.2', record_id='r2'),
+        RecordChange('update', 'c.zt', 'A', '172.28.0.3', record_id='r3'),
+        RecordChange('create', 'd.zt', 'A', '172.28.0.4'),
+    ]
+    report = scheduler.apply(mixed)
+    assert client.sent == [['b.zt', 'c.zt', 'a.zt'], ['d.zt']]
+    assert (report.applied, report.requests, report.failed) == (4, 2, [])
+
+
+def test_a_rejected_batch_is_bisected_down_to_the_bad_change(clock):
+    client = ScriptedClient(bad={'node005.zt'})
+    report = DnsChangeScheduler(client, bucket(clock), batch_size=8).apply(creates(16))
+
+    assert report.applied == 15
+    assert [change.name for change, _ in report.failed] == ['node005.zt']
+    assert 'invalid' in report.failed[0][1]
+    # Halves of 4, 2 and 1 around the bad change; the good halves go through whole
+    assert [len(batch) for batch in client.sent] == [8, 4, 4, 2, 1, 1, 2, 8]
+    assert client.sent[5] == ['node005.zt']
+
+
+def test_rate_limits_halve_the_rate_and_honour_retry_after(clock):
+    paced = bucket(clock, requests=120, seconds=10)
+    ceiling = paced.rate
+    client = ScriptedClient(limited=2, retry_after=4.0)
+    scheduler = DnsChangeScheduler(client, paced, batch_size=1, recover_after=2)
+
+    report = scheduler.apply(creates(1))
+    assert (report.applied, report.rate_limited, report.retries) == (1, 2, 2)
+    assert paced.rate == pytest.approx(ceiling / 4)
+    assert report.waited >= 8.0
+
+    scheduler.apply(creates(4))
+    assert paced.rate == pytest.approx(ceiling * 3 / 4)
+
+
+def test_gives_up_after_max_attempts(clock):
+    client = ScriptedClient(limited=10, retry_after=1.0)
+    report = DnsChangeScheduler(client, bucket(clock), max_attempts=3).apply(creates(2))
+    assert report.applied == 0
+    assert len(report.failed) == 2
+    assert "Gave up after 3 attempts" in report.failed[0][1]
+
+
+def test_paced_run_against_the_fake_api_sees_no_429s():
+    zone = FakeZone(limit=40, window=1.0)
+    server = serve(zone)
+    client = CloudflareDnsClient("zone", "token", base_url=base_url(server))
+    try:
+        paced = TokenBucket.for_window(40, 1.0)
+        report = DnsChangeScheduler(client, paced, use_batch=False).apply(creates(60))
+        # Identical records are rejected; bisection blames each one alone
+        duplicates = DnsChangeScheduler(client, paced).apply(creates(2))
+    finally:
+        client.close()
+        server.shutdown()
+    assert (report.applied, report.rate_limited, len(zone.records)) == (60, 0, 60)
+    assert zone.peak_window <= 40
+    assert duplicates.applied == 0
+    assert [change.name for change, _ in duplicates.failed] == ['node000.zt', 'node001.zt']
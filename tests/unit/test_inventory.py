@@ -0,0 +1,195 @@
+"""
+cloudcurio_lib.inventory
+Merging and indexing the Ansible inventory, DNS-name ansible_hosts, and
+the on-disk cache's invalidation
+"""
+
+import os
+
+import pytest
+
+from cloudcurio_lib import inventory
+from cloudcurio_lib.inventory import Host, Inventory, load_inventory
+
+HOSTS_INI = """\
+[servers]
+r720 ansible_host=172.28.82.205 ansible_user=cbwinslow
+db ansible_host=db.example.com  # resolved by DNS, not an address
+
+[desktops]
+amd ansible_host=172.28.176.115
+
+[workstations:children]
+desktops
+
+[all:vars]
+ansible_python_interpreter=/usr/bin/python3
+"""
+
+PRODUCTION_INI = """\
+[web]
+r720
+edge ansible_host=192.168.4.3
+
+[all:vars]
+environment=production
+"""
+
+ZEROTIER_YML = """\
+zerotier_network_subnet: "172.28.0.0/16"
+internal_domain: "zt.example.cc"
+zerotier_hostname_map:
+  laptop: 172.28.196.74
+zerotier_node_meta:
+  r720:
+    description: Dell R720
+    tags:
+      type: server
+  laptop:
+    tags:
+      type: laptop
+"""
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    """A repository root with two inventories and the ZeroTier vars, and a private cache"""
+    (tmp_path / "inventory" / "production").mkdir(parents=True)
+    (tmp_path / "group_vars").mkdir()
+    (tmp_path / "inventory" / "hosts.ini").write_text(HOSTS_INI)
+    (tmp_path / "inventory" / "production" / "hosts.ini").write_text(PRODUCTION_INI)
+    (tmp_path / "group_vars" / "zerotier_nodes.yml").write_text(ZEROTIER_YML)
+    monkeypatch.setattr(inventory, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(inventory, "_loaded", {})
+    return tmp_path
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """Counts real parses, as opposed to loads from either cache"""
+    count = [0]
+    build = inventory.build_inventory
+
+    def counting(sources):
+        count[0] += 1
+        return build(sources)
+
+    monkeypatch.setattr(inventory, "build_inventory", counting)
+    return count
+
+
+def hostnames(hosts):
+    return sorted(host.hostname for host in hosts)
+
+
+# Merging and indexing
+
+def test_hosts_merge_across_inventories(root):
+    loaded = load_inventory(root, use_cache=False)
+    r720 = loaded.host("r720")
+    assert r720.groups == ["servers", "web"]
+    assert r720.environments == ["production"]
+    assert r720.vars == {'ansible_host': "172.28.82.205", 'ansible_user': "cbwinslow"}
+    assert r720.description == "Dell R720"
+    assert loaded.internal_domain == "zt.example.cc"
+
+
+def test_groups_include_child_groups(root):
+    loaded = load_inventory(root, use_cache=False)
+    assert hostnames(loaded.group("workstations")) == ["amd"]
+    assert loaded.host("amd").groups == ["desktops", "workstations"]
+    assert loaded.group("nope") == []
+
+
+def test_zerotier_addresses_come_from_the_map_or_an_ansible_host_in_the_subnet(root):
+    loaded = load_inventory(root, use_cache=False)
+    assert loaded.zerotier_map() == {
+        'amd': "172.28.176.115", 'laptop': "172.28.196.74", 'r720': "172.28.82.205",
+    }
+    assert hostnames(loaded.with_tag("type", "laptop")) == ["laptop"]
+    assert loaded.host("edge").zerotier_ip is None
+
+
+@pytest.mark.parametrize("cidr", ["172.28.82.0/24", "172.28.0.0/16", "172.28.82.200/29",
+                                  "192.168.0.0/16", "10.0.0.0/8"])
+def test_subnet_queries_match_a_scan(root, cidr):
+    import ipaddress
+
+    loaded = load_inventory(root, use_cache=False)
+    network = ipaddress.ip_network(cidr, strict=False)
+    expected = [host.hostname for host in loaded
+                if any(ipaddress.ip_address(address) in network
+                       for address in (host.ansible_host, host.zerotier_ip)
+                       if address and address[0].isdigit())]
+    assert hostnames(loaded.in_subnet(cidr)) == sorted(expected)
+
+
+def test_dns_name_ansible_host_is_kept_but_not_indexed(root):
+    loaded = load_inventory(root, use_cache=False)
+    db = loaded.host("db")
+    assert db.ansible_host == "db.example.com"
+    assert db.zerotier_ip is None
+    assert db not in loaded.in_subnet("172.28.0.0/28")
+    assert all(db not in hosts for hosts in loaded.by_subnet.values())
+
+
+def test_four_label_dns_name_is_not_mistaken_for_an_address():
+    hosts = [Host("a", ansible_host="web.prod.example.com"), Host("b", ansible_host="10.1.2.3")]
+    indexed = Inventory(hosts)
+    assert sorted(indexed.by_subnet) == ["10.1.0.0/16", "10.1.2.0/24"]
+
+
+def test_round_trips_through_to_dict(root):
+    loaded = load_inventory(root, use_cache=False)
+    copy = Inventory.from_dict(loaded.to_dict())
+    assert copy.to_dict() == loaded.to_dict()
+    assert copy.by_subnet.keys() == loaded.by_subnet.keys()
+
+
+# Caching
+
+def test_loaded_once_per_process(root, builds):
+    first = load_inventory(root)
+    assert load_inventory(root) is first
+    assert load_inventory(root, use_cache=False) is not first
+    assert builds[0] == 2
+
+
+def test_disk_cache_is_reused_by_the_next_process(root, builds, monkeypatch):
+    first = load_inventory(root)
+    monkeypatch.setattr(inventory, "_loaded", {})
+    second = load_inventory(root)
+    assert builds[0] == 1
+    assert second is not first and second.to_dict() == first.to_dict()
+
+
+def test_touched_but_unchanged_sources_compare_by_content(root, builds, monkeypatch):
+    load_inventory(root)
+    hosts_ini = root / "inventory" / "hosts.ini"
+    stat = hosts_ini.stat()
+    os.utime(hosts_ini, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    monkeypatch.setattr(inventory, "_loaded", {})
+    load_inventory(root)
+    assert builds[0] == 1
+
+    # The new mtime was written back, so the next load skips hashing
+    monkeypatch.setattr(inventory, "_content_hash", lambda sources: pytest.fail("hashed"))
+    monkeypatch.setattr(inventory, "_loaded", {})
+    load_inventory(root)
+
+
+def test_edited_sources_are_parsed_again(root, builds, monkeypatch):
+    load_inventory(root)
+    with open(root / "inventory" / "hosts.ini", "a") as hosts_ini:
+        hosts_ini.write("\n[servers]\nnew ansible_host=172.28.9.9\n")
+    monkeypatch.setattr(inventory, "_loaded", {})
+    assert load_inventory(root).host("new").zerotier_ip == "172.28.9.9"
+    assert builds[0] == 2
+
+
+def test_cache_from_another_version_is_ignored(root, builds, monkeypatch):
+    load_inventory(root)
+    monkeypatch.setattr(inventory, "CACHE_VERSION", inventory.CACHE_VERSION + 1)
+    monkeypatch.setattr(inventory, "_loaded", {})
+    load_inventory(root)
+    assert builds[0] == 2
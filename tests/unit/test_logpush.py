@@ -0,0 +1,242 @@
+"""
+cloudcurio_lib.logpush
+Column batches from Logpush exports, the regex scan and its JSON
+fallback, and LogpushStats aggregation, merging and heavy-hitter bounds
+"""
+
+import gzip
+import json
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from cloudcurio_lib.logpush import (
+    COLUMNS, LogpushError, LogpushStats, _decode, _HeavyHitters, _scan, analyze, read_batches,
+)
+
+ZONE = "cloudcurio.cc"
+START = 1_700_000_000_000_000_000
+
+
+def request(index=0, **fields):
+    """One http_requests line with the LogpushJob's fields; a field set to ... is left out"""
+    line = {
+        'ClientRequestHost': f"grafana.{ZONE}",
+        'ClientIP': f"192.0.2.{index % 250}",
+        'ClientRequestMethod': "GET",
+        'ClientRequestURI': f"/d/{index}",
+        'EdgeResponseStatus': 200,
+        'EdgeResponseBytes': 1000 + index,
+        'EdgeStartTimestamp': START + index,
+        'EdgeEndTimestamp': START + index + 5_000_000,
+        'RayID': f"{index:016x}",
+    }
+    line.update(fields)
+    return {key: value for key, value in line.items() if value is not ...}
+
+
+def block(lines):
+    return "".join(json.dumps(line) + "\n" for line in lines).encode()
+
+
+def export(path, lines):
+    """An export file, gzipped when the name ends in .gz"""
+    path.write_bytes(gzip.compress(block(lines)) if path.suffix == '.gz' else block(lines))
+    return path
+
+
+def concat(batches):
+    batches = list(batches)
+    return {column: np.concatenate([batch[column] for batch in batches]) for column in batches[0]}
+
+
+def assert_batches_equal(first, second):
+    assert first.keys() == second.keys()
+    for column in first:
+        assert first[column].tolist() == second[column].tolist(), column
+
+
+# Scanning and its fallback
+
+def test_scan_matches_a_full_decode():
+    lines = [request(i) for i in range(20)]
+    lines[3]['ClientRequestURI'] = '/search?q="quoted"&x=é'
+    lines[4]['ClientRequestURI'] = "/back\\slash"
+    scanned = _scan(block(lines), list(COLUMNS))
+    assert scanned is not None
+    assert_batches_equal(scanned, _decode(block(lines), list(COLUMNS)))
+    assert scanned['uri'][3].decode() == '/search?q="quoted"&x=é'
+
+
+@pytest.mark.parametrize("change", [
+    {'ClientIP': None},
+    {'ClientIP': ...},
+    {'ClientRequestHost': None},
+    {'EdgeResponseBytes': ...},
+])
+def test_null_or_missing_fields_fall_back_to_decoding(tmp_path, change):
+    lines = [request(0), request(1, **change), request(2)]
+    assert _scan(block(lines), ('host', 'client_ip', 'bytes')) is None
+    (batch,) = read_batches([export(tmp_path / "a.ndjson", lines)])
+    assert_batches_equal(batch, _decode(block(lines), batch.keys()))
+    field = next(iter(change))
+    column = next(name for name, (logpush, _) in COLUMNS.items() if logpush == field)
+    assert batch[column][1] in (b"", 0)
+
+
+def test_null_numbers_read_as_zero_without_decoding():
+    lines = [request(0), request(1, EdgeResponseBytes=None, EdgeStartTimestamp=None)]
+    scanned = _scan(block(lines), ('bytes', 'start'))
+    assert scanned['bytes'].tolist() == [1000, 0]
+    assert scanned['start'].tolist() == [START, 0]
+
+
+def test_fields_the_job_does_not_export_are_empty():
+    lines = [request(i, RayID=..., EdgeResponseStatus=...) for i in range(3)]
+    scanned = _scan(block(lines), ('ray_id', 'status'))
+    assert scanned['ray_id'].tolist() == [b""] * 3
+    assert scanned['status'].tolist() == [0] * 3
+
+
+def test_a_field_repeated_in_a_nested_value_falls_back():
+    lines = [request(0), request(1, Extra={'ClientIP': "198.51.100.1"})]
+    assert _scan(block(lines), ('client_ip',)) is None
+    assert _decode(block(lines), ('client_ip',))['client_ip'].tolist() == [
+        b"192.0.2.0", b"192.0.2.1"]
+
+
+# Timestamps
+
+@pytest.mark.parametrize("start, end, expected", [
+    (START, START + 5_000_000, (START, START + 5_000_000)),
+    (1_700_000_000, 1_700_000_002, (START, START + 2 * 10**9)),
+    ("2023-11-14T22:13:20Z", "2023-11-14T22:13:20.25Z", (START, START + 250_000_000)),
+])
+def test_timestamp_formats(tmp_path, start, end, expected):
+    lines = [request(0, EdgeStartTimestamp=start, EdgeEndTimestamp=end),
+             request(1, EdgeStartTimestamp=..., EdgeEndTimestamp=...)]
+    (batch,) = read_batches([export(tmp_path / "a.ndjson", lines)], columns=('start', 'end'))
+    assert (batch['start'][0], batch['end'][0]) == expected
+    assert (batch['start'][1], batch['end'][1]) == (0, 0)
+
+
+# Batching
+
+@pytest.mark.parametrize("batch_bytes", [1, 97, 300, 1 << 20])
+def test_batches_hold_whole_lines_whatever_the_size(tmp_path, batch_bytes):
+    lines = [request(i, ClientRequestHost=f"Host{i % 3}.{ZONE}") for i in range(25)]
+    path = export(tmp_path / "a.ndjson.gz", lines)
+    batches = list(read_batches([path], columns=list(COLUMNS), batch_bytes=batch_bytes))
+    if batch_bytes < 300:
+        assert len(batches) > 1
+    whole = concat(batches)
+    assert whole['ray_id'].tolist() == [line['RayID'].encode() for line in lines]
+    assert whole['host'].tolist() == [f"host{i % 3}.{ZONE}".encode() for i in range(25)]
+
+
+def test_last_line_without_a_newline_and_blank_lines(tmp_path):
+    path = tmp_path / "a.ndjson"
+    path.write_bytes(block([request(0)]) + b"\n  \n" + json.dumps(request(1)).encode())
+    batches = list(read_batches([path], batch_bytes=64))
+    assert concat(batches)['bytes'].tolist() == [1000, 1001]
+
+
+def test_bad_input_names_the_file(tmp_path):
+    path = tmp_path / "a.ndjson"
+    path.write_bytes(block([request(0)]) + b'{"ClientIP": "192.0.2.1"\n')
+    with pytest.raises(LogpushError, match="a.ndjson"):
+        list(read_batches([path]))
+    with pytest.raises(LogpushError, match="Unknown columns: colo, tls"):
+        list(read_batches([path], columns=('host', 'tls', 'colo')))
+
+
+# Aggregation
+
+def test_stats_totals_statuses_and_latency(tmp_path):
+    lines = [request(i, ClientRequestHost=f"grafana.{ZONE}" if i % 4 else f"loki.{ZONE}",
+                     EdgeResponseStatus=404 if i % 10 == 0 else 200,
+                     EdgeEndTimestamp=START + i + (i + 1) * 1_000_000)
+             for i in range(100)]
+    stats = analyze([export(tmp_path / "a.ndjson.gz", lines)])
+    assert stats.requests == 100
+    assert stats.bytes == sum(line['EdgeResponseBytes'] for line in lines)
+    assert list(stats.per_host()) == [f"grafana.{ZONE}", f"loki.{ZONE}"]
+    assert stats.per_host()[f"loki.{ZONE}"] == (25, sum(1000 + i for i in range(0, 100, 4)))
+    assert stats.status_histogram() == {200: 90, 404: 10}
+    percentiles = stats.latency_percentiles((50, 99))
+    assert percentiles[50] == pytest.approx(50, rel=0.01)
+    assert percentiles[99] == pytest.approx(99, rel=0.01)
+    assert LogpushStats().latency_percentiles() == {}
+
+
+def test_merge_matches_one_pass(tmp_path):
+    rng = random.Random(3)
+    files = [export(tmp_path / f"{n}.ndjson.gz",
+                    [request(rng.randrange(1000), EdgeResponseStatus=rng.choice([200, 301, 503]))
+                     for _ in range(300)])
+             for n in range(3)]
+    single = analyze(files, talkers=10_000)
+    merged = LogpushStats(talkers=10_000)
+    for path in files:
+        merged.merge(analyze([path], talkers=10_000))
+    assert merged.to_dict(talkers=50) == single.to_dict(talkers=50)
+    assert merged.latency.tolist() == single.latency.tolist()
+    assert analyze(files, talkers=10_000, workers=2).to_dict(50) == single.to_dict(50)
+
+
+def test_talkers_by_bytes():
+    stats = LogpushStats(talkers_by="bytes")
+    stats.add(_decode(block([request(0), request(0), request(1, EdgeResponseBytes=5000)]),
+                      ('host', 'client_ip', 'status', 'bytes', 'start', 'end')))
+    assert stats.top_talkers(2) == [("192.0.2.1", 5000), ("192.0.2.0", 2000)]
+    with pytest.raises(ValueError, match="talkers_by must be 'requests' or 'bytes', got 'ips'"):
+        LogpushStats(talkers_by="ips")
+
+
+# Misra-Gries bounds
+
+def zipf_stream(rng, keys, length):
+    weights = [1 / (rank + 1) for rank in range(keys)]
+    return [f"10.0.{rank // 256}.{rank % 256}".encode()
+            for rank in rng.choices(range(keys), weights, k=length)]
+
+
+def assert_within_bounds(summary, truth, total):
+    counted = dict(zip(summary.keys.tolist(), summary.counts.tolist()))
+    assert len(counted) <= summary.capacity
+    assert summary.error <= total / (summary.capacity + 1)
+    for key, count in truth.items():
+        assert count - summary.error <= counted.get(key, 0) <= count, key
+        if count > summary.error:
+            assert key in counted
+
+
+@pytest.mark.parametrize("capacity", [1, 8, 64])
+def test_heavy_hitter_counts_are_low_by_at_most_the_error(capacity):
+    rng = random.Random(capacity)
+    stream = zipf_stream(rng, 500, 20_000)
+    summary = _HeavyHitters(capacity)
+    for start in range(0, len(stream), 1500):
+        keys, counts = np.unique(np.array(stream[start:start + 1500], dtype=bytes),
+                                 return_counts=True)
+        summary.add(keys, counts.astype(np.int64))
+    assert_within_bounds(summary, Counter(stream), len(stream))
+    assert summary.error > 0
+
+
+def test_merged_heavy_hitters_keep_the_bound():
+    rng = random.Random(11)
+    streams = [zipf_stream(rng, 300, 5000) for _ in range(4)]
+    stats = LogpushStats(talkers=16)
+    for stream in streams:
+        part = LogpushStats(talkers=16)
+        rows = len(stream)
+        part.add({'host': np.full(rows, b"h"), 'client_ip': np.array(stream, dtype=bytes),
+                  'status': np.full(rows, 200), 'bytes': np.ones(rows, dtype=np.int64),
+                  'start': np.zeros(rows, dtype=np.int64), 'end': np.zeros(rows, dtype=np.int64)})
+        stats.merge(part)
+    everything = [key for stream in streams for key in stream]
+    assert_within_bounds(stats._talkers, Counter(everything), len(everything))
+    assert stats.talker_error == stats._talkers.error
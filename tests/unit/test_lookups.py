@@ -0,0 +1,167 @@
+"""
+cloudcurio_lib.lookups
+Hits, expiry and refreshes of the on-disk lookup cache, keys per provider
+account, and the bypass under mocks
+"""
+
+import json
+
+import pulumi
+import pytest
+
+from benchmarks.harness import run_mocked
+from cloudcurio_lib import lookups
+from cloudcurio_lib.lookups import LookupCache, cached_invoke
+
+
+class Zone:
+    """Stands in for a provider result type: every property is a constructor argument"""
+
+    def __init__(self, id, name, name_servers):
+        self.id = id
+        self.name = name
+        self.name_servers = name_servers
+
+
+class FakeProvider:
+    """A get_zone-like data source that counts its calls"""
+
+    def __init__(self, module="pulumi_cloudflare.get_zone"):
+        self.calls = 0
+        self.__module__ = module
+        self.__qualname__ = "get_zone"
+
+    def __call__(self, name):
+        self.calls += 1
+        return Zone(id=f"zone-{self.calls}", name=name, name_servers=["a.ns", "b.ns"])
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LookupCache(tmp_path / "lookups", ttl=900)
+
+
+@pytest.fixture
+def get_zone():
+    return FakeProvider()
+
+
+@pytest.fixture
+def provider_env(monkeypatch):
+    """No Cloudflare credentials or config from the machine running the tests"""
+    for key in list(lookups.os.environ):
+        if key.startswith(("CLOUDFLARE_", "PULUMI_CONFIG")):
+            monkeypatch.delenv(key)
+    saved = pulumi.runtime.config.CONFIG.get()
+    pulumi.runtime.set_all_config({})
+    yield monkeypatch
+    pulumi.runtime.set_all_config(saved)
+
+
+def stored_entry(cache):
+    (path,) = cache.directory.glob("*/*.json")
+    return path
+
+
+# Hits, expiry and refresh
+
+def test_second_call_is_served_from_disk(cache, get_zone, provider_env):
+    first = cache.call(get_zone, name="cloudcurio.cc")
+    second = LookupCache(cache.directory).call(get_zone, name="cloudcurio.cc")
+    assert get_zone.calls == 1
+    assert type(second) is Zone and vars(second) == vars(first)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_arguments_are_part_of_the_key(cache, get_zone, provider_env):
+    cache.call(get_zone, name="cloudcurio.cc")
+    cache.call(get_zone, name="example.com")
+    assert get_zone.calls == 2
+
+
+def test_entries_older_than_the_ttl_are_fetched_again(cache, get_zone, provider_env):
+    cache.call(get_zone, name="cloudcurio.cc")
+    path = stored_entry(cache)
+    entry = json.loads(path.read_text())
+    entry['stored'] -= 1000
+    path.write_text(json.dumps(entry))
+
+    assert cache.call(get_zone, ttl=2000, name="cloudcurio.cc").id == "zone-1"
+    assert cache.call(get_zone, name="cloudcurio.cc").id == "zone-2"
+    assert get_zone.calls == 2
+
+
+def test_refresh_calls_the_provider_and_stores_the_result(cache, get_zone, provider_env):
+    cache.call(get_zone, name="cloudcurio.cc")
+    assert cache.call(get_zone, refresh=True, name="cloudcurio.cc").id == "zone-2"
+    assert cache.call(get_zone, name="cloudcurio.cc").id == "zone-2"
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_unreadable_entries_are_misses(cache, get_zone, provider_env):
+    cache.call(get_zone, name="cloudcurio.cc")
+    stored_entry(cache).write_text("{not json")
+    assert cache.call(get_zone, name="cloudcurio.cc").id == "zone-2"
+
+
+def test_outputs_are_refused(cache):
+    def get_output(name):
+        return pulumi.Output.from_input(name)
+
+    with pytest.raises(TypeError, match="returned an Output; cache the plain invoke instead"):
+        cache.call(get_output, name="cloudcurio.cc")
+    assert cache.clear() == 0
+
+
+# Provider identity
+
+def test_another_api_token_misses(cache, get_zone, provider_env):
+    provider_env.setenv("CLOUDFLARE_API_TOKEN", "token-one")
+    cache.call(get_zone, name="cloudcurio.cc")
+    provider_env.setenv("CLOUDFLARE_API_TOKEN", "token-two")
+    assert cache.call(get_zone, name="cloudcurio.cc").id == "zone-2"
+    provider_env.setenv("CLOUDFLARE_API_TOKEN", "token-one")
+    assert cache.call(get_zone, name="cloudcurio.cc").id == "zone-1"
+
+
+@pytest.mark.parametrize("key", ["cloudflare:apiToken", "cloudcurio:cloudflare_account_id"])
+def test_provider_and_account_config_are_part_of_the_key(cache, get_zone, provider_env, key):
+    pulumi.runtime.set_config(key, "first")
+    cache.call(get_zone, name="cloudcurio.cc")
+    pulumi.runtime.set_config(key, "second")
+    assert cache.call(get_zone, name="cloudcurio.cc").id == "zone-2"
+
+
+def test_config_from_the_environment_is_part_of_the_key(cache, get_zone, provider_env):
+    provider_env.setenv("PULUMI_CONFIG_CLOUDFLARE_APITOKEN", "token-one")
+    first = cache.key(get_zone, {'name': "cloudcurio.cc"})
+    provider_env.setenv("PULUMI_CONFIG_CLOUDFLARE_APITOKEN", "token-two")
+    assert cache.key(get_zone, {'name': "cloudcurio.cc"}) != first
+
+
+def test_other_providers_and_settings_do_not_change_the_key(cache, get_zone, provider_env):
+    first = cache.key(get_zone, {'name': "cloudcurio.cc"})
+    provider_env.setenv("ZEROTIER_CENTRAL_TOKEN", "token")
+    pulumi.runtime.set_config("cloudcurio:grafana_domain", "grafana.cloudcurio.cc")
+    assert cache.key(get_zone, {'name': "cloudcurio.cc"}) == first
+
+
+def test_credentials_are_not_written_to_disk(cache, get_zone, provider_env):
+    provider_env.setenv("CLOUDFLARE_API_TOKEN", "very-secret-token")
+    cache.call(get_zone, name="cloudcurio.cc")
+    assert "very-secret-token" not in stored_entry(cache).read_text()
+
+
+# cached_invoke
+
+def test_cached_invoke_skips_the_cache_under_mocks(cache, get_zone, provider_env):
+    provider_env.setattr(lookups, "_default", cache)
+    results = []
+
+    def program():
+        results.append(cached_invoke(get_zone, name="cloudcurio.cc"))
+        results.append(cached_invoke(get_zone, name="cloudcurio.cc"))
+
+    run_mocked(program)
+    assert [zone.id for zone in results] == ["zone-1", "zone-2"]
+    assert not cache.directory.exists()
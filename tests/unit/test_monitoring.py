@@ -0,0 +1,345 @@
+"""
+cloudcurio_lib.monitoring
+ArtifactWriter's content hashing and the change report write_configs()
+bases reload decisions on; scrape tier jobs, their file_sd routing,
+the recording rules and the TSDB capacity planner
+"""
+
+import json
+import os
+import re
+
+import pytest
+import yaml
+
+from benchmarks.harness import run_mocked
+from cloudcurio_lib.monitoring import (
+    GiB, ArtifactWriter, CapacityPlanner, HostLimits, JobLoad, MonitoringStack,
+    MonitoringStackArgs, PrometheusConfig, SeriesSample, count_series, sample_file,
+)
+
+TARGETS = [f"172.28.0.{i}" for i in range(1, 21)]
+
+
+def commit(directory, files):
+    writer = ArtifactWriter(directory)
+    for name, text in files.items():
+        writer.write_text(name, text)
+    return writer.commit()
+
+
+def mtimes(directory):
+    return {path: path.stat().st_mtime_ns for path in directory.rglob("*") if path.is_file()}
+
+
+# ArtifactWriter
+
+def test_unchanged_content_is_not_rewritten(tmp_path):
+    first = commit(tmp_path, {'a.yml': "a: 1\n", 'sub/b.json': "[]\n"})
+    assert first == {'changed': ['a.yml', 'sub/b.json'], 'unchanged': [], 'removed': []}
+    before = mtimes(tmp_path)
+
+    second = commit(tmp_path, {'a.yml': "a: 1\n", 'sub/b.json': "[]\n"})
+    assert second == {'changed': [], 'unchanged': ['a.yml', 'sub/b.json'], 'removed': []}
+    assert mtimes(tmp_path) == before
+
+
+def test_changed_content_replaces_only_that_file(tmp_path):
+    commit(tmp_path, {'a.yml': "a: 1\n", 'b.yml': "b: 1\n"})
+    b_mtime = (tmp_path / "b.yml").stat().st_mtime_ns
+    report = commit(tmp_path, {'a.yml': "a: 2\n", 'b.yml': "b: 1\n"})
+    assert report['changed'] == ['a.yml']
+    assert (tmp_path / "a.yml").read_text() == "a: 2\n"
+    assert (tmp_path / "b.yml").stat().st_mtime_ns == b_mtime
+
+
+def test_touched_files_are_compared_by_hash(tmp_path):
+    commit(tmp_path, {'a.yml': "a: 1\n"})
+    os.utime(tmp_path / "a.yml", ns=(0, 10**18))
+    assert commit(tmp_path, {'a.yml': "a: 1\n"})['unchanged'] == ['a.yml']
+
+
+def test_files_edited_by_hand_are_restored(tmp_path):
+    commit(tmp_path, {'a.yml': "a: 1\n"})
+    (tmp_path / "a.yml").write_text("a: 9\n")
+    assert commit(tmp_path, {'a.yml': "a: 1\n"})['changed'] == ['a.yml']
+    assert (tmp_path / "a.yml").read_text() == "a: 1\n"
+
+
+def test_stale_artifacts_are_removed(tmp_path):
+    commit(tmp_path, {'a.yml': "a\n", 'old.yml': "old\n"})
+    report = commit(tmp_path, {'a.yml': "a\n"})
+    assert report['removed'] == ['old.yml']
+    assert not (tmp_path / "old.yml").exists()
+    manifest = json.loads((tmp_path / ArtifactWriter.MANIFEST).read_text())
+    assert list(manifest) == ['a.yml']
+
+
+def test_a_failed_write_leaves_the_old_file_and_no_temporary(tmp_path):
+    commit(tmp_path, {'a.yml': "a: 1\n"})
+    writer = ArtifactWriter(tmp_path)
+    with pytest.raises(RuntimeError):
+        with writer.open('a.yml') as handle:
+            handle.write("a: 2\n")
+            raise RuntimeError("generator failed")
+    assert (tmp_path / "a.yml").read_text() == "a: 1\n"
+    assert sorted(path.name for path in tmp_path.iterdir()) == [ArtifactWriter.MANIFEST, 'a.yml']
+
+
+# write_configs change report
+
+def write(directory, targets=TARGETS, **kwargs):
+    kwargs.setdefault('shards', 2)
+    return PrometheusConfig.write_configs(directory, "15s", targets, **kwargs)
+
+
+def test_rerun_with_the_same_inputs_changes_nothing(tmp_path):
+    first = write(tmp_path)
+    assert first['changed_shards'] == [0, 1] and first['reload_required']
+    before = mtimes(tmp_path)
+
+    second = write(tmp_path)
+    assert (second['changed'], second['removed']) == ([], [])
+    assert second['changed_shards'] == []
+    assert not second['reload_required']
+    assert mtimes(tmp_path) == before
+
+
+def test_a_new_target_changes_only_its_shard_and_needs_no_reload(tmp_path):
+    write(tmp_path)
+    added = "172.28.0.99"
+    shard = PrometheusConfig.shard_of(f"{added}:9100", 2)
+    result = write(tmp_path, TARGETS + [added])
+    assert result['changed'] == [f"file_sd/node-exporter.shard-{shard}.json"]
+    assert result['changed_shards'] == [shard]
+    assert not result['reload_required']
+    assert sum(result['targets_per_shard']) == len(TARGETS) + 1
+
+
+def test_a_config_change_reloads_every_replica(tmp_path):
+    write(tmp_path)
+    # A 2m tier widens the rate() window, so the rules change too
+    result = write(tmp_path, retention_days=30, scrape_tiers={'laptop': "2m"})
+    assert {"prometheus-0.yml", "rules/node-exporter.yml"} <= set(result['changed'])
+    assert result['changed_shards'] == [0, 1]
+    assert result['reload_required']
+    assert result['flags'][-1] == "--storage.tsdb.retention.time=30d"
+
+
+def test_fewer_shards_remove_the_old_files(tmp_path):
+    write(tmp_path)
+    result = write(tmp_path, shards=1)
+    assert sorted(result['removed']) == ["file_sd/node-exporter.shard-1.json", "prometheus-1.yml"]
+    assert not (tmp_path / "prometheus-1.yml").exists()
+    assert result['reload_required']
+
+
+# Scrape tiers
+
+TIERS = {'server': "15s", 'laptop': "60s", 'fast': "5s"}
+
+
+def jobs(config):
+    return {job['job_name']: job for job in config['scrape_configs']}
+
+
+def test_each_tier_gets_a_job_relabeled_to_the_base_job():
+    config = PrometheusConfig.generate_config("15s", scrape_tiers=TIERS)
+    by_name = jobs(config)
+    assert list(by_name) == ['prometheus', 'node-exporter', 'node-exporter-server',
+                             'node-exporter-laptop', 'node-exporter-fast']
+    assert 'relabel_configs' not in by_name['node-exporter']
+    assert 'scrape_interval' not in by_name['node-exporter']
+    for tier, interval in TIERS.items():
+        job = by_name[f'node-exporter-{tier}']
+        assert job['scrape_interval'] == interval
+        assert job['relabel_configs'] == [{'target_label': 'job', 'replacement': 'node-exporter'}]
+        assert job['file_sd_configs'][0]['files'] == [
+            f"/etc/prometheus/file_sd/node-exporter-{tier}.shard-0.json"
+        ]
+
+
+def test_timeout_never_exceeds_a_short_interval():
+    by_name = jobs(PrometheusConfig.generate_config("15s", scrape_tiers=TIERS))
+    assert by_name['node-exporter-fast']['scrape_timeout'] == "5s"
+    assert 'scrape_timeout' not in by_name['node-exporter-laptop']
+
+
+def test_sharded_tier_jobs_keep_the_job_relabel_before_hashmod():
+    config = PrometheusConfig.generate_config("15s", shards=3, shard=2, scrape_tiers=TIERS)
+    laptop = jobs(config)['node-exporter-laptop']
+    assert [rule.get('action', 'replace') for rule in laptop['relabel_configs']] == [
+        'replace', 'hashmod', 'keep',
+    ]
+    assert laptop['relabel_configs'][1]['modulus'] == 3
+    assert laptop['relabel_configs'][2]['regex'] == "2"
+    assert config['global']['external_labels']['replica'] == "2"
+
+
+def test_targets_are_routed_to_their_tier_file(tmp_path):
+    targets = [("10.0.0.1", {'type': "server"}), ("10.0.0.2", {'type': "laptop"}),
+               ("10.0.0.3", {'type': "printer"}), "10.0.0.4",
+               ("10.0.0.5:9200", {'type': "laptop", 'site': "home"})]
+    writer = ArtifactWriter(tmp_path)
+    counts = PrometheusConfig.write_file_sd(targets, writer, scrape_tiers=TIERS)
+    writer.commit()
+    assert counts == {'node-exporter': [2], 'node-exporter-server': [1],
+                      'node-exporter-laptop': [2], 'node-exporter-fast': [0]}
+
+    def groups(job):
+        return json.loads((tmp_path / "file_sd" / f"{job}.shard-0.json").read_text())
+
+    assert groups('node-exporter-laptop') == [
+        {'targets': ["10.0.0.2:9100"], 'labels': {'type': "laptop"}},
+        {'targets': ["10.0.0.5:9200"], 'labels': {'type': "laptop", 'site': "home"}},
+    ]
+    assert groups('node-exporter') == [
+        {'targets': ["10.0.0.3:9100"], 'labels': {'type': "printer"}},
+        {'targets': ["10.0.0.4:9100"], 'labels': {}},
+    ]
+    assert groups('node-exporter-fast') == []
+
+
+def test_stack_counts_targets_per_tier():
+    args = MonitoringStackArgs(
+        targets=["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.4"],
+        scrape_tiers={'server': "15s", 'laptop': "60s"},
+        target_labels={"10.0.0.1": {'type': "server"}, "10.0.0.2": {'type': "laptop"},
+                       "10.0.0.3": {'type': "desktop"}},
+    )
+    stacks = []
+    result = run_mocked(lambda: stacks.append(MonitoringStack("monitoring", args)))
+    assert stacks[0].targets_per_tier == {'default': 2, 'server': 1, 'laptop': 1}
+    assert result.outputs["monitoring"]['targets_per_tier'] == stacks[0].targets_per_tier
+
+
+# Recording rules
+
+def test_rate_window_covers_four_scrapes_of_the_slowest_tier():
+    assert PrometheusConfig.rate_window("15s") == "5m"
+    assert PrometheusConfig.rate_window("15s", {'laptop': "60s"}) == "5m"
+    assert PrometheusConfig.rate_window("15s", {'laptop': "2m"}) == "8m"
+
+
+def test_recording_rules_render_and_reference_only_defined_series():
+    rules = PrometheusConfig.recording_rules("15s", {'laptop': "2m"}, tier_tag="role")
+    assert yaml.safe_load(yaml.safe_dump(rules)) == rules
+    instance, rollup = rules['groups']
+    assert [instance['name'], rollup['name']] == ['node-exporter.rules', 'node-exporter.role.rules']
+
+    records = {rule['record'] for rule in instance['rules']}
+    assert 'instance:node_cpu_utilisation:rate8m' in records
+    for rule in instance['rules']:
+        assert re.fullmatch(r"instance(_device)?:[a-z0-9_]+:[a-z0-9_]+", rule['record'])
+        assert 'job="node-exporter"' in rule['expr']
+        assert rule['expr'].count("(") == rule['expr'].count(")")
+        assert "[5m]" not in rule['expr']
+    for rule in rollup['rules']:
+        assert rule['record'].startswith("role:")
+        assert "by (role)" in rule['expr']
+        used = set(re.findall(r"instance:[a-z0-9_]+:[a-z0-9_]+", rule['expr']))
+        assert used <= records, rule['record']
+
+
+def test_generated_rules_file_is_loaded_by_the_config(tmp_path):
+    result = PrometheusConfig.write_configs(tmp_path, "15s", ["10.0.0.1"], rules_dir="/rules")
+    config = yaml.safe_load((tmp_path / "prometheus-0.yml").read_text())
+    assert config['rule_files'] == ["/rules/*.yml"]
+    rules = yaml.safe_load((tmp_path / "rules" / "node-exporter.yml").read_text())
+    assert rules == PrometheusConfig.recording_rules("15s")
+    assert result['configs'] == [str(tmp_path / "prometheus-0.yml")]
+
+
+# Capacity planning
+
+EXPOSITION = """\
+# HELP node_cpu_seconds_total Seconds the CPUs spent in each mode.
+# TYPE node_cpu_seconds_total counter
+node_cpu_seconds_total{cpu="0",mode="idle"} 1
+node_cpu_seconds_total{cpu="0",mode="user"} 2
+
+node_load1 0.5
+  node_boot_time_seconds\t1.7e9
+up{job="x"} 1
+"""
+
+
+def test_count_series_counts_sample_lines_per_metric():
+    sample = count_series(EXPOSITION.splitlines(keepends=True))
+    assert sample.total == 5
+    assert sample.by_metric == {'node_cpu_seconds_total': 2, 'node_load1': 1,
+                                'node_boot_time_seconds': 1, 'up': 1}
+    assert sample.top(1) == [('node_cpu_seconds_total', 2)]
+    assert count_series(EXPOSITION.encode().splitlines()).by_metric == sample.by_metric
+
+
+def test_fixtures_are_counted_from_disk():
+    from benchmarks.plan_capacity import FIXTURES
+
+    server = sample_file(FIXTURES / "node_exporter_server.prom")
+    laptop = sample_file(FIXTURES / "node_exporter_laptop.prom")
+    assert server.total > laptop.total > 0
+    assert server.by_metric['node_cpu_seconds_total'] > 0
+
+
+LIMITS = HostLimits("test host", memory_bytes=4 * GiB, disk_bytes=10 * 1000 ** 3)
+
+
+def test_projection_from_the_sizing_constants():
+    load = JobLoad("node-exporter", targets=10, series_per_target=1000, scrape_interval="10s")
+    assert (load.series, load.samples_per_second) == (10000, 1000)
+    plan = CapacityPlanner(LIMITS).plan([load], retention_days=10)
+
+    head_samples = 1000 * 3 * 3600
+    assert plan.head_memory_bytes == 10000 * 8 * 1024 + head_samples * 2
+    assert plan.wal_bytes == head_samples * 4 + 10000 * 256
+    # 1-day blocks: 10 of them, plus one block of compaction headroom
+    chunks, index = 10 * 86400 * 1000 * 2, 10 * 10000 * 1024
+    assert plan.block_bytes == int((chunks + index) * 1.1)
+    assert plan.disk_bytes == plan.block_bytes + plan.wal_bytes
+    assert plan.ok and plan.to_dict()['active_series'] == 10000
+
+
+def test_warns_near_and_over_the_budgets():
+    load = JobLoad("node-exporter", targets=10, series_per_target=1000, scrape_interval="10s")
+    near = CapacityPlanner(LIMITS).plan([load], retention_days=40)
+    assert [warning.split()[0] for warning in near.warnings] == ["disk"]
+    assert "of the" in near.warnings[0] and not near.ok
+
+    over = CapacityPlanner(LIMITS).plan([load], retention_days=60)
+    assert "exceeds the" in over.warnings[0]
+    assert "WARNING: disk" in over.report()
+
+    small = HostLimits("small", memory_bytes=GiB // 4, disk_bytes=LIMITS.disk_bytes)
+    [memory] = CapacityPlanner(small).plan([load], 1).warnings
+    assert memory.startswith("head memory") and "exceeds the 64.0MiB budget on small" in memory
+
+
+def test_max_retention_fits_the_disk_budget():
+    load = JobLoad("node-exporter", targets=10, series_per_target=1000, scrape_interval="10s")
+    planner = CapacityPlanner(LIMITS, warn_ratio=1.0)
+    days = planner.plan([load], retention_days=30).max_retention_days()
+    assert planner.plan([load], retention_days=days).disk_bytes <= LIMITS.disk_budget
+    assert planner.plan([load], retention_days=days + 2).disk_bytes > LIMITS.disk_budget
+
+
+def test_stack_loads_use_tier_intervals_and_fall_back_to_the_default_sample():
+    args = MonitoringStackArgs(
+        targets=["10.0.0.1", "10.0.0.2", "10.0.0.3"],
+        scrape_interval="15s",
+        scrape_tiers={'laptop': "60s", 'server': "15s"},
+        target_labels={"10.0.0.1": {'type': "laptop"}, "10.0.0.2": {'type': "laptop"}},
+        retention_days=30,
+    )
+    samples = {'default': SeriesSample(500), 'laptop': SeriesSample(200)}
+    loads = CapacityPlanner.loads_for(args, samples)
+    assert [(load.job, load.targets, load.series_per_target, load.scrape_interval)
+            for load in loads] == [("node-exporter", 1, 500, "15s"),
+                                   ("node-exporter-laptop", 2, 200, "60s")]
+
+    plan = CapacityPlanner(LIMITS).plan_stack(args, samples)
+    assert plan.retention_days == 30 and plan.active_series == 900
+    assert plan.samples_per_second == pytest.approx(500 / 15 + 400 / 60)
+
+    with pytest.raises(ValueError, match="No series sample for tier 'default'"):
+        CapacityPlanner.loads_for(args, {'server': SeriesSample(1)})
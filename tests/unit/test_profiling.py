@@ -0,0 +1,60 @@
+"""
+cloudcurio_lib.profiling.Profiler.prometheus_text
+Output must be a valid textfile collector file: one sample per series
+"""
+
+from collections import Counter
+
+from cloudcurio_lib.profiling import Profiler, Span
+
+
+def span(name, type_, category, seconds, children=0, size=0):
+    span = Span(name, type_, category)
+    span.end = span.start + int(seconds * 1e9)
+    span.children = children
+    span.size = size
+    return span
+
+
+def samples(text):
+    """{series: value} for the sample lines, failing on a repeated series"""
+    lines = [line for line in text.splitlines() if line and not line.startswith('#')]
+    series = Counter(line.rsplit(' ', 1)[0] for line in lines)
+    assert [name for name, count in series.items() if count > 1] == []
+    return {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1]) for line in lines}
+
+
+def test_repeated_spans_are_summed_into_one_series():
+    profiler = Profiler()
+    profiler.spans = [
+        span('getZone', 'cloudflare:index/getZone:getZone', 'invoke', 0.25),
+        span('getZone', 'cloudflare:index/getZone:getZone', 'invoke', 0.5),
+        span('r720-dns', 'cloudflare:index/record:Record', 'register', 0.125, size=100),
+        span('r720-dns', 'cloudflare:index/record:Record', 'register', 0.125, size=50),
+        span('r720', 'cloudcurio:zerotier:Node', 'construct', 1.0, children=2, size=10),
+    ]
+    values = samples(profiler.prometheus_text('infra', 'dev'))
+
+    base = 'project="infra",stack="dev"'
+    invoke = f'{base},category="invoke",type="cloudflare:index/getZone:getZone",name="getZone"'
+    record = f'{base},category="register",type="cloudflare:index/record:Record",name="r720-dns"'
+    node = f'{base},category="construct",type="cloudcurio:zerotier:Node",name="r720"'
+    assert values[f'cloudcurio_pulumi_span_seconds{{{invoke}}}'] == 0.75
+    assert values[f'cloudcurio_pulumi_bytes{{{record}}}'] == 150
+    assert values[f'cloudcurio_pulumi_children{{{node}}}'] == 2
+    assert f'cloudcurio_pulumi_children{{{record}}}' not in values
+    assert f'cloudcurio_pulumi_bytes{{{invoke}}}' not in values
+    assert values[f'cloudcurio_pulumi_spans_total{{{base},category="invoke"}}'] == 2
+
+
+def test_unfinished_spans_are_left_out():
+    profiler = Profiler()
+    profiler.spans = [Span('pending', 'cloudflare:index/record:Record', 'resolve')]
+    assert samples(profiler.prometheus_text('infra', 'dev')) == {}
+
+
+def test_label_values_are_escaped():
+    profiler = Profiler()
+    profiler.spans = [span('say "hi"\\now', 'custom:Thing', 'construct', 0.5)]
+    text = profiler.prometheus_text('infra', 'dev')
+    assert 'name="say \\"hi\\"\\\\now"' in text
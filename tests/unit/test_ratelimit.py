@@ -0,0 +1,138 @@
+"""
+cloudcurio_lib.ratelimit
+Replay counts against a per-request deque implementation of Cloudflare's
+sliding window, and request logs loaded from Logpush exports
+"""
+
+import json
+from collections import deque
+
+import numpy as np
+import pytest
+
+from cloudcurio_lib.ratelimit import RequestLog, candidate_rules, load_requests, replay
+from cloudcurio_lib.waf import API_RATE_LIMIT
+
+PATTERNS = ["/api/*", "/*"]
+API, ALL = 0b01, 0b10
+
+
+def log_of(rows, patterns=PATTERNS):
+    """A RequestLog from (client, time in ms, abusive, matches) rows"""
+    clients, times, abusive, matches = zip(*rows)
+    return RequestLog(clients, times, abusive, matches, patterns)
+
+
+def counts(outcome):
+    return (outcome.challenged_legitimate, outcome.challenged_abusive, outcome.clients_challenged)
+
+
+def reference(log, rule):
+    """One request at a time in time order, a deque of timestamps per client"""
+    bit = log.patterns.index(rule.path)
+    windows, mitigated_until, clients = {}, {}, set()
+    challenged = [0, 0]
+    order = np.argsort(log.times, kind='stable')
+    columns = (log.clients, log.times, log.abusive, log.matches)
+    rows = zip(*(column[order].tolist() for column in columns))
+    for client, now, abusive, matches in rows:
+        if not matches >> bit & 1:
+            continue
+        window = windows.setdefault(client, deque())
+        window.append(now)
+        while window[0] <= now - rule.period * 1000:
+            window.popleft()
+        if len(window) > rule.threshold:
+            mitigated_until[client] = now + rule.mitigation_ms
+            hit = True
+        else:
+            hit = now < mitigated_until.get(client, -1)
+        if hit:
+            challenged[abusive] += 1
+            clients.add(client)
+    return challenged[0], challenged[1], len(clients)
+
+
+def test_counts_requests_in_the_trailing_period():
+    rule = API_RATE_LIMIT.replace(threshold=2, period=10)
+    # At 12000 the request at 2000 is exactly one period old and no longer counts
+    [outcome] = replay(log_of([(1, t, False, API) for t in (0, 1000, 2000, 11500, 12000)]), [rule])
+    assert counts(outcome) == (1, 0, 1)
+    assert (outcome.legitimate, outcome.abusive) == (5, 0)
+    assert outcome.false_positive_rate == pytest.approx(1 / 5)
+
+
+def test_clients_and_patterns_are_counted_separately():
+    rule = API_RATE_LIMIT.replace(threshold=1, period=10)
+    rows = [(1, 0, False, API | ALL), (2, 100, True, API | ALL), (1, 200, False, ALL),
+            (2, 300, True, API | ALL)]
+    api, everything = replay(log_of(rows), [rule, rule.replace(path="/*")])
+    assert counts(api) == (0, 1, 1)
+    assert counts(everything) == (1, 1, 2)
+    assert (api.legitimate, api.abusive, api.catch_rate) == (1, 2, 0.5)
+
+
+def test_ban_keeps_mitigating_until_the_timeout_after_the_last_violation():
+    ban = API_RATE_LIMIT.replace(threshold=1, period=10, mode="ban", timeout=30)
+    log = log_of([(1, t, False, API) for t in (0, 1000, 20000, 35000, 60000, 80000)])
+    [outcome] = replay(log, [ban])
+    # 1000 violates; 20000 is under the limit but mitigated; 35000 is past the timeout
+    assert counts(outcome) == (2, 0, 1)
+    assert counts(outcome) == reference(log, ban)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_random_traffic_matches_the_deque_reference(seed):
+    rng = np.random.default_rng(seed)
+    size = 3000
+    clients = rng.integers(0, 12, size)
+    # Bursty: most requests land in a few seconds-long clusters
+    clustered = rng.integers(0, 5, size) * 40000 + rng.integers(0, 8000, size)
+    times = np.where(rng.random(size) < 0.7, clustered, rng.integers(0, 200000, size))
+    abusive = clients < 3
+    matches = np.where(rng.random(size) < 0.6, API | ALL, ALL)
+    log = RequestLog(clients, times, abusive, matches, PATTERNS)
+
+    rules = candidate_rules((5, 20, 80), (10, 60))
+    ban = API_RATE_LIMIT.replace(path="/*", mode="ban", timeout=15)
+    rules += candidate_rules((5, 20), (10,), ban)
+    for rule, outcome in zip(rules, replay(log, rules)):
+        assert counts(outcome) == reference(log, rule), rule.label
+        matching = log.matches >> log.patterns.index(rule.path) & 1
+        assert outcome.legitimate + outcome.abusive == int(matching.sum())
+
+
+def test_empty_log_and_unknown_pattern():
+    empty = RequestLog([], [], [], [], PATTERNS)
+    [outcome] = replay(empty, [API_RATE_LIMIT])
+    assert counts(outcome) == (0, 0, 0)
+    assert outcome.false_positive_rate == outcome.catch_rate == 0.0
+    with pytest.raises(ValueError, match="'/admin/\\*'"):
+        replay(empty, [API_RATE_LIMIT.replace(path="/admin/*")])
+
+
+def test_load_requests_from_a_logpush_export(tmp_path):
+    export = tmp_path / "http_requests.log"
+    rows = [
+        ("203.0.113.1", "api.cloudcurio.cc", "/api/v1/hosts?page=2", 1_700_000_000_000_000_000),
+        ("203.0.113.2", "api.cloudcurio.cc", "/status", 1_700_000_000_500_000_000),
+        ("203.0.113.1", "www.cloudcurio.cc", "/api/v1/hosts", 1_700_000_001_000_000_000),
+        ("203.0.113.9", "API.cloudcurio.cc", "/api/login", 1_700_000_002_000_000_000),
+    ]
+    export.write_text("".join(
+        json.dumps({'ClientIP': ip, 'ClientRequestHost': host, 'ClientRequestURI': uri,
+                    'EdgeStartTimestamp': start, 'EdgeResponseStatus': 200}) + "\n"
+        for ip, host, uri, start in rows
+    ))
+
+    log = load_requests([export], ["/api/*"], host="API.cloudcurio.cc", abusive=["203.0.113.9"])
+    # Hosts compare case-insensitively; the query string is not part of the path
+    assert log.client_names == ["203.0.113.1", "203.0.113.9"]
+    assert log.times.tolist() == [1_700_000_000_000, 1_700_000_002_000]
+    assert log.abusive.tolist() == [False, True]
+
+    log = load_requests([export], ["/api/*", "/*"], abusive=["203.0.113.9"])
+    assert len(log) == 4
+    assert [log.client_names[c] for c in log.clients] == [ip for ip, *_ in rows]
+    assert log.abusive.tolist() == [False, False, False, True]
+    assert log.matches.tolist() == [0b11, 0b10, 0b11, 0b11]
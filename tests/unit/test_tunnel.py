@@ -0,0 +1,212 @@
+"""
+cloudcurio_lib.tunnel
+Compiling the service registry into ingress rules, traffic ordering, and
+the first-match evaluation the ordering has to preserve
+"""
+
+import gzip
+import json
+import random
+
+import pytest
+
+from cloudcurio_lib.tunnel import (
+    CATCH_ALL_SERVICE, IngressError, IngressMatcher, IngressRule, TunnelService, _specificity,
+    compile_ingress, order_by_traffic, traffic_shares, tunnel_services, validate_ingress,
+)
+
+ZONE = "cloudcurio.cc"
+
+
+def service(name, port, hostname=None, path=None):
+    return TunnelService(name, "localhost", port, hostname=hostname, path=path)
+
+
+def routes(rules):
+    return [(rule.hostname, rule.path, rule.service) for rule in rules]
+
+
+def routed(rules, host, path="/"):
+    return IngressMatcher(rules).match(host, path).service
+
+
+# Compilation
+
+def test_registry_compiles_to_one_rule_per_service_and_a_catch_all():
+    rules = compile_ingress(tunnel_services("localhost", ["grafana", "prometheus"]), ZONE)
+    assert routes(rules) == [
+        (f"grafana.{ZONE}", None, "http://localhost:3000"),
+        (f"prometheus.{ZONE}", None, "http://localhost:9090"),
+        (None, None, CATCH_ALL_SERVICE),
+    ]
+    assert rules[0].args() == {'hostname': f"grafana.{ZONE}", 'service': "http://localhost:3000"}
+    assert rules[-1].args() == {'service': CATCH_ALL_SERVICE}
+
+
+def test_specific_rules_come_first():
+    rules = compile_ingress([
+        service("all", 8000, hostname=f"*.{ZONE}"),
+        service("docs", 8001),
+        service("api", 8002, hostname=f"*.{ZONE}", path="^/api"),
+        service("admin", 8003, hostname=f"docs.{ZONE}", path="^/admin"),
+    ], ZONE)
+    assert [rule.service[-4:] for rule in rules[:-1]] == ["8003", "8001", "8002", "8000"]
+
+
+def test_duplicates_are_dropped_and_paths_merged():
+    rules = compile_ingress([
+        service("api", 8000, path="^/v1"),
+        service("api", 8000, path="^/v1"),
+        service("api", 8000, path="^/v2"),
+        service("web", 8001),
+        service("web", 8001, path="^/static"),
+    ], ZONE)
+    assert routes(rules[:-1]) == [
+        (f"api.{ZONE}", "(?:^/v1)|(?:^/v2)", "http://localhost:8000"),
+        (f"web.{ZONE}", None, "http://localhost:8001"),
+    ]
+
+
+def test_one_host_and_path_cannot_route_to_two_services():
+    with pytest.raises(IngressError, match=f"grafana.{ZONE} routes to both "
+                                           "http://localhost:3000 and http://localhost:3001"):
+        compile_ingress([service("grafana", 3000), service("grafana", 3001)], ZONE)
+
+
+def test_invalid_path_regex_is_rejected():
+    with pytest.raises(ValueError, match="path for api is not a valid regex"):
+        service("api", 8000, path="^/(v1")
+
+
+def test_exact_host_covered_by_a_same_service_wildcard_is_dropped():
+    rules = compile_ingress([
+        service("web", 8000, hostname=f"www.{ZONE}"),
+        service("web", 8000, hostname=f"*.{ZONE}"),
+        service("grafana", 3000),
+    ], ZONE)
+    assert routes(rules[:-1]) == [
+        (f"grafana.{ZONE}", None, "http://localhost:3000"),
+        (f"*.{ZONE}", None, "http://localhost:8000"),
+    ]
+
+
+def test_exact_host_stays_when_another_service_could_match_before_the_wildcard():
+    registry = [
+        service("web", 8000, hostname=f"www.{ZONE}"),
+        service("admin", 9000, hostname=f"*.{ZONE}", path="^/admin"),
+        service("web", 8000, hostname=f"*.{ZONE}"),
+    ]
+    rules = compile_ingress(registry, ZONE)
+    assert (f"www.{ZONE}", None, "http://localhost:8000") in routes(rules)
+    assert routed(rules, f"www.{ZONE}", "/admin") == "http://localhost:8000"
+    assert routed(rules, f"app.{ZONE}", "/admin") == "http://localhost:9000"
+
+
+def test_pathed_exact_host_is_only_covered_by_a_wildcard_taking_that_path():
+    registry = [
+        service("web", 8000, hostname=f"www.{ZONE}", path="^/app"),
+        service("web", 8000, hostname=f"*.{ZONE}", path="^/static"),
+    ]
+    assert len(compile_ingress(registry, ZONE)) == 3
+
+
+def random_registry(rng):
+    """Unique (host, service) pairs, so that only the wildcard collapse applies"""
+    hosts = [f"a.{ZONE}", f"b.{ZONE}", f"*.{ZONE}", f"*.b.{ZONE}"]
+    paths = [None, None, "^/api", "^/admin", "metrics"]
+    services, seen = [], set()
+    for _ in range(rng.randint(1, 8)):
+        host, port, path = rng.choice(hosts), rng.choice([8000, 8001, 8002]), rng.choice(paths)
+        if (host, port) in seen or (host, path) in seen:
+            continue
+        seen.update([(host, port), (host, path)])
+        services.append(service(f"s{len(services)}", port, hostname=host, path=path))
+    return services
+
+
+def test_compiled_rules_route_like_the_registry():
+    rng = random.Random(7)
+    for _ in range(300):
+        registry = random_registry(rng)
+        written = [IngressRule(s.service, s.hostname, s.path) for s in registry]
+        reference = sorted(written, key=_specificity) + [IngressRule(CATCH_ALL_SERVICE)]
+        shares = {host: rng.random() for host in (f"a.{ZONE}", f"c.b.{ZONE}", f"x.{ZONE}")}
+        compiled = compile_ingress(registry, ZONE)
+        by_traffic = compile_ingress(registry, ZONE, shares)
+        for host in (f"a.{ZONE}", f"b.{ZONE}", f"c.b.{ZONE}", f"x.{ZONE}", "example.org"):
+            for path in ("/", "/api/v1", "/admin", "/x/metrics"):
+                expected = routed(reference, host, path)
+                assert routed(compiled, host, path) == expected, routes(compiled)
+                assert routed(by_traffic, host, path) == expected, routes(by_traffic)
+
+
+# Traffic ordering
+
+def test_busiest_disjoint_rules_move_first():
+    rules = [IngressRule(f"http://localhost:{port}", f"{name}.{ZONE}")
+             for port, name in ((3000, "grafana"), (9090, "prometheus"), (3001, "chat"))]
+    shares = {f"chat.{ZONE}": 0.7, f"grafana.{ZONE}": 0.2, f"prometheus.{ZONE}": 0.1}
+    ordered = order_by_traffic(rules, shares)
+    assert [rule.hostname for rule in ordered] == [f"chat.{ZONE}", f"grafana.{ZONE}",
+                                                   f"prometheus.{ZONE}"]
+
+
+def test_overlapping_rules_keep_their_order():
+    exact = IngressRule("http://localhost:8000", f"www.{ZONE}")
+    wildcard = IngressRule("http://localhost:8001", f"*.{ZONE}")
+    assert order_by_traffic([exact, wildcard], {f"app.{ZONE}": 0.99, f"www.{ZONE}": 0.01}) == [
+        exact, wildcard]
+
+
+def test_literal_prefixes_that_diverge_do_not_overlap():
+    api = IngressRule("http://localhost:8000", f"www.{ZONE}", "^/api")
+    admin = IngressRule("http://localhost:8001", f"www.{ZONE}", "^/admin")
+    regex = IngressRule("http://localhost:8002", f"www.{ZONE}", "admin$")
+    other = IngressRule("http://localhost:8003", f"docs.{ZONE}")
+    assert not api.overlaps(admin) and not api.overlaps(other)
+    assert api.overlaps(IngressRule("http://localhost:8004", f"www.{ZONE}", "^/api/v2"))
+    assert admin.overlaps(regex)
+    assert order_by_traffic([api, admin], {f"www.{ZONE}": 1.0}) == [api, admin]
+
+
+def test_traffic_shares_reads_plain_and_gzipped_logs(tmp_path):
+    plain = tmp_path / "a.ndjson"
+    plain.write_text(json.dumps({'ClientRequestHost': f"Grafana.{ZONE}"}) + "\n\n")
+    with gzip.open(tmp_path / "b.ndjson.gz", 'wt') as sample:
+        for host in ("chat", "chat", "grafana"):
+            sample.write(json.dumps({'ClientRequestHost': f"{host}.{ZONE}"}) + "\n")
+    shares = traffic_shares([plain, tmp_path / "b.ndjson.gz"])
+    assert shares == {f"grafana.{ZONE}": 0.5, f"chat.{ZONE}": 0.5}
+    empty = tmp_path / "empty.ndjson"
+    empty.write_text("")
+    assert traffic_shares([empty]) == {}
+
+
+# Matcher
+
+def test_matcher_takes_the_first_match_and_counts_rules_tested():
+    rules = [
+        IngressRule("http://localhost:8000", f"www.{ZONE}", "^/api"),
+        IngressRule("http://localhost:8001", f"*.{ZONE}"),
+        IngressRule(CATCH_ALL_SERVICE),
+    ]
+    matcher = IngressMatcher(rules)
+    assert matcher.match(f"www.{ZONE}", "/api/v1") is rules[0]
+    assert matcher.match(f"www.{ZONE}", "/") is rules[1]
+    assert matcher.match("example.org") is rules[2]
+    assert matcher.tested == 1 + 2 + 3
+
+
+def test_paths_are_searched_not_anchored():
+    rules = [IngressRule("http://localhost:9100", f"*.{ZONE}", "metrics"),
+             IngressRule(CATCH_ALL_SERVICE)]
+    assert routed(rules, f"node.{ZONE}", "/x/metrics") == "http://localhost:9100"
+    assert routed(rules, ZONE, "/metrics") == CATCH_ALL_SERVICE
+
+
+def test_rules_must_end_in_a_single_catch_all():
+    exact = IngressRule("http://localhost:8000", f"www.{ZONE}")
+    with pytest.raises(IngressError, match="last ingress rule must be a catch-all"):
+        IngressMatcher([exact])
+    with pytest.raises(IngressError, match=f"Catch-all rule 0 \\({CATCH_ALL_SERVICE}\\) shadows"):
+        validate_ingress([IngressRule(CATCH_ALL_SERVICE), exact, IngressRule(CATCH_ALL_SERVICE)])
@@ -0,0 +1,136 @@
+"""
+cloudcurio_lib.waf
+Parsing, normalization and evaluation of rules-language expressions;
+normalized trees must print back to text that parses to the same tree
+and matches the same requests
+"""
+
+import random
+
+import pytest
+
+from cloudcurio_lib.waf import (
+    WAF_RULES, WafError, WafEvaluator, WafRule, normalize, optimize_rules, parse, to_expression,
+)
+
+
+def matches(expression, request):
+    return WafEvaluator([WafRule('block', expression, "test")]).evaluate(request) is not None
+
+
+# A small request space, so random expressions hit both outcomes often
+HOSTS = ("a", "b", "API.example")
+COUNTRIES = ("US", "DE", "CN")
+PATHS = ("/admin/users", "/api/v1", "/")
+
+
+def random_request(rng):
+    return {
+        'http.host': rng.choice(HOSTS),
+        'ip.geoip.country': rng.choice(COUNTRIES),
+        'http.request.uri.path': rng.choice(PATHS),
+        'cf.threat_score': rng.randrange(0, 30),
+        'ip.src': rng.choice(("192.0.2.1", "198.51.100.7", "10.1.2.3")),
+        'ssl': rng.random() < 0.5,
+        'cf.client.bot': rng.random() < 0.5,
+    }
+
+
+def random_expression(rng, depth=0):
+    if depth >= 3 or rng.random() < 0.3:
+        return rng.choice([
+            lambda: f'http.host eq "{rng.choice(HOSTS)}"',
+            lambda: f'http.host ne "{rng.choice(HOSTS)}"',
+            lambda: f'lower(http.host) eq "{rng.choice(HOSTS).lower()}"',
+            lambda: f'ip.geoip.country in {{"{rng.choice(COUNTRIES)}" "{rng.choice(COUNTRIES)}"}}',
+            lambda: f'http.request.uri.path contains "{rng.choice(("/admin", "/api"))}"',
+            lambda: 'http.request.uri.path matches "^/a"',
+            lambda: f'cf.threat_score {rng.choice(("lt", "ge", "gt", "le"))} {rng.randrange(30)}',
+            lambda: 'ip.src in {10.0.0.0/8 192.0.2.1}',
+            lambda: rng.choice(('ssl', 'cf.client.bot')),
+        ])()
+    kind = rng.choice(('and', 'or', 'xor', 'not'))
+    if kind == 'not':
+        return f"not ({random_expression(rng, depth + 1)})"
+    terms = [random_expression(rng, depth + 1) for _ in range(rng.randrange(2, 4))]
+    return "(" + f" {kind} ".join(f"({term})" for term in terms) + ")"
+
+
+# Parsing
+
+def test_precedence_is_or_xor_and_not():
+    ssl, bot = ('bool', ('field', 'ssl')), ('bool', ('field', 'cf.client.bot'))
+    assert parse('ssl or cf.client.bot and not ssl xor ssl') == (
+        'or', (ssl, ('xor', (('and', (bot, ('not', ssl))), ssl))),
+    )
+
+
+@pytest.mark.parametrize("expression, error", [
+    ('lower(cf.threat_score) eq "a"', r"lower\(\) takes a str"),
+    ('upper(ip.src) eq "A"', r"upper\(\) takes a str"),
+    ('len(ssl) gt 1', r"len\(\) takes a str"),
+    ('cf.threat_score eq "high"', "is int"),
+    ('http.host', "needs a comparison"),
+    ('http.nope eq "a"', "Unknown or unsupported field"),
+    ('http.host matches "("', "Invalid regex"),
+    ('(ssl', r"Expected '\)'"),
+])
+def test_invalid_expressions_fail_at_parse_time(expression, error):
+    with pytest.raises(WafError, match=error):
+        parse(expression)
+
+
+# Normalization and printing
+
+def test_not_keeps_the_parentheses_of_a_compound_operand():
+    tree = normalize(parse('not (http.host eq "a" and ssl)'))
+    assert to_expression(tree) == '(not (http.host eq "a" and ssl))'
+    assert parse(to_expression(tree)) == tree
+
+
+def test_normalize_folds_and_inverts():
+    assert to_expression(normalize(parse('http.host eq "a" or http.host eq "b" or ssl'))) == \
+        '(ssl or http.host in {"a" "b"})'
+    assert to_expression(normalize(parse('not cf.threat_score gt 10'))) == '(cf.threat_score le 10)'
+    assert normalize(parse('not not ssl')) == parse('ssl')
+
+
+def test_random_expressions_round_trip_and_keep_their_meaning():
+    rng = random.Random(2024)
+    requests = [random_request(rng) for _ in range(40)]
+    for _ in range(300):
+        expression = random_expression(rng)
+        tree = normalize(parse(expression))
+        text = to_expression(tree)
+        assert parse(text) == tree, (expression, text)
+        for request in requests:
+            assert matches(text, request) == matches(expression, request), (expression, text)
+
+
+# Evaluation
+
+def test_xor_of_three_terms_is_parity():
+    expression = 'ssl xor cf.client.bot xor cf.bot_management.verified_bot'
+    for bits in range(8):
+        request = {'ssl': bool(bits & 1), 'cf.client.bot': bool(bits & 2),
+                   'cf.bot_management.verified_bot': bool(bits & 4)}
+        assert matches(expression, request) == (bin(bits).count('1') % 2 == 1)
+
+
+def test_ip_networks_and_missing_fields():
+    assert matches('ip.src in {10.0.0.0/8 192.0.2.1}', {'ip.src': "10.200.0.1"})
+    assert not matches('ip.src eq 10.0.0.0/8', {'ip.src': "192.0.2.1"})
+    assert matches('http.user_agent eq ""', {})
+    assert matches('len(http.host) gt 3', {'http.host': "API.example"})
+
+
+def test_optimized_rules_decide_like_the_originals():
+    rng = random.Random(5)
+    original, optimized = WafEvaluator(WAF_RULES), WafEvaluator(optimize_rules(WAF_RULES))
+    requests = [dict(random_request(rng), **{'cf.bot_management.score': rng.randrange(0, 100)})
+                for _ in range(500)]
+
+    def actions(evaluator):
+        return [(rule.action if rule else None) for rule in map(evaluator.evaluate, requests)]
+
+    assert actions(optimized) == actions(original)
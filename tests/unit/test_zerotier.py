@@ -0,0 +1,178 @@
+"""
+cloudcurio_lib.zerotier.SubnetAllocator
+Allocation order, reservations, exhaustion, saved state and the
+addresses for_nodes() keeps across runs; ZeroTierNetwork's bulk member
+table against per-node components under Pulumi mocks
+"""
+
+import pytest
+
+from benchmarks.harness import run_mocked
+from cloudcurio_lib.zerotier import (
+    AllocationError, SubnetAllocator, ZeroTierMemberTable, ZeroTierNetwork, ZeroTierNetworkArgs,
+    ZeroTierNodeArgs,
+)
+
+
+def test_allocates_in_order_skipping_network_and_broadcast():
+    allocator = SubnetAllocator("172.28.0.0/29")
+    assert [allocator.allocate() for _ in range(6)] == [f"172.28.0.{i}" for i in range(1, 7)]
+    with pytest.raises(AllocationError, match="exhausted"):
+        allocator.allocate()
+    assert allocator.free == 0
+
+
+def test_smaller_than_a_byte():
+    allocator = SubnetAllocator("10.0.0.0/30")
+    assert [allocator.allocate(), allocator.allocate()] == ["10.0.0.1", "10.0.0.2"]
+    with pytest.raises(AllocationError):
+        allocator.allocate()
+
+
+def test_hostnames_keep_their_address():
+    allocator = SubnetAllocator("172.28.0.0/24")
+    first = allocator.allocate("node-a")
+    allocator.allocate("node-b")
+    assert allocator.allocate("node-a") == first
+    assert allocator.used == 4
+
+
+def test_reserve_detects_collisions():
+    allocator = SubnetAllocator("172.28.0.0/24")
+    allocator.reserve("172.28.0.10", "node-a")
+    assert allocator.reserve("172.28.0.10", "node-a") == "172.28.0.10"
+    with pytest.raises(AllocationError, match="held by node-a"):
+        allocator.reserve("172.28.0.10", "node-b")
+    with pytest.raises(AllocationError, match="outside subnet"):
+        allocator.reserve("172.29.0.10")
+    with pytest.raises(AllocationError, match="Invalid address"):
+        allocator.reserve("not-an-ip")
+
+
+def test_allocate_skips_reserved_addresses():
+    allocator = SubnetAllocator("172.28.0.0/24")
+    allocator.reserve("172.28.0.1")
+    allocator.reserve("172.28.0.2")
+    assert allocator.allocate() == "172.28.0.3"
+
+
+def test_released_addresses_are_reused_after_wrapping():
+    allocator = SubnetAllocator("172.28.0.0/28")
+    addresses = [allocator.allocate() for _ in range(14)]
+    allocator.release(addresses[4])
+    assert not allocator.is_allocated(addresses[4])
+    assert allocator.allocate() == addresses[4]
+
+
+def test_release_drops_the_assignment():
+    allocator = SubnetAllocator("172.28.0.0/24")
+    address = allocator.allocate("node-a")
+    allocator.release(address)
+    assert "node-a" not in allocator.assignments
+    assert allocator.used == 2
+
+
+def test_state_round_trips(tmp_path):
+    allocator = SubnetAllocator("172.28.0.0/16")
+    for i in range(1000):
+        allocator.allocate(f"node{i}")
+    allocator.release("172.28.1.0")
+    path = str(tmp_path / "allocations.json")
+    allocator.save(path)
+
+    loaded = SubnetAllocator.load(path, "172.28.0.0/16")
+    assert loaded.used == allocator.used
+    assert loaded.assignments == allocator.assignments
+    assert loaded.allocate() == allocator.allocate()
+    assert SubnetAllocator.load(path, "10.0.0.0/24").used == 2
+
+
+# for_nodes
+
+def nodes(*names, **static):
+    return ([ZeroTierNodeArgs(hostname=name) for name in names]
+            + [ZeroTierNodeArgs(hostname=name, ip_address=ip) for name, ip in static.items()])
+
+
+def test_new_nodes_listed_first_do_not_take_saved_addresses(tmp_path):
+    state = str(tmp_path / "allocations.json")
+    SubnetAllocator.for_nodes("172.28.0.0/24", nodes("a", "b"), state)
+    allocator = SubnetAllocator.for_nodes("172.28.0.0/24", nodes("c", "a", "b"), state)
+    assert allocator.assignments == {'a': "172.28.0.1", 'b': "172.28.0.2", 'c': "172.28.0.3"}
+
+
+def test_a_static_address_wins_over_a_saved_one(tmp_path):
+    state = str(tmp_path / "allocations.json")
+    SubnetAllocator.for_nodes("172.28.0.0/24", nodes("a", "b"), state)
+    allocator = SubnetAllocator.for_nodes("172.28.0.0/24", nodes("a", "b", s="172.28.0.1"), state)
+    assert allocator.assignments == {'s': "172.28.0.1", 'b': "172.28.0.2", 'a': "172.28.0.3"}
+
+
+def test_removed_nodes_free_their_saved_address(tmp_path):
+    state = str(tmp_path / "allocations.json")
+    SubnetAllocator.for_nodes("172.28.0.0/24", nodes("a", "b", "c"), state)
+    allocator = SubnetAllocator.for_nodes("172.28.0.0/24", nodes("d", "c"), state)
+    assert allocator.assignments == {'c': "172.28.0.3", 'd': "172.28.0.1"}
+    assigned = allocator.assign(nodes("d", "c"))
+    assert [node.ip_address for node in assigned] == ["172.28.0.1", "172.28.0.3"]
+
+
+# Bulk member table
+
+FLEET = [
+    ZeroTierNodeArgs(hostname="r720", ip_address="172.28.0.10", description="Dell R720",
+                     tags={'type': "server"}),
+    ZeroTierNodeArgs(hostname="amd", tags={'type': "desktop"}),
+    ZeroTierNodeArgs(hostname="kali", authorized=False),
+    ZeroTierNodeArgs(hostname="mac", ip_address="172.28.0.2"),
+]
+
+
+def build(bulk, nodes=FLEET):
+    """Evaluate one ZeroTierNetwork under mocks; returns it and the run's recordings"""
+    built = []
+
+    def program():
+        built.append(ZeroTierNetwork("zt", ZeroTierNetworkArgs(
+            network_id="0000000000000000", network_name="cloudcurio", nodes=nodes,
+            subnet="172.28.0.0/24", bulk=bulk,
+        )))
+
+    result = run_mocked(program)
+    return built[0], result
+
+
+def test_bulk_members_match_per_node_components():
+    per_node, per_node_run = build(bulk=False)
+    bulk, bulk_run = build(bulk=True)
+    assigned = per_node.allocator.assign(FLEET)
+
+    assert bulk.allocator.assignments == per_node.allocator.assignments
+    for node in assigned:
+        assert bulk.ip_address(node.hostname) == per_node.ip_address(node.hostname)
+        assert bulk.members.member(node.hostname) == node.to_dict()
+        assert per_node_run.outputs[f"zt-{node.hostname}"] == {
+            'hostname': node.hostname, 'ip_address': node.ip_address,
+            'description': node.description,
+        }
+    assert bulk_run.outputs["zt"] == per_node_run.outputs["zt"]
+    assert bulk_run.resource_count < per_node_run.resource_count
+
+
+def test_member_table_stores_default_descriptions_as_none():
+    bulk, result = build(bulk=True)
+    members = result.outputs["zt-members"]
+    assert members['member_count'] == len(FLEET)
+    assert members['members']['description'] == ["Dell R720", None, None, None]
+    assert members['members']['tags'] == [{'type': "server"}, {'type': "desktop"}, None, None]
+    assert bulk.members.member("kali")['description'] == "ZeroTier node for kali"
+    assert "kali" in bulk.members and "nope" not in bulk.members
+
+
+def test_member_table_rejects_duplicate_hostnames():
+    def program():
+        ZeroTierMemberTable("members", [ZeroTierNodeArgs(hostname="a", ip_address="10.0.0.1"),
+                                        ZeroTierNodeArgs(hostname="a", ip_address="10.0.0.2")])
+
+    with pytest.raises(ValueError, match="Duplicate hostnames"):
+        run_mocked(program)